@@ -22,9 +22,109 @@
 # THE SOFTWARE.
 # ------------------------------------------------------------------------------
 
-import bpy, math
+import bpy, bmesh, math
+import numpy as np
 from bpy.props import *
 
+SHAPE_KEY_PROPERTIES = ["interpolation", "mute", "name", "relative_key", "slider_max", "slider_min", "value", "vertex_group"]
+
+def _shapeKeyProperties(key_b):
+    properties_object = {p:getattr(key_b, p) for p in SHAPE_KEY_PROPERTIES}
+    properties_object["relative_key"] = key_b.relative_key.name
+    return properties_object
+
+def _evaluatedCoords(context, obj):
+    depsgraph = context.evaluated_depsgraph_get()
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.to_mesh()
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    obj_eval.to_mesh_clear()
+    return coords.reshape(-1, 3)
+
+# Algorithm:
+# - Disable all other modifiers, so the evaluated mesh has only the applied modifier (like 'Apply' does),
+#   enabled armature modifiers are kept unless disable_armatures is set
+# - Pin each shape key in turn and read the coordinates of the evaluated mesh into one array
+# - Build the new mesh from the evaluated basis and write it to the object data
+# - Add the shape keys again and fill them from the array
+def applyModifierForObjectWithShapeKeys(context, modifierName, disable_armatures):
+    obj = context.object
+    modifier = obj.modifiers[modifierName]
+
+    if not obj.data.shape_keys:
+        bpy.ops.object.modifier_apply(modifier=modifierName)
+        return (True, None)
+    if obj.data.users > 1:
+        return (False, "Modifiers cannot be applied to multi-user data!")
+
+    key_blocks = obj.data.shape_keys.key_blocks
+    list_properties = [_shapeKeyProperties(key_b) for key_b in key_blocks]
+
+    # only the applied modifier, and the armatures if they are included, take part in the evaluation
+    modifiers_state = [(m, m.show_viewport) for m in obj.modifiers]
+    for m in obj.modifiers:
+        m.show_viewport = m == modifier or (not disable_armatures and m.type == 'ARMATURE' and m.show_viewport)
+    object_state = (obj.show_only_shape_key, obj.active_shape_key_index)
+    # a pinned shape key is blended by its vertex group and replaced by the basis when muted
+    for key_b in key_blocks:
+        key_b.vertex_group = ""
+        key_b.mute = False
+
+    wm = context.window_manager
+    wm.progress_begin(0, len(key_blocks))
+    try:
+        obj.show_only_shape_key = True
+        obj.active_shape_key_index = 0
+        depsgraph = context.evaluated_depsgraph_get()
+        basis_mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+        coords = np.empty((len(key_blocks), len(basis_mesh.vertices), 3), dtype=np.float32)
+        for i in range(len(key_blocks)):
+            obj.active_shape_key_index = i
+            key_coords = _evaluatedCoords(context, obj)
+            if len(key_coords) != coords.shape[1]:
+                bpy.data.meshes.remove(basis_mesh)
+                errorInfo = ("Shape keys ended up with different number of vertices!\n"
+                             "All shape keys needs to have the same number of vertices after modifier is applied.\n"
+                             "Otherwise joining such shape keys will fail!")
+                return (False, errorInfo)
+            coords[i] = key_coords
+            wm.progress_update(i)
+    finally:
+        wm.progress_end()
+        obj.show_only_shape_key, obj.active_shape_key_index = object_state
+        for m, show_viewport in modifiers_state:
+            m.show_viewport = show_viewport
+        if obj.data.shape_keys:
+            for key_b, properties_object in zip(obj.data.shape_keys.key_blocks, list_properties):
+                key_b.vertex_group = properties_object["vertex_group"]
+                key_b.mute = properties_object["mute"]
+
+    # replace the geometry, keeping the mesh datablock
+    obj.shape_key_clear()
+    bm = bmesh.new()
+    bm.from_mesh(basis_mesh)
+    bm.to_mesh(obj.data)
+    bm.free()
+    bpy.data.meshes.remove(basis_mesh)
+    obj.modifiers.remove(modifier)
+
+    for i, properties_object in enumerate(list_properties):
+        key_b = obj.shape_key_add(name=properties_object["name"], from_mix=False)
+        key_b.data.foreach_set("co", coords[i].ravel())
+        for p in ("interpolation", "mute", "slider_max", "slider_min", "value", "vertex_group"):
+            setattr(key_b, p, properties_object[p])
+    key_blocks = obj.data.shape_keys.key_blocks
+    for key_b, properties_object in zip(key_blocks, list_properties):
+        rel_key = key_blocks.get(properties_object["relative_key"])
+        if rel_key is not None:
+            key_b.relative_key = rel_key
+    obj.active_shape_key_index = object_state[1]
+    obj.data.update()
+
+    return (True, None)
+
+# Previous implementation, kept for comparison (see benchmark.py)
 # Algorithm:
 # - Duplicate active object as many times as the number of shape keys
 # - For each copy remove all shape keys except one
@@ -34,7 +134,7 @@ from bpy.props import *
 # - Delete all duplicated object except one
 # - Delete old object
 # - Restore name of object and object data
-def applyModifierForObjectWithShapeKeys(context, modifierName, disable_armatures):
+def applyModifierForObjectWithShapeKeysByDuplicates(context, modifierName, disable_armatures):
     
     list_properties = []
     properties = ["interpolation", "mute", "name", "relative_key", "slider_max", "slider_min", "value", "vertex_group"]
@@ -0,0 +1,78 @@
+# Compare the evaluated depsgraph implementation with the previous one (duplicate, apply and join shapes).
+#
+#   blender --background --factory-startup --python benchmark.py -- --keys 150 --subdivisions 100
+#
+# Both run on copies of the same grid with random shape keys and a Subdivision Surface modifier,
+# the resulting shape keys are compared.
+
+import argparse
+import os
+import sys
+import time
+
+import bpy
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from apply_modifier_shape_keys import applyModifierForObjectWithShapeKeys, applyModifierForObjectWithShapeKeysByDuplicates
+
+def make_object(keys, subdivisions, seed=0):
+    bpy.ops.mesh.primitive_grid_add(x_subdivisions=subdivisions, y_subdivisions=subdivisions, size=2)
+    obj = bpy.context.object
+    obj.shape_key_add(name="Basis", from_mix=False)
+    rng = np.random.default_rng(seed)
+    count = len(obj.data.vertices)
+    for i in range(keys):
+        key_b = obj.shape_key_add(name="Key %d" % i, from_mix=False)
+        coords = np.empty(count * 3, dtype=np.float32)
+        key_b.data.foreach_get("co", coords)
+        coords += rng.normal(0, 0.01, coords.shape).astype(np.float32)
+        key_b.data.foreach_set("co", coords)
+        key_b.value = rng.random()
+    obj.modifiers.new("Subdivision", 'SUBSURF').levels = 1
+    return obj
+
+def copy_object(obj):
+    copy = obj.copy()
+    copy.data = obj.data.copy()
+    bpy.context.collection.objects.link(copy)
+    return copy
+
+def key_coords(obj):
+    key_blocks = obj.data.shape_keys.key_blocks
+    coords = np.empty((len(key_blocks), len(obj.data.vertices) * 3), dtype=np.float32)
+    for i, key_b in enumerate(key_blocks):
+        key_b.data.foreach_get("co", coords[i])
+    return [key_b.name for key_b in key_blocks], coords
+
+def run(func, obj):
+    context = bpy.context
+    for o in context.view_layer.objects:
+        o.select_set(False)
+    context.view_layer.objects.active = obj
+    obj.select_set(True)
+    start = time.perf_counter()
+    success, errorInfo = func(context, "Subdivision", True)
+    elapsed = time.perf_counter() - start
+    if not success:
+        raise RuntimeError(errorInfo)
+    return elapsed, key_coords(context.view_layer.objects.active)
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--subdivisions", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    obj = make_object(args.keys, args.subdivisions)
+    print("%d vertices, %d shape keys" % (len(obj.data.vertices), args.keys + 1))
+    new_time, (new_names, new_coords) = run(applyModifierForObjectWithShapeKeys, copy_object(obj))
+    old_time, (old_names, old_coords) = run(applyModifierForObjectWithShapeKeysByDuplicates, copy_object(obj))
+    print("evaluated depsgraph: %.3fs" % new_time)
+    print("duplicate and join:  %.3fs" % old_time)
+    print("speedup:             %.1fx" % (old_time / new_time))
+    print("same shape keys:     %s" % (new_names == old_names and np.allclose(new_coords, old_coords, atol=1e-5)))
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,9 @@
 
 import bpy
 import bmesh
+import numpy as np
 from mathutils import Vector
+from mathutils.kdtree import KDTree
 
 from bpy.types import (Operator, 
                        UIList, 
@@ -41,9 +43,7 @@ class ShapeKeyTransfer:
         self.increment_radius = .05
         self.number_of_increments = 20
         # set total vertices incase you want to run for less number of vertices also set specify_end_vertex to True
-        # set current_vertex index incase you want to continue from another index
         # use_one_vertex will transfer the weight of the closest vertex within the selection sphere
-        self.current_vertex_index = 0
         self.total_vertices       = 0
         self.specify_end_vertex   = False # not yet implemented
         self.use_one_vertex       = True
@@ -57,86 +57,67 @@ class ShapeKeyTransfer:
         self.src_mwi              = None
         self.dest_shape_key_index = 0
         self.src_shape_key_index  = 0
-        self.do_once_per_vertex   = False        
-        self.current_vertex       = None
-        self.src_chosen_vertices  = []
         self.message              = ""
         self.skip_vertices_with_no_pair = False
 
-    # select required vertices within a radius and return array of indices
-    def select_vertices(self, center, radius):            
-        src_chosen_vertices = []
-        closest_vertex_index = -1
-        radius_vec = center + Vector((0, 0, radius))        
-        # put selection sphere in local coords.
-        lco = self.src_mwi @ center
-        r   = self.src_mwi @ (radius_vec) - lco
-        closest_length = r.length        
-
-        # select verts within radius
-        for index, v in enumerate(self.src_mesh.data.shape_keys.key_blocks[0].data):
-            is_selected = (v.co - lco).length <= r.length     
-            if(is_selected):
-                src_chosen_vertices.append(index)
-                if(self.use_one_vertex):
-                    if((v.co - lco).length <= closest_length):
-                        closest_length = (v.co - lco).length
-                        closest_vertex_index = index            
-
-        # update closest vertex
-        if(self.use_one_vertex):                
-            src_chosen_vertices = []
-            if(closest_vertex_index > - 1):
-                src_chosen_vertices.append(closest_vertex_index)            
-
-        return src_chosen_vertices
-
-    # this select function initially starts (if level=0) by matching a point in same space as the source mesh and if it cant find similar positioned point we increment search radius   
-    def select_required_verts(self, vert, rad, level=0):    
-        verts = []
-        if(level > self.number_of_increments):
-            return verts 
-        verts = self.select_vertices(vert, rad)    
-        if(len(verts) == 0):
-            return self.select_required_verts(vert, rad + self.increment_radius, level + 1)
-        else:        
-            return verts
-
-    # set the new vertex position on the shape key
-    def set_vertex_position(self, v_pos):    
-        self.dest_mesh.data.shape_keys.key_blocks[self.dest_shape_key_index].data[self.current_vertex_index].co = v_pos
-
-    # update 1 vertex of destination mesh
-    def update_vertex(self):
-        if(self.current_vertex_index >= self.total_vertices ):
-            return False
-
-        if(self.do_once_per_vertex):
-            #mathutils now uses the PEP 465 binary operator for multiplying matrices change * to @
-            self.current_vertex = self.dest_mesh.matrix_world @ self.dest_mesh.data.shape_keys.key_blocks[0].data[self.current_vertex_index].co       
-            self.src_chosen_vertices = self.select_required_verts(self.current_vertex,0)   
-            self.do_once_per_vertex = False
-
-        if(len(self.src_chosen_vertices) == 0):
-            self.message = ("Failed to find surrounding vertices | Try increasing increment radius | vertex index " + str(self.current_vertex_index) + " at shape key index " + str(self.src_shape_key_index))
-            self.current_vertex_index += 1
-            if(not self.skip_vertices_with_no_pair):
-                return True
-            else:
-                return False
-
-        result_position = Vector()    
-        for v in self.src_chosen_vertices:
-            result_position +=  self.src_mesh.data.shape_keys.key_blocks[0].data[v].co    
-        result_position /= len(self.src_chosen_vertices)
-
-        result_position2 = Vector()
-        for v in self.src_chosen_vertices:
-            result_position2 += self.src_mesh.data.shape_keys.key_blocks[self.src_shape_key_index].data[v].co        
-        result_position2 /= len(self.src_chosen_vertices)    
-        result = result_position2 - result_position + self.current_vertex        
-        self.set_vertex_position(result)
-        return False
+    # read the coordinates of a shape key as a (n, 3) array
+    def get_key_coords(self, key_block):
+        coords = np.empty(len(key_block.data) * 3, dtype=np.float32)
+        key_block.data.foreach_get("co", coords)
+        return coords.reshape(-1, 3).astype(np.float64)
+
+    # write a (n, 3) array to the coordinates of a shape key
+    def set_key_coords(self, key_block, coords):
+        key_block.data.foreach_set("co", np.ascontiguousarray(coords, dtype=np.float32).ravel())
+
+    # build a kd-tree of the source basis vertices (in source local space) once per transfer
+    def build_source_index(self, src_basis):
+        tree = KDTree(len(src_basis))
+        for index, co in enumerate(src_basis.tolist()):
+            tree.insert(co, index)
+        tree.balance()
+        return tree
+
+    # radius of each selection sphere (level 0 matches points in the same place), converted to source local space
+    def selection_radii(self):
+        radii = [0.0]
+        for level in range(self.number_of_increments):
+            radii.append(radii[-1] + self.increment_radius)
+        return np.array(radii) * (self.src_mwi.to_3x3() @ Vector((0, 0, 1))).length
+
+    # match all destination vertices (world coords) at once, returns a sparse mapping to the source vertices
+    # (rows: destination vertex, cols: source vertex, weights) and the mask of matched destination vertices
+    def match_vertices(self, tree, src_count, centers):
+        mwi = np.array(self.src_mwi)
+        local_centers = centers @ mwi[:3, :3].T + mwi[:3, 3]
+        radii = self.selection_radii()
+
+        nearest = np.zeros(len(centers), dtype=np.int64)
+        distance = np.full(len(centers), np.inf)
+        if src_count:
+            for i, co in enumerate(local_centers.tolist()):
+                _, nearest[i], distance[i] = tree.find(co)
+        # the smallest selection sphere containing the closest vertex
+        levels = np.searchsorted(radii, distance)
+        matched = levels < len(radii)
+
+        if self.use_one_vertex:
+            rows = np.flatnonzero(matched)
+            cols = nearest[rows]
+            return rows, cols, np.ones(len(rows)), matched
+
+        rows = []
+        cols = []
+        for i in np.flatnonzero(matched).tolist():
+            found = [index for _, index, _ in tree.find_range(local_centers[i].tolist(), radii[levels[i]])]
+            if not found:
+                found = [int(nearest[i])]
+            rows.extend([i] * len(found))
+            cols.extend(found)
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        counts = np.bincount(rows, minlength=len(centers))
+        return rows, cols, 1.0 / counts[rows], matched
 
     # store shapekey index 
     def update_global_shapekey_indices(self, p_key_name): 
@@ -156,15 +137,13 @@ class ShapeKeyTransfer:
     def transfer_shape_keys(self, src, dest, use_only_excluded_shape_keys = False):
         self.src_mesh   = self.get_parent(src)
         self.dest_mesh  = self.get_parent(dest)
-        self.src_mwi    = self.src_mesh.matrix_world.inverted()
-        
-        self.current_vertex_index = 0
 
         local_shape_key_list = [] # used only when considering excluded shape keys
 
         if(not(self.src_mesh and self.dest_mesh)):
             self.message = "The meshes are not valid!"
             return True
+        self.src_mwi    = self.src_mesh.matrix_world.inverted()
         if(self.specify_end_vertex == False):
             self.total_vertices = len(self.dest_mesh.data.vertices)            
         if(not hasattr(self.src_mesh.data.shape_keys, "key_blocks")):
@@ -187,27 +166,44 @@ class ShapeKeyTransfer:
                     valid_shape_key = True
             if(not valid_shape_key):
                 self.dest_mesh.shape_key_add(name=src_shape_key_iter.name)
-                
-
-        # all vertices in destination mesh
-        while(self.current_vertex_index < self.total_vertices):
-            self.do_once_per_vertex = True
-            print("Vertex: " + str(self.current_vertex_index + 1) + "/" + str(self.total_vertices))
-            if(use_only_excluded_shape_keys):
-                for key_name in local_shape_key_list:
-                    self.update_global_shapekey_indices(key_name)            
-                    if(self.update_vertex()):
-                        return True
-            else:
-                # Iterate all shape keys 
-                for shape_key_iter in self.src_mesh.data.shape_keys.key_blocks:    
-                    key_name = shape_key_iter.name
-                    # exclude shapekeys not needed
-                    if(not (key_name in self.excluded_shape_keys)):
-                        self.update_global_shapekey_indices(key_name)            
-                        if(self.update_vertex()):
-                            return True
-            self.current_vertex_index += 1
+
+        if(use_only_excluded_shape_keys):
+            key_names = local_shape_key_list
+        else:
+            # exclude shapekeys not needed
+            key_names = [sk.name for sk in self.src_mesh.data.shape_keys.key_blocks if not (sk.name in self.excluded_shape_keys)]
+        if(len(key_names) == 0):
+            self.message = "Transferred Shape Keys successfully!"
+            return False
+
+        src_key_blocks  = self.src_mesh.data.shape_keys.key_blocks
+        dest_key_blocks = self.dest_mesh.data.shape_keys.key_blocks
+        src_basis = self.get_key_coords(src_key_blocks[0])
+        #mathutils now uses the PEP 465 binary operator for multiplying matrices change * to @
+        mw = np.array(self.dest_mesh.matrix_world)
+        centers = self.get_key_coords(dest_key_blocks[0])[:self.total_vertices] @ mw[:3, :3].T + mw[:3, 3]
+
+        # find the surrounding source vertices of every destination vertex once, for all shape keys
+        tree = self.build_source_index(src_basis)
+        rows, cols, weights, matched = self.match_vertices(tree, len(src_basis), centers)
+        if(not (self.skip_vertices_with_no_pair or matched.all())):
+            self.message = ("Failed to find surrounding vertices | Try increasing increment radius | vertex index " + str(np.argmin(matched)))
+            return True
+        print("Matched vertices: " + str(np.count_nonzero(matched)) + "/" + str(len(matched)))
+
+        for key_name in key_names:
+            self.update_global_shapekey_indices(key_name)
+            # average offset of the chosen source vertices from the basis
+            delta = (self.get_key_coords(src_key_blocks[self.src_shape_key_index]) - src_basis)[cols] * weights[:, None]
+            offset = np.zeros_like(centers)
+            for axis in range(3):
+                offset[:, axis] = np.bincount(rows, delta[:, axis], minlength=len(centers))
+
+            dest_key = dest_key_blocks[self.dest_shape_key_index]
+            coords = self.get_key_coords(dest_key)
+            coords[:self.total_vertices][matched] = centers[matched] + offset[matched]
+            self.set_key_coords(dest_key, coords)
+        self.dest_mesh.data.update()
         self.message = "Transferred Shape Keys successfully!"
         return False
     
@@ -206,7 +206,7 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
 
         return closest_pos
 
-    def raycast_grid_coord(self, context, x, y, up_vector, right_vector, normal, work_layer_mask=0):
+    def raycast_grid_coord(self, context, x, y, up_vector, right_vector, normal, work_layer_mask=0, use_tree=False):
         """
         Raycast agains the object using grid coordinates around the cursor
         :param context:
@@ -216,6 +216,7 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
         :param right_vector:
         :param normal:
         :param work_layer_mask:
+        :param use_tree: Use the BVH tree of self.bmesh instead of building one, it must be up to date
         :return:
         """
         obj = context.object
@@ -229,20 +230,29 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
 
         ray_direction = -normal
 
+        tree = None
+        mesh = None
+        if use_tree:
+            tree = self.tree
+            mesh = self.bmesh
+
         return VIEW3D_OP_SprytileModalTool.raycast_object(obj, ray_origin, ray_direction, ray_dist=ray_offset*2,
-                                   work_layer_mask=work_layer_mask)
+                                   work_layer_mask=work_layer_mask, tree=tree, mesh=mesh)
 
     @staticmethod
     def raycast_object(obj, ray_origin, ray_direction, ray_dist=1000.0,
-                       world_normal=False, work_layer_mask=0, pass_dist=0.001):
+                       world_normal=False, work_layer_mask=0, pass_dist=0.001,
+                       tree=None, mesh=None):
         matrix = obj.matrix_world.copy()
         # get the ray relative to the object
         matrix_inv = matrix.inverted()
         ray_origin_obj = matrix_inv @ ray_origin
         ray_target_obj = matrix_inv @ (ray_origin + ray_direction)
         ray_direction_obj = ray_target_obj - ray_origin_obj
-        mesh = bmesh.from_edit_mesh(obj.data)
-        tree = BVHTree.FromBMesh(mesh)
+        # Building the tree is costly, reuse the given one and its bmesh
+        if tree is None or mesh is None:
+            mesh = bmesh.from_edit_mesh(obj.data)
+            tree = BVHTree.FromBMesh(mesh)
 
         location, normal, face_index, distance = tree.ray_cast(ray_origin_obj, ray_direction_obj, ray_dist)
         if face_index is None:
@@ -274,7 +284,8 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             # add shift offset if passing through
             shift_vec = ray_direction.normalized() * pass_dist
             new_ray_origin = location + shift_vec
-            return VIEW3D_OP_SprytileModalTool.raycast_object(obj, new_ray_origin, ray_direction, work_layer_mask=work_layer_mask)
+            return VIEW3D_OP_SprytileModalTool.raycast_object(obj, new_ray_origin, ray_direction, work_layer_mask=work_layer_mask,
+                                                              tree=tree, mesh=mesh)
 
         if world_normal:
             normal = matrix @ normal
@@ -401,26 +412,21 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
 
         return face_index
 
-    def merge_doubles(self, context, face, ray_origin, ray_direction, threshold):
-        face.select = True
-        work_layer_id = self.bmesh.faces.layers.int.get(UvDataLayers.WORK_LAYER)
-        work_layer_value = face[work_layer_id]
-        for check_face in self.bmesh.faces:
-            check_face.select = check_face[work_layer_id] == work_layer_value
-
-        merge_threshold = 0.00
+    @staticmethod
+    def get_merge_threshold(context):
+        merge_threshold = 0.0001
         if context.scene.sprytile_data.work_layer != 'BASE':
             merge_threshold = 0.01
-        bpy.ops.mesh.remove_doubles(threshold=merge_threshold, use_unselected=False)
+        return merge_threshold
+
+    def merge_doubles(self, context, face, ray_origin, ray_direction, threshold):
+        self.weld_faces([face], self.get_merge_threshold(context))
 
         for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
             el.index_update()
             el.ensure_lookup_table()
 
-        self.bmesh.select_flush_mode()
-
-        for iter_face in self.bmesh.faces:
-            iter_face.select = False
+        bmesh.update_edit_mesh(context.object.data, True, True)
 
         # Modified the mesh, refresh and raycast to find the new face index
         self.update_bmesh_tree(context)
@@ -428,12 +434,174 @@ class VIEW3D_OP_SprytileModalTool(bpy.types.Operator):
             context.object,
             ray_origin,
             ray_direction,
-            0.02
+            0.02,
+            tree=self.tree,
+            mesh=self.bmesh
         )
         if new_face_idx is not None:
             self.bmesh.faces[new_face_idx].select = False
         return new_face_idx
 
+    def weld_faces(self, faces, threshold):
+        """
+        Weld the vertices of the given faces to the vertices of faces on the same work layer
+        :param faces: BMFaces with their work layer set
+        :param threshold: Maximum distance between welded vertices, in object space
+        :return:
+        """
+        work_layer_id = self.bmesh.faces.layers.int.get(UvDataLayers.WORK_LAYER)
+        if work_layer_id is None or len(faces) == 0:
+            return
+        work_layers = set(face[work_layer_id] for face in faces)
+
+        new_verts = list(dict.fromkeys(vert for face in faces for vert in face.verts))
+
+        # Only vertices around the new ones can be welded
+        min_co = Vector([min(vert.co[i] for vert in new_verts) - threshold for i in range(3)])
+        max_co = Vector([max(vert.co[i] for vert in new_verts) + threshold for i in range(3)])
+
+        # Spatial hash of the vertices kept
+        cell_size = threshold * 2
+        cells = {}
+
+        def get_cell(co):
+            return (math.floor(co.x / cell_size), math.floor(co.y / cell_size), math.floor(co.z / cell_size))
+
+        def find_vert(co):
+            cell = get_cell(co)
+            for x in range(cell[0] - 1, cell[0] + 2):
+                for y in range(cell[1] - 1, cell[1] + 2):
+                    for z in range(cell[2] - 1, cell[2] + 2):
+                        for vert in cells.get((x, y, z), ()):
+                            if (vert.co - co).length <= threshold:
+                                return vert
+            return None
+
+        new_vert_set = set(new_verts)
+        for vert in self.bmesh.verts:
+            if vert in new_vert_set:
+                continue
+            co = vert.co
+            if not (min_co.x <= co.x <= max_co.x and min_co.y <= co.y <= max_co.y and min_co.z <= co.z <= max_co.z):
+                continue
+            if not any(face[work_layer_id] in work_layers for face in vert.link_faces):
+                continue
+            cells.setdefault(get_cell(co), []).append(vert)
+
+        target_map = {}
+        for vert in new_verts:
+            target = find_vert(vert.co)
+            if target is not None:
+                target_map[vert] = target
+            else:
+                cells.setdefault(get_cell(vert.co), []).append(vert)
+
+        if len(target_map) > 0:
+            bmesh.ops.weld_verts(self.bmesh, targetmap=target_map)
+
+    def construct_faces(self, context, tiles,
+                        grid_up, grid_right,
+                        up_vector, right_vector, plane_normal,
+                        require_base_layer=False,
+                        work_layer_mask=0):
+        """
+        Create new 1x1 faces or remap the existing faces of many tiles in a single bmesh edit.
+        self.tree must be up to date, it is rebuilt once at the end
+        :param context:
+        :param tiles: List of (grid_coord, tile_xy, tile_origin, paint_setting), paint_setting can be None
+        :param grid_up:
+        :param grid_right:
+        :param up_vector:
+        :param right_vector:
+        :param plane_normal:
+        :param require_base_layer:
+        :param work_layer_mask:
+        :return:
+        """
+        scene = context.scene
+        data = scene.sprytile_data
+        world_inv = context.object.matrix_world.inverted()
+
+        # Calculate where the origin of the grid is
+        grid_origin = scene.cursor.location.copy()
+        # If doing mesh decal, offset the grid origin
+        if data.work_layer == 'DECAL_1':
+            grid_origin += plane_normal * data.mesh_decal_offset
+
+        # Raycast all tiles against the mesh before modifying it,
+        # faces to remap are kept and tiles to build get their face position
+        hit_faces = []
+        build_positions = []
+        for grid_coord, tile_xy, tile_origin, paint_setting in tiles:
+            hit_loc, hit_normal, face_index, hit_dist = self.raycast_grid_coord(
+                context, grid_coord[0], grid_coord[1],
+                grid_up, grid_right, plane_normal,
+                work_layer_mask=work_layer_mask, use_tree=True
+            )
+            hit_face = None
+            build_position = None
+
+            if face_index is not None and face_index > -1:
+                # Only remap coplanar faces
+                check_dot = abs(abs(plane_normal.dot(hit_normal)) - 1) < 0.05
+                check_coplanar = abs(distance_point_to_plane(hit_loc, grid_origin, plane_normal)) < 0.05
+                if check_dot and check_coplanar:
+                    hit_face = self.bmesh.faces[face_index]
+            else:
+                base_face_index = 0
+                if require_base_layer:
+                    base_face_index = self.raycast_grid_coord(
+                        context, grid_coord[0], grid_coord[1],
+                        grid_up, grid_right, plane_normal, use_tree=True
+                    )[2]
+                # Build only if there is a base layer underneath when required
+                if base_face_index is not None:
+                    build_position = grid_origin + grid_coord[0] * grid_right + grid_coord[1] * grid_up
+
+            hit_faces.append(hit_face)
+            build_positions.append(build_position)
+
+        # Create the new faces
+        target_faces = []
+        new_faces = []
+        for hit_face, face_position in zip(hit_faces, build_positions):
+            if face_position is None:
+                target_faces.append(hit_face)
+                continue
+            face_verts = sprytile_utils.get_build_vertices(face_position, grid_right, grid_up,
+                                                           up_vector, right_vector)
+            face = self.bmesh.faces.new([self.bmesh.verts.new(world_inv @ vtx) for vtx in face_verts])
+            face.normal_update()
+            new_faces.append(face)
+            target_faces.append(face)
+
+        for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
+            el.index_update()
+            el.ensure_lookup_table()
+
+        # UV map all faces, the edit mesh is updated at the end
+        for tile, face in zip(tiles, target_faces):
+            if face is None:
+                continue
+            grid_coord, tile_xy, tile_origin, paint_setting = tile
+            if paint_setting is not None:
+                sprytile_utils.from_paint_settings(data, paint_setting)
+            sprytile_uv.uv_map_face(context, up_vector, right_vector,
+                                    tile_xy, tile_origin, face.index,
+                                    self.bmesh, update_mesh=False)
+
+        if data.auto_merge and len(new_faces) > 0:
+            self.weld_faces(new_faces, self.get_merge_threshold(context))
+
+            for el in [self.bmesh.faces, self.bmesh.verts, self.bmesh.edges]:
+                el.index_update()
+                el.ensure_lookup_table()
+
+        bmesh.update_edit_mesh(context.object.data, True, True)
+
+        self.update_bmesh_tree(context)
+        self.refresh_mesh = False
+
     def create_face(self, context, world_vertices):
         """
         Create a face in the bmesh using the given world space vertices
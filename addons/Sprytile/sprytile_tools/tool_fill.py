@@ -82,7 +82,8 @@ class ToolFill:
         if hit_coord.y < grid_min[1] or hit_coord.y >= grid_max[1]:
             return
 
-        # Build the fill map
+        # Build the fill map, raycasting against one BVH tree of the mesh
+        self.modal.update_bmesh_tree(context, True)
         sel_coords, sel_size, sel_ids = sprytile_utils.get_grid_selection_ids(context, grid)
         fill_map, face_idx_array = self.build_fill_map(context, grid_up, grid_right, plane_normal,
                                                        plane_size, grid_min, grid_max, sel_ids)
@@ -117,14 +118,13 @@ class ToolFill:
         require_base_layer = sprytile_data.work_layer != 'BASE'
 
         origin_xy = (grid.tile_selection[0], grid.tile_selection[1])
-        data = scene.sprytile_data
-        # Loop through list of coords to be filled
+        # List the tiles of the coords to be filled
+        tiles = []
         for idx, cell_coord in enumerate(fill_coords):
             # Fetch the paint settings from cache
+            paint_setting = None
             if paint_setting_cache is not None:
                 paint_setting = paint_setting_cache[idx]
-                if paint_setting is not None:
-                    sprytile_utils.from_paint_settings(data, paint_setting)
 
             # Convert map coord to grid coord
             grid_coord = [grid_min[0] + cell_coord[0],
@@ -133,18 +133,21 @@ class ToolFill:
             sub_x = (grid_coord[0] - int(hit_coord.x)) % sel_size[0]
             sub_y = (grid_coord[1] - int(hit_coord.y)) % sel_size[1]
             sub_xy = sel_coords[(sub_y * sel_size[0]) + sub_x]
-            self.modal.construct_face(context, grid_coord, [1,1],
-                                      sub_xy, origin_xy,
-                                      grid_up, grid_right,
-                                      up_vector, right_vector,
-                                      plane_normal,
-                                      require_base_layer=require_base_layer,
-                                      work_layer_mask=work_layer_mask)
+            tiles.append((grid_coord, sub_xy, origin_xy, paint_setting))
+
+        # Build all the faces in a single mesh edit
+        self.modal.construct_faces(context, tiles,
+                                   grid_up, grid_right,
+                                   up_vector, right_vector,
+                                   plane_normal,
+                                   require_base_layer=require_base_layer,
+                                   work_layer_mask=work_layer_mask)
 
     def build_fill_map(self, context, grid_up, grid_right,
                        plane_normal, plane_size, grid_min, grid_max,
                        selected_ids):
-        # Use raycast_grid_coord to build a 2d array of work plane
+        # Use raycast_grid_coord to build a 2d array of work plane,
+        # the BVH tree of the modal tool must be up to date
 
         fill_array = numpy.full((plane_size[1], plane_size[0]), -1)
         face_idx_array = numpy.full((plane_size[1], plane_size[0]), -1)
@@ -154,7 +157,8 @@ class ToolFill:
             for x in range(grid_min[0], grid_max[0]):
                 hit_loc, hit_normal, face_index, hit_dist = self.modal.raycast_grid_coord(
                                                                 context, x, y,
-                                                                grid_up, grid_right, plane_normal)
+                                                                grid_up, grid_right, plane_normal,
+                                                                use_tree=True)
 
                 if hit_loc is not None:
                     grid_id, tile_packed_id, width, height, origin = self.modal.get_tiledata_from_index(face_index)
@@ -235,7 +235,8 @@ def get_uv_paint_modify(data, uv_verts, uv_matrix, pad_scale, uv_unit_x, uv_unit
     return uv_verts
 
 
-def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index, mesh, tile_size=(1, 1)):
+def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index, mesh, tile_size=(1, 1),
+                update_mesh=True):
     """
     UV map the given face
     :param context:
@@ -246,6 +247,7 @@ def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index
     :param face_index: Face index to UV map
     :param mesh:
     :param tile_size: Tile units being UV mapped
+    :param update_mesh: Update the edit mesh, when False the caller updates it after mapping many faces
     :return:
     """
     if mesh is None:
@@ -298,14 +300,15 @@ def uv_map_face(context, up_vector, right_vector, tile_xy, origin_xy, face_index
               target_grid, mesh, data,
               target_img, tile_xy,
               origin_xy=origin_xy,
-              uv_layer=uv_layer)
+              uv_layer=uv_layer,
+              update_mesh=update_mesh)
 
     return face.index, target_grid
 
 
 def apply_uvs(context, face, uv_verts, target_grid,
               mesh, data, target_img, tile_xy,
-              uv_layer=None, origin_xy=None):
+              uv_layer=None, origin_xy=None, update_mesh=True):
 
     if uv_layer is None:
         uv_layer = mesh.loops.layers.uv.verify()
@@ -352,8 +355,9 @@ def apply_uvs(context, face, uv_verts, target_grid,
     face[paint_settings_id] = paint_settings
     face[work_layer_id] = work_layer_data
 
-    bmesh.update_edit_mesh(context.object.data)
-    mesh.faces.index_update()
+    if update_mesh:
+        bmesh.update_edit_mesh(context.object.data)
+        mesh.faces.index_update()
 
     return face.index, target_grid
 
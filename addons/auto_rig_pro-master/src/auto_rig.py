@@ -1,4 +1,5 @@
 import bpy, bmesh, mathutils, math, bpy_extras, ast, os, time, sys, re
+import numpy as np
 from bpy.types import (Operator, Menu, Panel, UIList, PropertyGroup)
 from bpy.props import *
 from mathutils import *
@@ -16989,26 +16990,18 @@ def bind_improve_weights(_obj, self):
                     print('  cleaning head weights...', head_side)
                     remove_other_parts = ["thumb", "hand", "index", "middle", "ring", "pinky", "arm_", "forearm", "shoulder_bend"]
 
-                    for vert in _obj.data.vertices:
-                        is_in_head_group = False                                           
-
-                        if len(vert.groups):
-                            for grp in vert.groups:
-                                vg_id = grp.group
-                                if vg_id > len(_obj.vertex_groups)-1 or vg_id < 0:# unknown bug, vertex group ID is invalid, skip for now
-                                    continue
-
-                                cur_vgroup = _obj.vertex_groups[vg_id]
-                                group_name = cur_vgroup.name
-
-                                # check if is in head
-                                if group_name == 'head'+head_side:
-                                    if grp.weight > 0.1:
-                                        is_in_head_group = True
-                                        
-                                for part in remove_other_parts:
-                                    if part in group_name and is_in_head_group:
-                                        cur_vgroup.add([vert.index], 0.00, 'REPLACE')
+                    vert_idx, grp_idx, grp_weights = get_vgroups_weights(object=_obj)
+                    head_grp_idx = _obj.vertex_groups['head'+head_side].index
+                    is_in_head_group = np.zeros(len(_obj.data.vertices), dtype=bool)
+                    is_in_head_group[vert_idx[(grp_idx == head_grp_idx) & (grp_weights > 0.1)]] = True
+
+                    for cur_vgroup in _obj.vertex_groups:
+                        for part in remove_other_parts:
+                            if part in cur_vgroup.name:
+                                head_verts = vert_idx[(grp_idx == cur_vgroup.index) & is_in_head_group[vert_idx]]
+                                if len(head_verts):
+                                    cur_vgroup.add(head_verts.tolist(), 0.00, 'REPLACE')
+                                break
                 
             # Delete helpers vertex groups        
             for vgroup in _obj.vertex_groups:
@@ -17124,104 +17117,105 @@ def bind_improve_weights(_obj, self):
             transfer_weight_mod(object=_obj, dict=copy_weights, replace=True)
 
         # apply a gradient decay based on the bone head/tail position
-        twist_bones_dict = {}# store local vars to minimize overhead in the loop
-
-        for vert in _obj.data.vertices:
-            if len(vert.groups):
-                for grp in vert.groups:
-
-                    grp_idx = grp.group
-                    if grp_idx > len(_obj.vertex_groups)-1 or grp_idx < 0:# unknown error, grp idx is out of range
-                        continue
-
-                    current_grp_name = _obj.vertex_groups[grp_idx].name
-
-                    for twist_bone_name in transfer_twists: 
-                        stretch_bone_name = transfer_twists[twist_bone_name][0]
-
-                        if current_grp_name == twist_bone_name or current_grp_name == stretch_bone_name:
+        vert_idx, grp_idx, grp_weights = get_vgroups_weights(object=_obj)
+        verts_co = np.empty(len(_obj.data.vertices)*3, dtype=np.float64)
+        _obj.data.vertices.foreach_get('co', verts_co)
+        obj_mat_np = np.array(obj_mat)
+        verts_co = verts_co.reshape(-1, 3) @ obj_mat_np[:3, :3].T + obj_mat_np[:3, 3]
+        mag = np.linalg.norm
+        
+        twist_grp_names = []
+        for twist_bone_name in transfer_twists:
+            for grp_name in [twist_bone_name, transfer_twists[twist_bone_name][0]]:
+                if not grp_name in twist_grp_names:
+                    twist_grp_names.append(grp_name)
+
+        for current_grp_name in twist_grp_names:
+            vgroup = _obj.vertex_groups.get(current_grp_name)
+            if vgroup == None:
+                continue
+            in_grp = grp_idx == vgroup.index
+            if not in_grp.any():
+                continue
 
-                            # get the vertex position projected on the bone to evaluate weight
-                            if not current_grp_name in twist_bones_dict:
-                                twist_bones_dict[current_grp_name] = rig_mat @ self.rig.pose.bones[current_grp_name].head.copy(), rig_mat @ self.rig.pose.bones[current_grp_name].tail.copy()
-                            
-                            bone_head, bone_tail = twist_bones_dict[current_grp_name]
-                            bone_tail_next = bone_tail+(bone_tail-bone_head)# 
-                            bone_head_prev = bone_head+(bone_head-bone_tail)# use negative side
-                            point = obj_mat @ vert.co
-                            
-                            distance = 0
-                            side = get_bone_side(current_grp_name)
-                            twist_bones_amount = {}
-                            if 'arm' in current_grp_name:
-                                twist_bones_amount = arms_twist_bones_amounts[get_bone_side(current_grp_name)] 
-                            elif 'thigh' in current_grp_name or 'leg' in current_grp_name:
-                                twist_bones_amount = legs_twist_bones_amounts[get_bone_side(current_grp_name)] 
+            # get the vertices position projected on the bone to evaluate weights
+            grp_verts = vert_idx[in_grp]
+            point = verts_co[grp_verts]
+            bone_head = np.array(rig_mat @ self.rig.pose.bones[current_grp_name].head)
+            bone_tail = np.array(rig_mat @ self.rig.pose.bones[current_grp_name].tail)
+            bone_tail_next = bone_tail+(bone_tail-bone_head)# 
+            bone_head_prev = bone_head+(bone_head-bone_tail)# use negative side
+            
+            distance = None
+            side = get_bone_side(current_grp_name)
+            twist_bones_amount = {}
+            if 'arm' in current_grp_name:
+                twist_bones_amount = arms_twist_bones_amounts[get_bone_side(current_grp_name)] 
+            elif 'thigh' in current_grp_name or 'leg' in current_grp_name:
+                twist_bones_amount = legs_twist_bones_amounts[get_bone_side(current_grp_name)] 
+            
+            if 'forearm' in current_grp_name or 'leg' in current_grp_name:
+                if 'forearm_twist'+side in current_grp_name or 'leg_twist'+side in current_grp_name:# forearm twist tip, extend two units backward
+                    pos = project_points_onto_line(bone_head_prev, bone_tail, point) 
+                    distance = mag(pos - bone_tail, axis=1) / mag(bone_head_prev - bone_tail)
+                    
+                elif 'forearm_twist_' in current_grp_name or 'leg_twist_' in current_grp_name:# other twists
+                    if '_2'+side in current_grp_name:# special case, the second twist must extend 2 units forward, and one backward
+                        pos = project_points_onto_line(bone_head_prev, bone_tail_next, point)
+                        dist_head_to_next = mag(bone_head-bone_tail_next)
+                        dist_pos_to_next = mag(pos-bone_tail_next, axis=1)
+                        # forward, backward
+                        distance = np.where(dist_pos_to_next <= dist_head_to_next, 
+                                            mag(pos - bone_head, axis=1) / mag(bone_tail_next - bone_head), 
+                                            mag(pos - bone_head, axis=1) / mag(bone_head_prev-bone_head))
                             
-                            if 'forearm' in current_grp_name or 'leg' in current_grp_name:
-                                if 'forearm_twist'+side in current_grp_name or 'leg_twist'+side in current_grp_name:# forearm twist tip, extend two units backward
-                                    pos = project_point_onto_line(bone_head_prev, bone_tail, point) 
-                                    distance = (pos - bone_tail).magnitude / (bone_head_prev - bone_tail).magnitude                                  
-                                    
-                                elif 'forearm_twist_' in current_grp_name or 'leg_twist_' in current_grp_name:# other twists
-                                    if '_2'+side in current_grp_name:# special case, the second twist must extend 2 units forward, and one backward
-                                        pos = project_point_onto_line(bone_head_prev, bone_tail_next, point)
-                                        dist_head_to_next = (bone_head-bone_tail_next).magnitude
-                                        dist_pos_to_next = (pos-bone_tail_next).magnitude
-                                        
-                                        if dist_pos_to_next <= dist_head_to_next:# forward                          
-                                            distance = (pos - bone_head).magnitude / (bone_tail_next - bone_head).magnitude
-                                        else:# backward
-                                            distance = (pos - bone_head).magnitude / (bone_head_prev-bone_head).magnitude
-                                            
-                                    else:# other twists
-                                        pos = project_point_onto_line(bone_head_prev, bone_tail, point)
-                                        distance = (pos - bone_head).magnitude / (bone_head - bone_tail).magnitude
-                                        
-                                if 'forearm_stretch'+side in current_grp_name or 'leg_stretch'+side in current_grp_name:
-                                    if twist_bones_amount > 1:
-                                        pos = project_point_onto_line(bone_head, bone_tail, point)
-                                        distance = (pos - bone_head).magnitude / (bone_tail - bone_head).magnitude                                    
-                                    else:# special case, if only one twist bone, the stretch bone must expand 2 units forward
-                                        pos = project_point_onto_line(bone_head, bone_tail_next, point)
-                                        distance = (pos - bone_head).magnitude / (bone_head - bone_tail_next).magnitude
-                                
-                            elif 'arm' in current_grp_name or 'thigh' in current_grp_name:
-                                if 'arm_stretch'+side in current_grp_name or 'thigh_stretch'+side in current_grp_name:
-                                    pos = project_point_onto_line(bone_head_prev, bone_tail, point) 
-                                    distance = (pos - bone_tail).magnitude / (bone_head_prev - bone_tail).magnitude
-                                    
-                                elif ('arm_twist'+side in current_grp_name or 'arm_twist_offset'+side in current_grp_name) or ('thigh_twist'+side in current_grp_name):
-                                    if twist_bones_amount > 1:
-                                        pos = project_point_onto_line(bone_head, bone_tail, point)
-                                        distance = (pos - bone_head).magnitude / (bone_tail - bone_head).magnitude                                    
-                                    else:# special case, if only one twist bone, the stretch bone must expand 2 units forward
-                                        pos = project_point_onto_line(bone_head, bone_tail_next, point)
-                                        distance = (pos - bone_head).magnitude / (bone_head - bone_tail_next).magnitude
-                                        
-                                elif 'arm_twist_' in current_grp_name or 'thigh_twist_' in current_grp_name:# twist > 1
-                                    if '_'+str(twist_bones_amount)+side in current_grp_name:# special case, the second twist must extend 2 units forward, and one backward
-                                        pos = project_point_onto_line(bone_head_prev, bone_tail_next, point)
-                                        dist_head_to_next = (bone_head-bone_tail_next).magnitude
-                                        dist_pos_to_next = (pos-bone_tail_next).magnitude
-                                        
-                                        if dist_pos_to_next <= dist_head_to_next:# forward                          
-                                            distance = (pos - bone_head).magnitude / (bone_tail_next - bone_head).magnitude
-                                        else:# backward
-                                            distance = (pos - bone_head).magnitude / (bone_head_prev-bone_head).magnitude
-                                            
-                                    else:# other twists
-                                        pos = project_point_onto_line(bone_head_prev, bone_tail, point)
-                                        distance = (pos - bone_head).magnitude / (bone_head - bone_tail).magnitude
-                                
-                            # clamp distance
-                            if distance > 1:
-                                distance = 1
+                    else:# other twists
+                        pos = project_points_onto_line(bone_head_prev, bone_tail, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_head - bone_tail)
+                        
+                if 'forearm_stretch'+side in current_grp_name or 'leg_stretch'+side in current_grp_name:
+                    if twist_bones_amount > 1:
+                        pos = project_points_onto_line(bone_head, bone_tail, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_tail - bone_head)
+                    else:# special case, if only one twist bone, the stretch bone must expand 2 units forward
+                        pos = project_points_onto_line(bone_head, bone_tail_next, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_head - bone_tail_next)
+                
+            elif 'arm' in current_grp_name or 'thigh' in current_grp_name:
+                if 'arm_stretch'+side in current_grp_name or 'thigh_stretch'+side in current_grp_name:
+                    pos = project_points_onto_line(bone_head_prev, bone_tail, point) 
+                    distance = mag(pos - bone_tail, axis=1) / mag(bone_head_prev - bone_tail)
+                    
+                elif ('arm_twist'+side in current_grp_name or 'arm_twist_offset'+side in current_grp_name) or ('thigh_twist'+side in current_grp_name):
+                    if twist_bones_amount > 1:
+                        pos = project_points_onto_line(bone_head, bone_tail, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_tail - bone_head)
+                    else:# special case, if only one twist bone, the stretch bone must expand 2 units forward
+                        pos = project_points_onto_line(bone_head, bone_tail_next, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_head - bone_tail_next)
+                        
+                elif 'arm_twist_' in current_grp_name or 'thigh_twist_' in current_grp_name:# twist > 1
+                    if '_'+str(twist_bones_amount)+side in current_grp_name:# special case, the second twist must extend 2 units forward, and one backward
+                        pos = project_points_onto_line(bone_head_prev, bone_tail_next, point)
+                        dist_head_to_next = mag(bone_head-bone_tail_next)
+                        dist_pos_to_next = mag(pos-bone_tail_next, axis=1)
+                        # forward, backward
+                        distance = np.where(dist_pos_to_next <= dist_head_to_next, 
+                                            mag(pos - bone_head, axis=1) / mag(bone_tail_next - bone_head), 
+                                            mag(pos - bone_head, axis=1) / mag(bone_head_prev-bone_head))
                             
-                            # set weight
-                            _obj.vertex_groups[current_grp_name].add([vert.index], grp.weight * (1 - distance), 'REPLACE')
-
-                            break
+                    else:# other twists
+                        pos = project_points_onto_line(bone_head_prev, bone_tail, point)
+                        distance = mag(pos - bone_head, axis=1) / mag(bone_head - bone_tail)
+            
+            if distance is None:
+                continue
+                
+            # clamp distance
+            distance = np.minimum(distance, 1)
+            
+            # set weights
+            set_vgroup_weights(vgroup, grp_verts, grp_weights[in_grp] * (1 - distance))
 
     if facial_enabled:
         print('  smoothing eyelids weights...')
@@ -17761,6 +17755,12 @@ def _bind_to_rig(self, context):
     weights_dict = {}
     non_selected_verts_dict = {}
     
+    # built-in heat maps solver, no need to split loose parts and reduce high resolution meshes
+    use_heat_solver = scn.arp_bind_engine == "HEAT_MAP" and scn.arp_bind_heat_solver
+    if use_heat_solver and not is_heat_solver_available():
+        print("SciPy not found, using Blender heat maps")
+        use_heat_solver = False
+    
     # scale
     if scn.arp_bind_scale_fix:
         # scale meshes
@@ -17819,7 +17819,7 @@ def _bind_to_rig(self, context):
                         break
 
     # High resolution meshes? If so reduce the polycount, and transfer weights back at the end
-    if scn.arp_optimize_highres and scn.arp_bind_engine == "HEAT_MAP":
+    if scn.arp_optimize_highres and scn.arp_bind_engine == "HEAT_MAP" and not use_heat_solver:
         for obj_name in self.obj_to_skin.copy():
             obj = get_object(obj_name)
 
@@ -18058,7 +18058,7 @@ def _bind_to_rig(self, context):
                        
         
         # split loose parts in option for better auto-skinning
-        if scn.arp_bind_split and scn.arp_bind_engine == "HEAT_MAP":
+        if scn.arp_bind_split and scn.arp_bind_engine == "HEAT_MAP" and not use_heat_solver:
             # duplicate to preserve vertex ID when splitting
             #if not "_arp_temp_skin" in obj_name:
             if not is_object_id(obj, '_arp_temp_skin', suffix_only=True):
@@ -18102,7 +18102,10 @@ def _bind_to_rig(self, context):
                 set_active_object(split_obj.name)
                 set_active_object(self.rig_add.name)
 
-                bpy.ops.object.parent_set(type='ARMATURE_AUTO')
+                if use_heat_solver:
+                    parent_armature_heat(split_obj, self.rig_add, split_loose=scn.arp_bind_split)
+                else:
+                    bpy.ops.object.parent_set(type='ARMATURE_AUTO')
 
                 set_active_object(split_obj.name)
                 get_armature_mod(self.rig_add.name).name = "rig_add"
@@ -18115,7 +18118,10 @@ def _bind_to_rig(self, context):
                 set_active_object(self.rig.name)
 
                 with redirect_stdout(self.skin_prints):
-                    bpy.ops.object.parent_set(type='ARMATURE_AUTO')
+                    if use_heat_solver:
+                        parent_armature_heat(split_obj, self.rig, split_loose=scn.arp_bind_split)
+                    else:
+                        bpy.ops.object.parent_set(type='ARMATURE_AUTO')
 
                 set_active_object(split_obj.name)
                 rig_mod = get_armature_mod(self.rig.name)
@@ -18300,49 +18306,51 @@ def _bind_to_rig(self, context):
 
             # fix vertices with no weights if any
             fix_verts = True
-            fix_vert_timestart = time.time()
 
             if fix_verts:
                 #print("\nFixing weights...")
+                edges = np.empty(len(obj.data.edges)*2, dtype=np.int64)
+                obj.data.edges.foreach_get('vertices', edges)
+                edges = edges.reshape(-1, 2)
+                # both directions of the edges, (vertex, connected vertex)
+                edges_verts = np.concatenate((edges[:, 0], edges[:, 1]))
+                edges_connected = np.concatenate((edges[:, 1], edges[:, 0]))
+                edges_order = np.concatenate((np.arange(len(edges)), np.arange(len(edges))))
+
+                # weights fixed in a step can be passed on to their neighbours in the next step,
+                # repeat until no more vertex can be fixed
+                prev_no_weight_count = None
+                while True:
+                    vert_idx, grp_idx, grp_weights = get_vgroups_weights(object=obj)
+                    has_weights = np.zeros(len(obj.data.vertices), dtype=bool)
+                    has_weights[vert_idx] = True
+                    verts_no_weight = np.flatnonzero(~has_weights)
+                    
+                    # copy the weights of the first connected vertex with weights
+                    valid = ~has_weights[edges_verts] & has_weights[edges_connected]
+                    sort = np.lexsort((edges_order[valid], edges_verts[valid]))
+                    fix_verts_idx, first = np.unique(edges_verts[valid][sort], return_index=True)
+                    source_verts_idx = edges_connected[valid][sort][first]
+                    if len(fix_verts_idx) == 0 or len(verts_no_weight) == prev_no_weight_count:
+                        break
+                    prev_no_weight_count = len(verts_no_weight)
+                    
+                    # weights entries of the source vertices, sorted by vertex
+                    entries = np.argsort(vert_idx, kind='stable')
+                    counts = np.bincount(vert_idx, minlength=len(obj.data.vertices))
+                    starts = np.cumsum(counts) - counts
+                    repeats = counts[source_verts_idx]
+                    offsets = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+                    copied = entries[np.repeat(starts[source_verts_idx], repeats) + offsets]
+                    copied_verts = np.repeat(fix_verts_idx, repeats)
+
+                    for grp_i in np.unique(grp_idx[copied]):
+                        if grp_i > len(obj.vertex_groups)-1:
+                            continue
+                        in_grp = grp_idx[copied] == grp_i
+                        set_vgroup_weights(obj.vertex_groups[int(grp_i)], copied_verts[in_grp], grp_weights[copied][in_grp])
 
-                for i in range(0, 2):# apply two times, hack to fix remaining issues...
-                    edges = [e.vertices for e in obj.data.edges]
-                    verts_no_weight = []
-                    fixed_weight_verts = []
-
-                    for v in obj.data.vertices:
-                        if (time.time() - fix_vert_timestart) > 6:# limit search to 6 seconds, if more, the skinning is probably invalid
-                            break
-
-                        if len(v.groups) == 0:
-                            verts_no_weight.append(v.index)
-
-                            # look for a connected vert
-                            vert_is_fixed = False
-
-                            for edge_verts in edges:
-
-                                if vert_is_fixed:
-                                    break
-
-                                if v.index in edge_verts:
-                                    for edge_vert_idx in edge_verts:
-                                        new_vert = obj.data.vertices[edge_vert_idx]
-                                        if len(new_vert.groups):
-                                            if v.index in fixed_weight_verts:
-                                                continue
-
-                                            for grp in new_vert.groups:
-                                                grp_idx = grp.group
-                                                grp_weight = grp.weight
-                                                vertex_group = obj.vertex_groups[grp_idx]
-                                                vertex_group.add([v.index], grp_weight, 'REPLACE')
-                                                vert_is_fixed = True
-
-                                            fixed_weight_verts.append(v.index)
-
-                    if len(fixed_weight_verts):
-                        print("Fixed "+ str(len(fixed_weight_verts)) + " vertices weights out of "+str(len(verts_no_weight)))
+                    print("Fixed "+ str(len(fix_verts_idx)) + " vertices weights out of "+str(len(verts_no_weight)))
 
 
     # Assign skinned objects to collection
@@ -39243,10 +39251,12 @@ class ARP_PT_binding_settings(Panel, ArpRigPanel):
             col = layout.column()
             col.separator()
             col.prop(scn, "arp_bind_split", text="Split Parts")
+            col.prop(scn, "arp_bind_heat_solver", text="Fast Solver")
             col = layout.column()
+            col.enabled = not scn.arp_bind_heat_solver
             col.prop(scn, "arp_optimize_highres", text="Optimize High Res")
             col = layout.column(align=True)
-            col.enabled = scn.arp_optimize_highres
+            col.enabled = scn.arp_optimize_highres and not scn.arp_bind_heat_solver
             col.prop(scn, "arp_highres_threshold", text="Polycount Threshold")
 
         elif scn.arp_bind_engine == "PSEUDO_VOXELS":
@@ -39870,6 +39880,8 @@ def register():
     bpy.types.Scene.arp_bind_improve_heels = BoolProperty(default=True, name="Improve Heels Weights", description="Improve foot, heel weights")
     bpy.types.Scene.arp_bind_split = BoolProperty(default=True,
                                                             description="Improve skinning by separating the loose parts (e.g: hats, buttons, belt...) before binding.\nWarning: meshes with a lot of separate pieces can take several minutes to bind.")
+    bpy.types.Scene.arp_bind_heat_solver = BoolProperty(default=False, name="Fast Heat Maps Solver",
+                                                            description="Compute heat maps with a built-in sparse solver, all bones at once, without splitting loose parts nor reducing high resolution meshes.\nRequires SciPy, otherwise Blender heat maps are used")
     bpy.types.Scene.arp_bind_chin = BoolProperty(default=True,
                                                            description="Improve head skinning based on the chin position, defined by Smart or approximated.\nOnly when facial is disabled, and biped type", name="Refine Head Weights")
     bpy.types.Scene.arp_bind_preserve = BoolProperty(default=True,
@@ -39956,6 +39968,7 @@ def unregister():
     del bpy.types.Scene.arp_bind_improve_twists
     del bpy.types.Scene.arp_bind_improve_heels
     del bpy.types.Scene.arp_bind_split
+    del bpy.types.Scene.arp_bind_heat_solver
     del bpy.types.Scene.arp_bind_chin
     del bpy.types.Scene.arp_bind_preserve
     del bpy.types.Scene.arp_bind_scale_fix
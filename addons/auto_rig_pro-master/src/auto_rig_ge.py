@@ -983,10 +983,18 @@ class ARP_OT_export(Operator):
         
         export_timer_total = 0.0
         
+        # profile the export stages if enabled, results are saved next to the exported file
+        self.profiler = ARP_Profiler(enabled=context.scene.arp_ge_profile, 
+                                    armature=context.active_object.name if context.active_object else '',
+                                    export_format=self.export_format, rig_type=context.scene.arp_export_rig_type, 
+                                    engine=context.scene.arp_engine_type, filepath=self.filepath)
+        self.profiler.begin('export')
+        
         
 
         try:
             time_start = time.time()
+            self.profiler.begin('export_prep')
             
             scn = bpy.context.scene
             
@@ -1220,7 +1228,8 @@ class ARP_OT_export(Operator):
                     col.hide_viewport = False            
             
             # Create copy objects
-            create_copies(self)
+            with self.profiler.stage('create_copies'):
+                create_copies(self)
             
             # Initialize arp_armatures scales
             self.arm_scale = get_object(self.armature_name+'_arpexp').scale[0]
@@ -1350,11 +1359,13 @@ class ARP_OT_export(Operator):
             if scn.arp_export_rig_type == 'HUMANOID':
 
                 # Set the humanoid armature
-                _set_humanoid_rig(self.armature_name, self.armature_add_name, False, self)
+                with self.profiler.stage('set_humanoid_rig'):
+                    _set_humanoid_rig(self.armature_name, self.armature_add_name, False, self)
                 
                 if scn.arp_engine_type == 'UNREAL':
                     if scn.arp_rename_for_ue:
-                        rename_for_ue()
+                        with self.profiler.stage('rename_for_ue'):
+                            rename_for_ue()
 
                         if scn.arp_mannequin_axes:
                             _set_mannequin_orientations(self)
@@ -1364,7 +1375,8 @@ class ARP_OT_export(Operator):
                 
                 elif scn.arp_engine_type == 'GODOT':
                     if scn.arp_rename_for_godot:
-                        rename_for_godot()
+                        with self.profiler.stage('rename_for_godot'):
+                            rename_for_godot()
                     
                 # custom renaming
                 if scn.arp_export_renaming:
@@ -1379,9 +1391,11 @@ class ARP_OT_export(Operator):
                 
                 # Bake Actions?
                 if scn.arp_bake_anim and len(bpy.data.actions):
-                    _bake_all(self.armature_name, "rig_humanoid", self)                    
+                    with self.profiler.stage('bake_all'):
+                        _bake_all(self.armature_name, "rig_humanoid", self)                    
                 else:                    
-                    _bake_pose("rig_humanoid")
+                    with self.profiler.stage('bake_pose'):
+                        _bake_pose("rig_humanoid")
 
                 # x100 units?
                 if (scn.arp_export_bake_axis_convert == False and scn.arp_engine_type == 'UNITY' and self.export_format == 'FBX') or scn.arp_engine_type in ['UNREAL', 'OTHERS'] or self.export_format == 'GLTF':
@@ -1412,7 +1426,8 @@ class ARP_OT_export(Operator):
             # M-Ped Export?
             if scn.arp_export_rig_type == 'UNIVERSAL':
                 # Set the mped armature
-                _set_mped_rig(self.armature_name, self.armature_add_name, False, self)
+                with self.profiler.stage('set_mped_rig'):
+                    _set_mped_rig(self.armature_name, self.armature_add_name, False, self)
 
                 # custom renaming
                 if scn.arp_export_renaming:
@@ -1427,9 +1442,11 @@ class ARP_OT_export(Operator):
 
                 # Bake Actions?
                 if scn.arp_bake_anim and len(bpy.data.actions):
-                    _bake_all(self.armature_name, "rig_mped", self)
+                    with self.profiler.stage('bake_all'):
+                        _bake_all(self.armature_name, "rig_mped", self)
                 else:
-                    _bake_pose("rig_mped")
+                    with self.profiler.stage('bake_pose'):
+                        _bake_pose("rig_mped")
                 
                 # x100 units?
                 if (scn.arp_export_bake_axis_convert == False and scn.arp_engine_type == 'UNITY' and self.export_format == 'FBX') or scn.arp_engine_type in ['UNREAL', 'OTHERS'] or self.export_format == 'GLTF':
@@ -1501,6 +1518,7 @@ class ARP_OT_export(Operator):
             
             #print(br)
             
+            self.profiler.end()# export_prep
             prep_time = round(time.time() - time_start, 2)
             export_timer_total += prep_time
             print("Export Prep Time:", prep_time, "seconds.")            
@@ -1542,6 +1560,8 @@ class ARP_OT_export(Operator):
                     else:
                         def_fp = self.filepath[:-4] + scn.arp_export_file_separator + export_id + '.fbx'
                 
+                self.profiler.begin(self.export_format.lower()+'_export', export_id=export_id)
+                
                 if self.export_format == 'FBX':
                     bpy.ops.arp_export_scene.fbx(filepath=def_fp, use_selection=True, 
                     global_scale=scn.arp_global_scale, apply_unit_scale=True, apply_scale_options=_apply_scale,
@@ -1554,7 +1574,8 @@ class ARP_OT_export(Operator):
                     shape_keys_baked_data=str(self.shape_keys_data), mesh_names_data=str(self.meshes_names_dict),
                     use_custom_props=True,
                     path_mode='COPY' if scn.arp_export_tex else 'AUTO', embed_textures=scn.arp_export_tex, export_action_only=export_id,
-                    use_triangles=scn.arp_export_triangulate, colors_type=scn.arp_ge_vcol_type
+                    use_triangles=scn.arp_export_triangulate, colors_type=scn.arp_ge_vcol_type,
+                    use_export_cache=scn.arp_ge_export_cache
                     )
                     
                 elif self.export_format == 'GLTF':
@@ -1578,6 +1599,8 @@ class ARP_OT_export(Operator):
                         args['export_animation_mode'] = 'ACTIONS'
                         
                     bpy.ops.export_scene.gltf(**args)
+                    
+                self.profiler.end()
         
             exporter_timer = round(time.time() - time_start, 2)
             export_timer_total += exporter_timer
@@ -1590,6 +1613,9 @@ class ARP_OT_export(Operator):
         
         finally:     
             time_start = time.time()
+            # close the stages left open by errors
+            self.profiler.end_all(keep=1)
+            self.profiler.begin('revert')
             
             if get_object(scn.arp_export_rig_name):
                 # check if mesh objects have same names as bones
@@ -1795,6 +1821,17 @@ class ARP_OT_export(Operator):
             revert_timer = round(time.time() - time_start, 2)
             export_timer_total += revert_timer
             print("Revert changes time:", revert_timer, "seconds.")
+            
+            self.profiler.end_all()
+            if self.profiler.enabled:
+                self.profiler.print_summary()
+                profile_fp = os.path.splitext(self.filepath)[0]
+                try:
+                    self.profiler.write_json(profile_fp+'_arp_profile.json')
+                    self.profiler.write_chrome_trace(profile_fp+'_arp_trace.json')
+                    print("Profiling saved to:", profile_fp+'_arp_profile.json')
+                except OSError as e:
+                    print("Could not save the export profiling:", e)
         
         self.report({'INFO'}, 'Character Exported')
         
@@ -1964,7 +2001,7 @@ class ARP_OT_unbind_humanoid(Operator):
 def _save_preset(self):
     scn = bpy.context.scene
     
-    settings_list = ['arp_export_rig_type', 'arp_engine_type', 'arp_ue4', 'arp_rename_for_ue', 'arp_rename_for_godot', 'arp_export_twist', 'arp_twist_fac', 'arp_keep_bend_bones', 'arp_full_facial', 'arp_push_bend', 'arp_mannequin_axes', 'arp_ue_ik', 'arp_ue_ik_anim', 'arp_ue_root_motion', 'arp_only_containing', 'arp_export_name_string', 'arp_units_x100', 'arp_bake_anim', 'arp_bake_type', 'arp_frame_range_type', 'arp_export_start_frame', 'arp_export_end_frame', 'arp_bake_only_active', 'arp_simplify_fac', 'arp_ge_bake_sample', 'arp_ge_startend_keying', 'arp_global_scale', 'arp_mesh_smooth_type', 'arp_use_tspace', 'arp_bone_axis_primary_export', 'arp_bone_axis_secondary_export', 'arp_fix_fbx_rot', 'arp_fix_fbx_matrix', 'arp_init_fbx_rot', 'arp_init_fbx_rot_mesh', 'arp_export_tex', 'arp_ge_sel_only', 'arp_ge_sel_bones_only', 'arp_see_actions', 'arp_export_noparent', 'arp_export_rig_name', 'arp_export_act_name', 'arp_export_file_separator', 'arp_export_actlist_idx', 'arp_export_use_actlist', 'arp_export_separate_fbx', 'arp_export_renaming', 'arp_rename_fp', 'arp_custom_export_script', 'arp_apply_mods', 'arp_apply_subsurf', 'arp_retro_ge_UE_twist_pos', 'arp_retro_ge_frame_range', 'arp_export_bake_axis_convert', 'arp_ge_add_dummy_mesh', 'arp_ge_force_rest_pose_export', 'arp_ge_gltf_format', 'arp_ge_gltf_all_inf', 'arp_ge_gltf_sk_normals', 'arp_ge_gltf_sk_tangents', 'arp_ge_gltf_unitsx100', 'arp_ge_gltf_sample_anim', 'arp_export_triangulate', 'arp_ge_vcol_type', 'arp_ge_master_traj', 'arp_ge_export_metacarp', 'arp_export_actlist']
+    settings_list = ['arp_export_rig_type', 'arp_engine_type', 'arp_ue4', 'arp_rename_for_ue', 'arp_rename_for_godot', 'arp_export_twist', 'arp_twist_fac', 'arp_keep_bend_bones', 'arp_full_facial', 'arp_push_bend', 'arp_mannequin_axes', 'arp_ue_ik', 'arp_ue_ik_anim', 'arp_ue_root_motion', 'arp_only_containing', 'arp_export_name_string', 'arp_units_x100', 'arp_bake_anim', 'arp_bake_type', 'arp_frame_range_type', 'arp_export_start_frame', 'arp_export_end_frame', 'arp_bake_only_active', 'arp_simplify_fac', 'arp_ge_bake_sample', 'arp_ge_startend_keying', 'arp_ge_bake_processes', 'arp_ge_bake_reduce', 'arp_ge_export_cache', 'arp_global_scale', 'arp_mesh_smooth_type', 'arp_use_tspace', 'arp_bone_axis_primary_export', 'arp_bone_axis_secondary_export', 'arp_fix_fbx_rot', 'arp_fix_fbx_matrix', 'arp_init_fbx_rot', 'arp_init_fbx_rot_mesh', 'arp_export_tex', 'arp_ge_sel_only', 'arp_ge_sel_bones_only', 'arp_see_actions', 'arp_export_noparent', 'arp_export_rig_name', 'arp_export_act_name', 'arp_export_file_separator', 'arp_export_actlist_idx', 'arp_export_use_actlist', 'arp_export_separate_fbx', 'arp_export_renaming', 'arp_rename_fp', 'arp_custom_export_script', 'arp_apply_mods', 'arp_apply_subsurf', 'arp_retro_ge_UE_twist_pos', 'arp_retro_ge_frame_range', 'arp_export_bake_axis_convert', 'arp_ge_add_dummy_mesh', 'arp_ge_force_rest_pose_export', 'arp_ge_gltf_format', 'arp_ge_gltf_all_inf', 'arp_ge_gltf_sk_normals', 'arp_ge_gltf_sk_tangents', 'arp_ge_gltf_unitsx100', 'arp_ge_gltf_sample_anim', 'arp_export_triangulate', 'arp_ge_vcol_type', 'arp_ge_master_traj', 'arp_ge_export_metacarp', 'arp_export_actlist']
     
     export_settings = {}
     for setting in settings_list:
@@ -3922,8 +3959,9 @@ def _bake_all(armature_name, baked_armature_name, self):
         
         print("  Baking NLA:", act_export_name, '['+str(int(fs))+'-'+str(int(fe))+']')
         
-        bake_anim(frame_start=fs, frame_end=fe, only_selected=True, bake_bones=True, bake_object=True, 
-                    shape_keys=True, _self=self, action_export_name=act_export_name, sampling_rate=scn.arp_ge_bake_sample)
+        with self.profiler.stage('bake_nla', action=act_export_name, frame_start=fs, frame_end=fe):
+            bake_anim(frame_start=fs, frame_end=fe, only_selected=True, bake_bones=True, bake_object=True, 
+                        shape_keys=True, _self=self, action_export_name=act_export_name, sampling_rate=scn.arp_ge_bake_sample, reduce_tolerance=scn.arp_ge_bake_reduce)
 
         try:
             # set action name
@@ -4115,8 +4153,9 @@ def _bake_all(armature_name, baked_armature_name, self):
                 # Bake bones transforms
                 print("  Baking action:", act_export_name, '['+str(int(fs))+'-'+str(int(fe))+']')
                 
-                bake_anim(frame_start=fs, frame_end=fe, only_selected=True, bake_bones=True, bake_object=True,
-                        shape_keys=True, _self=self, action_export_name=act_export_name, sampling_rate=scn.arp_ge_bake_sample)
+                with self.profiler.stage('bake_action', action=act_export_name, frame_start=fs, frame_end=fe):
+                    bake_anim(frame_start=fs, frame_end=fe, only_selected=True, bake_bones=True, bake_object=True,
+                            shape_keys=True, _self=self, action_export_name=act_export_name, sampling_rate=scn.arp_ge_bake_sample, reduce_tolerance=scn.arp_ge_bake_reduce)
                 
                 # Bake fcurve of custom properties driving shape keys if any
                 # Disable it for now, useless since shape keys are already baked previously
@@ -9237,7 +9276,10 @@ def export_panel_draw(self, context):
             col = box.column(align=True)
             col.prop(scn, "arp_simplify_fac")
             col.prop(scn, 'arp_ge_bake_sample')
+            col.prop(scn, 'arp_ge_bake_reduce')
             col.prop(scn, 'arp_ge_startend_keying')
+            if scn.arp_bake_type == 'ACTIONS':
+                col.prop(scn, 'arp_ge_bake_processes')
 
         if scn.arp_bake_type == 'NLA':
             return
@@ -9502,6 +9544,9 @@ def export_panel_draw(self, context):
             row = col1.row()
             row.label(text='Vertex Colors:')
             row.prop(scn, 'arp_ge_vcol_type', text='')        
+            col1.separator()
+            col1.prop(scn, 'arp_ge_export_cache')
+        col.prop(scn, 'arp_ge_profile')
         
         if self.export_format == 'FBX':
             box = layout.box()
@@ -9677,6 +9722,10 @@ def register():
     bpy.types.Scene.arp_simplify_fac = FloatProperty(name="Simplify Factor", default = 0.01, min=0.0, max=100, description="Simplify factor to compress the animation data size. Lower value = higher quality, higher file size")
     bpy.types.Scene.arp_ge_bake_sample = FloatProperty(name='Sampling Rate', default=1.0, min=0.001, max=1.0, description='Sampling rate when baking. Value below 1.0 allows subframe baking, e.g 0.1 = 10 keyframes per frame')
     bpy.types.Scene.arp_ge_startend_keying = BoolProperty(name='Force Start/End Keying', description='Always add a keyframe at start and end of actions for animated channels', default=True)
+    bpy.types.Scene.arp_ge_profile = BoolProperty(name='Profile Export', default=False, description='Record the time, RNA calls and memory of each export stage and baked action.\nSaved next to the exported file as JSON and Chrome trace (chrome://tracing, Perfetto) files')
+    bpy.types.Scene.arp_ge_export_cache = BoolProperty(name='Export Cache', default=False, description='Reuse the meshes and actions of previous exports when their data did not change, for faster repeated exports.\nThe cache is stored in the Blender user data folder')
+    bpy.types.Scene.arp_ge_bake_processes = IntProperty(name='Bake Processes', default=0, min=0, soft_max=16, description='Number of background Blender processes sampling the actions that only animate bones, when exporting multiple actions.\n0 samples all actions in this session. Starting processes has a cost, useful for many or long actions')
+    bpy.types.Scene.arp_ge_bake_reduce = FloatProperty(name='Reduce Tolerance', default=0.0, min=0.0, soft_max=0.01, precision=4, description='Remove the baked keyframes of linear and constant F-Curves that can be interpolated from their neighbours within this tolerance.\n0 keeps all keyframes')
     bpy.types.Scene.arp_global_scale = FloatProperty(name="Global Scale", default = 1.0, description="Global scale applied")
     bpy.types.Scene.arp_mesh_smooth_type = EnumProperty(name="Smoothing", items=(('OFF', "Normals Only", "Export only normals instead of writing edge or face smoothing data"), ('FACE', "Face", "Write face smoothing"), ('EDGE', "Edge", "Write edge smoothing")), description="Export smoothing information (prefer 'Normals Only' option if your target importer understand split normals)",default='OFF')
     bpy.types.Scene.arp_use_tspace = BoolProperty(name="Tangent Space", default=False, description="Add binormal and tangent vectors, together with normal they form the tangent space (will only work correctly with tris/quads only meshes!)")
@@ -9780,6 +9829,10 @@ def unregister():
     del bpy.types.Scene.arp_export_end_frame
     del bpy.types.Scene.arp_bake_only_active
     del bpy.types.Scene.arp_simplify_fac
+    del bpy.types.Scene.arp_ge_bake_processes
+    del bpy.types.Scene.arp_ge_bake_reduce
+    del bpy.types.Scene.arp_ge_export_cache
+    del bpy.types.Scene.arp_ge_profile
     del bpy.types.Scene.arp_ge_bake_sample
     del bpy.types.Scene.arp_ge_startend_keying
     del bpy.types.Scene.arp_global_scale
@@ -4,6 +4,7 @@ from bpy.props import StringProperty, FloatProperty, IntProperty, BoolProperty,
 from math import degrees, pi, radians, ceil, sqrt
 from bpy.types import Panel, UIList
 import mathutils
+import numpy as np
 from mathutils import Vector, Euler, Matrix
 from . import auto_rig
 from .utils import *
@@ -1109,6 +1110,7 @@ class ARP_OT_retarget(Operator):
     clean_fk_rot: BoolProperty(default=False, name='Clean FK rotations', description='Ensure single rotation axis for forearm and leg FK controllers (ARP armatures only)')
     clean_ik_pole: BoolProperty(default=False, name='Clean IK Poles', description='Remove IK pole bones keyframes below a given angle threshold')
     clean_ik_pole_angle: FloatProperty(default=5.0, name='Clean IK Pole Angle', description='Angle threshold')
+    fast_bake: BoolProperty(default=False, name='Fast Bake', description='Compute the retargetted animation from the source F-Curves for all frames at once, instead of evaluating the scene at each frame (much faster on long animations).\nFalls back to regular baking if the armatures use unsupported features: drivers, NLA, non-retargetting constraints...')
     too_long_bones_names: BoolProperty(default=False)
     
     source_origin_not_normalized = False
@@ -1194,6 +1196,7 @@ class ARP_OT_retarget(Operator):
         row1 = row.row()
         row1.prop(self, 'clean_ik_pole_angle', text='Angle')
         row1.enabled = self.clean_ik_pole
+        layout.prop(self, 'fast_bake')
         layout.separator() 
         
 
@@ -2934,8 +2937,12 @@ def _retarget(self):
                     continue
                     
                 pb_src.location, pb_src.rotation_mode, pb_src.rotation_euler, pb_src.rotation_quaternion = transf_offset_dict[bname]              
-                scn.frame_set(scn.frame_current)# bones transforms update hack
-                mat_redef_rest[bname] = pb_src.matrix.copy()
+                
+            # bones are stored parents first, a single update gives the same matrices as updating after each bone
+            scn.frame_set(scn.frame_current)# bones transforms update hack
+            for bname in transf_offset_dict.keys():
+                if bname not in mat_redef_rest:
+                    mat_redef_rest[bname] = get_pose_bone(bname).matrix.copy()
             
             #   get diff
             for pb_src in source_rig.pose.bones:
@@ -3542,11 +3549,29 @@ def _retarget(self):
                 frstart = source_rig.animation_data.action.frame_range[0]
                 frend = source_rig.animation_data.action.frame_range[1]
             
-            bpy.ops.transform.rotate(value=0)# update hack   
-       
-            # bake anim 
-            bake_anim(frame_start=frstart, frame_end=frend, only_selected=True, bake_bones=True, bake_object=False, 
-                interpolation_type=self.interpolation_type, handle_type=self.handle_type, support_constraints=True)
+            fast_baked = False
+            if self.fast_bake:
+                # compute the retargetted pose from the source F-Curves, no per-frame scene evaluation
+                baked_bones = [pb for pb in context.active_object.pose.bones if pb.bone.select]
+                frames = np.array(get_bake_frames(frstart, frend, 1.0))
+                bones_data = _retarget_math_bake(source_rig, context.active_object, baked_bones, frames)
+                
+                if isinstance(bones_data, str):
+                    print("  Fast bake not supported, " + bones_data + ". Baking frame by frame...")
+                else:
+                    action = bpy.data.actions.new('Action')
+                    context.active_object.animation_data_create().action = action
+                    set_bones_keyframes(action, baked_bones, frames, bones_data, 
+                        interpolation_type=self.interpolation_type, handle_type=self.handle_type)
+                    print("")
+                    fast_baked = True
+                    
+            if not fast_baked:
+                bpy.ops.transform.rotate(value=0)# update hack   
+           
+                # bake anim 
+                bake_anim(frame_start=frstart, frame_end=frend, only_selected=True, bake_bones=True, bake_object=False, 
+                    interpolation_type=self.interpolation_type, handle_type=self.handle_type, support_constraints=True)
             
             # Change action name
             target_rig.animation_data.action.name = source_rig.animation_data.action.name + '_remap'
@@ -3693,24 +3718,26 @@ def _retarget(self):
                 print("  Clean IK pole keyframes...")
                 if self.bind_only == False:               
                     angle_tolerance = self.clean_ik_pole_angle
-
-                    for keyframe in fcurves[0].keyframe_points:
-                        cframe = keyframe.co[0]
-                        if int(cframe) < self.frame_start or int(cframe) > self.frame_end:
-                            continue
-                        #check angle at each frames
-                        #scn.frame_current = keyframe.co[0]
-                        scn.frame_set(int(cframe))
-
-                        for key, value in ik_chains.items():
-                            bone1 = get_object(scn.source_rig).pose.bones[value[0]]
-                            bone2 = get_object(scn.source_rig).pose.bones[value[1]]
-                            chain_angle = bone1.y_axis.angle(bone2.y_axis)
-
-                            if math.degrees(chain_angle) < angle_tolerance:
-                                #remove keyframe, just interpolate
-                                pole_bone = get_object(scn.target_rig).pose.bones[value[2]]
-                                pole_bone.keyframe_delete(data_path="location")
+                    
+                    # fast bake: evaluate the chains angles from the F-Curves
+                    if not (self.fast_bake and _clean_ik_poles_math(self, fcurves[0], ik_chains)):
+                        for keyframe in fcurves[0].keyframe_points:
+                            cframe = keyframe.co[0]
+                            if int(cframe) < self.frame_start or int(cframe) > self.frame_end:
+                                continue
+                            #check angle at each frames
+                            #scn.frame_current = keyframe.co[0]
+                            scn.frame_set(int(cframe))
+
+                            for key, value in ik_chains.items():
+                                bone1 = get_object(scn.source_rig).pose.bones[value[0]]
+                                bone2 = get_object(scn.source_rig).pose.bones[value[1]]
+                                chain_angle = bone1.y_axis.angle(bone2.y_axis)
+
+                                if math.degrees(chain_angle) < angle_tolerance:
+                                    #remove keyframe, just interpolate
+                                    pole_bone = get_object(scn.target_rig).pose.bones[value[2]]
+                                    pole_bone.keyframe_delete(data_path="location")
 
 
             # restore source rig pos
@@ -3758,6 +3785,367 @@ def _retarget(self):
     scn.frame_set(current_frame)
 
     
+# Fast bake: the binding setup (helper bones and REMAP constraints) is evaluated with arrays
+# from the source F-Curves, for all frames at once instead of evaluating the scene at each frame.
+# Only the constraints created by the binding are supported, other setups use the regular bake.
+
+RETARGET_MATH_CHUNK = 1024# frames evaluated at once
+RETARGET_MATH_CHANNELS = ('location', 'rotation_euler', 'rotation_quaternion', 'rotation_axis_angle', 'scale')
+
+
+def _retarget_math_constraint_error(cns, armatures):
+    # return why the constraint can't be evaluated as arrays, None if it can
+    if cns.target not in armatures or cns.target.pose.bones.get(cns.subtarget) == None:
+        return 'target is not a bone of the retargetted armatures'
+    if getattr(cns, 'head_tail', 0.0) != 0.0:
+        return 'head/tail target'
+    if cns.influence < 1.0 and cns.type != 'COPY_LOCATION':
+        return 'partial influence'
+        
+    spaces = (cns.owner_space, cns.target_space)
+    
+    if cns.type == 'COPY_LOCATION':
+        if spaces == ('WORLD', 'WORLD') and cns.use_x and cns.use_y and cns.use_z and not (cns.invert_x or cns.invert_y or cns.invert_z or cns.use_offset):
+            return None
+    elif cns.type == 'COPY_ROTATION':
+        if spaces == ('WORLD', 'WORLD') and cns.use_x and cns.use_y and cns.use_z and not (cns.invert_x or cns.invert_y or cns.invert_z):
+            if getattr(cns, 'mix_mode', 'REPLACE') == 'REPLACE' and not getattr(cns, 'use_offset', False):
+                return None
+    elif cns.type == 'COPY_TRANSFORMS':
+        if spaces in (('WORLD', 'WORLD'), ('LOCAL', 'LOCAL')) and getattr(cns, 'mix_mode', 'REPLACE') in ('REPLACE', 'BEFORE', 'AFTER', 'BEFORE_FULL', 'AFTER_FULL'):
+            return None
+    elif cns.type == 'TRACK_TO':
+        if spaces == ('WORLD', 'WORLD') and cns.track_axis == 'TRACK_Y' and cns.up_axis == 'UP_Z' and not cns.use_target_z:
+            return None
+    elif cns.type == 'TRANSFORM':
+        if spaces == ('LOCAL', 'LOCAL') and cns.map_from == 'LOCATION' and cns.map_to == 'LOCATION':
+            if getattr(cns, 'mix_mode', 'ADD') in ('ADD', 'REPLACE'):
+                return None
+                
+    return 'unsupported ' + cns.type + ' constraint settings'
+    
+    
+def _retarget_math_setup(source_rig, target_rig, bones_keys, frames):
+    # collect the bones needed to evaluate the given (armature index, bone name) bones, in evaluation order
+    # return (nodes, order) or the reason why the setup can't be evaluated as arrays
+    armatures = (source_rig, target_rig)
+    
+    for arm in armatures:
+        if arm.parent or len(arm.constraints):
+            return arm.name + ' has a parent or constraints'
+        if arm.data.pose_position != 'POSE':
+            return arm.name + ' is in rest position'
+        anim_data = arm.animation_data
+        if anim_data:
+            for track in anim_data.nla_tracks:
+                if not track.mute and len(track.strips):
+                    return arm.name + ' has NLA tracks'
+                    
+    source_anim_data = source_rig.animation_data
+    if source_anim_data == None or source_anim_data.action == None:
+        return 'the source armature has no action'
+    source_action = source_anim_data.action
+    if source_anim_data.action_influence < 1.0 or source_anim_data.action_blend_type != 'REPLACE':
+        return 'the source action is blended'
+        
+    # source F-Curves, by bone
+    source_curves = {}
+    for fc in source_action.fcurves:
+        if fc.mute:
+            continue
+        if not fc.data_path.startswith('pose.bones["'):
+            if fc.data_path.split('.')[-1] in RETARGET_MATH_CHANNELS or fc.data_path.startswith('delta_'):
+                return 'the source armature object is animated'
+            continue
+        bname, _sep, channel = fc.data_path[len('pose.bones["'):].partition('"].')
+        if channel in RETARGET_MATH_CHANNELS:
+            source_curves.setdefault(bname, []).append(fc)
+            
+    # driven bones
+    driven = set()
+    for arm_idx, arm in enumerate(armatures):
+        if arm.animation_data:
+            for fc in arm.animation_data.drivers:
+                if not fc.mute and fc.data_path.startswith('pose.bones["'):
+                    driven.add((arm_idx, fc.data_path[len('pose.bones["'):].split('"]')[0]))
+    
+    nodes = {}
+    order = []
+    visiting = set()
+    
+    def visit(arm_idx, bname):
+        key = (arm_idx, bname)
+        if key in nodes:
+            return None
+        if key in visiting:
+            return 'dependency cycle (' + bname + ')'
+        visiting.add(key)
+        
+        pbone = armatures[arm_idx].pose.bones[bname]
+        if not is_bone_parent_transform_supported(pbone.bone):
+            return 'unsupported bone inheritance (' + bname + ')'
+        if key in driven:
+            return 'driven bone (' + bname + ')'
+            
+        deps = []
+        if pbone.parent:
+            deps.append((arm_idx, pbone.parent.name))
+            
+        constraints = []
+        for cns in pbone.constraints:
+            if cns.mute or cns.influence == 0.0 or not cns.is_valid:
+                continue
+            error = _retarget_math_constraint_error(cns, armatures)
+            if error:
+                return error + ' (' + bname + ': ' + cns.name + ')'
+            target_key = (armatures.index(cns.target), cns.subtarget)
+            constraints.append((cns, target_key))
+            deps.append(target_key)
+            
+        for dep in deps:
+            error = visit(*dep)
+            if error:
+                return error
+                
+        # sampled channels
+        values = {}
+        if arm_idx == 0:
+            for fc in source_curves.get(bname, []):
+                channel = fc.data_path.rpartition('.')[2]
+                values.setdefault(channel, {})[fc.array_index] = get_fcurve_values(fc, frames).astype(np.float32)
+            
+        nodes[key] = {
+            'pbone': pbone,
+            'arm': arm_idx,
+            'parent': (arm_idx, pbone.parent.name) if pbone.parent else None,
+            'basis': np.array(pbone.matrix_basis, dtype=np.float64),
+            'values': values,
+            'constraints': constraints,
+            }
+        order.append(key)
+        visiting.discard(key)
+        return None
+        
+    for arm_idx, bname in bones_keys:
+        error = visit(arm_idx, bname)
+        if error:
+            return error
+            
+    return nodes, order
+    
+    
+def _retarget_math_local(node, chunk):
+    # local (matrix_basis) matrices of the bone for the frames slice
+    pbone = node['pbone']
+    count = chunk.stop - chunk.start
+    if len(node['values']) == 0:
+        return np.broadcast_to(node['basis'], (count, 4, 4))
+        
+    def channel(name, current):
+        values = np.tile(np.array(current, dtype=np.float64), (count, 1))
+        for index, fvalues in node['values'].get(name, {}).items():
+            if index < values.shape[1]:
+                values[:, index] = fvalues[chunk]
+        return values
+        
+    if pbone.rotation_mode == 'QUATERNION':
+        rot = quats_to_rot_matrices(channel('rotation_quaternion', pbone.rotation_quaternion))
+    elif pbone.rotation_mode == 'AXIS_ANGLE':
+        rot = axis_angle_to_rot_matrices(channel('rotation_axis_angle', pbone.rotation_axis_angle))
+    else:
+        rot = eulers_to_rot_matrices(channel('rotation_euler', pbone.rotation_euler), pbone.rotation_mode)
+        
+    return loc_rot_scale_to_matrices(channel('location', pbone.location), rot, channel('scale', pbone.scale))
+    
+    
+def _retarget_math_constraint(cns, node, parent_pose, pose, target_node, target_parent_pose, target_pose, obj_mats):
+    # evaluate a constraint supported by _retarget_math_constraint_error(), return the new pose matrices
+    owner_mat, target_mat = obj_mats[node['arm']], obj_mats[target_node['arm']]
+    bone, target_bone = node['pbone'].bone, target_node['pbone'].bone
+    
+    if cns.owner_space == 'LOCAL':
+        local = bone_pose_to_local(bone, parent_pose, pose)
+        target_local = bone_pose_to_local(target_bone, target_parent_pose, target_pose)
+        
+        if cns.type == 'COPY_TRANSFORMS':
+            mix_mode = getattr(cns, 'mix_mode', 'REPLACE')
+            if mix_mode == 'BEFORE':
+                local = mul_matrices_aligned_scale(target_local, local)
+            elif mix_mode == 'AFTER':
+                local = mul_matrices_aligned_scale(local, target_local)
+            elif mix_mode == 'BEFORE_FULL':
+                local = target_local @ local
+            elif mix_mode == 'AFTER_FULL':
+                local = local @ target_local
+            else:
+                local = target_local.copy()
+                
+        elif cns.type == 'TRANSFORM':
+            axes = 'XYZ'
+            from_min = np.array([cns.from_min_x, cns.from_min_y, cns.from_min_z])
+            from_max = np.array([cns.from_max_x, cns.from_max_y, cns.from_max_z])
+            to_min = np.array([cns.to_min_x, cns.to_min_y, cns.to_min_z])
+            to_max = np.array([cns.to_max_x, cns.to_max_y, cns.to_max_z])
+            map_from = [axes.index(cns.map_to_x_from), axes.index(cns.map_to_y_from), axes.index(cns.map_to_z_from)]
+            
+            from_range = from_max - from_min
+            sval = (target_local[:, :3, 3] - from_min) / np.where(from_range == 0.0, 1.0, from_range)
+            sval[:, from_range == 0.0] = 0.0
+            if not cns.use_motion_extrapolate:
+                sval = np.clip(sval, 0.0, 1.0)
+            dvec = to_min + sval[:, map_from] * (to_max - to_min)
+            
+            local = local.copy()
+            if getattr(cns, 'mix_mode', 'ADD') == 'ADD':
+                local[:, :3, 3] += dvec
+            else:
+                local[:, :3, 3] = dvec
+                
+        return bone_local_to_pose(bone, parent_pose, local)
+        
+    world = owner_mat @ pose
+    target_world = target_mat @ target_pose
+    
+    if cns.type == 'COPY_LOCATION':
+        new_world = world.copy()
+        new_world[:, :3, 3] += (target_world[:, :3, 3] - world[:, :3, 3]) * cns.influence
+        
+    elif cns.type == 'COPY_ROTATION':
+        scale = np.linalg.norm(world[:, :3, :3], axis=-2)
+        target_rot = target_world[:, :3, :3] / np.linalg.norm(target_world[:, :3, :3], axis=-2)[:, None, :]
+        new_world = loc_rot_scale_to_matrices(world[:, :3, 3], target_rot, scale)
+        
+    elif cns.type == 'COPY_TRANSFORMS':
+        mix_mode = getattr(cns, 'mix_mode', 'REPLACE')
+        if mix_mode == 'BEFORE':
+            new_world = mul_matrices_aligned_scale(target_world, world)
+        elif mix_mode == 'AFTER':
+            new_world = mul_matrices_aligned_scale(world, target_world)
+        elif mix_mode == 'BEFORE_FULL':
+            new_world = target_world @ world
+        elif mix_mode == 'AFTER_FULL':
+            new_world = world @ target_world
+        else:
+            new_world = target_world
+            
+    elif cns.type == 'TRACK_TO':
+        # Y axis to the target, Z axis up
+        scale = np.linalg.norm(world[:, :3, :3], axis=-2)
+        y_axis = target_world[:, :3, 3] - world[:, :3, 3]
+        length = np.linalg.norm(y_axis, axis=-1, keepdims=True)
+        y_axis = np.where(length == 0.0, np.array([0.0, 0.0, -1.0]), y_axis / np.where(length == 0.0, 1.0, length))
+        z_axis = np.array([0.0, 0.0, 1.0]) - y_axis[:, 2, None] * y_axis
+        length = np.linalg.norm(z_axis, axis=-1, keepdims=True)
+        z_axis = np.where(length == 0.0, np.array([0.0, 1.0, 0.0]), z_axis / np.where(length == 0.0, 1.0, length))
+        x_axis = np.cross(y_axis, z_axis)
+        x_axis /= np.linalg.norm(x_axis, axis=-1, keepdims=True)
+        rot = np.stack((x_axis, y_axis, z_axis), axis=-1)
+        new_world = loc_rot_scale_to_matrices(world[:, :3, 3], rot, scale)
+        
+    return np.linalg.inv(owner_mat) @ new_world
+    
+    
+def _retarget_math_eval(nodes, order, chunk, obj_mats):
+    # pose matrices of all nodes for the frames slice
+    poses = {}
+    for key in order:
+        node = nodes[key]
+        parent_pose = poses[node['parent']] if node['parent'] else None
+        pose = bone_local_to_pose(node['pbone'].bone, parent_pose, _retarget_math_local(node, chunk))
+        
+        for cns, target_key in node['constraints']:
+            target_node = nodes[target_key]
+            target_parent_pose = poses[target_node['parent']] if target_node['parent'] else None
+            pose = _retarget_math_constraint(cns, node, parent_pose, pose, target_node, target_parent_pose, poses[target_key], obj_mats)
+            
+        poses[key] = pose
+    return poses
+    
+    
+def _retarget_math_bake(source_rig, target_rig, baked_bones, frames):
+    # matrix_basis (frames, bones, 4, 4) of the baked target bones, computed from the source F-Curves
+    # return the reason as a string if the setup can't be evaluated this way
+    setup = _retarget_math_setup(source_rig, target_rig, [(1, pbone.name) for pbone in baked_bones], frames)
+    if isinstance(setup, str):
+        return setup
+    nodes, order = setup
+    
+    obj_mats = [np.array(source_rig.matrix_world, dtype=np.float64), np.array(target_rig.matrix_world, dtype=np.float64)]
+    bones_data = np.empty((len(frames), len(baked_bones), 4, 4), dtype=np.float32)
+    
+    for start in range(0, len(frames), RETARGET_MATH_CHUNK):
+        chunk = slice(start, min(start + RETARGET_MATH_CHUNK, len(frames)))
+        poses = _retarget_math_eval(nodes, order, chunk, obj_mats)
+        
+        for slot, pbone in enumerate(baked_bones):
+            node = nodes[(1, pbone.name)]
+            parent_pose = poses[node['parent']] if node['parent'] else None
+            bones_data[chunk, slot] = bone_pose_to_local(pbone.bone, parent_pose, poses[(1, pbone.name)])
+            
+        print_progress_bar("Fast baking", chunk.stop, len(frames))
+        
+    print("")
+    return bones_data
+    
+    
+def _retarget_math_source_poses(source_rig, target_rig, bone_names, frames):
+    # pose matrices {bone name: (frames, 4, 4)} of source bones, computed from the source F-Curves
+    # return the reason as a string if the bones can't be evaluated this way
+    setup = _retarget_math_setup(source_rig, target_rig, [(0, bname) for bname in bone_names], frames)
+    if isinstance(setup, str):
+        return setup
+    nodes, order = setup
+    
+    obj_mats = [np.array(source_rig.matrix_world, dtype=np.float64), np.array(target_rig.matrix_world, dtype=np.float64)]
+    poses = _retarget_math_eval(nodes, order, slice(0, len(frames)), obj_mats)
+    return {bname: poses[(0, bname)] for bname in bone_names}
+    
+    
+def _clean_ik_poles_math(self, fcurve, ik_chains):
+    # remove the IK poles keyframes where the source chains are straight, without evaluating the scene
+    # return False if the source bones can't be evaluated from the F-Curves
+    scn = bpy.context.scene
+    source_rig = get_object(scn.source_rig)
+    target_rig = get_object(scn.target_rig)
+    
+    co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get('co', co)
+    frames = np.unique(co[0::2].astype(np.int64))
+    frames = frames[(frames >= self.frame_start) & (frames <= self.frame_end)]
+    
+    bone_names = list({bname for value in ik_chains.values() for bname in value[:2]})
+    poses = _retarget_math_source_poses(source_rig, target_rig, bone_names, frames.astype(np.float64))
+    if isinstance(poses, str):
+        print("  Fast clean not supported, " + poses)
+        return False
+        
+    action = target_rig.animation_data.action
+    
+    for key, value in ik_chains.items():
+        y_axis1, y_axis2 = poses[value[0]][:, :3, 1], poses[value[1]][:, :3, 1]
+        cos_angle = np.sum(y_axis1 * y_axis2, axis=-1) / (np.linalg.norm(y_axis1, axis=-1) * np.linalg.norm(y_axis2, axis=-1))
+        straight_frames = frames[np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0))) < self.clean_ik_pole_angle]
+        if len(straight_frames) == 0:
+            continue
+            
+        # remove keyframe, just interpolate
+        data_path = 'pose.bones["' + value[2] + '"].location'
+        for i in range(0, 3):
+            fc = action.fcurves.find(data_path, index=i)
+            if fc == None:
+                continue
+            keys_co = np.empty(len(fc.keyframe_points) * 2, dtype=np.float32)
+            fc.keyframe_points.foreach_get('co', keys_co)
+            for key_idx in reversed(np.flatnonzero(np.isin(keys_co[0::2], straight_frames)).tolist()):
+                fc.keyframe_points.remove(fc.keyframe_points[key_idx], fast=True)
+            if len(fc.keyframe_points) == 0:
+                action.fcurves.remove(fc)
+            else:
+                fc.update()
+                
+    return True
+    
+    
 def get_target_bone_name(src_name):
     scn = bpy.context.scene
     for item in scn.bones_map_v2:
@@ -290,6 +290,7 @@ class ARP_OT_export_fbx_wrap(bpy.types.Operator, ExportHelper):
     shape_keys_baked_data: StringProperty(name="sk data", default="")
     mesh_names_data: StringProperty(name="mesh names", default="")
     export_action_only: StringProperty(name="", default="")
+    use_export_cache: BoolProperty(name="Export Cache", default=False, options={'HIDDEN'})
 
     @property
     def check_extension(self):
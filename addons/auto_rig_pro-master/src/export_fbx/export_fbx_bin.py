@@ -35,6 +35,7 @@ from bpy.app.translations import pgettext_tip as tip_
 from mathutils import Vector, Matrix
 
 from . import encode_bin, data_types, fbx_utils
+from .fbx_export_cache import FBXExportCache
 from .fbx_utils import (
     # Constants.
     FBX_VERSION, FBX_HEADER_VERSION, FBX_SCENEINFO_VERSION, FBX_TEMPLATES_VERSION,
@@ -1605,6 +1606,95 @@ def fbx_data_mesh_elements(root, me_obj, scene_data, done_meshes):
     done_meshes.add(me_key)
 
 
+# Auto-Rig Pro implant
+# (foreach_get property, dtype, values per item) of the attribute types
+ATTRIBUTE_HASH_FORMATS = {
+    'FLOAT': ('value', np.float32, 1), 'INT': ('value', np.int32, 1), 'INT8': ('value', np.int8, 1),
+    'BOOLEAN': ('value', bool, 1), 'FLOAT2': ('vector', np.float32, 2), 'FLOAT_VECTOR': ('vector', np.float32, 3),
+    'FLOAT_COLOR': ('color', np.float32, 4), 'BYTE_COLOR': ('color', np.float32, 4),
+    'INT32_2D': ('value', np.int32, 2), 'QUATERNION': ('value', np.float32, 4), 'FLOAT4X4': ('value', np.float32, 16),
+}
+
+
+def fbx_mesh_cache_key(scene_data, me_obj, export_cache):
+    """
+    Hash of everything fbx_data_mesh_elements() reads, None if the mesh can't be cached.
+    """
+    settings = scene_data.settings
+    me_key, me, _free = scene_data.data_meshes[me_obj]
+    h = export_cache.new_hash(
+        "mesh", me_key, me.name, settings.mesh_smooth_type, settings.use_mesh_edges, settings.use_tspace,
+        settings.use_custom_props, settings.colors_type, settings.prioritize_active_color, settings.use_subsurf)
+
+    if me_obj.use_bake_space_transform(scene_data):
+        h.update_matrix(settings.global_matrix)
+    if settings.use_custom_props:
+        h.update_idprops(me)
+    if settings.use_subsurf:
+        h.update([(mod.type, mod.show_render, mod.show_viewport, mod.subdivision_type, mod.boundary_smooth,
+                   mod.levels, mod.render_levels, mod.use_creases)
+                  for mod in me_obj.bdata.modifiers if mod.type == 'SUBSURF'])
+
+    h.update_foreach(me.vertices, "co", np.float32, 3)
+    h.update_foreach(me.edges, "vertices", np.int32, 2)
+    h.update_foreach(me.loops, "vertex_index", np.int32)
+    h.update_foreach(me.polygons, "loop_start", np.int32)
+    h.update(me.normals_domain)
+    h.update_foreach(me.corner_normals, "vector", np.float32, 3)
+    for attr in me.attributes:
+        attr_format = ATTRIBUTE_HASH_FORMATS.get(attr.data_type)
+        if attr_format is None:
+            return None
+        h.update((attr.name, attr.domain, attr.data_type))
+        h.update_foreach(attr.data, *attr_format)
+    h.update((me.uv_layers.active.name if me.uv_layers.active else None,
+              [(uv.name, uv.active_render) for uv in me.uv_layers],
+              me.color_attributes.active_color_name, me.color_attributes.default_color_name))
+
+    # Materials layer
+    material_indices = scene_data.mesh_material_indices.get(me)
+    h.update((sorted((get_blenderID_key(ma), idx) for ma, idx in material_indices.items())
+              if material_indices is not None else None,
+              [get_blenderID_key(ma) if ma else None for ma in me_obj.materials]))
+
+    # Shape keys, with their bind pose and deformers
+    if me in scene_data.data_deformers_shape:
+        _me_key, shape_key, shapes = scene_data.data_deformers_shape[me]
+        h.update((shape_key, me_obj.key))
+        h.update_matrix(me_obj.fbx_object_matrix(scene_data, global_space=True))
+        for shape, (channel_key, geom_key, shape_verts_co, shape_verts_idx) in shapes.items():
+            h.update((channel_key, geom_key, shape.name, shape.value, shape.vertex_group))
+            h.update_array(shape_verts_co)
+            h.update_array(shape_verts_idx)
+            if shape.vertex_group:
+                h.update([(v.index, g.group, g.weight) for v in me.vertices for g in v.groups])
+
+    return h.hexdigest()
+
+
+def fbx_data_mesh_elements_cached(root, me_obj, scene_data, done_meshes):
+    """
+    fbx_data_mesh_elements(), reusing the element subtrees of the export cache when enabled.
+    """
+    export_cache = scene_data.settings.export_cache
+    me_key = scene_data.data_meshes[me_obj][0]
+    if export_cache is None or me_key in done_meshes:
+        fbx_data_mesh_elements(root, me_obj, scene_data, done_meshes)
+        return
+
+    key = fbx_mesh_cache_key(scene_data, me_obj, export_cache)
+    elems = export_cache.get_elems(key) if key else None
+    if elems is not None:
+        root.elems.extend(elems)
+        done_meshes.add(me_key)
+        return
+
+    start = len(root.elems)
+    fbx_data_mesh_elements(root, me_obj, scene_data, done_meshes)
+    if key:
+        export_cache.put_elems(key, root.elems[start:])
+
+
 def fbx_data_material_elements(root, ma, scene_data):
     """
     Write the Material data block.
@@ -2314,9 +2404,196 @@ def fbx_generate_leaf_bones(settings, data_bones):
     return leaf_bones
 
 
-def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=None, force_keep=False):
+def fbx_animations_frames(f_start, f_end, bake_step):
+    # `np.arange` excludes the `stop` argument like when using `range`, so we use np.nextafter to get the next
+    # representable value after f_end and use that as the `stop` argument instead.
+    return np.arange(f_start, np.nextafter(f_end, np.inf), step=bake_step)
+
+
+def fbx_animated_paths(id_data):
+    """
+    Data paths animated by the active action, the unmuted NLA strips and the drivers of an ID.
+    Returns None when anything may be animated (meta strips...).
+    """
+    anim = id_data.animation_data
+    paths = set()
+    if anim is None:
+        return paths
+    actions = [anim.action] if anim.action else []
+    for track in anim.nla_tracks:
+        if track.mute:
+            continue
+        for strip in track.strips:
+            if strip.mute:
+                continue
+            if strip.type == 'META':
+                return None
+            if strip.action:
+                actions.append(strip.action)
+    for act in actions:
+        paths.update(fc.data_path for fc in act.fcurves)
+    paths.update(fc.data_path for fc in anim.drivers)
+    return paths
+
+
+def fbx_animated_objects(scene_data, objects):
+    """
+    Return the objects and bones whose transform may change with the frame, all others are static
+    for the current actions. This is conservative: constraints, physics, duplis and animated parents
+    make an object animated.
+    """
+    animated = {}
+    armature_bones = {}  # Armature object: escaped names of the bones with animated paths, None if unknown.
+    ik_chain_bones = {}  # Armature object: names of the bones moved by IK or Spline IK constraints.
+
+    def get_armature_bones(arm):
+        names = armature_bones.get(arm, ...)
+        if names is ...:
+            paths = fbx_animated_paths(arm)
+            if paths is not None:
+                names = set()
+                for path in paths:
+                    if not path.startswith('pose.bones["'):
+                        continue
+                    end = path.find('"]', 12)
+                    while end > 0 and path[end - 1] == '\\':
+                        end = path.find('"]', end + 1)
+                    names.add(path[12:end])
+            armature_bones[arm] = names
+        return names
+
+    def get_ik_chain_bones(arm):
+        # IK and Spline IK move the parents of the constrained bone, up to the chain length (0: the whole chain).
+        names = ik_chain_bones.get(arm)
+        if names is None:
+            names = set()
+            for pbone in arm.pose.bones:
+                for con in pbone.constraints:
+                    if con.type not in {'IK', 'SPLINE_IK'}:
+                        continue
+                    chain_bone = pbone
+                    count = con.chain_count
+                    while chain_bone is not None:
+                        names.add(chain_bone.name)
+                        count -= 1
+                        if count == 0:
+                            break
+                        chain_bone = chain_bone.parent
+            ik_chain_bones[arm] = names
+        return names
+
+    def is_animated(ob_obj):
+        result = animated.get(ob_obj)
+        if result is not None:
+            return result
+        if ob_obj.is_dupli:
+            result = True
+        elif ob_obj.is_bone:
+            pbone = ob_obj.bdata_pose_bone
+            names = get_armature_bones(pbone.id_data)
+            result = (names is None or bpy.utils.escape_identifier(pbone.name) in names or len(pbone.constraints) > 0
+                      or pbone.name in get_ik_chain_bones(pbone.id_data)
+                      or (ob_obj.bdata.parent is not None and is_animated(ob_obj.parent)))
+        else:
+            ob = ob_obj.bdata
+            paths = fbx_animated_paths(ob)
+            result = (paths is None or any(not path.startswith('pose.') for path in paths)
+                      or len(ob.constraints) > 0 or ob.rigid_body is not None
+                      or (ob.parent is not None and (ob.parent_type not in {'OBJECT', 'BONE'} or is_animated(ob_obj.parent))))
+        animated[ob_obj] = result
+        return result
+
+    return {ob_obj for ob_obj in objects if is_animated(ob_obj)}
+
+
+def fbx_animated_camera(cam):
+    paths = fbx_animated_paths(cam)
+    return paths is None or len(paths) > 0
+
+
+def fbx_pose_bones_tx(scene_data, arm, bo_objs, pose_matrices, p_rots):
+    """
+    Array version of ObjectWrapper.fbx_object_tx() for bones of the same armature, over all frames.
+    pose_matrices: (frames, pose bones, 4, 4) PoseBone.matrix values, in pose.bones order
+    p_rots: (bones, 3) euler rotations preceding the first frame
+    Returns the (bones, 9, frames) location, rotation (XYZ euler) and scale values.
+    """
+    index = {name: i for i, name in enumerate(arm.pose.bones.keys())}
+    bone_idx = [index[bo_obj.bdata.name] for bo_obj in bo_objs]
+    parents = [bo_obj.bdata.parent for bo_obj in bo_objs]
+    has_parent = np.array([par is not None for par in parents], dtype=bool)
+    mats = pose_matrices[:, bone_idx]
+
+    # PoseBone.matrix is in armature space, bring in back in real local one!
+    if has_parent.any():
+        par_mats = pose_matrices[:, [index[par.name] for par in parents if par is not None]]
+        # Same as Matrix.inverted_safe(), degenerated matrices get a small epsilon on their diagonal.
+        degenerated = np.abs(np.linalg.det(par_mats)) < 1e-30
+        if degenerated.any():
+            par_mats[degenerated] += np.eye(4) * 1e-8
+        mats[:, has_parent] = np.linalg.inv(par_mats) @ mats[:, has_parent]
+
+    settings = scene_data.settings
+    if settings.bone_correction_matrix_inv:
+        mats[:, has_parent] = np.array(settings.bone_correction_matrix_inv) @ mats[:, has_parent]
+    if settings.bone_correction_matrix:
+        mats = mats @ np.array(settings.bone_correction_matrix)
+
+    loc, rot, scale = matrices_to_loc_rot_scale(mats)
+    if scene_data.scene.arp_fix_fbx_matrix:
+        # Matrix.to_euler() only normalizes the axes, negative scales are not flipped
+        rot = mats[..., :3, :3] / np.maximum(np.linalg.norm(mats[..., :3, :3], axis=-2), 1e-30)[..., None, :]
+
+    eulers = np.empty(loc.shape)
+    prev = np.array(p_rots, dtype=np.float64)
+    for i in range(len(rot)):
+        prev = eulers[i] = rot_matrices_to_compatible_eulers(rot[i], prev, 'XYZ')
+
+    return np.concatenate((loc, eulers, scale), axis=-1).transpose(1, 2, 0)
+
+
+def fbx_animations_mute_modifiers(scene_data):
+    """
+    Disable the viewport modifiers of the meshes whose geometry can't move anything exported while
+    sampling frames, so that only transforms and poses are evaluated. Meshes are already converted at
+    this point. Returns the modifiers to restore with fbx_animations_restore_modifiers().
+    """
+    view_layer_objects = scene_data.scene.objects
+    # Geometry read by constraints and vertex parents must still be evaluated
+    keep = set()
+    for ob in view_layer_objects:
+        if ob.parent and ob.parent_type in {'VERTEX', 'VERTEX_3'}:
+            keep.add(ob.parent)
+        constraints = list(ob.constraints)
+        if ob.type == 'ARMATURE' and ob.pose:
+            for pbone in ob.pose.bones:
+                constraints.extend(pbone.constraints)
+        for cns in constraints:
+            for target in getattr(cns, 'targets', ()):
+                keep.add(target.target)
+            keep.add(getattr(cns, 'target', None))
+
+    muted = []
+    for ob in view_layer_objects:
+        if ob.type != 'MESH' or ob in keep or ob.library or ob.is_instancer or len(ob.particle_systems):
+            continue
+        for mod in ob.modifiers:
+            if mod.show_viewport:
+                mod.show_viewport = False
+                muted.append(mod)
+    return muted
+
+
+def fbx_animations_restore_modifiers(muted):
+    for mod in muted:
+        mod.show_viewport = True
+
+
+def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=None, force_keep=False, pose_samples=None):
     """
     Generate animation data (a single AnimStack) from objects, for a given frame range.
+    Only the objects, bones and cameras that may change with the frame are sampled, on every frame.
+    pose_samples: optional {armature object: (frames, bones * 16) PoseBone.matrix values} sampled elsewhere.
     """
     bake_step = scene_data.settings.bake_anim_step
     simplify_fac = scene_data.settings.bake_anim_simplify_factor
@@ -2342,6 +2619,7 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
     back_currframe = scene.frame_current
     animdata_ob = {}
     p_rots = {}
+    static_values = []
 
     for ob_obj in objects:
         if ob_obj.parented_to_armature:
@@ -2354,6 +2632,7 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
                                ACNW(ob_obj.key, 'LCL_ROTATION', force_key, force_sek, rot_deg),
                                ACNW(ob_obj.key, 'LCL_SCALING', force_key, force_sek, scale))
         p_rots[ob_obj] = rot
+        static_values.append((*loc, *rot, *scale))
 
     force_key = (simplify_fac == 0.0)
     animdata_shapes = {}
@@ -2382,32 +2661,49 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
     has_animated_duplis = bool(dupli_parent_bdata)
 
     # Initialize keyframe times array. Each AnimationCurveNodeWrapper will share the same instance.
-    # `np.arange` excludes the `stop` argument like when using `range`, so we use np.nextafter to get the next
-    # representable value after f_end and use that as the `stop` argument instead.
-    currframes = np.arange(f_start, np.nextafter(f_end, np.inf), step=bake_step)
+    currframes = fbx_animations_frames(f_start, f_end, bake_step)
     
     # Convert from Blender time to FBX time.
     fps = scene.render.fps / scene.render.fps_base
     real_currframes = currframes - f_start if start_zero else currframes
     real_currframes_round = [round(i, 3) for i in real_currframes]# ARP implant, round frame value because of decimals issues 
     real_currframes = (real_currframes / fps * FBX_KTIME).astype(np.int64)
-    
-    # Generator that yields the animated values of each frame in order.
-    def frame_values_gen():
+    num_frames = len(real_currframes)
+
+    # Static channels keep the values computed above, only the animated ones are sampled.
+    # Baked shape keys values are not sampled, they come from shape_keys_baked_data_dict.
+    animated = fbx_animated_objects(scene_data, animdata_ob)
+    ob_index = {ob_obj: i for i, ob_obj in enumerate(animdata_ob)}
+    ob_values = np.empty((len(animdata_ob), 9, num_frames))
+    ob_values[...] = np.reshape(static_values, (len(animdata_ob), 9, 1))
+    animated_obs = [ob_obj for ob_obj in animdata_ob if ob_obj in animated and not ob_obj.is_bone]
+    animated_bones = {}
+    for ob_obj in animdata_ob:
+        if ob_obj.is_bone and ob_obj in animated:
+            animated_bones.setdefault(ob_obj.bdata_pose_bone.id_data, []).append(ob_obj)
+
+    pose_matrices = dict(pose_samples) if pose_samples else {}
+    sampled_pose_matrices = {arm: np.empty((num_frames, len(arm.pose.bones) * 16), dtype=np.float32)
+                             for arm in animated_bones if arm not in pose_matrices}
+    pose_matrices.update(sampled_pose_matrices)
+
+    camera_values = np.empty((len(animdata_cameras), 2, num_frames))
+    animated_cameras = []
+    for i, (_anim_camera_lens, _anim_camera_focus_distance, cam) in enumerate(animdata_cameras.values()):
+        camera_values[i] = np.reshape((cam.lens, cam.dof.focus_distance), (2, 1))
+        if fbx_animated_camera(cam):
+            animated_cameras.append((i, cam))
+
+    if animated_obs or sampled_pose_matrices or animated_cameras or has_animated_duplis:
         # Precalculate integer frames and subframes.
         int_currframes = currframes.astype(int)
         subframes = currframes - int_currframes
+        # Previous frame's rotation for each animated object, this will be updated each frame.
+        animated_obs_p_rots = [p_rots[ob_obj] for ob_obj in animated_obs]
+        animated_obs_idx = [ob_index[ob_obj] for ob_obj in animated_obs]
 
-        # Create simpler iterables that return only the values we care about.
-        animdata_shapes_only = [shape for _anim_shape, _me, shape in animdata_shapes.values()]
-        animdata_cameras_only = [camera for _anim_camera_lens, _anim_camera_focus_distance, camera
-                                 in animdata_cameras.values()]
-        # Previous frame's rotation for each object in animdata_ob, this will be updated each frame.
-        animdata_ob_p_rots = p_rots.values()        
-       
-        # Iterate through each frame and yield the values for that frame.
-        # Iterating .data, the memoryview of an array, is faster than iterating the array directly.                                                    
-        for int_currframe, subframe in zip(int_currframes.data, subframes.data):
+        # Iterating .data, the memoryview of an array, is faster than iterating the array directly.
+        for f, (int_currframe, subframe) in enumerate(zip(int_currframes.data, subframes.data)):
             subframe = round(subframe, 3)# ARP implant, round frame value because of decimals issues 
             scene.frame_set(int_currframe, subframe=subframe)
             
@@ -2419,51 +2715,32 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
                         # ObjectWrapper caches its instances. Attempting to create a new instance updates the existing
                         # ObjectWrapper instance with the current frame's matrix and then returns the existing instance.
                         ObjectWrapper(dup)
-            next_p_rots = []
-            for ob_obj, p_rot in zip(animdata_ob, animdata_ob_p_rots):
+            for i, ob_obj in enumerate(animated_obs):
                 # We compute baked loc/rot/scale for all objects (rot being euler-compat with previous value!).
-                loc, rot, scale, _m, _mr = ob_obj.fbx_object_tx(scene_data, rot_euler_compat=p_rot)
-                next_p_rots.append(rot)
-                yield from loc
-                yield from rot
-                yield from scale
-            animdata_ob_p_rots = next_p_rots
-            for shape in animdata_shapes_only:
-                yield shape.value
-            for camera in animdata_cameras_only:
-                yield camera.lens
-                yield camera.dof.focus_distance   
-                                                     
-    # Providing `count` to np.fromiter pre-allocates the array, avoiding extra memory allocations while iterating.
-    num_ob_values = len(animdata_ob) * 9  # Location, rotation and scale, each of which have x, y, and z components
-    num_shape_values = len(animdata_shapes)  # Only 1 value per shape key
-    num_camera_values = len(animdata_cameras) * 2  # Focal length (`.lens`) and focus distance
-    num_values_per_frame = num_ob_values + num_shape_values + num_camera_values
-    num_frames = len(real_currframes)
-    all_values_flat = np.fromiter(frame_values_gen(), dtype=float, count=num_frames * num_values_per_frame)
-
-    # Restore the scene's current frame.
-    scene.frame_set(back_currframe, subframe=0.0)
-
-    # View such that each column is all values for a single frame and each row is all values for a single curve.
-    all_values = all_values_flat.reshape(num_frames, num_values_per_frame).T
-    # Split into views of the arrays for each curve type.
-    split_at = [num_ob_values, num_shape_values, num_camera_values]
-    # For unequal sized splits, np.split takes indices to split at, which can be acquired through a cumulative sum
-    # across the list.
-    # The last value isn't needed, because the last split is assumed to go to the end of the array.
-    split_at = np.cumsum(split_at[:-1])
-    all_ob_values, all_shape_key_values, all_camera_values = np.split(all_values, split_at)
+                loc, rot, scale, _m, _mr = ob_obj.fbx_object_tx(scene_data, rot_euler_compat=animated_obs_p_rots[i])
+                animated_obs_p_rots[i] = rot
+                ob_values[animated_obs_idx[i], :, f] = (*loc, *rot, *scale)
+            for arm, matrices in sampled_pose_matrices.items():
+                arm.pose.bones.foreach_get('matrix', matrices[f])
+            for i, cam in animated_cameras:
+                camera_values[i, :, f] = (cam.lens, cam.dof.focus_distance)
+
+        # Restore the scene's current frame.
+        scene.frame_set(back_currframe, subframe=0.0)
+
+    # Bones are converted all at once from their pose matrices.
+    for arm, bo_objs in animated_bones.items():
+        # foreach_get returns column-major matrices
+        matrices = pose_matrices[arm].reshape(num_frames, -1, 4, 4).transpose(0, 1, 3, 2).astype(np.float64)
+        ob_values[[ob_index[bo_obj] for bo_obj in bo_objs]] = fbx_pose_bones_tx(
+            scene_data, arm, bo_objs, matrices, [p_rots[bo_obj] for bo_obj in bo_objs])
 
     all_anims = []
     
     # Set location/rotation/scale curves.
-    # Split into equal sized views of the arrays for each object.  
-    split_into = len(animdata_ob)
-    per_ob_values = np.split(all_ob_values, split_into) if split_into > 0 else ()
-    for anims, ob_values in zip(animdata_ob.values(), per_ob_values):
-        # Split again into equal sized views of the location, rotation and scaling arrays.
-        loc_xyz, rot_xyz, sca_xyz = np.split(ob_values, 3)
+    for anims, ob_values_ in zip(animdata_ob.values(), ob_values):
+        # Split into equal sized views of the location, rotation and scaling arrays.
+        loc_xyz, rot_xyz, sca_xyz = np.split(ob_values_, 3)
         # In-place convert from Blender rotation to FBX rotation.
         np.rad2deg(rot_xyz, out=rot_xyz)
                 
@@ -2521,11 +2798,8 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
         all_anims.append(anim_shape)
         
     # Set camera curves.
-    # Split into equal sized views of the arrays for each camera.
-    split_into = len(animdata_cameras)
-    per_camera_values = np.split(all_camera_values, split_into) if split_into > 0 else ()
-    zipped = zip(animdata_cameras.values(), per_camera_values)
-    for (anim_camera_lens, anim_camera_focus_distance, _camera), (lens_values, focus_distance_values) in zipped:
+    for (anim_camera_lens, anim_camera_focus_distance, _camera), (lens_values, focus_distance_values) in zip(
+            animdata_cameras.values(), camera_values):
         # In-place convert from Blender focus distance to FBX.
         focus_distance_values *= (1000 * gscale)
         anim_camera_lens.set_keyframes(real_currframes, lens_values)
@@ -2565,6 +2839,110 @@ def fbx_animations_do(scene_data, ref_id, f_start, f_end, start_zero, objects=No
     return (astack_key, animations, alayer_key, name, f_start, f_end) if animations else None
 
 
+def fbx_take_cache_key(scene_data, ob_obj, act, export_cache):
+    """
+    Hash of everything fbx_animations_do() reads for the take of an action assigned to an object, None
+    if the take can't be cached: drivers, constraints, NLA, modifiers on curves and animated cameras,
+    parents or duplis may depend on other data.
+    """
+    scene = scene_data.scene
+    settings = scene_data.settings
+    ob = ob_obj.bdata
+    anim = ob.animation_data
+    if anim.drivers or any(not track.mute for track in anim.nla_tracks) or ob.constraints:
+        return None
+    if ob.parent and ObjectWrapper(ob.parent) in fbx_animated_objects(scene_data, {ObjectWrapper(ob.parent)}):
+        return None
+    if any(fbx_animated_camera(cam_obj.bdata.data) for cam_obj in scene_data.data_cameras):
+        return None
+    if any(True for _dp_obj in ob_obj.dupli_list_gen(scene_data.depsgraph)):
+        return None
+    if any(fc.modifiers for fc in act.fcurves):
+        return None
+
+    h = export_cache.new_hash(
+        "take", scene.name, scene.render.fps, scene.render.fps_base, scene.arp_fix_fbx_matrix, scene.arp_export_act_name,
+        settings.bake_anim_step, settings.bake_anim_simplify_factor, settings.bake_anim_use_all_bones,
+        settings.bake_anim_force_startend_keying, settings.global_scale, settings.bake_space_transform,
+        ob_obj.key, ob.parent.name if ob.parent else None)
+    h.update_matrix(settings.global_matrix)
+    if settings.bone_correction_matrix:
+        h.update_matrix(settings.bone_correction_matrix)
+    # Current transform of the object, static unless keyed by the action
+    loc, rot, scale, _m, _mr = ob_obj.fbx_object_tx(scene_data)
+    h.update((tuple(loc), tuple(rot), tuple(scale)))
+
+    # Rest pose, pose of the channels not keyed by the action
+    if ob.type == 'ARMATURE':
+        if any(pbone.constraints for pbone in ob.pose.bones):
+            return None
+        h.update(sorted(bo_obj.key for bo_obj in ob_obj.bones if bo_obj in scene_data.objects))
+        h.update([(bone.name, bone.parent.name if bone.parent else None) for bone in ob.data.bones])
+        h.update_foreach(ob.data.bones, "matrix_local", np.float32, 16)
+        h.update_foreach(ob.pose.bones, "matrix_basis", np.float32, 16)
+        h.update_foreach(ob.pose.bones, "matrix", np.float32, 16)
+
+    # Action curves
+    h.update((act.name, tuple(act.frame_range), sorted(act.keys())))
+    for fc in act.fcurves:
+        h.update((fc.data_path, fc.array_index, fc.mute, fc.extrapolation))
+        points = fc.keyframe_points
+        for attr, dtype, width in (("co", np.float32, 2), ("handle_left", np.float32, 2),
+                                   ("handle_right", np.float32, 2), ("interpolation", np.int32, 1),
+                                   ("easing", np.int32, 1), ("back", np.float32, 1),
+                                   ("amplitude", np.float32, 1), ("period", np.float32, 1)):
+            h.update_foreach(points, attr, dtype, width)
+
+    # Baked shape keys and camera values
+    prefix = act.name + '|'
+    h.update(sorted(channel_key for me, (_me_key, _shapes_key, shapes) in scene_data.data_deformers_shape.items()
+                    if me.shape_keys.use_relative for channel_key, *_shape_data in shapes.values()))
+    h.update(sorted((key, value) for key, value in settings.shape_keys_baked_data_dict.items() if key.startswith(prefix)))
+    h.update(sorted(settings.mesh_names_data_dict.items()))
+    h.update(sorted((cam_key, cam_obj.bdata.data.lens, cam_obj.bdata.data.dof.focus_distance)
+                    for cam_obj, cam_key in scene_data.data_cameras.items()))
+    return h.hexdigest()
+
+
+def fbx_animations_sample_in_workers(scene_data, ob_obj, actions):
+    """
+    Sample the poses of the actions only animating the bones of an armature in background Blender
+    processes, when enabled by the arp_ge_bake_processes scene setting.
+    Returns {action: pose samples} for fbx_animations_do().
+    """
+    scene = scene_data.scene
+    processes = scene.arp_ge_bake_processes
+    ob = ob_obj.bdata
+    if processes < 1 or ob.type != 'ARMATURE' or ob.library or scene != bpy.context.scene:
+        return {}
+    if any(fbx_animated_camera(cam_obj.bdata.data) for cam_obj in scene_data.data_cameras):
+        return {}
+    if any(True for _dp_obj in ob_obj.dupli_list_gen(scene_data.depsgraph)):
+        return {}
+
+    objects = {ob_obj} | {bo_obj for bo_obj in ob_obj.bones if bo_obj in scene_data.objects}
+    org_act = ob.animation_data.action
+    takes = []
+    try:
+        for act in actions:
+            if act.library:
+                continue
+            ob.animation_data.action = act
+            animated = fbx_animated_objects(scene_data, objects)
+            if not animated or ob_obj in animated:
+                continue
+            frames = fbx_animations_frames(*act.frame_range, scene_data.settings.bake_anim_step)
+            takes.append((act, [(int(f), round(f - int(f), 3)) for f in frames.tolist()]))
+    finally:
+        ob.animation_data.action = org_act
+
+    # not worth starting processes for a single action
+    if len(takes) < 2:
+        return {}
+    from .fbx_anim_workers import sample_actions
+    return sample_actions(ob, takes, processes)
+
+
 def fbx_animations(scene_data):
     """
     Generate global animation data from objects.
@@ -2686,6 +3064,7 @@ def fbx_animations(scene_data):
             org_act = ob.animation_data.action
             path_resolve = ob.path_resolve  
             
+            export_actions = []
             for act in bpy.data.actions:
                 # Auto-Rig Pro implant for selective actions export                
                 save_action = False
@@ -2702,18 +3081,42 @@ def fbx_animations(scene_data):
                     # Unless that action was already assigned to the object!
                     if act != org_act and not validate_actions(act, path_resolve):
                         continue
-                    ob.animation_data.action = act
-                    frame_start, frame_end = act.frame_range  # sic!                    
-                    add_anim(animations, animated,
-                             fbx_animations_do(scene_data, (ob, act), frame_start, frame_end, True,
-                                               objects={ob_obj}, force_keep=True))
-                    # Ugly! :/
-                    if pbones_matrices is not ...:
-                        for pbo, mat in zip(ob.pose.bones, pbones_matrices):
-                            pbo.matrix_basis = mat.copy()
-                    ob.animation_data.action = org_act
-                    restore_object(ob, ob_copy)
-                    scene.frame_set(scene.frame_current, subframe=0.0)
+                    export_actions.append(act)
+
+            # Auto-Rig Pro implant, reuse the cached takes
+            export_cache = scene_data.settings.export_cache
+            take_keys = {}
+            cached_anims = {}
+            if export_cache is not None:
+                for act in export_actions:
+                    key = take_keys[act] = fbx_take_cache_key(scene_data, ob_obj, act, export_cache)
+                    cached = export_cache.get(key) if key else None
+                    if cached is not None:
+                        cached_anims[act] = cached[0]
+
+            # Auto-Rig Pro implant, actions only animating bones can be sampled in background processes
+            pose_samples = fbx_animations_sample_in_workers(
+                scene_data, ob_obj, [act for act in export_actions if act not in cached_anims])
+
+            for act in export_actions:
+                if act in cached_anims:
+                    add_anim(animations, animated, cached_anims[act])
+                    continue
+                ob.animation_data.action = act
+                frame_start, frame_end = act.frame_range  # sic!                    
+                anim = fbx_animations_do(scene_data, (ob, act), frame_start, frame_end, True,
+                                         objects={ob_obj}, force_keep=True,
+                                         pose_samples={ob: pose_samples[act]} if act in pose_samples else None)
+                add_anim(animations, animated, anim)
+                if take_keys.get(act):
+                    export_cache.put(take_keys[act], (anim,))
+                # Ugly! :/
+                if pbones_matrices is not ...:
+                    for pbo, mat in zip(ob.pose.bones, pbones_matrices):
+                        pbo.matrix_basis = mat.copy()
+                ob.animation_data.action = org_act
+                restore_object(ob, ob_copy)
+                scene.frame_set(scene.frame_current, subframe=0.0)
 
             if pbones_matrices is not ...:
                 for pbo, mat in zip(ob.pose.bones, pbones_matrices):
@@ -3078,7 +3481,14 @@ def fbx_data_from_scene(scene, depsgraph, settings):
             data_bones, data_leaf_bones, data_deformers_skin, data_deformers_shape,
             data_world, data_materials, data_textures, data_videos,
         )
-        animations, animated, frame_start, frame_end = fbx_animations(tmp_scdata)
+        # Only transforms and poses are evaluated when sampling frames.
+        muted_modifiers = fbx_animations_mute_modifiers(tmp_scdata)
+        try:
+            animations, animated, frame_start, frame_end = fbx_animations(tmp_scdata)
+        finally:
+            fbx_animations_restore_modifiers(muted_modifiers)
+            if muted_modifiers:
+                depsgraph.update()
 
     # ##### Creation of templates...
 
@@ -3529,7 +3939,7 @@ def fbx_objects_elements(root, scene_data):
 
     done_meshes = set()
     for me_obj in scene_data.data_meshes:
-        fbx_data_mesh_elements(objects, me_obj, scene_data, done_meshes)
+        fbx_data_mesh_elements_cached(objects, me_obj, scene_data, done_meshes)
     del done_meshes
 
     #perfmon.step("FBX export fetch objects (%d)..." % len(scene_data.objects))
@@ -3644,6 +4054,7 @@ def save_single(operator, scene, depsgraph, filepath="",
                 shape_keys_baked_data=None,# Auto-Rig Pro implant
                 mesh_names_data=None,# //
                 export_action_only='all_actions',# //
+                use_export_cache=False,# //
                 **kwargs
                 ):
 
@@ -3715,7 +4126,8 @@ def save_single(operator, scene, depsgraph, filepath="",
         bake_anim, bake_anim_use_all_bones, bake_anim_use_nla_strips, bake_anim_use_all_actions,
         bake_anim_step, bake_anim_simplify_factor, bake_anim_force_startend_keying,
         False, media_settings, use_custom_props, colors_type, prioritize_active_color,
-        shape_keys_baked_data_dict, mesh_names_data_dict, export_action_only#Auto-Rig Pro implant
+        shape_keys_baked_data_dict, mesh_names_data_dict, export_action_only,#Auto-Rig Pro implant
+        FBXExportCache() if use_export_cache else None,# //
     )
 
     import bpy_extras.io_utils
@@ -3754,6 +4166,10 @@ def save_single(operator, scene, depsgraph, filepath="",
         # Cleanup!
         fbx_scene_data_cleanup(scene_data)
 
+    # Auto-Rig Pro implant, cached element subtrees can be stored once their arrays are compressed
+    if settings.export_cache is not None:
+        settings.export_cache.flush()
+
     # And we are done, all multithreaded tasks are complete, and we can write the whole thing to file!
     encode_bin.write(filepath, root, FBX_VERSION)
 
@@ -0,0 +1,86 @@
+# Auto-Rig Pro implant
+# Sample the pose of many actions in background Blender processes.
+# The current file is saved as a temporary copy, each worker opens it, plays its share of the actions
+# and saves the PoseBone.matrix values of every frame in .npy files, merged back by the FBX exporter.
+# This file is also the worker script, run with:
+#     blender --background --factory-startup <copy.blend> --python fbx_anim_workers.py -- <job.json>
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import bpy
+
+
+def sample_job(job):
+    # run in the worker
+    scene = bpy.context.scene
+    ob = bpy.data.objects[job["object"]]
+    pose_bones = ob.pose.bones
+    # each take starts from the same pose, the channels not keyed by its action keep their value
+    basis = np.empty(len(pose_bones) * 16, dtype=np.float32)
+    pose_bones.foreach_get("matrix_basis", basis)
+
+    for take in job["takes"]:
+        pose_bones.foreach_set("matrix_basis", basis)
+        ob.animation_data.action = bpy.data.actions[take["action"]]
+        frames = take["frames"]
+        matrices = np.empty((len(frames), len(pose_bones) * 16), dtype=np.float32)
+        for f, (frame, subframe) in enumerate(frames):
+            scene.frame_set(frame, subframe=subframe)
+            pose_bones.foreach_get("matrix", matrices[f])
+        np.save(take["output"], matrices)
+        print("Sampled", take["action"])
+
+
+def sample_actions(ob, takes, processes):
+    """
+    Sample the pose of an armature for several actions in parallel Blender processes.
+    takes: list of (action, frames), frames being (frame, subframe) tuples
+    Returns {action: (frames, bones * 16) PoseBone.matrix values}, failed actions are missing.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="arp_fbx_anim_")
+    try:
+        blend_path = os.path.join(tmp_dir, "pose_sampling.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, check_existing=False)
+
+        args = [bpy.app.binary_path, "--background", "--factory-startup"]
+        if bpy.context.preferences.filepaths.use_scripts_auto_execute:
+            # python drivers, must be enabled before loading the file
+            args.append("--enable-autoexec")
+        args += [blend_path, "--python-exit-code", "1"]
+
+        jobs = []
+        for i in range(min(processes, len(takes))):
+            job = {"object": ob.name, "takes": []}
+            for j, (action, frames) in enumerate(takes[i::processes]):
+                job["takes"].append({"action": action.name, "frames": frames,
+                                     "output": os.path.join(tmp_dir, "take_%d_%d.npy" % (i, j))})
+            job_path = os.path.join(tmp_dir, "job_%d.json" % i)
+            with open(job_path, "w") as f:
+                json.dump(job, f)
+            worker = subprocess.Popen(args + ["--python", __file__, "--", job_path],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            jobs.append((worker, takes[i::processes], job))
+
+        results = {}
+        for worker, job_takes, job in jobs:
+            _out, err = worker.communicate()
+            if worker.returncode != 0:
+                print("Pose sampling process failed, its actions are sampled in this session\n",
+                      err.decode(errors="replace")[-2000:])
+            for (action, _frames), take in zip(job_takes, job["takes"]):
+                if os.path.exists(take["output"]):
+                    results[action] = np.load(take["output"])
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    with open(sys.argv[sys.argv.index("--") + 1]) as f:
+        sample_job(json.load(f))
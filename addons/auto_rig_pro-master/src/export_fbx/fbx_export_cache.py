@@ -0,0 +1,161 @@
+# Auto-Rig Pro implant
+# Persistent cache of the FBX exporter results, for repeated exports of a scene where little changes.
+# Entries are keyed by a hash of all the data they are built from, see fbx_mesh_cache_key() and
+# fbx_take_cache_key() in export_fbx_bin.py:
+#   * meshes: the encoded Geometry/Deformer/Pose element subtrees written by fbx_data_mesh_elements()
+#   * takes: the baked curves returned by fbx_animations_do()
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import bpy
+
+from . import encode_bin
+
+# Bump when the exporter output changes for the same input data
+CACHE_VERSION = 1
+
+# Exporter sources, any change invalidates the cache
+_SOURCE_FILES = ("export_fbx_bin.py", "fbx_utils.py", "encode_bin.py", "fbx_export_cache.py")
+
+
+def get_cache_dir():
+    return bpy.utils.user_resource('DATAFILES', path="arp_export_cache", create=True)
+
+
+class FBXExportHash:
+    """
+    Incremental hash of Blender data, values are tagged with their type so that
+    different sequences of values can't produce the same hash.
+    """
+    __slots__ = ("_hash",)
+
+    def __init__(self, *values):
+        self._hash = hashlib.blake2b(digest_size=20)
+        self.update(("version", CACHE_VERSION, tuple(bpy.app.version)))
+        self.update(values)
+
+    def update(self, value):
+        self._hash.update(repr(value).encode())
+
+    def update_array(self, array):
+        array = np.ascontiguousarray(array)
+        self.update((array.dtype.str, array.shape))
+        self._hash.update(array.tobytes())
+
+    def update_foreach(self, collection, attr, dtype, width=1):
+        array = np.empty(len(collection) * width, dtype=dtype)
+        collection.foreach_get(attr, array)
+        self.update(attr)
+        self.update_array(array)
+
+    def update_matrix(self, matrix):
+        self.update_array(np.array(matrix, dtype=np.float64))
+
+    def update_idprops(self, id_data):
+        # custom properties, IDPropertyGroup and arrays reprs contain addresses
+        items = []
+        for key, value in id_data.items():
+            if hasattr(value, "to_dict"):
+                value = value.to_dict()
+            elif hasattr(value, "to_list"):
+                value = value.to_list()
+            items.append((key, value))
+        self.update(sorted(items, key=lambda item: item[0]))
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _elem_to_tuple(elem):
+    return (elem.id, bytes(elem.props_type), list(elem.props), [_elem_to_tuple(child) for child in elem.elems])
+
+
+def _elem_from_tuple(data):
+    elem_id, props_type, props, elems = data
+    elem = encode_bin.FBXElem(elem_id)
+    elem.props_type = bytearray(props_type)
+    elem.props = props
+    elem.elems = [_elem_from_tuple(child) for child in elems]
+    return elem
+
+
+class FBXExportCache:
+    """
+    Cache entries are pickled files named after their key, the least recently used ones
+    are removed past max_entries.
+    Element subtrees are only stored by flush(), once their arrays are compressed.
+    """
+
+    def __init__(self, directory=None, max_entries=2048):
+        self.directory = directory or get_cache_dir()
+        self.max_entries = max_entries
+        self.code_key = self._get_code_key()
+        self._pending_elems = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _get_code_key():
+        folder = os.path.dirname(__file__)
+        stats = []
+        for name in _SOURCE_FILES:
+            stat = os.stat(os.path.join(folder, name))
+            stats.append((name, stat.st_size, stat.st_mtime_ns))
+        return repr(stats)
+
+    def new_hash(self, *values):
+        return FBXExportHash(self.code_key, *values)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.misses += 1
+            return default
+        # Keep recently used entries when pruning.
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("Could not write FBX export cache entry:", e)
+
+    def get_elems(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        return [_elem_from_tuple(elem) for elem in data]
+
+    def put_elems(self, key, elems):
+        self._pending_elems.append((key, elems))
+
+    def flush(self):
+        """Store the pending element subtrees and remove the oldest entries."""
+        for key, elems in self._pending_elems:
+            self.put(key, [_elem_to_tuple(elem) for elem in elems])
+        self._pending_elems.clear()
+
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pickle")]
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        print("FBX export cache: %d reused, %d rebuilt" % (self.hits, self.misses))
@@ -1,4 +1,5 @@
 import bpy, sys, math
+import numpy as np
 from .maths_geo import *
 from .bone_pose import *
 from .version import *
@@ -87,82 +88,356 @@ def set_keyf_data(key, data):
     key.easing = data[8]
     
 
+def get_bake_frames(frame_start, frame_end, sampling_rate):
+    # (sub)frames to bake, rounded because of decimals issues
+    frames = []
+    f = float(int(frame_start))
+    while f <= int(frame_end):
+        f = round(f, 3)
+        frames.append(f)
+        f += sampling_rate
+        f = round(f, 3)
+    return frames
+    
+    
+def reduce_keyframes(frames, values, tolerance, interpolation='LINEAR'):
+    # return the mask of keyframes to keep, so that the curve stays within tolerance of the baked values
+    # (linear interpolation error, or steps for constant interpolation)
+    # the shape of bezier curves depends on the handles computed by Blender, their keys are all kept
+    count = len(frames)
+    if interpolation not in {'LINEAR', 'CONSTANT'}:
+        return np.ones(count, dtype=bool)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if count > 2:
+        if interpolation == 'CONSTANT':
+            # the held value is the one of the last kept key, small steps can add up
+            last_value = values[0]
+            for i, value in enumerate(values.tolist()):
+                if abs(value - last_value) > tolerance:
+                    keep[i] = True
+                    last_value = value
+        else:
+            fac = (frames[1:-1] - frames[:-2]) / (frames[2:] - frames[:-2])
+            lerp = values[:-2] + (values[2:] - values[:-2]) * fac
+            keep[1:-1] = np.abs(values[1:-1] - lerp) > tolerance
+            # removing several keys in a row can add up errors, add back the worst ones until it fits
+            while True:
+                kept = np.flatnonzero(keep)
+                error = np.abs(np.interp(frames, frames[kept], values[kept]) - values) > tolerance
+                if not error.any():
+                    break
+                keep |= error
+    # constant curve, a single key is enough
+    if np.all(np.abs(values - values[0]) <= tolerance):
+        keep[:] = False
+        keep[0] = True
+    return keep
+    
+    
+def set_fcurve_keyframes(action, data_path, index, group, frames, values, interpolation=None, handle_type='DEFAULT', replace=False):
+    # write keyframes in one go, into a new F-Curve or a new (replaced) one
+    fcurve = action.fcurves.find(data_path=data_path, index=index)
+    if fcurve and (replace or len(fcurve.keyframe_points) == 0):
+        action.fcurves.remove(fcurve)
+        fcurve = None
+        
+    if fcurve:
+        # merge into existing keyframes, like keyframe_insert
+        for frame, value in zip(frames.tolist(), values.tolist()):
+            fcurve.keyframe_points.insert(frame, value, options={'FAST'})
+        fcurve.update()
+        return fcurve
+        
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+    num_keys = len(frames)
+    co = np.empty(num_keys * 2, dtype=np.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    fcurve.keyframe_points.add(num_keys)
+    fcurve.keyframe_points.foreach_set('co', co)
+    
+    if interpolation:
+        if bpy.app.version >= (2,90,0):# internal error when doing so with Blender 2.83, only for Blender 2.90 and higher
+            interp_value = bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[interpolation].value
+            fcurve.keyframe_points.foreach_set('interpolation', (interp_value,) * num_keys)
+            
+            # set handle type
+            if handle_type != 'DEFAULT':
+                handle_enum_value = bpy.types.Keyframe.bl_rna.properties['handle_left_type'].enum_items[handle_type].value
+                fcurve.keyframe_points.foreach_set('handle_left_type', (handle_enum_value,) * num_keys)
+                fcurve.keyframe_points.foreach_set('handle_right_type', (handle_enum_value,) * num_keys)
+        else:
+            for kf in fcurve.keyframe_points:
+                # set interpolation type (pre Blender 2.90 versions)
+                kf.interpolation = interpolation
+                
+                # set handle type (pre Blender 2.90 versions)
+                if handle_type != 'DEFAULT':
+                    kf.handle_left_type = handle_type
+                    kf.handle_right_type = handle_type
+                    
+    fcurve.update()
+    return fcurve
+    
+    
+def get_transform_channels(mats, rotation_mode, euler_prev=None, euler_matrix_compat=True):
+    # split matrices (frames, count, 4, 4) into keyframe channels, in the keyframe_insert order
+    # euler_prev: eulers of the previous frames, to continue the compatible chain
+    loc, rot, scale = matrices_to_loc_rot_scale(mats)
+    
+    if rotation_mode == 'QUATERNION':
+        rot_path = 'rotation_quaternion'
+        rot_values = quats_make_compatible(rot_matrices_to_quats(rot))
+    elif rotation_mode == 'AXIS_ANGLE':
+        rot_path = 'rotation_axis_angle'
+        rot_values = quats_to_axis_angle(rot_matrices_to_quats(rot))
+    else:# euler, XYZ, ZXY etc
+        rot_path = 'rotation_euler'
+        rot_values = np.empty(rot.shape[:-2] + (3,))
+        for i in range(len(rot)):
+            if i == 0 and euler_prev is None:
+                rot_values[i] = rot_matrices_to_eulers(rot[i], rotation_mode)
+                continue
+            prev = rot_values[i-1] if i > 0 else euler_prev
+            if euler_matrix_compat:# Matrix.to_euler(mode, prev)
+                rot_values[i] = rot_matrices_to_compatible_eulers(rot[i], prev, rotation_mode)
+            else:# Euler.make_compatible(prev)
+                rot_values[i] = eulers_make_compatible(rot_matrices_to_eulers(rot[i], rotation_mode), prev)
+                
+    return [('location', loc), (rot_path, rot_values), ('scale', scale)]
+    
+
+def set_bones_keyframes(action, pbones, frames, bones_data, interpolation_type='LINEAR', handle_type='DEFAULT', 
+    keyframes_dict=None, reduce_tolerance=0.0):
+    # convert the matrix_basis values (frames, bones, 4, 4) of the pose bones to channels and write their F-Curves
+    # bones sharing rotation mode and keyed frames are converted together
+    bones_groups = {}
+    for slot, pbone in enumerate(pbones):
+        frames_mask = np.ones(len(frames), dtype=bool)
+        if keyframes_dict:# optional, only keyframe given frames
+            frames_mask = np.isin(frames, keyframes_dict[pbone.name])
+        key = (pbone.rotation_mode, frames_mask.tobytes())
+        bones_groups.setdefault(key, (frames_mask, []))[1].append(slot)
+
+    bone_count = 0
+    total_bone_count = len(pbones)
+
+    for (rotation_mode, _), (frames_mask, slots) in bones_groups.items():
+        if not frames_mask.any():
+            bone_count += len(slots)
+            continue
+        channels = get_transform_channels(bones_data[frames_mask][:, slots].astype(np.float64), rotation_mode)
+        keyed_frames = frames[frames_mask]
+
+        for i, slot in enumerate(slots):
+            pbone = pbones[slot]
+            bone_count += 1
+            print_progress_bar("Baking phase 2", bone_count, total_bone_count)
+
+            # set interpolation type
+            key_interp = interpolation_type
+            if 'const_interp' in pbone.bone.keys():
+                if pbone.bone['const_interp'] == True:
+                    key_interp = 'CONSTANT'
+
+            for prop_type, values in channels:
+                data_path = 'pose.bones["' + pbone.name + '"].' + prop_type
+                for index in range(values.shape[-1]):
+                    key_frames = keyed_frames
+                    key_values = values[:, i, index]
+                    if reduce_tolerance > 0.0:
+                        keep = reduce_keyframes(key_frames, key_values, reduce_tolerance, key_interp)
+                        key_frames, key_values = key_frames[keep], key_values[keep]
+                    # for now always remove existing keyframes if overwriting current action, must be driven by constraints only
+                    set_fcurve_keyframes(action, data_path, index, pbone.name, key_frames, key_values, 
+                        interpolation=key_interp, handle_type=handle_type, replace=True)
+                            
+                            
+def get_fcurve_values(fcurve, frames):
+    # values of the F-Curve at the given frames, without evaluating the scene
+    # keyed frames, linear and constant segments and constant extrapolation are read from the keyframes arrays, 
+    # other frames (bezier segments, modifiers...) are evaluated
+    frames = np.asarray(frames, dtype=np.float64)
+    keys = fcurve.keyframe_points
+    count = len(keys)
+    if count == 0 or len(fcurve.modifiers):
+        return np.array([fcurve.evaluate(f) for f in frames.tolist()], dtype=np.float64)
+        
+    co = np.empty(count * 2, dtype=np.float32)
+    keys.foreach_get('co', co)
+    key_frames = co[0::2].astype(np.float64)
+    key_values = co[1::2].astype(np.float64)
+    interp = np.empty(count, dtype=np.int32)
+    keys.foreach_get('interpolation', interp)
+    interp_items = bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items
+    
+    values = np.empty(len(frames), dtype=np.float64)
+    solved = np.zeros(len(frames), dtype=bool)
+    # index of the previous keyframe
+    idx = np.searchsorted(key_frames, frames, side='right') - 1
+    
+    on_key = (idx >= 0) & (key_frames[np.maximum(idx, 0)] == frames)
+    values[on_key] = key_values[idx[on_key]]
+    solved |= on_key
+    
+    if fcurve.extrapolation == 'CONSTANT':
+        before = idx < 0
+        after = (idx == count - 1) & ~solved
+        values[before] = key_values[0]
+        values[after] = key_values[-1]
+        solved |= before | after
+        
+    inside = ~solved & (idx >= 0) & (idx < count - 1)
+    seg = idx[inside]
+    seg_interp = interp[seg]
+    
+    linear = seg_interp == interp_items['LINEAR'].value
+    constant = seg_interp == interp_items['CONSTANT'].value
+    seg_values = key_values[seg]
+    fac = (frames[inside] - key_frames[seg]) / (key_frames[seg + 1] - key_frames[seg])
+    seg_values = np.where(linear, seg_values + (key_values[np.minimum(seg + 1, count - 1)] - seg_values) * fac, seg_values)
+    values[inside] = seg_values
+    solved[inside] = linear | constant
+    
+    for i in np.flatnonzero(~solved).tolist():
+        values[i] = fcurve.evaluate(frames[i])
+    return values
+    
+    
 def bake_anim(frame_start=0, frame_end=10, only_selected=False, bake_bones=True, bake_object=False, 
     shape_keys=False, _self=None, action_export_name=None, new_action=True, new_action_name='Action', 
     interpolation_type='LINEAR', handle_type='DEFAULT',
     keyframes_dict=None, sampling_rate=1.0,
-    support_constraints=False):
+    support_constraints=False, reduce_tolerance=0.0):
+    # Bake the evaluated pose of each (sub)frame into keyframes.
+    # The pose matrices of all bones are sampled in a single buffer per frame, then converted 
+    # to channels and written to the F-Curves in one go. 
+    # reduce_tolerance > 0.0 removes the keyframes that can be interpolated within tolerance.
     
     scn = bpy.context.scene
-    obj_data = []
-    bones_data = []
     armature = bpy.data.objects.get(bpy.context.active_object.name)
-
-    def get_bones_matrix():
-        matrices_dict = {}
-
-        for pbone in armature.pose.bones:
+    pose_bones = armature.pose.bones
+    bones_index = {pbone.name: i for i, pbone in enumerate(pose_bones)}
+    
+    def get_constraint_parent(pbone):
+        # counter transform the ChildOf/Armature constraints
+        constraint = None
+        bparent_name = ''
+        parent_type = ''
+        
+        for c in pbone.constraints:
+            if not c.mute and c.influence > 0.5:
+                if c.type == 'CHILD_OF':
+                    if c.target:
+                        #if bone
+                        if c.target.type == 'ARMATURE':
+                            bparent_name = c.subtarget
+                            parent_type = "bone"
+                            constraint = c
+                            break
+                        #if object
+                        else:
+                            bparent_name = c.target.name
+                            parent_type = "object"
+                            constraint = c
+                            break
+                            
+                elif c.type == 'ARMATURE':
+                    for tar in c.targets:
+                        if tar.weight > 0.5:
+                            bparent_name = tar.subtarget
+                            parent_type = "bone"
+                            constraint = c
+                            break
+                            
+        if constraint and parent_type == 'bone' and bparent_name == '':
+            constraint = None
+        return constraint, parent_type, bparent_name
+        
+    def has_default_inherit(bone):
+        # pose space to local space is a plain matrix product 
+        if bpy.app.version >= (2,81,0):
+            inherit_scale = bone.inherit_scale == 'FULL'
+        else:
+            inherit_scale = bone.use_inherit_scale
+        return bone.use_inherit_rotation and inherit_scale and bone.use_local_location
+        
+    # bones to bake, sampled as a batch or through convert_space (other inherit modes, object constraints)
+    baked_bones = []
+    batch_slots = []
+    batch_parents = []
+    batch_channel_parents = []
+    batch_offsets = []
+    other_slots = []
+    
+    if bake_bones:
+        for pbone in pose_bones:
             if only_selected and not pbone.bone.select:
                 continue
-
-            def_matrix = None
-            constraint = None
-            bparent_name = ''
-            parent_type = ''
-            valid_constraint = True
+            slot = len(baked_bones)
+            baked_bones.append(pbone)
             
-            if support_constraints:# counter transform the ChildOf/Armature constraints            
-                if len(pbone.constraints):
-                    for c in pbone.constraints:
-                        if not c.mute and c.influence > 0.5:
-                            if c.type == 'CHILD_OF':
-                                if c.target:
-                                    #if bone
-                                    if c.target.type == 'ARMATURE':
-                                        bparent_name = c.subtarget
-                                        parent_type = "bone"
-                                        constraint = c
-                                        break
-                                    #if object
-                                    else:
-                                        bparent_name = c.target.name
-                                        parent_type = "object"
-                                        constraint = c
-                                        break
-                                        
-                            elif c.type == 'ARMATURE':
-                                for tar in c.targets:
-                                    if tar.weight > 0.5:
-                                        bparent_name = tar.subtarget
-                                        parent_type = "bone"
-                                        constraint = c
-                                        break
-
-                if constraint:
-                    if parent_type == 'bone':
-                        if bparent_name == '':
-                            valid_constraint = False
-
-            # apply constraint parent
-            if constraint and valid_constraint:
+            constraint, parent_type, bparent_name = None, '', ''
+            if support_constraints and len(pbone.constraints):
+                constraint, parent_type, bparent_name = get_constraint_parent(pbone)
+                
+            if has_default_inherit(pbone.bone) and (constraint == None or (parent_type == 'bone' and bparent_name in bones_index)):
+                rest = pbone.bone.matrix_local
+                if pbone.parent:
+                    rest = pbone.parent.bone.matrix_local.inverted() @ rest
+                batch_slots.append(slot)
+                batch_parents.append(bones_index[pbone.parent.name] if pbone.parent else -1)
+                batch_channel_parents.append(bones_index[bparent_name] if constraint else -1)
+                batch_offsets.append(np.array(rest.inverted()))
+            else:
+                other_slots.append((slot, pbone, constraint, parent_type, bparent_name))
+                
+    batch_slots = np.array(batch_slots, dtype=np.int64)
+    batch_parents = np.array(batch_parents, dtype=np.int64)
+    batch_channel_parents = np.array(batch_channel_parents, dtype=np.int64)
+    batch_offsets = np.array(batch_offsets).reshape(-1, 4, 4)
+    use_channels = bool((batch_channel_parents >= 0).any())
+    
+    def get_bones_matrix(buffer):
+        # matrix_basis of all baked bones, written to buffer (count, 4, 4)
+        if len(batch_slots):
+            # foreach_get gives column-major matrices, one more identity matrix for the root bones
+            pose_mats = np.empty((len(pose_bones) + 1) * 16, dtype=np.float32)
+            pose_bones.foreach_get('matrix', pose_mats[:-16])
+            pose_mats = pose_mats.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64)
+            pose_mats[-1] = np.identity(4)
+            inv_pose_mats = np.linalg.inv(pose_mats)
+            
+            mats = pose_mats[batch_slots_index]
+            if use_channels:
+                channel_mats = np.empty((len(pose_bones) + 1) * 16, dtype=np.float32)
+                pose_bones.foreach_get('matrix_channel', channel_mats[:-16])
+                channel_mats = channel_mats.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64)
+                channel_mats[-1] = np.identity(4)
+                mats = np.linalg.inv(channel_mats[batch_channel_parents]) @ mats
+                
+            # pose space to local space
+            buffer[batch_slots] = batch_offsets @ inv_pose_mats[batch_parents] @ mats
+            
+        for slot, pbone, constraint, parent_type, bparent_name in other_slots:
+            def_matrix = pbone.matrix
+            if constraint:
                 if parent_type == "bone":
                     bone_parent = get_pose_bone(bparent_name)
                     def_matrix = bone_parent.matrix_channel.inverted() @ pbone.matrix
                 if parent_type == "object":
                     rig = bpy.data.objects[bparent_name]
-                    def_matrix = constraint.inverse_matrix.inverted() @ rig.matrix_world.inverted() @ def_matrix.matrix
-            
-                # apply armature object matrix
-                def_matrix = armature.convert_space(pose_bone=pbone, matrix=def_matrix, from_space="POSE", to_space="LOCAL")    
-                
-            else:
-                def_matrix = armature.convert_space(pose_bone=pbone, matrix=pbone.matrix, from_space="POSE", to_space="LOCAL")
-            
-            matrices_dict[pbone.name] = def_matrix
+                    def_matrix = constraint.inverse_matrix.inverted() @ rig.matrix_world.inverted() @ pbone.matrix
+                    
+            # apply armature object matrix
+            buffer[slot] = armature.convert_space(pose_bone=pbone, matrix=def_matrix, from_space="POSE", to_space="LOCAL")
             
-        return matrices_dict
-        
-
+    # pose bones indices of the batch bones
+    batch_slots_index = np.array([bones_index[baked_bones[slot].name] for slot in batch_slots], dtype=np.int64)
+    
     def get_obj_matrix():
         parent = armature.parent
         matrix = armature.matrix_world
@@ -182,45 +457,44 @@ def bake_anim(frame_start=0, frame_end=10, only_selected=False, bake_bones=True,
                 continue
             if len(ob.data.shape_keys.key_blocks) <= 1:
                 continue
-            sk_objects.append(ob)
+                
+            if scn.arp_retro_ge_mesh == False:
+                obj_base = bpy.data.objects.get(ob.name.replace('_arpexp', ''))
+                obj_data_name = obj_base.data.name
+            else:
+                obj_data_name = ob.data.name
+            key_blocks = ob.data.shape_keys.key_blocks
+            entries = [action_export_name+'|'+'BMesh#'+obj_data_name+'|Shape|BShape Key#'+sk.name+'|' for sk in key_blocks]
+            skip_basis = key_blocks[0].name in ["Basis", "00_Basis"]
+            sk_objects.append((key_blocks, entries, skip_basis))
             
     # store matrices
     current_frame = scn.frame_current
-    f = float(int(frame_start))
-
-    while f <= int(frame_end):    
-        f = round(f, 3)# round frame value because of decimals issues 
+    frames = get_bake_frames(frame_start, frame_end, sampling_rate)
+    bones_data = np.empty((len(frames), len(baked_bones), 4, 4), dtype=np.float32)
+    obj_data = np.empty((len(frames), 1, 4, 4), dtype=np.float32)
+    
+    for fi, f in enumerate(frames):
         scn.frame_set(math.floor(f), subframe=f-math.floor(f))
         bpy.context.view_layer.update()
        
         if bake_bones:
-            bones_data.append((f, get_bones_matrix()))
+            get_bones_matrix(bones_data[fi])
         if bake_object:
-            obj_data.append((f, get_obj_matrix()))
+            obj_data[fi, 0] = get_obj_matrix()
 
         # shape keys data (for animation export only)
-        #print('f', f)
-        for ob in sk_objects:
-            for i, sk in enumerate(ob.data.shape_keys.key_blocks):
-                if (sk.name == "Basis" or sk.name == "00_Basis") and i == 0:
+        frame_in_action = float(f-int(frame_start))
+        frame_in_action = str(round(frame_in_action, 3))# round frame value because of decimals issues 
+        for key_blocks, entries, skip_basis in sk_objects:
+            values = np.empty(len(key_blocks), dtype=np.float32)
+            key_blocks.foreach_get('value', values)
+            for i, value in enumerate(values.tolist()):
+                if i == 0 and skip_basis:
                     continue
-
-                frame_in_action = float(f-int(frame_start))
-                frame_in_action = round(frame_in_action, 3)# round frame value because of decimals issues 
-
-                if scn.arp_retro_ge_mesh == False:
-                    obj_base = bpy.data.objects.get(ob.name.replace('_arpexp', ''))
-                    obj_data_name = obj_base.data.name
-                else:
-                    obj_data_name = ob.data.name
-                #print('Bake shape key', obj_data_name, sk.name, sk.value)
-                dict_entry = action_export_name+'|'+'BMesh#'+obj_data_name+'|Shape|BShape Key#'+sk.name+'|'+str(frame_in_action)
-                _self.shape_keys_data[dict_entry] = sk.value
+                _self.shape_keys_data[entries[i]+frame_in_action] = value
                 
-
         print_progress_bar("Baking phase 1", f-frame_start, frame_end-frame_start)
-        f += sampling_rate
-        f = round(f, 3)# round frame value because of decimals issues
         
     print("")
 
@@ -232,156 +506,27 @@ def bake_anim(frame_start=0, frame_end=10, only_selected=False, bake_bones=True,
         anim_data.action = action
     else:
         action = armature.animation_data.action
-
-    def store_keyframe(bone_name, prop_type, fc_array_index, frame, value):
-        fc_data_path = 'pose.bones["' + bone_name + '"].' + prop_type
-        fc_key = (fc_data_path, fc_array_index)
-        if not keyframes.get(fc_key):
-            keyframes[fc_key] = []
-        keyframes[fc_key].extend((frame, value))
-
-
-    # set transforms and store keyframes
-    
-    if bake_bones:
-        bone_count = 0
-        total_bone_count = len(armature.pose.bones)      
         
-        for pbone in armature.pose.bones:
-            bone_count += 1
-            print_progress_bar("Baking phase 2", bone_count, total_bone_count)
-
-            if only_selected and not pbone.bone.select:
-                continue       
-
-            euler_prev = None
-            quat_prev = None
-            keyframes = {}
+    frames = np.array(frames)
 
-            for (f, matrix) in bones_data:
-                # optional, only keyframe given frames
-                if keyframes_dict:
-                    keyf_list = keyframes_dict[pbone.name]
-                    if not f in keyf_list:
-                        continue
-                        
-                pbone.matrix_basis = matrix[pbone.name].copy()
-                
-                for arr_idx, value in enumerate(pbone.location):
-                    store_keyframe(pbone.name, "location", arr_idx, f, value)
-
-                rotation_mode = pbone.rotation_mode
-                if rotation_mode == 'QUATERNION':
-                    if quat_prev is not None:
-                        quat = pbone.rotation_quaternion.copy()
-                        if bpy.app.version >= (2,82,0):# previous versions don't know this function
-                            quat.make_compatible(quat_prev)
-                        pbone.rotation_quaternion = quat
-                        quat_prev = quat
-                        del quat
-                    else:
-                        quat_prev = pbone.rotation_quaternion.copy()
-
-                    for arr_idx, value in enumerate(pbone.rotation_quaternion):
-                        store_keyframe(pbone.name, "rotation_quaternion", arr_idx, f, value)
-
-                elif rotation_mode == 'AXIS_ANGLE':
-                    for arr_idx, value in enumerate(pbone.rotation_axis_angle):
-                        store_keyframe(pbone.name, "rotation_axis_angle", arr_idx, f, value)
-
-                else:  # euler, XYZ, ZXY etc
-                    if euler_prev is not None:                    
-                        euler = pbone.matrix_basis.to_euler(pbone.rotation_mode, euler_prev)
-                        pbone.rotation_euler = euler                      
-                        del euler
-                    
-                    euler_prev = pbone.rotation_euler.copy()
-
-                    for arr_idx, value in enumerate(pbone.rotation_euler):
-                        store_keyframe(pbone.name, "rotation_euler", arr_idx, f, value)
-
-                for arr_idx, value in enumerate(pbone.scale):
-                    store_keyframe(pbone.name, "scale", arr_idx, f, value)
-
-            # Add keyframes
-            fi = 0
-            for fc_key, key_values in keyframes.items():
-                data_path, index = fc_key
-                fcurve = action.fcurves.find(data_path=data_path, index=index)
-                if new_action == False and fcurve:# for now always remove existing keyframes if overwriting current action, must be driven by constraints only
-                    action.fcurves.remove(fcurve)
-                    fcurve = action.fcurves.new(data_path, index=index, action_group=pbone.name)
-                if fcurve == None:
-                    fcurve = action.fcurves.new(data_path, index=index, action_group=pbone.name)
-
-                # set keyframes points
-                num_keys = len(key_values) // 2
-                fcurve.keyframe_points.add(num_keys)
-                fcurve.keyframe_points.foreach_set('co', key_values)
-                
-                # set interpolation type
-                key_interp = interpolation_type
-                if 'const_interp' in pbone.bone.keys():
-                    if pbone.bone['const_interp'] == True:
-                        key_interp = 'CONSTANT'
-                        
-                if bpy.app.version >= (2,90,0):# internal error when doing so with Blender 2.83, only for Blender 2.90 and higher
-                    interp_value = bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[key_interp].value                    
-                    fcurve.keyframe_points.foreach_set('interpolation', (interp_value,) * num_keys)
-                    
-                    # set handle type
-                    if handle_type != 'DEFAULT':
-                        handle_enum_value = bpy.types.Keyframe.bl_rna.properties['handle_left_type'].enum_items[handle_type].value
-                        fcurve.keyframe_points.foreach_set('handle_left_type', (handle_enum_value,) * num_keys)
-                        fcurve.keyframe_points.foreach_set('handle_right_type', (handle_enum_value,) * num_keys)
-                else:
-                    for kf in fcurve.keyframe_points:
-                        # set interpolation type (pre Blender 2.90 versions)
-                        kf.interpolation = key_interp
-                        
-                        # set handle type (pre Blender 2.90 versions)
-                        if handle_type != 'DEFAULT':
-                            kf.handle_type_right = handle_type
-                            kf.handle_type_left = handle_type
-
-                fcurve.update()
+    # convert matrices to channels and store keyframes
+    if bake_bones:
+        set_bones_keyframes(action, baked_bones, frames, bones_data, interpolation_type=interpolation_type, 
+            handle_type=handle_type, keyframes_dict=keyframes_dict, reduce_tolerance=reduce_tolerance)
                 
-    if bake_object:
-        euler_prev = None
-        quat_prev = None
-
-        for (f, matrix) in obj_data:
-            name = "Action Bake"
-            armature.matrix_basis = matrix
-
-            armature.keyframe_insert("location", index=-1, frame=f, group=name)
-
-            rotation_mode = armature.rotation_mode
-            if rotation_mode == 'QUATERNION':
-                if quat_prev is not None:
-                    quat = armature.rotation_quaternion.copy()
-                    if bpy.app.version >= (2,82,0):# previous versions don't know this function
-                        quat.make_compatible(quat_prev)
-                    armature.rotation_quaternion = quat
-                    quat_prev = quat
-                    del quat
-                else:
-                    quat_prev = armature.rotation_quaternion.copy()
-                armature.keyframe_insert("rotation_quaternion", index=-1, frame=f, group=name)
-            elif rotation_mode == 'AXIS_ANGLE':
-                armature.keyframe_insert("rotation_axis_angle", index=-1, frame=f, group=name)
-            else:  # euler, XYZ, ZXY etc
-                if euler_prev is not None:
-                    euler = armature.rotation_euler.copy()
-                    euler.make_compatible(euler_prev)
-                    armature.rotation_euler = euler
-                    euler_prev = euler
-                    del euler
-                else:
-                    euler_prev = armature.rotation_euler.copy()
-                armature.keyframe_insert("rotation_euler", index=-1, frame=f, group=name)
-
-            armature.keyframe_insert("scale", index=-1, frame=f, group=name)
+    if bake_object and len(frames):
+        name = "Action Bake"
+        edit_prefs = bpy.context.preferences.edit
+        channels = get_transform_channels(obj_data.astype(np.float64), armature.rotation_mode, euler_matrix_compat=False)
+        for prop_type, values in channels:
+            for index in range(values.shape[-1]):
+                key_frames = frames
+                key_values = values[:, 0, index]
+                if reduce_tolerance > 0.0:
+                    keep = reduce_keyframes(key_frames, key_values, reduce_tolerance, edit_prefs.keyframe_new_interpolation_type)
+                    key_frames, key_values = key_frames[keep], key_values[keep]
+                set_fcurve_keyframes(action, prop_type, index, name, key_frames, key_values, 
+                    interpolation=edit_prefs.keyframe_new_interpolation_type, handle_type=edit_prefs.keyframe_new_handle_type)
 
 
     # restore current frame
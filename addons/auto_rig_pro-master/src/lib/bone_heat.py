@@ -0,0 +1,281 @@
+import bpy, os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+from .mesh import *
+
+# SciPy is not bundled with every Blender build, the heat maps fall back to Blender automatic weights without it
+try:
+    import scipy.sparse
+    import scipy.sparse.csgraph
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+
+# Same constants as Blender bone heat weighting (meshlaplacian.cc)
+_HEAT_C_WEIGHT = 1.0
+_HEAT_DISTANCE_EPSILON = 1e-4
+_HEAT_WEIGHT_LIMIT_START = 0.05
+_HEAT_WEIGHT_LIMIT_END = 0.025
+
+# vertices per chunk when computing the vertex-bone distances, bone columns per solve
+_HEAT_VERTS_CHUNK = 2048
+_HEAT_BONES_CHUNK = 8
+
+def is_heat_solver_available():
+    return scipy is not None
+
+
+def get_mesh_world_triangles(obj):
+    # vertices in world space, and the triangles of the mesh
+    me = obj.data
+    me.calc_loop_triangles()
+
+    co = np.empty(len(me.vertices)*3, dtype=np.float32)
+    me.vertices.foreach_get('co', co)
+    mat = np.array(obj.matrix_world, dtype=np.float64)
+    verts = co.reshape(-1, 3) @ mat[:3, :3].T + mat[:3, 3]
+
+    tris = np.empty(len(me.loop_triangles)*3, dtype=np.int32)
+    me.loop_triangles.foreach_get('vertices', tris)
+
+    return verts, tris.reshape(-1, 3)
+
+
+def _tris_cotangents(v1, v2, v3):
+    # cotangent of the angle at v1, zero for degenerated triangles
+    a = v2 - v1
+    b = v3 - v1
+    clen = np.linalg.norm(np.cross(a, b), axis=1)
+    dot = np.einsum('ij,ij->i', a, b)
+    return np.divide(dot, clen, out=np.zeros_like(dot), where=clen > 1.192092896e-07)
+
+
+def get_heat_laplacian(verts, tris):
+    # cotangent Laplacian weighted by the inverse vertex areas, as laplacian_system_construct_end()
+    n = len(verts)
+    i1, i2, i3 = tris[:, 0], tris[:, 1], tris[:, 2]
+    v1, v2, v3 = verts[i1], verts[i2], verts[i3]
+
+    t1 = _tris_cotangents(v1, v2, v3)
+    t2 = _tris_cotangents(v2, v3, v1)
+    t3 = _tris_cotangents(v3, v1, v2)
+
+    # voronoi areas, half and quarter of the triangle area for obtuse triangles
+    area = 0.5 * np.linalg.norm(np.cross(v2 - v1, v3 - v1), axis=1)
+    obtuse1 = np.einsum('ij,ij->i', v2 - v1, v3 - v1) < 0
+    obtuse2 = ~obtuse1 & (np.einsum('ij,ij->i', v1 - v2, v3 - v2) < 0)
+    obtuse3 = ~obtuse1 & ~obtuse2 & (np.einsum('ij,ij->i', v1 - v3, v2 - v3) < 0)
+    obtuse = obtuse1 | obtuse2 | obtuse3
+
+    len1 = np.einsum('ij,ij->i', v2 - v3, v2 - v3)
+    len2 = np.einsum('ij,ij->i', v1 - v3, v1 - v3)
+    len3 = np.einsum('ij,ij->i', v1 - v2, v1 - v2)
+    a1 = np.where(obtuse, np.where(obtuse1, area, area*0.5), (t2*len2 + t3*len3) * 0.25)
+    a2 = np.where(obtuse, np.where(obtuse2, area, area*0.5), (t1*len1 + t3*len3) * 0.25)
+    a3 = np.where(obtuse, np.where(obtuse3, area, area*0.5), (t1*len1 + t2*len2) * 0.25)
+
+    varea = np.bincount(i1, a1, n) + np.bincount(i2, a2, n) + np.bincount(i3, a3, n)
+    varea = np.divide(0.5, varea, out=np.zeros_like(varea), where=varea != 0.0)
+
+    # cotangent weights divided by the number of faces sharing the edge, as laplacian_triangle_weights()
+    edges = np.sort(np.concatenate((tris[:, [1, 2]], tris[:, [2, 0]], tris[:, [0, 1]])).astype(np.int64), axis=1)
+    _keys, inverse, counts = np.unique(edges[:, 0] * n + edges[:, 1], return_inverse=True, return_counts=True)
+    edge_faces = counts[inverse.ravel()].reshape(3, -1)
+    t1, t2, t3 = t1 / edge_faces[0], t2 / edge_faces[1], t3 / edge_faces[2]
+
+    rows = np.concatenate((i1, i2, i3, i1, i2, i2, i3, i3, i1))
+    cols = np.concatenate((i1, i2, i3, i2, i1, i3, i2, i1, i3))
+    vals = np.concatenate((t2+t3, t1+t3, t1+t2, -t3, -t3, -t1, -t1, -t2, -t2))
+
+    return scipy.sparse.csr_matrix((vals * varea[rows], (rows, cols)), shape=(n, n))
+
+
+def get_vertex_normals(verts, tris):
+    # sum of the faces normals, as heat_calc_vnormals()
+    fnor = np.cross(verts[tris[:, 1]] - verts[tris[:, 0]], verts[tris[:, 2]] - verts[tris[:, 0]])
+    flen = np.linalg.norm(fnor, axis=1, keepdims=True)
+    fnor = np.divide(fnor, flen, out=np.zeros_like(fnor), where=flen > 0.0)
+    vnor = np.zeros_like(verts)
+    for i in range(3):
+        np.add.at(vnor, tris[:, i], fnor)
+    vlen = np.linalg.norm(vnor, axis=1, keepdims=True)
+    return np.divide(vnor, vlen, out=np.zeros_like(vnor), where=vlen > 0.0)
+
+
+def _closest_bones(verts, vnors, heads, tails):
+    # closest bones of each vertex, the distance being increased if the vertex normal does not point along the bone
+    # returns the min distance per vertex, and the (vertex, bone) candidates with their closest points on bones
+    mindist = np.empty(len(verts))
+    cand_verts, cand_bones, cand_points = [], [], []
+
+    segs = tails - heads
+    seg_len_sq = np.einsum('ij,ij->i', segs, segs)
+
+    for start in range(0, len(verts), _HEAT_VERTS_CHUNK):
+        co = verts[start:start+_HEAT_VERTS_CHUNK]
+        nor = vnors[start:start+_HEAT_VERTS_CHUNK]
+
+        fac = np.einsum('vbk,bk->vb', co[:, None, :] - heads[None], segs)
+        fac = np.clip(np.divide(fac, seg_len_sq, out=np.zeros_like(fac), where=seg_len_sq > 0.0), 0.0, 1.0)
+        closest = heads[None] + fac[..., None] * segs[None]
+
+        vec = co[:, None, :] - closest
+        dist = np.linalg.norm(vec, axis=2)
+        vec = np.divide(vec, dist[..., None], out=np.zeros_like(vec), where=dist[..., None] > 1e-35)
+        cosine = np.einsum('vbk,vk->vb', vec, nor)
+        dist = dist / (0.5 * (cosine + 1.001))
+
+        chunk_min = dist.min(axis=1)
+        mindist[start:start+len(co)] = chunk_min
+        v_idx, b_idx = np.nonzero(dist <= chunk_min[:, None] * (1.0 + _HEAT_DISTANCE_EPSILON))
+        cand_verts.append(v_idx + start)
+        cand_bones.append(b_idx)
+        cand_points.append(closest[v_idx, b_idx])
+
+    return mindist, np.concatenate(cand_verts), np.concatenate(cand_bones), np.concatenate(cand_points)
+
+
+def _rays_visible(tree, verts, points, ray_verts, tris_comp=None, verts_comp=None):
+    # True where the bone point is visible from the vertex, as heat_ray_source_visible()
+    # faces pointing against the ray are skipped, as bvh_callback()
+    # if components are given, only the faces of the vertex component can hide it (loose parts skinned separately)
+    visible = np.ones(len(ray_verts), dtype=bool)
+    vecs = points - verts[ray_verts]
+    starts = verts[ray_verts] + vecs * 1e-5
+    vecs *= 1.0 - 2e-5
+    dists = np.linalg.norm(vecs, axis=1)
+    dirs = np.divide(vecs, dists[:, None], out=np.zeros_like(vecs), where=dists[:, None] > 0.0)
+
+    ray_cast = tree.ray_cast
+    for i, (start, direction, dist) in enumerate(zip(starts.tolist(), dirs.tolist(), dists.tolist())):
+        if dist <= 0.0:
+            continue
+        comp = verts_comp[ray_verts[i]] if tris_comp is not None else None
+        origin = Vector(start)
+        direction = Vector(direction)
+        while dist > 0.0:
+            hit, nor, tri_idx, hit_dist = ray_cast(origin, direction, dist)
+            if hit is None:
+                break
+            if nor.dot(direction) >= -1e-5 and (tris_comp is None or tris_comp[tri_idx] == comp):
+                visible[i] = False
+                break
+            # back face or another loose part, continue behind it
+            origin = hit + direction * 1e-5
+            dist -= hit_dist + 1e-5
+
+    return visible
+
+
+def _threshold_heat_weights(weights):
+    # fade out the low weights, as heat_bone_weighting()
+    fade = (weights - _HEAT_WEIGHT_LIMIT_END) / (_HEAT_WEIGHT_LIMIT_START - _HEAT_WEIGHT_LIMIT_END) * _HEAT_WEIGHT_LIMIT_START
+    return np.where(weights > _HEAT_WEIGHT_LIMIT_START, weights, np.where(weights > _HEAT_WEIGHT_LIMIT_END, fade, 0.0))
+
+
+def bone_heat_weights(verts, tris, heads, tails, split_loose=False):
+    # Bone heat weighting (Baran and Popovic), solved for all bones with a single factorization of the heat system
+    # heads, tails: (bones, 3) bones coordinates, in the same space as verts
+    # split_loose: loose parts are occluded by themselves only, as if they were skinned one by one
+    # returns the (vertex indices, weights) of each bone, and False if some vertices could not be solved
+    n = len(verts)
+    weights = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for i in range(len(heads))]
+    if n == 0 or len(heads) == 0:
+        return weights, True
+
+    vnors = get_vertex_normals(verts, tris)
+    mindist, cand_verts, cand_bones, cand_points = _closest_bones(verts, vnors, heads, tails)
+
+    # connected components, from the triangles edges
+    edges = np.concatenate((tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]]))
+    adjacency = scipy.sparse.coo_matrix((np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])), shape=(n, n))
+    comp_count, verts_comp = scipy.sparse.csgraph.connected_components(adjacency, directed=False)
+
+    # visibility
+    tree = BVHTree.FromPolygons(verts.tolist(), tris.tolist(), all_triangles=True)
+    if split_loose:
+        visible = _rays_visible(tree, verts, cand_points, cand_verts, tris_comp=verts_comp[tris[:, 0]], verts_comp=verts_comp)
+    else:
+        visible = _rays_visible(tree, verts, cand_points, cand_verts)
+    cand_verts, cand_bones = cand_verts[visible], cand_bones[visible]
+
+    # heat: H = numclosest * C / d^2, right hand side H * p = C / d^2
+    numclosest = np.bincount(cand_verts, minlength=n)
+    heat = _HEAT_C_WEIGHT / np.maximum(mindist, 1e-4) ** 2
+    H = numclosest * heat
+
+    # a loose part without visible bones can't be solved
+    comp_heat = np.bincount(verts_comp, H, comp_count)
+    solved = comp_heat[verts_comp] > 0.0
+    success = bool(solved.all())
+    if not solved.any():
+        return weights, success
+
+    solved_idx = np.flatnonzero(solved)
+    rows = np.full(n, -1, dtype=np.int64)
+    rows[solved_idx] = np.arange(len(solved_idx))
+
+    system = get_heat_laplacian(verts, tris) + scipy.sparse.diags(H)
+    system = system.tocsr()[solved_idx][:, solved_idx].tocsc()
+    lu = scipy.sparse.linalg.splu(system)
+
+    rhs = scipy.sparse.csc_matrix((heat[cand_verts], (rows[cand_verts], cand_bones)), shape=(len(solved_idx), len(heads)))
+    bones_idx = np.flatnonzero(np.diff(rhs.indptr))
+
+    def solve(chunk):
+        solution = _threshold_heat_weights(lu.solve(rhs[:, chunk].toarray()))
+        for i, bone_idx in enumerate(chunk):
+            nonzero = np.flatnonzero(solution[:, i])
+            weights[bone_idx] = solved_idx[nonzero], solution[nonzero, i].astype(np.float32)
+
+    chunks = [bones_idx[i:i+_HEAT_BONES_CHUNK] for i in range(0, len(bones_idx), _HEAT_BONES_CHUNK)]
+    with ThreadPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1) or 1) as executor:
+        for _result in executor.map(solve, chunks):
+            pass
+
+    return weights, success
+
+
+def parent_armature_heat(obj, armature, split_loose=False):
+    # Parent the mesh to the armature with automatic weights, as bpy.ops.object.parent_set(type='ARMATURE_AUTO')
+    # returns False if some vertices could not be weighted
+    obj.parent = armature
+    obj.matrix_parent_inverse = armature.matrix_world.inverted()
+
+    has_mod = False
+    for mod in obj.modifiers:
+        if mod.type == 'ARMATURE' and mod.object == armature:
+            has_mod = True
+            break
+    if not has_mod:
+        mod = obj.modifiers.new('Armature', 'ARMATURE')
+        mod.object = armature
+
+    bones_names = [b.name for b in armature.data.bones if b.use_deform]
+    mat = armature.matrix_world
+    heads = np.array([mat @ armature.pose.bones[name].head for name in bones_names], dtype=np.float64).reshape(-1, 3)
+    tails = np.array([mat @ armature.pose.bones[name].tail for name in bones_names], dtype=np.float64).reshape(-1, 3)
+
+    verts, tris = get_mesh_world_triangles(obj)
+    weights, success = bone_heat_weights(verts, tris, heads, tails, split_loose=split_loose)
+
+    for name, (indices, bone_weights) in zip(bones_names, weights):
+        keep = bone_weights >= 0.5 / WEIGHT_STEPS
+        indices = indices[keep]
+        vgroup = obj.vertex_groups.get(name)
+        if vgroup == None:
+            vgroup = obj.vertex_groups.new(name=name)
+        else:
+            # the vertices out of the bone influence are removed from existing groups
+            outside = np.ones(len(verts), dtype=bool)
+            outside[indices] = False
+            vgroup.remove(np.flatnonzero(outside).tolist())
+        set_vgroup_weights(vgroup, indices, bone_weights[keep], steps=WEIGHT_STEPS)
+
+    if not success:
+        print('Warning: Bone Heat Weighting: failed to find solution for one or more bones')
+
+    return success
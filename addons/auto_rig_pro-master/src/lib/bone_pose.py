@@ -1,4 +1,5 @@
 import bpy
+import numpy as np
 from .objects import *
 from .version import blender_version
 from .types_convert import *
@@ -195,4 +196,65 @@ def reset_pbone_transforms(pbone):
     pbone.location = [0,0,0]
     pbone.rotation_euler = [0,0,0]
     pbone.rotation_quaternion = [1,0,0,0]
-    pbone.scale = [1,1,1]     
\ No newline at end of file
+    pbone.scale = [1,1,1]     
+    
+    
+# Array versions of the pose evaluation, bones are evaluated for many frames at once.
+# Matrices are row-major numpy arrays (frames, 4, 4) in pose space.
+
+def get_bone_inherit_scale(bone):
+    if bpy.app.version >= (2,81,0):
+        return bone.inherit_scale
+    else:
+        return 'FULL' if bone.use_inherit_scale else 'NONE_LEGACY'
+        
+        
+def is_bone_parent_transform_supported(bone):
+    # inheritance modes handled by get_bone_parent_transforms()
+    if not bone.use_local_location:
+        return False
+    return get_bone_inherit_scale(bone) in ('FULL', 'NONE', 'NONE_LEGACY')
+    
+    
+def get_bone_parent_transforms(bone, parent_pose):
+    # rotation/scale and location matrices (frames, 4, 4) applied to the bone local transforms, 
+    # like BKE_bone_parent_transform_calc_from_matrices()
+    offset = np.array(bone.matrix_local, dtype=np.float64)
+    if bone.parent == None or parent_pose is None:
+        return offset, offset
+        
+    offset = np.array(bone.parent.matrix_local.inverted(), dtype=np.float64) @ offset
+    inherit_scale = get_bone_inherit_scale(bone)
+    full_transform = bone.use_inherit_rotation and inherit_scale == 'FULL'
+    
+    if full_transform:
+        rotscale = parent_pose @ offset
+        return rotscale, rotscale
+        
+    if bone.use_inherit_rotation:
+        # remove the parent scale
+        tmat = parent_pose.copy()
+        tmat[:, :3, :3] /= np.linalg.norm(tmat[:, :3, :3], axis=-2)[:, None, :]
+    else:
+        # parent rest orientation, keep the parent scale if needed
+        tmat = np.broadcast_to(np.array(bone.parent.matrix_local, dtype=np.float64), parent_pose.shape).copy()
+        if inherit_scale == 'FULL':
+            tmat[:, :3, :3] *= np.linalg.norm(parent_pose[:, :3, :3], axis=-2)[:, None, :]
+            
+    return tmat @ offset, parent_pose @ offset
+    
+    
+def bone_local_to_pose(bone, parent_pose, local):
+    # pose matrices from the local (matrix_basis) ones, parent_pose is None for root bones
+    rotscale, loc_mat = get_bone_parent_transforms(bone, parent_pose)
+    pose = rotscale @ local
+    pose[..., :3, 3] = (loc_mat[..., :3, :3] @ local[..., :3, 3, None])[..., 0] + loc_mat[..., :3, 3]
+    return pose
+    
+    
+def bone_pose_to_local(bone, parent_pose, pose):
+    # local (matrix_basis) matrices from the pose ones, inverse of bone_local_to_pose()
+    rotscale, loc_mat = get_bone_parent_transforms(bone, parent_pose)
+    local = np.linalg.inv(rotscale) @ pose
+    local[..., :3, 3] = (np.linalg.inv(loc_mat) @ pose[..., :, 3, None])[..., :3, 0]
+    return local
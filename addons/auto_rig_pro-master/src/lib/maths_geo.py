@@ -248,6 +248,13 @@ def project_point_onto_line(a, b, p):
     return result_pos
 
 
+def project_points_onto_line(a, b, points):
+    # project the (n, 3) points array onto the line a,b
+    ab = np.asarray(b) - np.asarray(a)
+    fac = (np.asarray(points) - a) @ ab / ab.dot(ab)
+    return a + fac[:, None] * ab
+
+
 def project_vector_onto_vector(a, b):
     abdot = (a[0] * b[0]) + (a[1] * b[1]) + (a[2] * b[2])
     blensq = (b[0] ** 2) + (b[1] ** 2) + (b[2] ** 2)
@@ -344,4 +351,221 @@ def compare_mat(mat1, mat2, prec):
         for j in range(0,4):
             if round(mat1[i][j], prec) != round(mat2[i][j], prec):
                 return False
-    return True
\ No newline at end of file
+    return True
+
+# Array versions of the mathutils matrix decomposition, used to bake many frames/bones at once.
+# Matrices are row-major numpy arrays (..., 4, 4), like np.array(Matrix).
+
+EULER_ORDERS = {'XYZ': ((0,1,2), False), 'XZY': ((0,2,1), True), 'YXZ': ((1,0,2), True), 
+                'YZX': ((1,2,0), False), 'ZXY': ((2,0,1), False), 'ZYX': ((2,1,0), True)}
+                
+
+def matrices_to_loc_rot_scale(mats):
+    # return location, normalized rotation matrices and scale, like Matrix.decompose()
+    loc = mats[..., :3, 3].copy()
+    rot = mats[..., :3, :3].copy()
+    scale = np.linalg.norm(rot, axis=-2)
+    rot /= np.where(scale == 0.0, 1.0, scale)[..., None, :]
+    negative = np.linalg.det(rot) < 0
+    rot[negative] *= -1
+    scale[negative] *= -1
+    return loc, rot, scale
+    
+
+def rot_matrices_to_quats(rot):
+    # normalized rotation matrices to quaternions (w, x, y, z)
+    m = rot
+    q = np.empty(rot.shape[:-2] + (4,))
+    tr = 0.25 * (1.0 + m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2])
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # trace > 0
+        s = np.sqrt(np.maximum(tr, 0.0))
+        inv = 1.0 / (4.0 * s)
+        q_tr = np.stack((s, (m[..., 2, 1] - m[..., 1, 2]) * inv, (m[..., 0, 2] - m[..., 2, 0]) * inv, (m[..., 1, 0] - m[..., 0, 1]) * inv), axis=-1)
+        # largest diagonal x
+        s = 2.0 * np.sqrt(np.maximum(1.0 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], 0.0))
+        q_x = np.stack(((m[..., 2, 1] - m[..., 1, 2]) / s, 0.25 * s, (m[..., 0, 1] + m[..., 1, 0]) / s, (m[..., 0, 2] + m[..., 2, 0]) / s), axis=-1)
+        # largest diagonal y
+        s = 2.0 * np.sqrt(np.maximum(1.0 + m[..., 1, 1] - m[..., 0, 0] - m[..., 2, 2], 0.0))
+        q_y = np.stack(((m[..., 0, 2] - m[..., 2, 0]) / s, (m[..., 0, 1] + m[..., 1, 0]) / s, 0.25 * s, (m[..., 1, 2] + m[..., 2, 1]) / s), axis=-1)
+        # largest diagonal z
+        s = 2.0 * np.sqrt(np.maximum(1.0 + m[..., 2, 2] - m[..., 0, 0] - m[..., 1, 1], 0.0))
+        q_z = np.stack(((m[..., 1, 0] - m[..., 0, 1]) / s, (m[..., 0, 2] + m[..., 2, 0]) / s, (m[..., 1, 2] + m[..., 2, 1]) / s, 0.25 * s), axis=-1)
+        
+    use_x = (m[..., 0, 0] > m[..., 1, 1]) & (m[..., 0, 0] > m[..., 2, 2])
+    use_y = ~use_x & (m[..., 1, 1] > m[..., 2, 2])
+    q = np.where(use_x[..., None], q_x, np.where(use_y[..., None], q_y, q_z))
+    q = np.where((tr > 1e-4)[..., None], q_tr, q)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+    
+
+def quats_make_compatible(quats):
+    # flip the quaternions signs along the first axis (frames), 
+    # each one closest to the previous one, like Quaternion.make_compatible()
+    dots = np.sum(quats[1:] * quats[:-1], axis=-1)
+    negative = np.concatenate((np.zeros((1,) + dots.shape[1:], dtype=np.int64), np.cumsum(dots < 0, axis=0)))
+    # an orthogonal quaternion is kept as is, the parity count restarts from it
+    reset = np.concatenate((np.ones((1,) + dots.shape[1:], dtype=bool), dots == 0))
+    index = np.arange(len(quats)).reshape((-1,) + (1,) * (quats.ndim - 2))
+    last_reset = np.maximum.accumulate(np.where(reset, index, 0), axis=0)
+    parity = negative - np.take_along_axis(negative, last_reset, axis=0)
+    return np.where((parity % 2 == 1)[..., None], -quats, quats)
+    
+
+def quats_to_axis_angle(quats):
+    # quaternions to (angle, x, y, z)
+    w = np.clip(quats[..., 0], -1.0, 1.0)
+    ha = np.arccos(w)
+    si = np.sin(ha)
+    si = np.where(np.abs(si) < 1.192092896e-07, 1.0, si)
+    axis = quats[..., 1:] / si[..., None]
+    zero = ~axis.any(axis=-1)
+    axis[zero, 1] = 1.0
+    return np.concatenate(((ha * 2.0)[..., None], axis), axis=-1)
+    
+
+def rot_matrices_to_eulers2(rot, order='XYZ'):
+    # the two euler solutions of normalized rotation matrices
+    (i, j, k), parity = EULER_ORDERS[order]
+    m = rot
+    cy = np.hypot(m[..., i, i], m[..., j, i])
+    e1 = np.empty(rot.shape[:-2] + (3,))
+    e2 = np.empty(rot.shape[:-2] + (3,))
+    e1[..., i] = np.arctan2(m[..., k, j], m[..., k, k])
+    e1[..., j] = np.arctan2(-m[..., k, i], cy)
+    e1[..., k] = np.arctan2(m[..., j, i], m[..., i, i])
+    e2[..., i] = np.arctan2(-m[..., k, j], -m[..., k, k])
+    e2[..., j] = np.arctan2(-m[..., k, i], -cy)
+    e2[..., k] = np.arctan2(-m[..., j, i], -m[..., i, i])
+    
+    # gimbal lock
+    lock = cy <= 16.0 * 1.192092896e-07
+    if lock.any():
+        e1[lock, i] = np.arctan2(-m[..., j, k], m[..., j, j])[lock]
+        e1[lock, k] = 0.0
+        e2[lock] = e1[lock]
+        
+    if parity:
+        e1, e2 = -e1, -e2
+    return e1, e2
+    
+
+def rot_matrices_to_eulers(rot, order='XYZ'):
+    # the euler solution with the smallest angles, like Matrix.to_euler(order)
+    e1, e2 = rot_matrices_to_eulers2(rot, order)
+    use_e2 = np.sum(np.abs(e1), axis=-1) > np.sum(np.abs(e2), axis=-1)
+    return np.where(use_e2[..., None], e2, e1)
+    
+
+def eulers_make_compatible(eulers, old):
+    # like Euler.make_compatible(), avoid 360 degrees jumps from the old eulers
+    pi_thresh = 5.1
+    pi_x2 = 2.0 * pi
+    eul = np.array(eulers, dtype=np.float64)
+    deul = eul - old
+    eul = np.where(deul > pi_thresh, eul - np.floor(deul / pi_x2 + 0.5) * pi_x2, eul)
+    eul = np.where(deul < -pi_thresh, eul + np.floor(-deul / pi_x2 + 0.5) * pi_x2, eul)
+    deul = eul - old
+    
+    # is 1 of the axis rotations larger than 180 degrees and the other small?
+    abs_deul = np.abs(deul)
+    for a in range(3):
+        b, c = (a + 1) % 3, (a + 2) % 3
+        flip = (abs_deul[..., a] > 3.2) & (abs_deul[..., b] < 1.6) & (abs_deul[..., c] < 1.6)
+        eul[..., a] = np.where(flip, np.where(deul[..., a] > 0.0, eul[..., a] - pi_x2, eul[..., a] + pi_x2), eul[..., a])
+    return eul
+    
+
+def rot_matrices_to_compatible_eulers(rot, old, order='XYZ'):
+    # like Matrix.to_euler(order, old): the solution closest to the old eulers
+    e1, e2 = rot_matrices_to_eulers2(rot, order)
+    e1 = eulers_make_compatible(e1, old)
+    e2 = eulers_make_compatible(e2, old)
+    use_e2 = np.sum(np.abs(e1 - old), axis=-1) > np.sum(np.abs(e2 - old), axis=-1)
+    return np.where(use_e2[..., None], e2, e1)
+    
+    
+def eulers_to_rot_matrices(eulers, order='XYZ'):
+    # eulers (..., 3) to rotation matrices (..., 3, 3), like Euler.to_matrix()
+    (i, j, k), parity = EULER_ORDERS[order]
+    eulers = np.asarray(eulers, dtype=np.float64)
+    ti, tj, th = eulers[..., i], eulers[..., j], eulers[..., k]
+    if parity:
+        ti, tj, th = -ti, -tj, -th
+    ci, cj, ch = np.cos(ti), np.cos(tj), np.cos(th)
+    si, sj, sh = np.sin(ti), np.sin(tj), np.sin(th)
+    cc, cs, sc, ss = ci * ch, ci * sh, si * ch, si * sh
+    
+    m = np.empty(eulers.shape[:-1] + (3, 3))
+    m[..., i, i] = cj * ch
+    m[..., i, j] = sj * sc - cs
+    m[..., i, k] = sj * cc + ss
+    m[..., j, i] = cj * sh
+    m[..., j, j] = sj * ss + cc
+    m[..., j, k] = sj * cs - sc
+    m[..., k, i] = -sj
+    m[..., k, j] = cj * si
+    m[..., k, k] = cj * ci
+    return m
+    
+    
+def quats_to_rot_matrices(quats):
+    # quaternions (w, x, y, z) to rotation matrices (..., 3, 3), normalized first like the pose evaluation
+    q = np.asarray(quats, dtype=np.float64)
+    length = np.linalg.norm(q, axis=-1, keepdims=True)
+    q = np.where(length == 0.0, np.array([1.0, 0.0, 0.0, 0.0]), q / np.where(length == 0.0, 1.0, length))
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    
+    m = np.empty(q.shape[:-1] + (3, 3))
+    m[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[..., 0, 1] = 2.0 * (x * y - w * z)
+    m[..., 0, 2] = 2.0 * (x * z + w * y)
+    m[..., 1, 0] = 2.0 * (x * y + w * z)
+    m[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[..., 1, 2] = 2.0 * (y * z - w * x)
+    m[..., 2, 0] = 2.0 * (x * z - w * y)
+    m[..., 2, 1] = 2.0 * (y * z + w * x)
+    m[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return m
+    
+    
+def axis_angle_to_rot_matrices(axis_angle):
+    # (angle, x, y, z) to rotation matrices (..., 3, 3), a null axis gives the identity
+    axis_angle = np.asarray(axis_angle, dtype=np.float64)
+    angle = axis_angle[..., 0]
+    axis = axis_angle[..., 1:]
+    length = np.linalg.norm(axis, axis=-1)
+    null = length == 0.0
+    axis = axis / np.where(null, 1.0, length)[..., None]
+    half = np.where(null, 0.0, angle * 0.5)
+    quats = np.concatenate((np.cos(half)[..., None], axis * np.sin(half)[..., None]), axis=-1)
+    return quats_to_rot_matrices(quats)
+    
+    
+def loc_rot_scale_to_matrices(loc, rot, scale):
+    # location (..., 3), rotation matrices (..., 3, 3) and scale (..., 3) to matrices (..., 4, 4)
+    mats = np.zeros(rot.shape[:-2] + (4, 4))
+    mats[..., :3, :3] = rot * np.asarray(scale)[..., None, :]
+    mats[..., :3, 3] = loc
+    mats[..., 3, 3] = 1.0
+    return mats
+    
+    
+def matrices_to_rot_scale(mats):
+    # rotation matrices (..., 3, 3) and scale (..., 3) of matrices (..., 4, 4), as mat4_to_loc_rot_size()
+    # a negative determinant negates the scale
+    scale = np.linalg.norm(mats[..., :3, :3], axis=-2)
+    rot = np.divide(mats[..., :3, :3], scale[..., None, :], out=np.zeros(mats.shape[:-2] + (3, 3)), where=scale[..., None, :] != 0.0)
+    negative = np.linalg.det(rot) < 0.0
+    rot[negative] *= -1.0
+    scale[negative] *= -1.0
+    return rot, scale
+    
+    
+def mul_matrices_aligned_scale(a, b):
+    # a @ b with the scales multiplied per axis instead of skewing, as mul_m4_m4m4_aligned_scale()
+    rot_a, scale_a = matrices_to_rot_scale(a)
+    rot_b, scale_b = matrices_to_rot_scale(b)
+    loc = (a @ b[..., :, 3, None])[..., :3, 0]
+    return loc_rot_scale_to_matrices(loc, rot_a @ rot_b, scale_a * scale_b)
@@ -1,4 +1,5 @@
 import bpy, bmesh
+import numpy as np
 from .objects import *
 from .bone_data import *
 from .version import *
@@ -422,4 +423,31 @@ def clamp_weights(object=None, vertice=None, vertex_weight=None, group_name=None
                     target_weight = grp.weight
 
         def_weight = min(vertex_weight, target_weight)
-        object.vertex_groups[group_name].add([vertice.index], def_weight, 'REPLACE')
\ No newline at end of file
+        object.vertex_groups[group_name].add([vertice.index], def_weight, 'REPLACE')
+
+
+# Weights functions on arrays, with one vertex_group.add() call per distinct weight instead of one per vertex
+# weights can be rounded to 1/WEIGHT_STEPS, for fewer distinct values
+WEIGHT_STEPS = 4096
+def get_vgroups_weights(object=None):
+    # returns the (vertex indices, group indices, weights) arrays of all vertex group assignments
+    entries = [(vert.index, grp.group, grp.weight) for vert in object.data.vertices for grp in vert.groups]
+    if len(entries) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    entries = np.array(entries, dtype=np.float64)
+    return entries[:, 0].astype(np.int64), entries[:, 1].astype(np.int64), entries[:, 2].astype(np.float32)
+
+
+def set_vgroup_weights(vgroup, indices, weights, steps=None):
+    # steps: round the weights to 1/steps, to reduce the number of distinct weights to add
+    if steps:
+        weights = np.round(np.asarray(weights, dtype=np.float64) * steps) / steps
+    indices = np.asarray(indices)
+    weights = np.asarray(weights)
+    if len(indices) == 0:
+        return
+    order = np.argsort(weights, kind='stable')
+    indices, weights = indices[order], weights[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(weights)) + 1))
+    for idx, weight in zip(np.split(indices, starts[1:]), weights[starts]):
+        vgroup.add(idx.tolist(), float(weight), 'REPLACE')
\ No newline at end of file
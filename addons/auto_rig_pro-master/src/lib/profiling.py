@@ -0,0 +1,141 @@
+import bpy, os, sys, time, json
+from contextlib import contextmanager
+
+
+def get_memory_usage():
+    # resident memory of the Blender process in bytes, None if unknown
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:# Linux
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+
+    try:# macOS, peak memory only
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+class ARP_RNACallCounter:
+    # profile function counting the calls of RNA functions (foreach_get, keyframe_points.insert...) and operators
+    def __init__(self):
+        self.rna_calls = 0
+        self.ops_calls = 0
+        self.rna_types = tuple(getattr(bpy.types, name) for name in ['bpy_struct', 'bpy_prop_collection', 'bpy_prop_array'] if hasattr(bpy.types, name))
+        self.ops_file = getattr(bpy.ops, '__file__', None)
+
+    def __call__(self, frame, event, arg):
+        if event == 'c_call':
+            if isinstance(getattr(arg, '__self__', None), self.rna_types):
+                self.rna_calls += 1
+        elif event == 'call':
+            if frame.f_code.co_name == '__call__' and frame.f_code.co_filename == self.ops_file:
+                self.ops_calls += 1
+
+
+class ARP_Profiler:
+    # Records the wall time, RNA calls and memory of named stages.
+    # Stages can be nested, the values of a stage include its children.
+    # When disabled, stages are no-ops.
+
+    def __init__(self, enabled=True, **infos):
+        self.enabled = enabled
+        self.infos = infos
+        self.records = []
+        self.stack = []
+        self.counter = ARP_RNACallCounter() if enabled else None
+        self.time_origin = time.perf_counter()
+        self.previous_profile = None
+
+    def begin(self, name, **args):
+        if not self.enabled:
+            return
+
+        if len(self.stack) == 0:
+            self.previous_profile = sys.getprofile()
+            sys.setprofile(self.counter)
+
+        record = {'name': name, 'args': args, 'depth': len(self.stack),
+                'start': time.perf_counter() - self.time_origin, 'duration': 0.0,
+                'rna_calls': self.counter.rna_calls, 'ops_calls': self.counter.ops_calls,
+                'memory_start': get_memory_usage(), 'memory_end': None}
+        self.records.append(record)
+        self.stack.append(record)
+
+    def end(self):
+        if not self.enabled or len(self.stack) == 0:
+            return
+
+        record = self.stack.pop()
+        record['duration'] = time.perf_counter() - self.time_origin - record['start']
+        record['rna_calls'] = self.counter.rna_calls - record['rna_calls']
+        record['ops_calls'] = self.counter.ops_calls - record['ops_calls']
+        record['memory_end'] = get_memory_usage()
+
+        if len(self.stack) == 0:
+            sys.setprofile(self.previous_profile)
+            self.previous_profile = None
+
+    def end_all(self, keep=0):
+        # keep: amount of outer stages left open
+        while len(self.stack) > keep:
+            self.end()
+
+    @contextmanager
+    def stage(self, name, **args):
+        self.begin(name, **args)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def to_dict(self):
+        return {'blender': bpy.app.version_string, 'blend_file': bpy.data.filepath,
+                'infos': self.infos, 'stages': self.records}
+
+    def write_json(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1, default=str)
+
+    def write_chrome_trace(self, filepath):
+        # complete events, can be loaded in chrome://tracing or Perfetto
+        events = []
+        for record in self.records:
+            args = dict(record['args'])
+            for key in ['rna_calls', 'ops_calls', 'memory_start', 'memory_end']:
+                args[key] = record[key]
+            events.append({'name': record['name'], 'cat': 'arp', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                        'ts': record['start'] * 1e6, 'dur': record['duration'] * 1e6, 'args': args})
+
+        with open(filepath, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.infos}, f, default=str)
+
+    def print_summary(self):
+        print('Profiling:')
+        for record in self.records:
+            memory = ''
+            if record['memory_start'] != None and record['memory_end'] != None:
+                memory = ', memory '+'{:+.1f}'.format((record['memory_end'] - record['memory_start']) / 1048576)+' MB'
+            args = ''
+            if len(record['args']):
+                args = ' ('+', '.join(str(key)+'='+str(value) for key, value in record['args'].items())+')'
+            print('  '*(record['depth']+1) + record['name'] + args + ': ' + str(round(record['duration'], 3)) + ' s, ' +
+                str(record['rna_calls']) + ' RNA calls, ' + str(record['ops_calls']) + ' operators' + memory)
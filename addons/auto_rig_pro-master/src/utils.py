@@ -6,6 +6,7 @@ from bpy.types import Panel, UIList
 from .lib.animation import *
 from .lib.armature import *
 from .lib.bone_data import *
+from .lib.bone_heat import *
 from .lib.bone_edit import *
 from .lib.bone_pose import *
 from .lib.collections import *
@@ -18,6 +19,7 @@ from .lib.mesh import *
 from .lib.modifiers import *
 from .lib.names_func import *
 from .lib.objects import *
+from .lib.profiling import *
 from .lib.sys_print import *
 from .lib.types_convert import *
 from .lib.properties import *
@@ -2,6 +2,10 @@
 import struct
 import os
 import logging
+import mmap
+from collections.abc import MutableSequence
+
+import numpy as np
 
 class InvalidFileError(Exception):
     pass
@@ -38,10 +42,41 @@ class FileStream:
             self.__file_obj = None
 
 class FileReadStream(FileStream):
-    def __init__(self, path, pmx_header=None):
+    def __init__(self, path, pmx_header=None, use_mmap=False):
         self.__fin = open(path, 'rb')
+        self.__mapped = False
+        if use_mmap:
+            try:
+                mapped = mmap.mmap(self.__fin.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError): # empty file or not mappable
+                pass
+            else:
+                self.__fin.close()
+                self.__fin = mapped
+                self.__mapped = True
         FileStream.__init__(self, path, self.__fin, pmx_header)
 
+    def isMapped(self):
+        """ True if the file is memory-mapped, which enables the array based loading of fixed-layout sections.
+        """
+        return self.__mapped
+
+    def tell(self):
+        return self.__fin.tell()
+
+    def byteAt(self, pos):
+        """ Random access to a single byte of a memory-mapped file, without moving the read position.
+        """
+        return self.__fin[pos]
+
+    def readArray(self, dtype, count):
+        dtype = np.dtype(dtype)
+        size = dtype.itemsize*count
+        buf = self.__fin.read(size)
+        if len(buf) != size:
+            raise struct.error('unpack requires a buffer of %d bytes'%size)
+        return np.frombuffer(buf, dtype, count)
+
     def __readIndex(self, size, typedict):
         index = None
         if size in typedict :
@@ -367,11 +402,14 @@ class Model:
         logging.info('Load Vertices')
         logging.info('------------------------------')
         num_vertices = fs.readInt()
-        self.vertices = []
-        for i in range(num_vertices):
-            v = Vertex()
-            v.load(fs)
-            self.vertices.append(v)
+        if fs.isMapped():
+            self.vertices = ArrayView(_read_vertex_arrays(fs, num_vertices), num_vertices, _vertex_from_arrays)
+        else:
+            self.vertices = []
+            for i in range(num_vertices):
+                v = Vertex()
+                v.load(fs)
+                self.vertices.append(v)
         logging.info('----- Loaded %d vertices', len(self.vertices))
 
         logging.info('')
@@ -379,12 +417,17 @@ class Model:
         logging.info(' Load Faces')
         logging.info('------------------------------')
         num_faces = fs.readInt()
-        self.faces = []
-        for i in range(int(num_faces/3)):
-            f1 = fs.readVertexIndex()
-            f2 = fs.readVertexIndex()
-            f3 = fs.readVertexIndex()
-            self.faces.append((f3, f2, f1))
+        if fs.isMapped():
+            index_dtype = _index_dtype(self.header.vertex_index_size, _UNSIGNED_INDEX_TYPES)
+            faces = fs.readArray(index_dtype, int(num_faces/3)*3).reshape(-1, 3)[:, ::-1]
+            self.faces = ArrayView({'faces': faces.astype(np.int64)}, len(faces), _face_from_arrays)
+        else:
+            self.faces = []
+            for i in range(int(num_faces/3)):
+                f1 = fs.readVertexIndex()
+                f2 = fs.readVertexIndex()
+                f3 = fs.readVertexIndex()
+                self.faces.append((f3, f2, f1))
         logging.info(' Load %d faces', len(self.faces))
 
         logging.info('')
@@ -578,16 +621,25 @@ comment(english):
 
         logging.info('exporting vertices... %d', len(self.vertices))
         fs.writeInt(len(self.vertices))
-        for i in self.vertices:
-            i.save(fs)
+        arrays = getattr(self.vertices, 'arrays', lambda: None)()
+        if arrays is not None:
+            _write_vertex_arrays(fs, arrays)
+        else:
+            for i in self.vertices:
+                i.save(fs)
         logging.info('finished exporting vertices.')
 
         logging.info('exporting faces... %d', len(self.faces))
         fs.writeInt(len(self.faces)*3)
-        for f3, f2, f1 in self.faces:
-            fs.writeVertexIndex(f1)
-            fs.writeVertexIndex(f2)
-            fs.writeVertexIndex(f3)
+        arrays = getattr(self.faces, 'arrays', lambda: None)()
+        if arrays is not None:
+            index_dtype = _index_dtype(fs.header().vertex_index_size, _UNSIGNED_INDEX_TYPES)
+            fs.writeBytes(np.ascontiguousarray(arrays['faces'][:, ::-1], dtype=index_dtype))
+        else:
+            for f3, f2, f1 in self.faces:
+                fs.writeVertexIndex(f1)
+                fs.writeVertexIndex(f2)
+                fs.writeVertexIndex(f3)
         logging.info('finished exporting faces.')
 
         logging.info('exporting textures... %d', len(self.textures))
@@ -777,6 +829,320 @@ class BoneWeight:
             raise ValueError('invalid weight type %s'%str(self.type))
 
 
+_SIGNED_INDEX_TYPES = {1: '<i1', 2: '<i2', 4: '<i4'}
+_UNSIGNED_INDEX_TYPES = {1: '<u1', 2: '<u2', 4: '<u4'}
+
+def _index_dtype(size, typedict):
+    if size not in typedict:
+        raise ValueError('invalid data size %s'%str(size))
+    return np.dtype(typedict[size])
+
+class ArrayView(MutableSequence):
+    """ A list whose elements are created on first access from the rows of numpy arrays.
+
+    The arrays stay available through arrays() as long as the list itself is not modified.
+    Modifying the list turns it into a plain list of the created elements and arrays() returns None.
+    Changes made to the created elements are not written back to the arrays.
+    """
+    def __init__(self, arrays, count, factory):
+        self.__arrays = arrays
+        self.__factory = factory
+        self.__items = [None] * count
+
+    def arrays(self):
+        return self.__arrays
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.__items)))]
+        item = self.__items[index]
+        if item is None:
+            if index < 0:
+                index += len(self.__items)
+            item = self.__items[index] = self.__factory(self.__arrays, index)
+        return item
+
+    def __iter__(self):
+        for i in range(len(self.__items)):
+            yield self[i]
+
+    def __materialize(self):
+        if self.__arrays is not None:
+            for i in range(len(self.__items)):
+                self[i]
+            self.__arrays = None
+
+    def __setitem__(self, index, value):
+        self.__materialize()
+        self.__items[index] = value
+
+    def __delitem__(self, index):
+        self.__materialize()
+        del self.__items[index]
+
+    def insert(self, index, value):
+        self.__materialize()
+        self.__items.insert(index, value)
+
+    def sort(self, key=None, reverse=False):
+        self.__materialize()
+        self.__items.sort(key=key, reverse=reverse)
+
+    def __repr__(self):
+        return '<ArrayView %d items%s>'%(len(self.__items), '' if self.__arrays is None else ' (array backed)')
+
+def _vertex_from_arrays(arrays, i):
+    v = Vertex()
+    v.co = tuple(arrays['co'][i].tolist())
+    v.normal = tuple(arrays['normal'][i].tolist())
+    v.uv = tuple(arrays['uv'][i].tolist())
+    v.additional_uvs = [tuple(uv) for uv in arrays['additional_uvs'][i].tolist()]
+    w = v.weight = BoneWeight()
+    w.type = int(arrays['weight_type'][i])
+    bones, weights = arrays['bones'][i].tolist(), arrays['weights'][i].tolist()
+    if w.type == BoneWeight.BDEF1:
+        w.bones = bones[:1]
+    elif w.type == BoneWeight.BDEF2:
+        w.bones = bones[:2]
+        w.weights = weights[:1]
+    elif w.type == BoneWeight.BDEF4:
+        w.bones = bones
+        w.weights = tuple(weights)
+    else:
+        c, r0, r1 = arrays['sdef'][i].tolist()
+        w.bones = bones[:2]
+        w.weights = BoneWeightSDEF(weights[0], tuple(c), tuple(r0), tuple(r1))
+    v.edge_scale = float(arrays['edge_scale'][i])
+    return v
+
+def _face_from_arrays(arrays, i):
+    return tuple(arrays['faces'][i].tolist())
+
+def _read_vertex_arrays(fs, count):
+    """ Decode the vertex section of a memory-mapped file into arrays.
+
+    bones and weights hold the effective bone/weight per slot (BDEF1 [b, -1, -1, -1], [1, 0, 0, 0],
+    BDEF2 and SDEF [b0, b1, -1, -1], [w, 1-w, 0, 0]), sdef holds c, r0, r1 of SDEF vertices.
+    """
+    header = fs.header()
+    bone_size = header.bone_index_size
+    bone_dtype = _index_dtype(bone_size, _SIGNED_INDEX_TYPES)
+    num_uvs = header.additional_uvs
+    type_pos = 32 + 16*num_uvs
+    weight_sizes = {
+        BoneWeight.BDEF1: bone_size,
+        BoneWeight.BDEF2: 2*bone_size + 4,
+        BoneWeight.BDEF4: 4*bone_size + 16,
+        BoneWeight.SDEF: 2*bone_size + 40,
+        }
+    # vertex size = leading fields + type byte + weight data + edge scale
+    vertex_sizes = {t: type_pos + 1 + size + 4 for t, size in weight_sizes.items()}
+
+    # vertices have a variable size depending on the weight type,
+    # so the offsets are scanned one by one and all fields are decoded in bulk afterwards
+    start = fs.tell()
+    offsets = [0] * count
+    pos = start
+    byteAt = fs.byteAt
+    try:
+        for i in range(count):
+            offsets[i] = pos
+            pos += vertex_sizes[byteAt(pos + type_pos)]
+    except IndexError:
+        raise struct.error('unexpected end of file in vertex data')
+    except KeyError:
+        raise ValueError('invalid weight type %s'%str(byteAt(pos + type_pos)))
+    data = fs.readArray(np.uint8, pos - start)
+    rel = np.array(offsets, dtype=np.int64) - start
+
+    def gather(rows, offset, dtype, n):
+        dtype = np.dtype(dtype)
+        cols = rows[:, None] + (offset + np.arange(dtype.itemsize*n))
+        return data[cols].view(dtype).reshape(len(rows), n)
+
+    weight_type = data[rel + type_pos]
+    bones = np.full((count, 4), -1, dtype=np.int32)
+    weights = np.zeros((count, 4), dtype=np.float32)
+    sdef = np.zeros((count, 3, 3), dtype=np.float32)
+    edge_scale = np.empty(count, dtype=np.float32)
+    for t, num_bones in ((BoneWeight.BDEF1, 1), (BoneWeight.BDEF2, 2), (BoneWeight.BDEF4, 4), (BoneWeight.SDEF, 2)):
+        mask = weight_type == t
+        if not mask.any():
+            continue
+        rows = rel[mask] + type_pos + 1
+        bones[mask, :num_bones] = gather(rows, 0, bone_dtype, num_bones)
+        weight_pos = num_bones*bone_size
+        if t == BoneWeight.BDEF1:
+            weights[mask, 0] = 1.0
+        elif t == BoneWeight.BDEF4:
+            weights[mask] = gather(rows, weight_pos, '<f4', 4)
+        else:
+            w = gather(rows, weight_pos, '<f4', 1)[:, 0]
+            weights[mask, 0] = w
+            weights[mask, 1] = 1.0 - w
+            if t == BoneWeight.SDEF:
+                sdef[mask] = gather(rows, weight_pos + 4, '<f4', 9).reshape(-1, 3, 3)
+        edge_scale[mask] = gather(rows, weight_sizes[t], '<f4', 1)[:, 0]
+
+    return {
+        'co': gather(rel, 0, '<f4', 3),
+        'normal': gather(rel, 12, '<f4', 3),
+        'uv': gather(rel, 24, '<f4', 2),
+        'additional_uvs': gather(rel, 32, '<f4', 4*num_uvs).reshape(count, num_uvs, 4),
+        'weight_type': weight_type,
+        'bones': bones,
+        'weights': weights,
+        'sdef': sdef,
+        'edge_scale': edge_scale,
+        }
+
+def vertex_arrays(vertices, additional_uvs=0):
+    """ Arrays of a vertex list, in the layout of _read_vertex_arrays.
+
+    Array backed lists return their arrays directly, plain lists of Vertex objects are converted.
+    """
+    arrays = getattr(vertices, 'arrays', lambda: None)()
+    if arrays is not None:
+        return arrays
+    count = len(vertices)
+    bones = np.full((count, 4), -1, dtype=np.int32)
+    weights = np.zeros((count, 4), dtype=np.float32)
+    sdef = np.zeros((count, 3, 3), dtype=np.float32)
+    weight_type = np.zeros(count, dtype=np.uint8)
+    add_uvs = np.zeros((count, additional_uvs, 4), dtype=np.float32)
+    for i, v in enumerate(vertices):
+        w = v.weight
+        if isinstance(w.weights, BoneWeightSDEF):
+            weight_type[i] = BoneWeight.SDEF
+            bones[i, :2] = w.bones
+            weights[i, :2] = (w.weights.weight, 1.0 - w.weights.weight)
+            sdef[i] = (w.weights.c, w.weights.r0, w.weights.r1)
+        elif len(w.bones) == 1:
+            weight_type[i] = BoneWeight.BDEF1
+            bones[i, 0] = w.bones[0]
+            weights[i, 0] = 1.0
+        elif len(w.bones) == 2:
+            weight_type[i] = BoneWeight.BDEF2
+            bones[i, :2] = w.bones
+            weights[i, :2] = (w.weights[0], 1.0 - w.weights[0])
+        elif len(w.bones) == 4:
+            weight_type[i] = BoneWeight.BDEF4
+            bones[i] = w.bones
+            weights[i] = w.weights
+        else:
+            raise Exception('unkown bone weight type.')
+        for j, uv in enumerate(v.additional_uvs[:additional_uvs]):
+            add_uvs[i, j] = uv
+    return {
+        'co': np.array([v.co for v in vertices], dtype=np.float32).reshape(count, 3),
+        'normal': np.array([v.normal for v in vertices], dtype=np.float32).reshape(count, 3),
+        'uv': np.array([v.uv for v in vertices], dtype=np.float32).reshape(count, 2),
+        'additional_uvs': add_uvs,
+        'weight_type': weight_type,
+        'bones': bones,
+        'weights': weights,
+        'sdef': sdef,
+        'edge_scale': np.array([v.edge_scale for v in vertices], dtype=np.float32),
+        }
+
+def face_array(faces):
+    """ #faces by 3 array of the (f3, f2, f1) vertex indices of a face list.
+    """
+    arrays = getattr(faces, 'arrays', lambda: None)()
+    if arrays is not None:
+        return arrays['faces']
+    return np.array([tuple(f) for f in faces], dtype=np.int64).reshape(-1, 3)
+
+def morph_offset_arrays(offsets, size):
+    """ index and offset arrays of a vertex (size 3) or uv (size 4) morph offset list.
+    """
+    arrays = getattr(offsets, 'arrays', lambda: None)()
+    if arrays is not None:
+        return arrays
+    return {
+        'index': np.array([x.index for x in offsets], dtype=np.int64),
+        'offset': np.array([x.offset for x in offsets], dtype=np.float32).reshape(-1, size),
+        }
+
+def vertex_list(arrays):
+    """ Array backed list of vertices, the inverse of vertex_arrays.
+    """
+    return ArrayView(arrays, len(arrays['co']), _vertex_from_arrays)
+
+def face_list(faces):
+    """ Array backed list of faces, the inverse of face_array.
+    """
+    return ArrayView({'faces': faces}, len(faces), _face_from_arrays)
+
+def morph_offset_list(arrays, size):
+    """ Array backed list of vertex (size 3) or uv (size 4) morph offsets, the inverse of morph_offset_arrays.
+    """
+    factory = VertexMorphOffset.fromArrays if size == 3 else UVMorphOffset.fromArrays
+    return ArrayView(arrays, len(arrays['index']), factory)
+
+def _write_vertex_arrays(fs, arrays):
+    """ Encode arrays in the layout of _read_vertex_arrays as the vertex section.
+    """
+    header = fs.header()
+    bone_dtype = _index_dtype(header.bone_index_size, _SIGNED_INDEX_TYPES)
+    num_uvs = header.additional_uvs
+    count = len(arrays['co'])
+    weight_type = arrays['weight_type']
+
+    leading = [('co', '<f4', (3,)), ('normal', '<f4', (3,)), ('uv', '<f4', (2,))]
+    if num_uvs:
+        leading.append(('additional_uvs', '<f4', (num_uvs, 4)))
+    leading.append(('weight_type', 'u1'))
+    weight_fields = {
+        BoneWeight.BDEF1: [('bones', bone_dtype, (1,))],
+        BoneWeight.BDEF2: [('bones', bone_dtype, (2,)), ('weights', '<f4', (1,))],
+        BoneWeight.BDEF4: [('bones', bone_dtype, (4,)), ('weights', '<f4', (4,))],
+        BoneWeight.SDEF: [('bones', bone_dtype, (2,)), ('weights', '<f4', (1,)), ('sdef', '<f4', (3, 3))],
+        }
+    dtypes = {t: np.dtype(leading + fields + [('edge_scale', '<f4')]) for t, fields in weight_fields.items()}
+    if np.any(~np.isin(weight_type, list(dtypes))):
+        raise ValueError('invalid weight type %s'%str(weight_type[~np.isin(weight_type, list(dtypes))][0]))
+
+    # encode each weight type into rows of the longest vertex size, then drop the padding
+    sizes = np.zeros(count, dtype=np.int64)
+    rows = np.zeros((count, max(d.itemsize for d in dtypes.values())), dtype=np.uint8)
+    for t, dtype in dtypes.items():
+        selected = np.flatnonzero(weight_type == t)
+        if len(selected) < 1:
+            continue
+        records = np.zeros(len(selected), dtype=dtype)
+        for name in ('co', 'normal', 'uv', 'weight_type', 'edge_scale'):
+            records[name] = arrays[name][selected]
+        if num_uvs:
+            uvs = arrays['additional_uvs'][selected, :num_uvs]
+            records['additional_uvs'][:, :uvs.shape[1]] = uvs
+        num_bones = dtype['bones'].shape[0]
+        records['bones'] = arrays['bones'][selected, :num_bones]
+        if 'weights' in dtype.names:
+            records['weights'] = arrays['weights'][selected, :dtype['weights'].shape[0]]
+        if 'sdef' in dtype.names:
+            records['sdef'] = arrays['sdef'][selected]
+        rows[selected, :dtype.itemsize] = records.view(np.uint8).reshape(len(selected), dtype.itemsize)
+        sizes[selected] = dtype.itemsize
+    fs.writeBytes(rows[np.arange(rows.shape[1]) < sizes[:, None]])
+
+def _write_morph_offset_arrays(fs, arrays):
+    offsets = arrays['offset']
+    dtype = np.dtype([('index', _index_dtype(fs.header().vertex_index_size, _UNSIGNED_INDEX_TYPES)), ('offset', '<f4', offsets.shape[1:])])
+    data = np.empty(len(offsets), dtype=dtype)
+    data['index'] = arrays['index']
+    data['offset'] = offsets
+    fs.writeBytes(data)
+
+def _read_morph_offset_arrays(fs, count, size):
+    dtype = np.dtype([('index', _index_dtype(fs.header().vertex_index_size, _UNSIGNED_INDEX_TYPES)), ('offset', '<f4', (size,))])
+    data = fs.readArray(dtype, count)
+    return {'index': data['index'].astype(np.int64), 'offset': np.ascontiguousarray(data['offset'])}
+
+
 class Texture:
     def __init__(self):
         self.path = ''
@@ -1181,6 +1547,10 @@ class Morph:
         fs.writeSignedByte(self.category)
         fs.writeSignedByte(self.type_index())
         fs.writeInt(len(self.offsets))
+        arrays = getattr(self.offsets, 'arrays', lambda: None)()
+        if arrays is not None:
+            _write_morph_offset_arrays(fs, arrays)
+            return
         for i in self.offsets:
             i.save(fs)
 
@@ -1193,6 +1563,9 @@ class VertexMorph(Morph):
 
     def load(self, fs):
         num = fs.readInt()
+        if fs.isMapped():
+            self.offsets = ArrayView(_read_morph_offset_arrays(fs, num, 3), num, VertexMorphOffset.fromArrays)
+            return
         for i in range(num):
             t = VertexMorphOffset()
             t.load(fs)
@@ -1203,6 +1576,13 @@ class VertexMorphOffset:
         self.index = 0
         self.offset = []
 
+    @classmethod
+    def fromArrays(cls, arrays, i):
+        t = cls()
+        t.index = int(arrays['index'][i])
+        t.offset = tuple(arrays['offset'][i].tolist())
+        return t
+
     def load(self, fs):
         self.index = fs.readVertexIndex()
         self.offset = fs.readVector(3)
@@ -1222,6 +1602,9 @@ class UVMorph(Morph):
     def load(self, fs):
         self.offsets = []
         num = fs.readInt()
+        if fs.isMapped():
+            self.offsets = ArrayView(_read_morph_offset_arrays(fs, num, 4), num, UVMorphOffset.fromArrays)
+            return
         for i in range(num):
             t = UVMorphOffset()
             t.load(fs)
@@ -1232,6 +1615,13 @@ class UVMorphOffset:
         self.index = 0
         self.offset = []
 
+    @classmethod
+    def fromArrays(cls, arrays, i):
+        t = cls()
+        t.index = int(arrays['index'][i])
+        t.offset = tuple(arrays['offset'][i].tolist())
+        return t
+
     def load(self, fs):
         self.index = fs.readVertexIndex()
         self.offset = fs.readVector(4)
@@ -1586,8 +1976,13 @@ class Joint:
 
 
 
-def load(path):
-    with FileReadStream(path) as fs:
+def load(path, use_mmap=True):
+    """ Load a pmx file.
+
+    With use_mmap the file is memory-mapped and the vertices, faces and vertex/uv morph offsets
+    are decoded in bulk into numpy arrays, exposed as lazy ArrayView lists of the usual objects.
+    """
+    with FileReadStream(path, use_mmap=use_mmap) as fs:
         logging.info('****************************************')
         logging.info(' mmd_tools.pmx module')
         logging.info('----------------------------------------')
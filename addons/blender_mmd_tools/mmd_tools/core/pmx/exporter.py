@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import os
-import copy
 import logging
 import shutil
 import time
@@ -8,6 +7,7 @@ import time
 import mathutils
 import bpy
 import bmesh
+import numpy as np
 
 from collections import OrderedDict
 from mmd_tools.core import pmx
@@ -23,32 +23,25 @@ from mmd_tools.bpyutils import matmul
 from mmd_tools.operators.misc import MoveObject
 
 
-class _Vertex:
-    def __init__(self, co, groups, offsets, edge_scale, vertex_order, uv_offsets):
-        self.co = co
-        self.groups = groups # [(group_number, weight), ...]
-        self.offsets = offsets
-        self.edge_scale = edge_scale
-        self.vertex_order = vertex_order # used for controlling vertex order
-        self.uv_offsets = uv_offsets
-        self.index = None
-        self.uv = None
-        self.normal = None
-        self.sdef_data = [] # (C, R0, R1)
-        self.add_uvs = [None]*4 # UV1~UV4
-
-class _Face:
-    def __init__(self, vertices, index=-1):
-        ''' Temporary Face Class
-        '''
-        self.vertices = vertices
-        self.index = index
+def _foreach_get(collection, prop, dtype, size=1):
+    values = np.empty(len(collection)*size, dtype=dtype)
+    collection.foreach_get(prop, values)
+    return values.reshape(-1, size) if size > 1 else values
+
+def _flip_uv_v(uv):
+    uv = np.array(uv, dtype=np.float64)
+    uv[..., 1] = 1.0 - uv[..., 1]
+    return uv
 
 class _Mesh:
-    def __init__(self, material_faces, shape_key_names, material_names):
-        self.material_faces = material_faces # dict of {material_index => [face1, face2, ....]}
+    def __init__(self, material_faces, shape_key_names, material_names, vertices, offsets, uv_offsets):
+        self.material_faces = material_faces # dict of {material_index => #faces by 3 array of vertex indices}
         self.shape_key_names = shape_key_names
         self.material_names = material_names
+        self.vertices = vertices # dict of arrays in the layout of pmx.vertex_arrays, plus 'vertex_order'
+        self.offsets = offsets # dict of {shape_key_name => (vertex indices, offsets)}
+        self.uv_offsets = uv_offsets # dict of {uv_morph_name => (vertex indices, offsets)}
+        self.export_index = np.full(len(vertices['co']), -1, dtype=np.int64) # pmx vertex index of each vertex
 
 
 class _DefaultMaterial:
@@ -78,7 +71,7 @@ class __PmxExporter:
         self.__model = None
         self.__bone_name_table = []
         self.__material_name_table = []
-        self.__exported_vertices = []
+        self.__exported_meshes = []
         self.__default_material = None
         self.__vertex_order_map = None # used for controlling vertex order
         self.__overwrite_bone_morphs_from_pose_library = False
@@ -86,31 +79,11 @@ class __PmxExporter:
         self.__disable_specular = False
         self.__add_uv_count = 0
 
-    @staticmethod
-    def flipUV_V(uv):
-        u, v = uv
-        return u, 1.0-v
-
     def __getDefaultMaterial(self):
         if self.__default_material is None:
             self.__default_material = _DefaultMaterial()
         return self.__default_material.material
 
-    def __sortVertices(self):
-        logging.info(' - Sorting vertices ...')
-        weight_items = self.__vertex_order_map.items()
-        sorted_indices = [i[0] for i in sorted(weight_items, key=lambda x: x[1].vertex_order)]
-        vertices = self.__model.vertices
-        self.__model.vertices = [vertices[i] for i in sorted_indices]
-
-        # update indices
-        index_map = {x:i for i, x in enumerate(sorted_indices)}
-        for v in self.__vertex_order_map.values():
-            v.index = index_map[v.index]
-        for f in self.__model.faces:
-            f[:] = [index_map[i] for i in f]
-        logging.debug('   - Done (count:%d)', len(self.__vertex_order_map))
-
     def __exportMeshes(self, meshes, bone_map):
         mat_map = OrderedDict()
         for mesh in meshes:
@@ -118,91 +91,57 @@ class __PmxExporter:
                 name = mesh.material_names[index]
                 if name not in mat_map:
                     mat_map[name] = []
-                mat_map[name].append(mat_faces)
+                mat_map[name].append((mesh, mat_faces))
 
-        sort_vertices = self.__vertex_order_map is not None
-        if sort_vertices:
-            self.__vertex_order_map.clear()
-
-        # export vertices
+        # export vertices in the order of their first use by the faces of each material
+        vertex_chunks = []
+        face_chunks = []
+        vertex_count = 0
         for mat_name, mat_meshes in mat_map.items():
             face_count = 0
-            for mat_faces in mat_meshes:
-                mesh_vertices = []
-                for face in mat_faces:
-                    mesh_vertices.extend(face.vertices)
-
-                for v in mesh_vertices:
-                    if v.index is not None:
-                        continue
-
-                    v.index = len(self.__model.vertices)
-                    if sort_vertices:
-                        self.__vertex_order_map[v.index] = v
-
-                    pv = pmx.Vertex()
-                    pv.co = v.co
-                    pv.normal = v.normal
-                    pv.uv = self.flipUV_V(v.uv)
-                    pv.edge_scale = v.edge_scale
-                    for _uvzw in v.add_uvs:
-                        if _uvzw:
-                            pv.additional_uvs.append(self.flipUV_V(_uvzw[0])+self.flipUV_V(_uvzw[1]))
-
-                    t = len(v.groups)
-                    if t == 0:
-                        weight = pmx.BoneWeight()
-                        weight.type = pmx.BoneWeight.BDEF1
-                        weight.bones = [0]
-                        pv.weight = weight
-                    elif t == 1:
-                        weight = pmx.BoneWeight()
-                        weight.type = pmx.BoneWeight.BDEF1
-                        weight.bones = [v.groups[0][0]]
-                        pv.weight = weight
-                    elif t == 2:
-                        vg1, vg2 = v.groups
-                        weight = pmx.BoneWeight()
-                        weight.type = pmx.BoneWeight.BDEF2
-                        weight.bones = [vg1[0], vg2[0]]
-                        w1, w2 = vg1[1], vg2[1]
-                        weight.weights = [w1/(w1+w2)]
-                        if v.sdef_data:
-                            weight.type = pmx.BoneWeight.SDEF
-                            sdef_weights = pmx.BoneWeightSDEF()
-                            sdef_weights.weight = weight.weights[0]
-                            sdef_weights.c, sdef_weights.r0, sdef_weights.r1 = v.sdef_data
-                            if weight.bones[0] > weight.bones[1]:
-                                weight.bones.reverse()
-                                sdef_weights.weight = 1.0 - sdef_weights.weight
-                            weight.weights = sdef_weights
-                        pv.weight = weight
-                    else:
-                        weight = pmx.BoneWeight()
-                        weight.type = pmx.BoneWeight.BDEF4
-                        weight.bones = [0, 0, 0, 0]
-                        weight.weights = [0.0, 0.0, 0.0, 0.0]
-                        w_all = 0.0
-                        if t > 4:
-                            v.groups.sort(key=lambda x: -x[1])
-                        for i in range(min(t, 4)):
-                            gn, w = v.groups[i]
-                            weight.bones[i] = gn
-                            weight.weights[i] = w
-                            w_all += w
-                        for i in range(4):
-                            weight.weights[i] /= w_all
-                        pv.weight = weight
-                    self.__model.vertices.append(pv)
-                    self.__exported_vertices.append(v)
-
-                for face in mat_faces:
-                    self.__model.faces.append([x.index for x in face.vertices])
+            for mesh, mat_faces in mat_meshes:
+                face_vertices = mat_faces.ravel()
+                _, first_index = np.unique(face_vertices, return_index=True)
+                new_vertices = face_vertices[np.sort(first_index)]
+                new_vertices = new_vertices[mesh.export_index[new_vertices] < 0]
+                mesh.export_index[new_vertices] = np.arange(vertex_count, vertex_count+len(new_vertices))
+                vertex_count += len(new_vertices)
+                vertex_chunks.append((mesh, new_vertices))
+                face_chunks.append(mesh.export_index[mat_faces])
                 face_count += len(mat_faces)
             self.__exportMaterial(bpy.data.materials[mat_name], face_count)
+        self.__exported_meshes = meshes
+        if not vertex_chunks:
+            return
 
-        if sort_vertices:
-            self.__sortVertices()
+        num_uvs = min(self.__add_uv_count, 4)
+        vertices = {}
+        for name in meshes[0].vertices.keys():
+            if name == 'additional_uvs':
+                chunks = [np.zeros((len(indices), num_uvs, 4)) for _, indices in vertex_chunks]
+                for chunk, (mesh, indices) in zip(chunks, vertex_chunks):
+                    uvs = mesh.vertices[name][indices, :num_uvs]
+                    chunk[:, :uvs.shape[1]] = uvs
+            else:
+                chunks = [mesh.vertices[name][indices] for mesh, indices in vertex_chunks]
+            vertices[name] = np.concatenate(chunks)
+        faces = np.concatenate(face_chunks)
+
+        vertex_order = vertices.pop('vertex_order')
+        if self.__vertex_order_map is not None:
+            logging.info(' - Sorting vertices ...')
+            sorted_indices = np.lexsort((np.arange(vertex_count),) + tuple(vertex_order.T[::-1]))
+            index_map = np.empty(vertex_count, dtype=np.int64)
+            index_map[sorted_indices] = np.arange(vertex_count)
+            vertices = {name:values[sorted_indices] for name, values in vertices.items()}
+            faces = index_map[faces]
+            for mesh in meshes:
+                exported = mesh.export_index >= 0
+                mesh.export_index[exported] = index_map[mesh.export_index[exported]]
+            logging.debug('   - Done (count:%d)', vertex_count)
+
+        self.__model.vertices = pmx.vertex_list(vertices)
+        self.__model.faces = pmx.face_list(faces)
 
     def __exportTexture(self, filepath):
         if filepath.strip() == '':
@@ -567,6 +506,23 @@ class __PmxExporter:
                 r = c
         return r
 
+    @staticmethod
+    def __offsetList(mesh_offsets, offset_cls, size, scale=1):
+        """ Array backed list of morph offsets sorted by pmx vertex index.
+
+        mesh_offsets yields (mesh, (vertex indices, offsets)) of exported meshes.
+        """
+        indices, offsets = [np.zeros(0, dtype=np.int64)], [np.zeros((0, size))]
+        for mesh, (vertex_indices, vertex_offsets) in mesh_offsets:
+            export_index = mesh.export_index[vertex_indices]
+            exported = export_index >= 0
+            indices.append(export_index[exported])
+            offsets.append(vertex_offsets[exported])
+        indices, offsets = np.concatenate(indices), np.concatenate(offsets) * scale
+        order = np.argsort(indices, kind='stable')
+        arrays = {'index':indices[order], 'offset':offsets[order].astype(np.float32)}
+        return pmx.ArrayView(arrays, len(indices), offset_cls.fromArrays)
+
     def __exportVertexMorphs(self, meshes, root):
         shape_key_names = []
         for mesh in meshes:
@@ -591,13 +547,9 @@ class __PmxExporter:
             )
             self.__model.morphs.append(morph)
 
-        append_table = dict(zip(shape_key_names, [m.offsets.append for m in self.__model.morphs]))
-        for v in self.__exported_vertices:
-            for i, offset in v.offsets.items():
-                mo = pmx.VertexMorphOffset()
-                mo.index = v.index
-                mo.offset = offset
-                append_table[i](mo)
+        for morph in self.__model.morphs:
+            offsets = ((mesh, mesh.offsets[morph.name]) for mesh in self.__exported_meshes if morph.name in mesh.offsets)
+            morph.offsets = self.__offsetList(offsets, pmx.VertexMorphOffset, 3)
 
     def __export_material_morphs(self, root):
         mmd_root = root.mmd_root
@@ -640,34 +592,27 @@ class __PmxExporter:
          モデル中心座標から離れている位置で使用されているマテリアルほどリストの後ろ側にくるように。
          かなりいいかげんな実装
         """
-        center = mathutils.Vector([0, 0, 0])
-        vertices = self.__model.vertices
-        vert_num = len(vertices)
-        for v in self.__model.vertices:
-            center += mathutils.Vector(v.co) / vert_num
+        co = pmx.vertex_arrays(self.__model.vertices)['co'].astype(np.float64)
+        center = co.mean(axis=0) if len(co) else np.zeros(3)
+        faces = pmx.face_array(self.__model.faces)
+        face_distances = np.linalg.norm(co[faces] - center, axis=2).sum(axis=1)
 
-        faces = self.__model.faces
         offset = 0
         distances = []
         for mat, bl_mat_name in zip(self.__model.materials, self.__material_name_table):
-            d = 0
             face_num = int(mat.vertex_count / 3)
-            for i in range(offset, offset + face_num):
-                face = faces[i]
-                d += (mathutils.Vector(vertices[face[0]].co) - center).length
-                d += (mathutils.Vector(vertices[face[1]].co) - center).length
-                d += (mathutils.Vector(vertices[face[2]].co) - center).length
+            d = float(face_distances[offset:offset + face_num].sum())
             distances.append((d/mat.vertex_count, mat, offset, face_num, bl_mat_name))
             offset += face_num
-        sorted_faces = []
+        sorted_faces = [faces[:0]]
         sorted_mat = []
         self.__material_name_table.clear()
-        for d, mat, offset, vert_count, bl_mat_name in sorted(distances, key=lambda x: x[0]):
-            sorted_faces.extend(faces[offset:offset+vert_count])
+        for d, mat, offset, face_num, bl_mat_name in sorted(distances, key=lambda x: x[0]):
+            sorted_faces.append(faces[offset:offset+face_num])
             sorted_mat.append(mat)
             self.__material_name_table.append(bl_mat_name)
         self.__model.materials = sorted_mat
-        self.__model.faces = sorted_faces
+        self.__model.faces = pmx.face_list(np.concatenate(sorted_faces))
 
     def __export_bone_morphs(self, root):
         if self.__overwrite_bone_morphs_from_pose_library:
@@ -709,7 +654,7 @@ class __PmxExporter:
         if len(mmd_root.uv_morphs) == 0:
             return
         categories = self.CATEGORIES
-        append_table_vg = {}
+        vg_uv_morphs = {}
         for morph in mmd_root.uv_morphs:
             uv_morph = pmx.UVMorph(
                 name=morph.name,
@@ -719,24 +664,18 @@ class __PmxExporter:
             uv_morph.uv_index = morph.uv_index
             self.__model.morphs.append(uv_morph)
             if morph.data_type == 'VERTEX_GROUP':
-                append_table_vg[morph.name] = uv_morph.offsets.append
+                vg_uv_morphs[morph.name] = uv_morph
                 continue
             logging.warning(' * Deprecated UV morph "%s", please convert it to vertex groups', morph.name)
 
-        if append_table_vg:
-            incompleted = set()
+        if vg_uv_morphs:
             uv_morphs = mmd_root.uv_morphs
-            for v in self.__exported_vertices:
-                for name, offset in v.uv_offsets.items():
-                    if name not in append_table_vg:
-                        incompleted.add(name)
-                        continue
-                    scale = uv_morphs[name].vertex_group_scale
-                    morph_data = pmx.UVMorphOffset()
-                    morph_data.index = v.index
-                    morph_data.offset = (offset[0]*scale, -offset[1]*scale, offset[2]*scale, -offset[3]*scale)
-                    append_table_vg[name](morph_data)
+            for name, uv_morph in vg_uv_morphs.items():
+                scale = uv_morphs[name].vertex_group_scale
+                offsets = ((mesh, mesh.uv_offsets[name]) for mesh in self.__exported_meshes if name in mesh.uv_offsets)
+                uv_morph.offsets = self.__offsetList(offsets, pmx.UVMorphOffset, 4, np.array((1, -1, 1, -1))*scale)
 
+            incompleted = {name for mesh in self.__exported_meshes for name in mesh.uv_offsets if name not in vg_uv_morphs}
             if incompleted:
                 logging.warning(' * Incompleted UV morphs %s with vertex groups', incompleted)
 
@@ -880,40 +819,18 @@ class __PmxExporter:
 
 
     @staticmethod
-    def __convertFaceUVToVertexUV(vert_index, uv, normal, vertices_map):
-        vertices = vertices_map[vert_index]
-        for i in vertices:
-            if i.uv is None:
-                i.uv = uv
-                i.normal = normal
-                return i
-            elif (i.uv - uv).length < 0.001 and (normal - i.normal).length < 0.01:
-                return i
-        n = copy.copy(i) # shallow copy should be fine
-        n.uv = uv
-        n.normal = normal
-        vertices.append(n)
-        return n
+    def __triangulate(mesh, custom_normals):
+        """ Triangles of mesh as #triangles by 3 loop indices and the polygon index of each triangle.
 
-    @staticmethod
-    def __convertAddUV(vert, adduv, addzw, uv_index, vertices, rip_vertices):
-        if vert.add_uvs[uv_index] is None:
-            vert.add_uvs[uv_index] = (adduv, addzw)
-            return vert
-        for i in rip_vertices:
-            uvzw = i.add_uvs[uv_index]
-            if (uvzw[0] - adduv).length < 0.001 and (uvzw[1] - addzw).length < 0.001:
-                return i
-        n = copy.copy(vert)
-        add_uvs = n.add_uvs.copy()
-        add_uvs[uv_index] = (adduv, addzw)
-        n.add_uvs = add_uvs
-        vertices.append(n)
-        rip_vertices.append(n)
-        return n
+        Blender 2.80+ reads the loop triangles, older versions triangulate mesh with bmesh,
+        custom_normals (per loop) are remapped to the loops of the triangulated mesh then.
+        """
+        if hasattr(mesh, 'loop_triangles'):
+            mesh.calc_loop_triangles()
+            tri_loops = _foreach_get(mesh.loop_triangles, 'loops', np.int64, 3)
+            tri_polygons = _foreach_get(mesh.loop_triangles, 'polygon_index', np.int64)
+            return tri_loops, tri_polygons, custom_normals
 
-    @staticmethod
-    def __triangulate(mesh, custom_normals):
         bm = bmesh.new()
         bm.from_mesh(mesh)
 
@@ -929,20 +846,18 @@ class __PmxExporter:
                 vert_to_loop_id[v] = loop_id
                 loop_id += 1
 
-        loop_normals, face_indices = None, None
-        if is_triangulated:
-            loop_normals = custom_normals
-        else:
+        loop_normals, face_indices = custom_normals, np.arange(len(mesh.polygons))
+        if not is_triangulated:
             quad_method, ngon_method = (1, 1) if bpy.app.version < (2, 80, 0) else ('FIXED', 'EAR_CLIP')
             face_map = bmesh.ops.triangulate(bm, faces=bm.faces, quad_method=quad_method, ngon_method=ngon_method)['face_map']
             logging.debug(' - Remapping custom normals...')
-            loop_normals, face_indices = [], []
+            loop_ids, face_indices = [], []
             for f in bm.faces:
                 f_orig = face_map.get(f, f)
                 face_indices.append(f_orig.index)
                 vert_to_loop_id = face_verts_to_loop_id_map[f_orig]
-                for v in f.verts:
-                    loop_normals.append(custom_normals[vert_to_loop_id[v]])
+                loop_ids.extend(vert_to_loop_id[v] for v in f.verts)
+            loop_normals, face_indices = custom_normals[loop_ids], np.array(face_indices, dtype=np.int64)
             logging.debug('   - Done (faces:%d)', len(bm.faces))
             bm.to_mesh(mesh)
             face_map.clear()
@@ -950,35 +865,35 @@ class __PmxExporter:
         bm.free()
 
         assert(len(loop_normals) == len(mesh.loops))
-        return loop_normals, face_indices
+        return np.arange(len(mesh.loops)).reshape(-1, 3), face_indices, loop_normals
 
     @staticmethod
     def __get_normals(mesh, matrix):
-        custom_normals = None
-        if hasattr(mesh, 'has_custom_normals'):
-            logging.debug(' - Calculating normals split...')
-            mesh.calc_normals_split()
-            custom_normals = [matmul(matrix, l.normal).normalized() for l in mesh.loops]
-            mesh.free_normals_split()
-        elif mesh.use_auto_smooth:
-            logging.debug(' - Calculating normals split (angle:%f)...', mesh.auto_smooth_angle)
-            mesh.calc_normals_split(mesh.auto_smooth_angle)
-            custom_normals = [matmul(matrix, l.normal).normalized() for l in mesh.loops]
+        if hasattr(mesh, 'has_custom_normals') or mesh.use_auto_smooth:
+            if hasattr(mesh, 'has_custom_normals'):
+                logging.debug(' - Calculating normals split...')
+                mesh.calc_normals_split()
+            else:
+                logging.debug(' - Calculating normals split (angle:%f)...', mesh.auto_smooth_angle)
+                mesh.calc_normals_split(mesh.auto_smooth_angle)
+            normals = _foreach_get(mesh.loops, 'normal', np.float32, 3)
             mesh.free_normals_split()
         else:
             logging.debug(' - Calculating normals...')
             mesh.calc_normals()
-            #custom_normals = [matmul(matrix, mesh.vertices[l.vertex_index].normal).normalized() for l in mesh.loops]
-            custom_normals = []
-            for f in mesh.polygons:
-                if f.use_smooth:
-                    for v in f.vertices:
-                        custom_normals.append(matmul(matrix, mesh.vertices[v].normal).normalized())
-                else:
-                    for v in f.vertices:
-                        custom_normals.append(matmul(matrix, f.normal).normalized())
+            loop_start, loop_total = _foreach_get(mesh.polygons, 'loop_start', np.int64), _foreach_get(mesh.polygons, 'loop_total', np.int64)
+            order = np.argsort(loop_start)
+            loop_polygons = np.repeat(order, loop_total[order])
+            loop_vertices = _foreach_get(mesh.loops, 'vertex_index', np.int64)
+            use_smooth = _foreach_get(mesh.polygons, 'use_smooth', bool)[loop_polygons]
+            normals = np.where(use_smooth[:, None],
+                _foreach_get(mesh.vertices, 'normal', np.float32, 3)[loop_vertices],
+                _foreach_get(mesh.polygons, 'normal', np.float32, 3)[loop_polygons])
+        normals = np.dot(normals, np.array(matrix, dtype=np.float64).T)
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=(lengths > 0))
         logging.debug('   - Done (polygons:%d)', len(mesh.polygons))
-        return custom_normals
+        return normals
 
     def __doLoadMeshData(self, meshObj, bone_map):
         vg_to_bone = {i:bone_map[x.name] for i, x in enumerate(meshObj.vertex_groups) if x.name in bone_map}
@@ -1005,111 +920,79 @@ class __PmxExporter:
             _to_mesh_clear = lambda obj, mesh: obj.to_mesh_clear()
 
         base_mesh = _to_mesh(meshObj)
-        loop_normals, face_indices = self.__triangulate(base_mesh, self.__get_normals(base_mesh, normal_matrix))
+        tri_loops, tri_polygons, loop_normals = self.__triangulate(base_mesh, self.__get_normals(base_mesh, normal_matrix))
         base_mesh.transform(pmx_matrix)
 
-        def _get_weight(vertex_group_index, vertex, default_weight):
-            for i in vertex.groups:
-                if i.group == vertex_group_index:
-                    return i.weight
-            return default_weight
+        # vertex data, one row per blender vertex
+        vertex_count = len(base_mesh.vertices)
+        base_co = _foreach_get(base_mesh.vertices, 'co', np.float32, 3)
+        groups = np.array([(v.index, g.group, g.weight) for v in base_mesh.vertices for g in v.groups], dtype=np.float64).reshape(-1, 3)
+        group_vertices, group_indices, group_weights = groups[:, 0].astype(np.int64), groups[:, 1].astype(np.int64), groups[:, 2]
 
-        get_edge_scale = None
-        if vg_edge_scale:
-            get_edge_scale = lambda x: _get_weight(vg_edge_scale.index, x, 1)
-        else:
-            get_edge_scale = lambda x: 1
+        def _get_weights(vertex_group, default_weight):
+            weights = np.full(vertex_count, default_weight, dtype=np.float64)
+            if vertex_group:
+                selected = (group_indices == vertex_group.index)
+                weights[group_vertices[selected]] = group_weights[selected]
+            return weights
+
+        edge_scale = _get_weights(vg_edge_scale, 1)
 
-        get_vertex_order = None
+        vertex_order = np.zeros((vertex_count, 3))
         if self.__vertex_order_map: # sort vertices
             mesh_id = self.__vertex_order_map.setdefault('mesh_id', 0)
             self.__vertex_order_map['mesh_id'] += 1
+            vertex_order[:, 0] = mesh_id
             if vg_vertex_order and self.__vertex_order_map['method'] == 'CUSTOM':
-                get_vertex_order = lambda x: (mesh_id, _get_weight(vg_vertex_order.index, x, 2), x.index)
-            else:
-                get_vertex_order = lambda x: (mesh_id, x.index)
-        else:
-            get_vertex_order = lambda x: None
+                vertex_order[:, 1] = _get_weights(vg_vertex_order, 2)
+            vertex_order[:, 2] = np.arange(vertex_count)
 
+        uv_offsets = {}
         uv_morph_names = {g.index:(n, x) for g, n, x in FnMorph.get_uv_morph_vertex_groups(meshObj)}
-        def get_uv_offsets(v):
-            uv_offsets = {}
-            for x in v.groups:
-                if x.group in uv_morph_names and x.weight > 0:
-                    name, axis = uv_morph_names[x.group]
-                    d = uv_offsets.setdefault(name, [0, 0, 0, 0])
-                    d['XYZW'.index(axis[1])] += -x.weight if axis[0] == '-' else x.weight
-            return uv_offsets
-
-        base_vertices = {}
-        for v in base_mesh.vertices:
-            base_vertices[v.index] = [_Vertex(
-                v.co.copy(),
-                [(vg_to_bone[x.group], x.weight) for x in v.groups if x.weight > 0 and x.group in vg_to_bone],
-                {},
-                get_edge_scale(v),
-                get_vertex_order(v),
-                get_uv_offsets(v),
-                )]
-
-        # load face data
-        class _DummyUV:
-            uv1 = uv2 = uv3 = mathutils.Vector((0, 1))
-            def __init__(self, uvs):
-                self.uv1,  self.uv2, self.uv3 = (v.uv.copy() for v in uvs)
-
-        _UVWrapper = lambda x: (_DummyUV(x[i:i+3]) for i in range(0, len(x), 3))
-
-        material_faces = {}
+        for group_index, (name, axis) in uv_morph_names.items():
+            selected = (group_indices == group_index) & (group_weights > 0)
+            if not np.any(selected):
+                continue
+            offsets, has_offset = uv_offsets.setdefault(name, (np.zeros((vertex_count, 4)), np.zeros(vertex_count, dtype=bool)))
+            values = group_weights[selected]
+            offsets[group_vertices[selected], 'XYZW'.index(axis[1])] += -values if axis[0] == '-' else values
+            has_offset[group_vertices[selected]] = True
+        uv_offsets = {name:(np.flatnonzero(has_offset), offsets[has_offset]) for name, (offsets, has_offset) in uv_offsets.items()}
+
+        group_bones = np.full(len(meshObj.vertex_groups)+1, -1, dtype=np.int64)
+        for group_index, bone_index in vg_to_bone.items():
+            group_bones[group_index] = bone_index
+        group_bones = group_bones[group_indices]
+        selected = (group_weights > 0) & (group_bones >= 0)
+        weight_type, bones, weights = self.__convertBoneWeights(vertex_count, group_vertices[selected], group_bones[selected], group_weights[selected])
+
+        # split vertices by uv, normal and additional uvs of their loops
+        loop_count = len(base_mesh.loops)
+        loop_vertices = _foreach_get(base_mesh.loops, 'vertex_index', np.int64)
         uv_data = base_mesh.uv_layers.active
-        if uv_data:
-            uv_data = _UVWrapper(uv_data.data)
-        else:
-            uv_data = iter(lambda: _DummyUV, None)
-        face_seq = []
-        for face, uv, face_index in zip(base_mesh.polygons, uv_data, face_indices or iter(lambda: -1, None)):
-            if len(face.vertices) != 3:
-                raise Exception
-            idx = face.index * 3
-            n1, n2, n3 = loop_normals[idx:idx+3]
-            v1 = self.__convertFaceUVToVertexUV(face.vertices[0], uv.uv1, n1, base_vertices)
-            v2 = self.__convertFaceUVToVertexUV(face.vertices[1], uv.uv2, n2, base_vertices)
-            v3 = self.__convertFaceUVToVertexUV(face.vertices[2], uv.uv3, n3, base_vertices)
-
-            t = _Face([v1, v2, v3], face_index)
-            face_seq.append(t)
-            if face.material_index not in material_faces:
-                material_faces[face.material_index] = []
-            material_faces[face.material_index].append(t)
-
-        if face_indices:
-            for f in material_faces.values():
-                f.sort(key=lambda x: x.index)
-        _mat_name = lambda x: x.name if x else self.__getDefaultMaterial().name
-        material_names = {i:_mat_name(m) for i, m in enumerate(base_mesh.materials)}
-        material_names = {i:material_names.get(i, None) or _mat_name(None) for i in material_faces.keys()}
+        loop_uvs = _foreach_get(uv_data.data, 'uv', np.float32, 2) if uv_data else np.tile(np.float32((0, 1)), (loop_count, 1))
+        split_keys = [loop_vertices[:, None], np.round(loop_uvs / 0.001), np.round(loop_normals / 0.01)]
 
-        # export add UV
         bl_add_uvs = [i for i in base_mesh.uv_layers[1:] if not i.name.startswith('_')]
         self.__add_uv_count = max(self.__add_uv_count, len(bl_add_uvs))
+        loop_add_uvs = []
         for uv_n, uv_tex in enumerate(bl_add_uvs):
             if uv_n > 3:
                 logging.warning(' * extra addUV%d+ are not supported', uv_n+1)
                 break
-            uv_data = _UVWrapper(uv_tex.data)
             zw_data = base_mesh.uv_layers.get('_'+uv_tex.name, None)
             logging.info(' # exporting addUV%d: %s [zw: %s]', uv_n+1, uv_tex.name, zw_data)
-            if zw_data:
-                zw_data = _UVWrapper(zw_data.data)
-            else:
-                zw_data = iter(lambda: _DummyUV, None)
-            rip_vertices_map = {}
-            for f, face, uv, zw in zip(face_seq, base_mesh.polygons, uv_data, zw_data):
-                vertices = [base_vertices[x] for x in face.vertices]
-                rip_vertices = [rip_vertices_map.setdefault(x, [x]) for x in f.vertices]
-                f.vertices[0] = self.__convertAddUV(f.vertices[0], uv.uv1, zw.uv1, uv_n, vertices[0], rip_vertices[0])
-                f.vertices[1] = self.__convertAddUV(f.vertices[1], uv.uv2, zw.uv2, uv_n, vertices[1], rip_vertices[1])
-                f.vertices[2] = self.__convertAddUV(f.vertices[2], uv.uv3, zw.uv3, uv_n, vertices[2], rip_vertices[2])
+            add_uv = _foreach_get(uv_tex.data, 'uv', np.float32, 2)
+            add_zw = _foreach_get(zw_data.data, 'uv', np.float32, 2) if zw_data else np.tile(np.float32((0, 1)), (loop_count, 1))
+            split_keys += [np.round(add_uv / 0.001), np.round(add_zw / 0.001)]
+            loop_add_uvs.append(np.column_stack((_flip_uv_v(add_uv), _flip_uv_v(add_zw))))
+        _, first_loops, loop_split_vertices = np.unique(np.column_stack(split_keys).astype(np.int64), axis=0, return_index=True, return_inverse=True)
+        loop_split_vertices = loop_split_vertices.ravel()
+        split_base = loop_vertices[first_loops]
+
+        polygon_materials = _foreach_get(base_mesh.polygons, 'material_index', np.int64)
+        _mat_name = lambda x: x.name if x else self.__getDefaultMaterial().name
+        material_names = {i:_mat_name(m) for i, m in enumerate(base_mesh.materials)}
 
         _to_mesh_clear(meshObj, base_mesh)
 
@@ -1127,7 +1010,9 @@ class __PmxExporter:
                     shape_key_list.append((i, kb))
 
         shape_key_names = []
-        sdef_counts = 0
+        offsets = {}
+        sdef = np.zeros((vertex_count, 3, 3))
+        sdef_vertices = np.zeros(0, dtype=np.int64)
         for i, kb in shape_key_list:
             shape_key_name = kb.name
             logging.info(' - processing shape key: %s', shape_key_name)
@@ -1136,47 +1021,98 @@ class __PmxExporter:
             mesh = _to_mesh(meshObj)
             mesh.transform(pmx_matrix)
             kb.mute = kb_mute
-            if len(mesh.vertices) != len(base_vertices):
+            if len(mesh.vertices) != vertex_count:
                 logging.warning('   * Error! vertex count mismatch!')
                 continue
+            co = _foreach_get(mesh.vertices, 'co', np.float32, 3)
             if shape_key_name in {'mmd_sdef_c', 'mmd_sdef_r0', 'mmd_sdef_r1'}:
                 if shape_key_name == 'mmd_sdef_c':
-                    for v in mesh.vertices:
-                        base = base_vertices[v.index][0]
-                        if len(base.groups) != 2:
-                            continue
-                        base_co = base.co
-                        c_co = v.co
-                        if (c_co - base_co).length < 0.001:
-                            continue
-                        base.sdef_data[:] = tuple(c_co), base_co, base_co
-                        sdef_counts += 1
-                    logging.info('   - Restored %d SDEF vertices', sdef_counts)
-                elif sdef_counts > 0:
+                    is_bdef2 = (weight_type == pmx.BoneWeight.BDEF2)
+                    sdef_vertices = np.flatnonzero(is_bdef2 & (np.linalg.norm(co - base_co, axis=1) >= 0.001))
+                    sdef[sdef_vertices] = np.stack((co, base_co, base_co), axis=1)[sdef_vertices]
+                    logging.info('   - Restored %d SDEF vertices', len(sdef_vertices))
+                elif len(sdef_vertices) > 0:
                     ri = 1 if shape_key_name == 'mmd_sdef_r0' else 2
-                    for v in mesh.vertices:
-                        sdef_data = base_vertices[v.index][0].sdef_data
-                        if sdef_data:
-                            sdef_data[ri] = tuple(v.co)
+                    sdef[sdef_vertices, ri] = co[sdef_vertices]
                     logging.info('   - Updated SDEF data')
             else:
                 shape_key_names.append(shape_key_name)
-                for v in mesh.vertices:
-                    base = base_vertices[v.index][0]
-                    offset = v.co - base.co
-                    if offset.length < 0.001:
-                        continue
-                    base.offsets[shape_key_name] = offset
+                offset = co - base_co
+                indices = np.flatnonzero(np.linalg.norm(offset, axis=1) >= 0.001)
+                offsets[shape_key_name] = (indices, offset[indices])
             _to_mesh_clear(meshObj, mesh)
 
+        # SDEF vertices are BDEF2 vertices with the lower bone index first
+        weight_type[sdef_vertices] = pmx.BoneWeight.SDEF
+        swap = sdef_vertices[bones[sdef_vertices, 0] > bones[sdef_vertices, 1]]
+        bones[swap, :2] = bones[swap, 1::-1]
+        weights[swap, :2] = weights[swap, 1::-1]
+
+        vertices = {
+            'co': base_co[split_base],
+            'normal': loop_normals[first_loops],
+            'uv': _flip_uv_v(loop_uvs[first_loops]),
+            'additional_uvs': np.stack(loop_add_uvs, axis=1)[first_loops] if loop_add_uvs else np.zeros((len(first_loops), 0, 4)),
+            'weight_type': weight_type[split_base],
+            'bones': bones[split_base],
+            'weights': weights[split_base],
+            'sdef': sdef[split_base],
+            'edge_scale': edge_scale[split_base],
+            'vertex_order': vertex_order[split_base],
+            }
+
+        # vertex data of blender vertices belongs to all of their split vertices
+        def _split_offsets(indices, values):
+            rows = np.full(vertex_count, -1, dtype=np.int64)
+            rows[indices] = np.arange(len(indices))
+            split_rows = rows[split_base]
+            split_indices = np.flatnonzero(split_rows >= 0)
+            return split_indices, values[split_rows[split_indices]]
+
+        faces = loop_split_vertices[tri_loops]
         if not pmx_matrix.is_negative: # pmx.load/pmx.save reverse face vertices by default
-            for f in face_seq:
-                f.vertices.reverse()
+            faces = faces[:, ::-1]
+        face_order = np.argsort(tri_polygons, kind='stable')
+        faces, face_materials = faces[face_order], polygon_materials[tri_polygons[face_order]]
+        material_faces = {i:faces[face_materials == i] for i in np.unique(face_materials).tolist()}
+        material_names = {i:material_names.get(i, None) or _mat_name(None) for i in material_faces.keys()}
 
         return _Mesh(
             material_faces,
             shape_key_names,
-            material_names)
+            material_names,
+            vertices,
+            {name:_split_offsets(*x) for name, x in offsets.items()},
+            {name:_split_offsets(*x) for name, x in uv_offsets.items()})
+
+    @staticmethod
+    def __convertBoneWeights(vertex_count, vertex_indices, bone_indices, bone_weights):
+        """ pmx weight types and per slot bones/weights of vertices from (vertex, bone, weight) entries.
+
+        Entries are in the order of the vertex groups of each vertex, only the 4 largest weights of a vertex are kept.
+        """
+        counts = np.bincount(vertex_indices, minlength=vertex_count)
+        order = np.lexsort((np.where(counts[vertex_indices] > 4, -bone_weights, 0), vertex_indices))
+        vertex_indices, bone_indices, bone_weights = vertex_indices[order], bone_indices[order], bone_weights[order]
+        slots = np.arange(len(vertex_indices)) - np.searchsorted(vertex_indices, vertex_indices)
+        kept = slots < 4
+        bones = np.zeros((vertex_count, 4), dtype=np.int64)
+        weights = np.zeros((vertex_count, 4))
+        bones[vertex_indices[kept], slots[kept]] = bone_indices[kept]
+        weights[vertex_indices[kept], slots[kept]] = bone_weights[kept]
+
+        weight_type = np.full(vertex_count, pmx.BoneWeight.BDEF4, dtype=np.uint8)
+        weight_type[counts < 2] = pmx.BoneWeight.BDEF1
+        weight_type[counts == 2] = pmx.BoneWeight.BDEF2
+        weights[counts < 2] = (1, 0, 0, 0)
+        bones[counts < 2, 1:] = -1
+        bdef2 = (counts == 2)
+        weights[bdef2, 0] /= weights[bdef2, 0] + weights[bdef2, 1]
+        weights[bdef2, 1] = 1.0 - weights[bdef2, 0]
+        bones[bdef2, 2:] = -1
+        bdef4 = (counts > 2)
+        weights[bdef4] /= weights[bdef4].sum(axis=1, keepdims=True)
+        return weight_type, bones, weights
 
     def __loadMeshData(self, meshObj, bone_map):
         show_only_shape_key = meshObj.show_only_shape_key
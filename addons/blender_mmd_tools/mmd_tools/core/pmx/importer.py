@@ -5,6 +5,7 @@ import logging
 import time
 
 import bpy
+import numpy as np
 from mathutils import Vector, Matrix
 
 import mmd_tools.core.model as mmd_model
@@ -56,7 +57,8 @@ class PMXImporter:
         self.__materialTable = []
         self.__imageTable = {}
 
-        self.__sdefVertices = {} # pmx vertices
+        self.__vertexArrays = None
+        self.__sdefVertices = ((), None) # blender vertex indices, (c, r0, r1) arrays
         self.__blender_ik_links = set()
         self.__vertex_map = None
 
@@ -113,67 +115,85 @@ class PMXImporter:
         self.__importVertexGroup()
 
         pmxModel = self.__model
-        pmx_vertices = pmxModel.vertices
-        vertex_count = len(pmx_vertices)
+        additional_uvs = pmxModel.header.additional_uvs if pmxModel.header else 0
+        self.__vertexArrays = arrays = pmx.vertex_arrays(pmxModel.vertices, additional_uvs)
+        indices = np.arange(len(pmxModel.vertices))
         vertex_map = self.__vertex_map
         if vertex_map:
-            indices = collections.OrderedDict(vertex_map).keys()
-            pmx_vertices = tuple(pmxModel.vertices[x] for x in indices)
-            vertex_count = len(indices)
+            indices = np.flatnonzero(np.array(vertex_map)[:, 0] == indices)
+        vertex_count = len(indices)
         if vertex_count < 1:
             return
 
         mesh = self.__meshObj.data
         mesh.vertices.add(count=vertex_count)
-        mesh.vertices.foreach_set('co', tuple(i for pv in pmx_vertices for i in (Vector(pv.co).xzy * self.__scale)))
+        mesh.vertices.foreach_set('co', (arrays['co'][indices][:, [0, 2, 1]] * self.__scale).astype(np.float32).ravel())
 
-        vertex_group_table = self.__vertexGroupTable
+        blender_indices = np.arange(vertex_count)
         vg_edge_scale = self.__meshObj.vertex_groups.new(name='mmd_edge_scale')
         vg_vertex_order = self.__meshObj.vertex_groups.new(name='mmd_vertex_order')
-        for i, pv in enumerate(pmx_vertices):
-            pv_bones, pv_weights, idx = pv.weight.bones, pv.weight.weights, (i,)
-
-            vg_edge_scale.add(index=idx, weight=pv.edge_scale, type='REPLACE')
-            vg_vertex_order.add(index=idx, weight=i/vertex_count, type='REPLACE')
-
-            if isinstance(pv_weights, pmx.BoneWeightSDEF):
-                if pv_bones[0] > pv_bones[1]:
-                    pv_bones.reverse()
-                    pv_weights.weight = 1.0 - pv_weights.weight
-                    pv_weights.r0, pv_weights.r1 = pv_weights.r1, pv_weights.r0
-                vertex_group_table[pv_bones[0]].add(index=idx, weight=pv_weights.weight, type='ADD')
-                vertex_group_table[pv_bones[1]].add(index=idx, weight=1.0-pv_weights.weight, type='ADD')
-                self.__sdefVertices[i] = pv
-            elif len(pv_bones) == 1:
-                bone_index = pv_bones[0]
-                if bone_index >= 0:
-                    vertex_group_table[bone_index].add(index=idx, weight=1.0, type='ADD')
-            elif len(pv_bones) == 2:
-                vertex_group_table[pv_bones[0]].add(index=idx, weight=pv_weights[0], type='ADD')
-                vertex_group_table[pv_bones[1]].add(index=idx, weight=1.0-pv_weights[0], type='ADD')
-            elif len(pv_bones) == 4:
-                for bone, weight in zip(pv_bones, pv_weights):
-                    vertex_group_table[bone].add(index=idx, weight=weight, type='ADD')
-            else:
-                raise Exception('unkown bone weight type.')
+        self.__addGroupWeights(vg_edge_scale, blender_indices, arrays['edge_scale'][indices])
+        self.__addGroupWeights(vg_vertex_order, blender_indices, blender_indices/vertex_count)
+
+        weight_type = arrays['weight_type'][indices]
+        bones = arrays['bones'][indices]
+        weights = arrays['weights'][indices]
+        sdef = arrays['sdef'][indices]
+
+        is_sdef = (weight_type == pmx.BoneWeight.SDEF)
+        swap = is_sdef & (bones[:, 0] > bones[:, 1])
+        bones[swap, :2] = bones[swap, 1::-1]
+        weights[swap, :2] = weights[swap, 1::-1]
+        sdef[swap, 1:] = sdef[swap, :0:-1]
+        self.__sdefVertices = (blender_indices[is_sdef], sdef[is_sdef])
+
+        # (vertex, bone, weight) entries, negative bone indices of BDEF1 vertices mean no bone
+        bone_counts = np.array([1, 2, 4, 2])[weight_type]
+        valid = np.arange(4) < bone_counts[:, None]
+        valid[:, 0] &= (weight_type != pmx.BoneWeight.BDEF1) | (bones[:, 0] >= 0)
+        vertex_group_table = self.__vertexGroupTable
+        group_indices = bones[valid].astype(np.int64)
+        group_indices[group_indices < 0] += len(vertex_group_table)
+        if np.any(group_indices < 0) or np.any(group_indices >= len(vertex_group_table)):
+            raise IndexError('bone index out of range')
+        # sum the weights of a vertex assigned to the same bone more than once
+        keys, inverse = np.unique(group_indices * vertex_count + np.broadcast_to(blender_indices[:, None], valid.shape)[valid], return_inverse=True)
+        group_weights = np.bincount(inverse.ravel(), weights=weights[valid], minlength=len(keys))
+        group_indices, vertex_indices = np.divmod(keys, vertex_count)
+        starts = np.flatnonzero(np.diff(group_indices)) + 1
+        for vi, w, gi in zip(np.split(vertex_indices, starts), np.split(group_weights, starts), group_indices[np.r_[0, starts]] if len(keys) else ()):
+            self.__addGroupWeights(vertex_group_table[gi], vi, w)
 
         vg_edge_scale.lock_weight = True
         vg_vertex_order.lock_weight = True
 
+    @staticmethod
+    def __addGroupWeights(vertex_group, indices, weights):
+        """ Assign weights to a vertex group with one call per distinct weight value.
+        """
+        if len(indices) < 1:
+            return
+        weights = np.asarray(weights, dtype=np.float32)
+        order = np.argsort(weights, kind='stable')
+        indices, weights = indices[order], weights[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(weights)) + 1]
+        for idx, w in zip(np.split(indices, starts[1:]), weights[starts]):
+            vertex_group.add(index=idx.tolist(), weight=float(w), type='REPLACE')
+
     def __storeVerticesSDEF(self):
-        if len(self.__sdefVertices) < 1:
+        sdef_indices, sdef = self.__sdefVertices
+        if len(sdef_indices) < 1:
             return
 
         self.__createBasisShapeKey()
-        sdefC = self.__meshObj.shape_key_add(name='mmd_sdef_c')
-        sdefR0 = self.__meshObj.shape_key_add(name='mmd_sdef_r0')
-        sdefR1 = self.__meshObj.shape_key_add(name='mmd_sdef_r1')
-        for i, pv in self.__sdefVertices.items():
-            w = pv.weight.weights
-            sdefC.data[i].co = Vector(w.c).xzy * self.__scale
-            sdefR0.data[i].co = Vector(w.r0).xzy * self.__scale
-            sdefR1.data[i].co = Vector(w.r1).xzy * self.__scale
-        logging.info('Stored %d SDEF vertices', len(self.__sdefVertices))
+        co = np.empty(len(self.__meshObj.data.vertices)*3, dtype=np.float32)
+        for i, name in enumerate(('mmd_sdef_c', 'mmd_sdef_r0', 'mmd_sdef_r1')):
+            shapeKey = self.__meshObj.shape_key_add(name=name)
+            shapeKey.data.foreach_get('co', co)
+            key_co = co.reshape(-1, 3)
+            key_co[sdef_indices] = sdef[:, i, [0, 2, 1]] * self.__scale
+            shapeKey.data.foreach_set('co', co)
+        logging.info('Stored %d SDEF vertices', len(sdef_indices))
 
     def __importTextures(self):
         pmxModel = self.__model
@@ -581,43 +601,44 @@ class PMXImporter:
         pmxModel = self.__model
         mesh = self.__meshObj.data
         vertex_map = self.__vertex_map
+        arrays = self.__vertexArrays
 
-        loop_indices_orig = tuple(i for f in pmxModel.faces for i in f)
-        loop_indices = tuple(vertex_map[i][1] for i in loop_indices_orig) if vertex_map else loop_indices_orig
-        material_indices = tuple(i for i, c in enumerate(self.__materialFaceCountTable) for x in range(c))
+        loop_indices_orig = pmx.face_array(pmxModel.faces).ravel()
+        loop_indices = np.array(vertex_map)[:, 1][loop_indices_orig] if vertex_map else loop_indices_orig
+        material_indices = np.repeat(np.arange(len(self.__materialFaceCountTable)), self.__materialFaceCountTable)
+        face_count = len(loop_indices_orig)//3
 
-        mesh.loops.add(len(pmxModel.faces)*3)
-        mesh.loops.foreach_set('vertex_index', loop_indices)
+        mesh.loops.add(face_count*3)
+        mesh.loops.foreach_set('vertex_index', loop_indices.astype(np.int32))
 
-        mesh.polygons.add(len(pmxModel.faces))
-        mesh.polygons.foreach_set('loop_start', tuple(range(0, len(mesh.loops), 3)))
-        mesh.polygons.foreach_set('loop_total', (3,)*len(pmxModel.faces))
-        mesh.polygons.foreach_set('use_smooth', (True,)*len(pmxModel.faces))
-        mesh.polygons.foreach_set('material_index', material_indices)
+        mesh.polygons.add(face_count)
+        mesh.polygons.foreach_set('loop_start', np.arange(0, face_count*3, 3, dtype=np.int32))
+        mesh.polygons.foreach_set('loop_total', np.full(face_count, 3, dtype=np.int32))
+        mesh.polygons.foreach_set('use_smooth', np.ones(face_count, dtype=bool))
+        mesh.polygons.foreach_set('material_index', material_indices.astype(np.int32))
 
+        flip_uv_v = lambda uv: np.column_stack((uv[:, 0], 1.0 - uv[:, 1])).astype(np.float32)
         uv_textures, uv_layers = getattr(mesh, 'uv_textures', mesh.uv_layers), mesh.uv_layers
         uv_tex = uv_textures.new()
         uv_layer = uv_layers[uv_tex.name]
-        uv_table = {vi:self.flipUV_V(v.uv) for vi, v in enumerate(pmxModel.vertices)}
-        uv_layer.data.foreach_set('uv', tuple(v for i in loop_indices_orig for v in uv_table[i]))
+        uv_layer.data.foreach_set('uv', flip_uv_v(arrays['uv'])[loop_indices_orig].ravel())
 
         if hasattr(mesh, 'uv_textures'):
-            for bf, mi in zip(uv_tex.data, material_indices):
+            for bf, mi in zip(uv_tex.data, material_indices.tolist()):
                 bf.image = self.__imageTable.get(mi, None)
 
         if pmxModel.header and pmxModel.header.additional_uvs:
             logging.info('Importing %d additional uvs', pmxModel.header.additional_uvs)
             zw_data_map = collections.OrderedDict()
-            split_uvzw = lambda uvi: (self.flipUV_V(uvi[:2]), uvi[2:])
             for i in range(pmxModel.header.additional_uvs):
                 add_uv = uv_layers[uv_textures.new(name='UV'+str(i+1)).name]
                 logging.info(' - %s...(uv channels)', add_uv.name)
-                uv_table = {vi:split_uvzw(v.additional_uvs[i]) for vi, v in enumerate(pmxModel.vertices)}
-                add_uv.data.foreach_set('uv', tuple(v for i in loop_indices_orig for v in uv_table[i][0]))
-                if not any(any(s[1]) for s in uv_table.values()):
+                uvzw = arrays['additional_uvs'][:, i]
+                add_uv.data.foreach_set('uv', flip_uv_v(uvzw[:, :2])[loop_indices_orig].ravel())
+                if not np.any(uvzw[:, 2:]):
                     logging.info('\t- zw are all zeros: %s', add_uv.name)
                 else:
-                    zw_data_map['_'+add_uv.name] = {k:self.flipUV_V(v[1]) for k, v in uv_table.items()}
+                    zw_data_map['_'+add_uv.name] = flip_uv_v(uvzw[:, 2:])
             for name, zw_table in zw_data_map.items():
                 logging.info(' - %s...(zw channels of %s)', name, name[1:])
                 add_zw = uv_textures.new(name=name)
@@ -625,7 +646,7 @@ class PMXImporter:
                     logging.warning('\t* Lost zw channels')
                     continue
                 add_zw = uv_layers[add_zw.name]
-                add_zw.data.foreach_set('uv', tuple(v for i in loop_indices_orig for v in zw_table[i]))
+                add_zw.data.foreach_set('uv', zw_table[loop_indices_orig].ravel())
 
         if bpy.app.version >= (2, 80, 0):
             self.__fixOverlappingFaceMaterials(mesh.materials, mesh.vertices, loop_indices, material_indices)
@@ -634,42 +655,53 @@ class PMXImporter:
         # This is not the best way to setup blend_method, might just work for some common cases. And FnMaterial.update_alpha() is still using 'HASHED'.
         # For EEVEE, basically users should know which blend_method is best for each material of their models.
         # For Cycles, users have to offset or delete those z-fighting faces to fix it manually.
+        assert(len(loop_indices) == len(material_indices)*3)
+        if len(material_indices) < 1:
+            return
+
+        # faces are compared by the ids of their sorted rounded vertex positions
+        co = np.empty(len(vertices)*3, dtype=np.float32)
+        vertices.foreach_get('co', co)
+        _, co_ids = np.unique(np.round(co.reshape(-1, 3).astype(np.float64), 6), axis=0, return_inverse=True)
+        face_keys = np.sort(co_ids.ravel()[loop_indices].reshape(-1, 3), axis=1)
+
         check = {}
         mi_skip = -1
-        _vi_cache = {}
-        def _rounded_co_vi(vi):
-            if vi not in _vi_cache:
-                vco = vertices[vi].co
-                _vi_cache[vi] = (round(vco[0], 6), round(vco[1], 6), round(vco[2], 6))
-            return _vi_cache[vi]
-
-        assert(len(loop_indices) == len(material_indices)*3)
-        for i, mi in enumerate(material_indices):
+        starts = np.r_[0, np.flatnonzero(np.diff(material_indices)) + 1, len(material_indices)]
+        for start, end in zip(starts[:-1], starts[1:]):
+            mi = int(material_indices[start])
             if mi <= mi_skip:
                 continue
-            si = 3*i
-            verts = tuple(sorted((_rounded_co_vi(loop_indices[si]), _rounded_co_vi(loop_indices[si+1]), _rounded_co_vi(loop_indices[si+2]))))
-            if verts not in check:
-                check[verts] = mi
-            elif check[verts] < mi:
-                logging.debug(' >> fix blend method of material: %s', materials[mi].name)
-                materials[mi].blend_method = 'BLEND'
-                materials[mi].show_transparent_back = False
-                mi_skip = mi
+            for verts in map(tuple, face_keys[start:end].tolist()):
+                if verts not in check:
+                    check[verts] = mi
+                elif check[verts] < mi:
+                    logging.debug(' >> fix blend method of material: %s', materials[mi].name)
+                    materials[mi].blend_method = 'BLEND'
+                    materials[mi].show_transparent_back = False
+                    mi_skip = mi
+                    break
 
     def __importVertexMorphs(self):
         mmd_root = self.__root.mmd_root
         categories = self.CATEGORIES
         self.__createBasisShapeKey()
+        basis = self.__meshObj.data.shape_keys.reference_key
+        basis_co = np.empty(len(basis.data)*3, dtype=np.float32)
+        basis.data.foreach_get('co', basis_co)
+        basis_co = basis_co.reshape(-1, 3)
         for morph in (x for x in self.__model.morphs if isinstance(x, pmx.VertexMorph)):
             shapeKey = self.__meshObj.shape_key_add(name=morph.name)
             vtx_morph = mmd_root.vertex_morphs.add()
             vtx_morph.name = morph.name
             vtx_morph.name_e = morph.name_e
             vtx_morph.category = categories.get(morph.category, 'OTHER')
-            for md in morph.offsets:
-                shapeKeyPoint = shapeKey.data[md.index]
-                shapeKeyPoint.co += Vector(md.offset).xzy * self.__scale
+            offsets = pmx.morph_offset_arrays(morph.offsets, 3)
+            if len(offsets['index']) < 1:
+                continue
+            co = basis_co.copy()
+            np.add.at(co, offsets['index'], offsets['offset'][:, [0, 2, 1]] * self.__scale)
+            shapeKey.data.foreach_set('co', co.ravel())
 
     def __importMaterialMorphs(self):
         mmd_root = self.__root.mmd_root
@@ -786,13 +818,13 @@ class PMXImporter:
             logging.info(' * No support for custom normals!!')
             return
         logging.info('Setting custom normals...')
+        normals = self.__vertexArrays['normal'][:, [0, 2, 1]].astype(np.float64)
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=(lengths > 0))
         if self.__vertex_map:
-            verts, faces = self.__model.vertices, self.__model.faces
-            custom_normals = [(Vector(verts[i].normal).xzy).normalized() for f in faces for i in f]
-            mesh.normals_split_custom_set(custom_normals)
+            mesh.normals_split_custom_set(normals[pmx.face_array(self.__model.faces).ravel()].tolist())
         else:
-            custom_normals = [(Vector(v.normal).xzy).normalized() for v in self.__model.vertices]
-            mesh.normals_split_custom_set_from_vertices(custom_normals)
+            mesh.normals_split_custom_set_from_vertices(normals.tolist())
         mesh.use_auto_smooth = True
         logging.info('   - Done!!')
 
@@ -813,6 +845,12 @@ class PMXImporter:
             m.name = utils.uniqueName(m.name or 'Morph', used_names)
             used_names.add(m.name)
 
+    @staticmethod
+    def __timeStage(name, func):
+        start_time = time.time()
+        func()
+        logging.info(' - %s: %f seconds', name, time.time() - start_time)
+
     def execute(self, **args):
         if 'pmx' in args:
             self.__model = args['pmx']
@@ -848,12 +886,12 @@ class PMXImporter:
             if remove_doubles:
                 self.__vertex_map = _PMXCleaner.remove_doubles(self.__model, 'MORPHS' not in types)
             self.__createMeshObject()
-            self.__importVertices()
-            self.__importMaterials()
-            self.__importFaces()
-            self.__meshObj.data.update()
-            self.__assignCustomNormals()
-            self.__storeVerticesSDEF()
+            self.__timeStage('vertices', self.__importVertices)
+            self.__timeStage('materials', self.__importMaterials)
+            self.__timeStage('faces', self.__importFaces)
+            self.__timeStage('mesh update', self.__meshObj.data.update)
+            self.__timeStage('custom normals', self.__assignCustomNormals)
+            self.__timeStage('SDEF', self.__storeVerticesSDEF)
 
         if 'ARMATURE' in types:
             # for tracking bone order
@@ -881,10 +919,10 @@ class PMXImporter:
 
         if 'MORPHS' in types:
             self.__importGroupMorphs()
-            self.__importVertexMorphs()
+            self.__timeStage('vertex morphs', self.__importVertexMorphs)
             self.__importBoneMorphs()
             self.__importMaterialMorphs()
-            self.__importUVMorphs()
+            self.__timeStage('uv morphs', self.__importUVMorphs)
 
         if self.__meshObj:
             self.__addArmatureModifier(self.__meshObj, self.__armObj)
@@ -905,6 +943,11 @@ class _PMXCleaner:
         pmx_faces = pmx_model.faces
         pmx_vertices = pmx_model.vertices
 
+        is_array_backed = lambda x: getattr(x, 'arrays', lambda: None)() is not None
+        if is_array_backed(pmx_faces) and is_array_backed(pmx_vertices):
+            cls.__clean_arrays(pmx_model, mesh_only)
+            return
+
         # clean face/vertex
         cls.__clean_pmx_faces(pmx_faces, pmx_model.materials, lambda f: frozenset(f))
 
@@ -938,6 +981,75 @@ class _PMXCleaner:
             cls.__clean_pmx_morphs(pmx_model.morphs, __update_index)
         logging.info('   - Done!!')
 
+    @classmethod
+    def __clean_arrays(cls, pmx_model, mesh_only):
+        """ clean() for array backed faces and vertices, which stay array backed
+        """
+        faces = pmx.face_array(pmx_model.faces)
+        vertex_arrays = pmx_model.vertices.arrays()
+        vertex_count = len(pmx_model.vertices)
+
+        # clean face: drop degenerate faces and faces repeated within a material,
+        # faces past the last material are dropped as well
+        mat_counts = np.array([int(mat.vertex_count/3) for mat in pmx_model.materials], dtype=np.int64)
+        mat_counts = np.clip(len(faces) - (np.cumsum(mat_counts) - mat_counts), 0, mat_counts)
+        mat_indices = np.repeat(np.arange(len(mat_counts)), mat_counts)
+        covered = faces[:len(mat_indices)]
+        sorted_faces = np.sort(covered, axis=1)
+        keep = (sorted_faces[:, 0] != sorted_faces[:, 1]) & (sorted_faces[:, 1] != sorted_faces[:, 2])
+        keys = np.column_stack((mat_indices, sorted_faces))[keep]
+        first = np.unique(keys, axis=0, return_index=True)[1] if len(keys) else np.zeros(0, dtype=np.int64)
+        kept = np.sort(np.flatnonzero(keep)[first])
+        new_mat_counts = np.bincount(mat_indices[kept], minlength=len(mat_counts))
+        for mat, count in zip(pmx_model.materials, new_mat_counts.tolist()):
+            mat.vertex_count = count*3
+        is_face_clean = len(kept) == len(faces)
+        if is_face_clean:
+            logging.info('   (faces is clean)')
+        else:
+            logging.warning('   - removed %d faces', len(faces)-len(kept))
+            faces = faces[kept]
+
+        # clean vertex
+        used = np.unique(faces)
+        is_index_clean = len(used) == vertex_count
+        if is_index_clean:
+            logging.info('   (vertices is clean)')
+        else:
+            logging.warning('   - removed %d vertices', vertex_count-len(used))
+            index_map = np.full(vertex_count, -1, dtype=np.int64)
+            index_map[used] = np.arange(len(used))
+            pmx_model.vertices = pmx.vertex_list({k:v[used] for k, v in vertex_arrays.items()})
+            faces = index_map[faces]
+        if not (is_face_clean and is_index_clean):
+            pmx_model.faces = pmx.face_list(faces)
+
+        if mesh_only:
+            logging.info('   - Done (mesh only)!!')
+            return
+
+        if not is_index_clean:
+            # clean vertex/uv morphs
+            for m in pmx_model.morphs:
+                if isinstance(m, pmx.VertexMorph):
+                    size = 3
+                elif isinstance(m, pmx.UVMorph):
+                    size = 4
+                else:
+                    continue
+                arrays = pmx.morph_offset_arrays(m.offsets, size)
+                old_index = arrays['index']
+                new_index = np.full(len(old_index), -1, dtype=np.int64)
+                in_range = (old_index >= 0) & (old_index < vertex_count)
+                new_index[in_range] = index_map[old_index[in_range]]
+                valid = new_index >= 0
+                old_len = len(m.offsets)
+                m.offsets = pmx.morph_offset_list({'index': new_index[valid], 'offset': arrays['offset'][valid]}, size)
+                counts = old_len - len(m.offsets)
+                if counts:
+                    logging.warning('   - removed %d (of %d) offsets of "%s"', counts, old_len, m.name)
+        logging.info('   - Done!!')
+
     @classmethod
     def remove_doubles(cls, pmx_model, mesh_only):
         logging.info('Removing doubles...')
@@ -2,6 +2,10 @@
 import struct
 import collections
 
+import numpy as np
+
+from mmd_tools.core.pmx import ArrayView
+
 class InvalidFileError(Exception):
     pass
 
@@ -54,6 +58,24 @@ class BoneFrameKey:
         fin.write(struct.pack('<ffff', *self.rotation))
         fin.write(struct.pack('<64b', *self.interp))
 
+    DTYPE = [('frame_number', '<u4'), ('location', '<f4', (3,)), ('rotation', '<f4', (4,)), ('interp', 'i1', (64,))]
+
+    @classmethod
+    def fromArrays(cls, arrays, i):
+        k = cls()
+        k.frame_number = int(arrays['frame_number'][i])
+        k.location = arrays['location'][i].tolist()
+        k.rotation = arrays['rotation'][i].tolist()
+        if not any(k.rotation):
+            k.rotation = (0, 0, 0, 1)
+        k.interp = arrays['interp'][i].tolist()
+        return k
+
+    @staticmethod
+    def fixArrays(arrays):
+        rotation = arrays['rotation']
+        rotation[~rotation.any(axis=1)] = (0, 0, 0, 1)
+
     def __repr__(self):
         return '<BoneFrameKey frame %s, loa %s, rot %s>'%(
             str(self.frame_number),
@@ -75,6 +97,19 @@ class ShapeKeyFrameKey:
         fin.write(struct.pack('<L', self.frame_number))
         fin.write(struct.pack('<f', self.weight))
 
+    DTYPE = [('frame_number', '<u4'), ('weight', '<f4')]
+
+    @classmethod
+    def fromArrays(cls, arrays, i):
+        k = cls()
+        k.frame_number = int(arrays['frame_number'][i])
+        k.weight = float(arrays['weight'][i])
+        return k
+
+    @staticmethod
+    def fixArrays(arrays):
+        pass
+
     def __repr__(self):
         return '<ShapeKeyFrameKey frame %s, weight %s>'%(
             str(self.frame_number),
@@ -216,14 +251,52 @@ class _AnimationBase(collections.defaultdict):
         raise NotImplementedError
 
     def load(self, fin):
+        """ Decode all frame keys in one read.
+
+        The keys of each name are sorted by frame number and stored as an ArrayView,
+        its arrays (one row per key) are available by frameArrays().
+        """
         count, = struct.unpack('<L', fin.read(4))
         print('loading %s... %d'%(self.__class__.__name__, count))
-        for i in range(count):
-            name = _toShiftJisString(struct.unpack('<15s', fin.read(15))[0])
-            cls = self.frameClass()
-            frameKey = cls()
-            frameKey.load(fin)
-            self[name].append(frameKey)
+        cls = self.frameClass()
+        dtype = np.dtype([('name', 'S15')] + cls.DTYPE)
+        data = fin.read(count*dtype.itemsize)
+        loaded_count = len(data)//dtype.itemsize
+        data = np.frombuffer(data, dtype=dtype, count=loaded_count)
+
+        # group the keys by decoded name, in order of first appearance
+        raw_names, first_index, inverse = np.unique(data['name'], return_index=True, return_inverse=True)
+        name_ids = {}
+        raw_name_ids = np.empty(len(raw_names), dtype=np.int64)
+        for i in np.argsort(first_index):
+            raw_name_ids[i] = name_ids.setdefault(_toShiftJisString(raw_names[i]), len(name_ids))
+        key_name_ids = raw_name_ids[inverse.ravel()]
+        order = np.lexsort((data['frame_number'], key_name_ids))
+        starts = np.searchsorted(key_name_ids[order], np.arange(len(name_ids)+1))
+        for name, i in name_ids.items():
+            keys = data[order[starts[i]:starts[i+1]]]
+            arrays = {field:np.array(keys[field]) for field, *_ in cls.DTYPE}
+            cls.fixArrays(arrays)
+            self[name] = ArrayView(arrays, len(keys), cls.fromArrays)
+
+        if loaded_count < count:
+            raise struct.error('%s: %d of %d keys are missing'%(self.__class__.__name__, count-loaded_count, count))
+
+    def frameArrays(self, name):
+        """ Arrays of the frame keys of name sorted by frame number, one row per key.
+        """
+        frameKeys = self.get(name, ())
+        arrays = getattr(frameKeys, 'arrays', lambda: None)()
+        if arrays is not None:
+            return arrays
+        cls = self.frameClass()
+        frameKeys = sorted(frameKeys, key=lambda x:x.frame_number)
+        arrays = {}
+        for field, field_type, *shape in cls.DTYPE:
+            values = np.array([getattr(k, field) for k in frameKeys], dtype=field_type)
+            arrays[field] = values.reshape((len(frameKeys),) + (shape[0] if shape else ()))
+        cls.fixArrays(arrays)
+        return arrays
 
     def save(self, fin):
         count = sum([len(i) for i in self.values()])
@@ -5,6 +5,7 @@ import os
 
 import bpy
 import math
+import numpy as np
 from mathutils import Vector, Quaternion
 
 from mmd_tools import utils
@@ -31,6 +32,14 @@ class _MirrorMapper:
     def get_rotation(rotation_xyzw):
         return (rotation_xyzw[0], -rotation_xyzw[1], -rotation_xyzw[2], rotation_xyzw[3])
 
+    @staticmethod
+    def get_locations(locations):
+        return locations * (-1, 1, 1)
+
+    @staticmethod
+    def get_rotations(rotations_xyzw):
+        return rotations_xyzw * (1, -1, -1, 1)
+
     @staticmethod
     def get_rotation3(rotation_xyz):
         return (rotation_xyz[0], -rotation_xyz[1], -rotation_xyz[2])
@@ -89,6 +98,18 @@ class BoneConverter:
         rot.x, rot.y, rot.z, rot.w = rotation_xyzw
         return Quaternion(matmul(self.__mat, rot.axis) * -1, rot.angle).normalized()
 
+    def convert_locations(self, locations):
+        return np.dot(locations, np.array(self.__mat).T) * self.__scale
+
+    def convert_rotations(self, rotations_xyzw):
+        """ convert_rotation of #keys by 4 (x, y, z, w) rotations, returns (w, x, y, z) rows.
+        """
+        # the axis of a unit quaternion is scaled by sin(angle/2), so rotating the axis keeps w
+        rot = np.asarray(rotations_xyzw, dtype=np.float64)
+        rot = np.column_stack((rot[:, 3], -np.dot(rot[:, :3], np.array(self.__mat).T)))
+        norm = np.linalg.norm(rot, axis=1, keepdims=True)
+        return np.divide(rot, norm, out=np.tile((1.0, 0.0, 0.0, 0.0), (len(rot), 1)), where=(norm > 0))
+
 class BoneConverterPoseMode:
     def __init__(self, pose_bone, scale, invert=False):
         mat = pose_bone.matrix.to_3x3()
@@ -117,6 +138,12 @@ class BoneConverterPoseMode:
         rot = Quaternion(matmul(self.__mat, rot.axis) * -1, rot.angle)
         return matmul(self.__mat_rot, rot.to_matrix()).to_quaternion()
 
+    def convert_locations(self, locations):
+        return np.array([tuple(self.convert_location(v)) for v in locations]).reshape(-1, 3)
+
+    def convert_rotations(self, rotations_xyzw):
+        return np.array([tuple(self.convert_rotation(r)) for r in rotations_xyzw]).reshape(-1, 4)
+
     def _convert_location_inverted(self, location):
         return matmul(self.__mat_loc, Vector(location) - self.__offset) * self.__scale
 
@@ -127,6 +154,11 @@ class BoneConverterPoseMode:
         return Quaternion(matmul(self.__mat, rot.axis) * -1, rot.angle).normalized()
 
 
+# raw values of the keyframe enums, for foreach_get/foreach_set
+_ENUM_LINEAR, _ENUM_BEZIER = 1, 2 # interpolation
+_ENUM_FREE = 0 # handle_left_type, handle_right_type
+
+
 class _FnBezier:
 
     __BLENDER_2_91_OR_NEWER = not (bpy.app.version < (2, 91, 0))
@@ -287,6 +319,54 @@ class VMDImporter:
         kp0.handle_right = kp0.co + Vector((d.x * bezier[0], d.y * bezier[1]))
         kp1.handle_left = kp0.co + Vector((d.x * bezier[2], d.y * bezier[3]))
 
+    @staticmethod
+    def __setKeyframes(fcurve, frames, values, beziers, default_value=None):
+        """ Fill the keyframe points of a new F-Curve in bulk.
+
+        The bezier (x1, y1, x2, y2) of a key, in VMD's [0, 127] range, shapes the curve from the previous key,
+        which is the same as calling __setInterpolation on each pair of keys.
+        A default_value adds a linear key at frame 1 before the keys.
+        """
+        kps = fcurve.keyframe_points
+        extra = 0 if default_value is None else 1
+        count = extra + len(frames)
+        kps.add(count)
+        if count < 1:
+            return
+
+        def _get(prop, dtype, size=1):
+            values = np.empty(count*size, dtype=dtype)
+            kps.foreach_get(prop, values)
+            return values.reshape(count, size) if size > 1 else values
+
+        co = np.empty((count, 2))
+        if extra:
+            co[0] = (1, default_value)
+        co[extra:, 0] = frames
+        co[extra:, 1] = values
+        interpolation, left_type, right_type = _get('interpolation', np.int32), _get('handle_left_type', np.int32), _get('handle_right_type', np.int32)
+        handle_left, handle_right = _get('handle_left', np.float32, 2), _get('handle_right', np.float32, 2)
+        if extra:
+            interpolation[0] = _ENUM_LINEAR
+
+        kp0, kp1, bezier = co[extra:-1], co[extra+1:], np.asarray(beziers, dtype=np.float64)[1:]
+        segments = slice(extra, count-1)
+        is_linear = (bezier[:, 0] == bezier[:, 1]) & (bezier[:, 2] == bezier[:, 3])
+        interpolation[segments] = np.where(is_linear, _ENUM_LINEAR, _ENUM_BEZIER)
+        right_type[segments] = _ENUM_FREE
+        left_type[extra+1:] = _ENUM_FREE
+        d = (kp1 - kp0) / 127.0
+        handle_right[segments] = kp0 + d * bezier[:, :2]
+        handle_left[extra+1:] = kp0 + d * bezier[:, 2:]
+
+        kps.foreach_set('co', co.astype(np.float32).ravel())
+        kps.foreach_set('interpolation', interpolation)
+        kps.foreach_set('handle_left_type', left_type)
+        kps.foreach_set('handle_right_type', right_type)
+        kps.foreach_set('handle_left', handle_left.ravel())
+        kps.foreach_set('handle_right', handle_right.ravel())
+        fcurve.update()
+
     @staticmethod
     def __fixFcurveHandles(fcurve):
         kp0 = fcurve.keyframe_points[0]
@@ -302,10 +382,21 @@ class VMDImporter:
         compatible_quaternion = self.__minRotationDiff
         class _ConverterWrap:
             convert_location = converter.convert_location
+            convert_locations = converter.convert_locations
             convert_interpolation = converter.convert_interpolation
             if mode == 'QUATERNION':
                 convert_rotation = converter.convert_rotation
                 compatible_rotation = compatible_quaternion
+                @staticmethod
+                def convert_rotations(rotations, prev_rot=None):
+                    # same as compatible_rotation on each key: flip a key when it points away from the (flipped) previous one
+                    rot = converter.convert_rotations(rotations)
+                    prev = np.vstack(([tuple(prev_rot)] if prev_rot is not None else rot[:1], rot[:-1]))
+                    dots = np.einsum('ij,ij->i', prev, rot)
+                    flips = np.cumsum(dots < 0)
+                    flips -= np.maximum.accumulate(np.where(dots == 0, flips, 0)) # a zero dot product keeps the key as is
+                    rot[flips % 2 == 1] *= -1
+                    return rot
             elif mode == 'AXIS_ANGLE':
                 @staticmethod
                 def convert_rotation(rot):
@@ -325,6 +416,17 @@ class VMDImporter:
             else:
                 convert_rotation = lambda rot: converter.convert_rotation(rot).to_euler(mode)
                 compatible_rotation = lambda prev, curr: curr.make_compatible(prev) or curr
+            if mode != 'QUATERNION':
+                @classmethod
+                def convert_rotations(cls, rotations, prev_rot=None):
+                    result = []
+                    for rot in rotations:
+                        curr_rot = cls.convert_rotation(rot)
+                        if prev_rot is not None:
+                            curr_rot = cls.compatible_rotation(prev_rot, curr_rot)
+                        result.append(tuple(curr_rot))
+                        prev_rot = curr_rot
+                    return np.array(result).reshape(len(rotations), -1)
         return _ConverterWrap
 
     def __assignToArmature(self, armObj, action_name=None):
@@ -346,10 +448,8 @@ class VMDImporter:
         _loc = _rot = lambda i: i
         if self.__mirror:
             pose_bones = _MirrorMapper(pose_bones)
-            _loc, _rot = _MirrorMapper.get_location, _MirrorMapper.get_rotation
+            _loc, _rot = _MirrorMapper.get_locations, _MirrorMapper.get_rotations
 
-        class _Dummy: pass
-        dummy_keyframe_points = iter(lambda: _Dummy, None)
         prop_rot_map = {'QUATERNION':'rotation_quaternion', 'AXIS_ANGLE':'rotation_axis_angle'}
 
         bone_name_table = {}
@@ -365,56 +465,28 @@ class VMDImporter:
             assert(bone_name_table.get(bone.name, name) == name)
             bone_name_table[bone.name] = name
 
-            fcurves = [dummy_keyframe_points]*7 # x, y, z, r0, r1, r2, (r3)
             data_path_rot = prop_rot_map.get(bone.rotation_mode, 'rotation_euler')
             bone_rotation = getattr(bone, data_path_rot)
             default_values = list(bone.location) + list(bone_rotation)
-            data_path = 'pose.bones["%s"].location'%bone.name
-            for axis_i in range(3):
-                fcurves[axis_i] = action.fcurves.new(data_path=data_path, index=axis_i, action_group=bone.name)
-            data_path = 'pose.bones["%s"].%s'%(bone.name, data_path_rot)
-            for axis_i in range(len(bone_rotation)):
-                fcurves[3+axis_i] = action.fcurves.new(data_path=data_path, index=axis_i, action_group=bone.name)
-
-            for i in range(len(default_values)):
-                c = fcurves[i]
-                c.keyframe_points.add(extra_frame+num_frame)
-                kp_iter = iter(c.keyframe_points)
-                if extra_frame:
-                    kp = next(kp_iter)
-                    kp.co = (1, default_values[i])
-                    kp.interpolation = 'LINEAR'
-                fcurves[i] = kp_iter
 
             converter = self.__getBoneConverter(bone)
-            prev_rot = bone_rotation if extra_frame else None
-            prev_kps, indices = None, tuple(converter.convert_interpolation((0, 16, 32)))+(48,)*len(bone_rotation)
-            keyFrames.sort(key=lambda x:x.frame_number)
-            for k, x, y, z, r0, r1, r2, r3 in zip(keyFrames, *fcurves):
-                frame = k.frame_number + self.__frame_margin
-                loc = converter.convert_location(_loc(k.location))
-                curr_rot = converter.convert_rotation(_rot(k.rotation))
-                if prev_rot is not None:
-                    curr_rot = converter.compatible_rotation(prev_rot, curr_rot)
-                    #FIXME the rotation interpolation has slightly different result
-                    #   Blender: rot(x) = prev_rot*(1 - bezier(t)) + curr_rot*bezier(t)
-                    #       MMD: rot(x) = prev_rot.slerp(curr_rot, factor=bezier(t))
-                prev_rot = curr_rot
-
-                x.co = (frame, loc[0])
-                y.co = (frame, loc[1])
-                z.co = (frame, loc[2])
-                r0.co = (frame, curr_rot[0])
-                r1.co = (frame, curr_rot[1])
-                r2.co = (frame, curr_rot[2])
-                r3.co = (frame, curr_rot[-1])
-
-                curr_kps = (x, y, z, r0, r1, r2, r3)
-                if prev_kps is not None:
-                    interp = k.interp
-                    for idx, prev_kp, kp in zip(indices, prev_kps, curr_kps):
-                        self.__setInterpolation(interp[idx:idx+16:4], prev_kp, kp)
-                prev_kps = curr_kps
+            arrays = boneAnim.frameArrays(name)
+            frames = arrays['frame_number'] + self.__frame_margin
+            locations = converter.convert_locations(_loc(arrays['location']))
+            rotations = converter.convert_rotations(_rot(arrays['rotation']), bone_rotation if extra_frame else None)
+            #FIXME the rotation interpolation has slightly different result
+            #   Blender: rot(x) = prev_rot*(1 - bezier(t)) + curr_rot*bezier(t)
+            #       MMD: rot(x) = prev_rot.slerp(curr_rot, factor=bezier(t))
+
+            # the bezier (x1, y1, x2, y2) of each channel, x/y/z follow the axes of the converted location
+            interp = arrays['interp']
+            indices = tuple(converter.convert_interpolation((0, 16, 32))) + (48,)*len(bone_rotation)
+            values = np.column_stack((locations, rotations))
+            data_path = 'pose.bones["%s"].location'%bone.name
+            data_path_rot = 'pose.bones["%s"].%s'%(bone.name, data_path_rot)
+            for i, idx in enumerate(indices):
+                fcurve = action.fcurves.new(data_path=data_path if i < 3 else data_path_rot, index=i if i < 3 else i-3, action_group=bone.name)
+                self.__setKeyframes(fcurve, frames, values[:, i], interp[:, idx:idx+16:4], default_values[i] if extra_frame else None)
 
         for c in action.fcurves:
             self.__fixFcurveHandles(c)
@@ -460,14 +532,17 @@ class VMDImporter:
             logging.info('(mesh) frames:%5d  name: %s', len(keyFrames), name)
             shapeKey = shapeKeyDict[name]
             fcurve = action.fcurves.new(data_path='key_blocks["%s"].value'%shapeKey.name)
-            fcurve.keyframe_points.add(len(keyFrames))
-            keyFrames.sort(key=lambda x:x.frame_number)
-            for k, v in zip(keyFrames, fcurve.keyframe_points):
-                v.co = (k.frame_number+self.__frame_margin, k.weight)
-                v.interpolation = 'LINEAR'
-            weights = tuple(i.weight for i in keyFrames)
-            shapeKey.slider_min = min(shapeKey.slider_min, floor(min(weights)))
-            shapeKey.slider_max = max(shapeKey.slider_max, ceil(max(weights)))
+            arrays = shapeKeyAnim.frameArrays(name)
+            weights = arrays['weight']
+            kps = fcurve.keyframe_points
+            kps.add(len(weights))
+            if len(weights) < 1:
+                continue
+            kps.foreach_set('co', np.column_stack((arrays['frame_number'] + self.__frame_margin, weights)).astype(np.float32).ravel())
+            kps.foreach_set('interpolation', np.full(len(weights), _ENUM_LINEAR, dtype=np.int32))
+            fcurve.update()
+            shapeKey.slider_min = min(shapeKey.slider_min, floor(weights.min()))
+            shapeKey.slider_max = max(shapeKey.slider_max, ceil(weights.max()))
 
 
     def __assignToRoot(self, rootObj, action_name=None):
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from mmd_tools.core import pmx
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class TestPmxReader(unittest.TestCase):
+    '''
+    The memory-mapped array reader has to produce the same data as the per-element reader
+    '''
+
+    def setUp(self):
+        '''
+        '''
+        import logging
+        logger = logging.getLogger()
+        logger.setLevel('ERROR')
+
+    def __create_model(self, num_vertices, additional_uvs):
+        model = pmx.Model()
+        model.name = model.name_e = 'reader'
+        model.display = []
+        for i in range(num_vertices):
+            v = pmx.Vertex()
+            v.co = (i*0.5, -i*0.25, 1.0/(i+1))
+            v.normal = (0.0, 1.0, 0.0)
+            v.uv = (i/num_vertices, 1.0-i/num_vertices)
+            v.additional_uvs = [(1.0, 2.0, 3.0, float(i)) for _ in range(additional_uvs)]
+            w = v.weight = pmx.BoneWeight()
+            w.type = i % 4
+            if w.type == pmx.BoneWeight.BDEF1:
+                w.bones = [i % 100]
+            elif w.type == pmx.BoneWeight.BDEF2:
+                w.bones = [1, 2]
+                w.weights = [0.25]
+            elif w.type == pmx.BoneWeight.BDEF4:
+                w.bones = [1, 2, 3, 99]
+                w.weights = [0.125, 0.125, 0.25, 0.5]
+            else:
+                w.bones = [5, 7]
+                w.weights = pmx.BoneWeightSDEF(0.75, (1.0, 2.0, 3.0), (4.0, 5.0, 6.0), (7.0, 8.0, 9.0))
+            v.edge_scale = 0.5
+            model.vertices.append(v)
+        model.faces = [(i, (i+1) % num_vertices, (i+2) % num_vertices) for i in range(num_vertices)]
+
+        vertex_morph = pmx.VertexMorph('vertex', 'vertex', 1)
+        for i in range(0, num_vertices, 3):
+            offset = pmx.VertexMorphOffset()
+            offset.index = i
+            offset.offset = (0.5, 1.5, float(i))
+            vertex_morph.offsets.append(offset)
+        uv_morph = pmx.UVMorph('uv', 'uv', 1, type_index=4)
+        offset = pmx.UVMorphOffset()
+        offset.index = 3
+        offset.offset = (1.0, 2.0, 3.0, 4.0)
+        uv_morph.offsets.append(offset)
+        model.morphs = [vertex_morph, uv_morph]
+        return model
+
+    def __check_models(self, source_model, result_model):
+        self.assertEqual(len(source_model.vertices), len(result_model.vertices))
+        for v0, v1 in zip(source_model.vertices, result_model.vertices):
+            self.assertEqual(v0.co, v1.co)
+            self.assertEqual(v0.normal, v1.normal)
+            self.assertEqual(v0.uv, v1.uv)
+            self.assertEqual(v0.additional_uvs, v1.additional_uvs)
+            self.assertEqual(v0.edge_scale, v1.edge_scale)
+            self.assertEqual(v0.weight.type, v1.weight.type)
+            self.assertEqual(v0.weight.bones, v1.weight.bones)
+            if v0.weight.type == pmx.BoneWeight.SDEF:
+                self.assertEqual(vars(v0.weight.weights), vars(v1.weight.weights))
+            else:
+                self.assertEqual(v0.weight.weights, v1.weight.weights)
+        self.assertEqual(list(source_model.faces), list(result_model.faces))
+        self.assertEqual(len(source_model.morphs), len(result_model.morphs))
+        for m0, m1 in zip(source_model.morphs, result_model.morphs):
+            self.assertEqual([vars(x) for x in m0.offsets], [vars(x) for x in m1.offsets])
+
+    def test_mapped_reader(self):
+        for num_vertices, additional_uvs in ((200, 0), (1000, 2)):
+            filepath = os.path.join(TESTS_DIR, 'output', 'reader_%d.pmx'%num_vertices)
+            pmx.save(filepath, self.__create_model(num_vertices, additional_uvs), additional_uvs)
+            source_model = pmx.load(filepath, use_mmap=False)
+            result_model = pmx.load(filepath, use_mmap=True)
+            self.assertIsNotNone(result_model.vertices.arrays())
+            self.__check_models(source_model, result_model)
+
+    def test_array_writer(self):
+        for num_vertices, additional_uvs in ((200, 0), (1000, 2)):
+            source_path = os.path.join(TESTS_DIR, 'output', 'writer_source_%d.pmx'%num_vertices)
+            result_path = os.path.join(TESTS_DIR, 'output', 'writer_result_%d.pmx'%num_vertices)
+            pmx.save(source_path, self.__create_model(num_vertices, additional_uvs), additional_uvs)
+            model = pmx.load(source_path, use_mmap=True)
+            pmx.save(result_path, model, additional_uvs)
+            with open(source_path, 'rb') as f0, open(result_path, 'rb') as f1:
+                self.assertEqual(f0.read(), f1.read())
+
+    def test_array_view_mutation(self):
+        filepath = os.path.join(TESTS_DIR, 'output', 'reader_mutation.pmx')
+        pmx.save(filepath, self.__create_model(30, 0))
+        model = pmx.load(filepath)
+        vertex = model.vertices[5]
+        self.assertIs(vertex, model.vertices[5])
+        model.vertices[0] = vertex
+        del model.vertices[10:]
+        self.assertIsNone(model.vertices.arrays())
+        self.assertEqual(len(model.vertices), 10)
+        self.assertIs(model.vertices[0], vertex)
+
+if __name__ == '__main__':
+    import sys
+    sys.argv = [__file__] + (sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else [])
+    unittest.main()
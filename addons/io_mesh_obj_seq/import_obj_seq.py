@@ -0,0 +1,220 @@
+import bpy
+import numpy as np
+from pathlib import Path
+from bpy.app.handlers import persistent
+from bpy.props import (
+    BoolProperty,
+    CollectionProperty,
+    IntProperty,
+    StringProperty,
+)
+from bpy_extras.io_utils import ImportHelper
+
+from .obj_reader import read_obj_vertices, to_blender_axes
+
+
+class ImportObjSeq(bpy.types.Operator, ImportHelper):
+    """Load an OBJ Sequence as absolute shape keys"""
+
+    bl_idname = "import_scene.objseq"
+    bl_label = "Import OBJ Seq"
+    bl_options = {"REGISTER", "UNDO"}
+
+    filename_ext = ".obj"
+    filter_glob: StringProperty(default="*.obj", options={"HIDDEN"})
+
+    files: CollectionProperty(
+        name="File Path",
+        description="File path used for importing the OBJ sequence",
+        type=bpy.types.OperatorFileListElement,
+    )
+    directory: StringProperty()
+
+    relative_shapekey: BoolProperty(
+        name="Relative ShapeKey",
+        description="Import shapes as relative shapekeys. Uncheck to import absolute shapekeys.",
+        default=True,
+    )
+
+    use_point_cache: BoolProperty(
+        name="Point Cache",
+        description="Store the sequence in a memory-mapped .npy file next to the OBJ files instead of shape keys",
+        default=False,
+    )
+
+    reader_processes: IntProperty(
+        name="Reader Processes",
+        description="Number of processes reading the OBJ files. 0 reads them in Blender",
+        default=0,
+        min=0,
+        soft_max=16,
+    )
+
+    def execute(self, context):
+        filepaths = [Path(self.directory, n.name) for n in self.files]
+        if not filepaths:
+            filepaths.append(Path(self.filepath))
+
+        try:
+            if self.use_point_cache:
+                self.create_point_cache(filepaths)
+            else:
+                self.create_shapekeys(filepaths)
+        except ValueError as e:
+            self.report({"ERROR"}, str(e))
+            return {"CANCELLED"}
+
+        return {"FINISHED"}
+
+    def import_first(self, filepath):
+        from contextlib import redirect_stdout
+
+        with redirect_stdout(None):
+            bpy.ops.wm.obj_import(
+                filepath=str(filepath),
+                filter_glob='*.obj;*.mtl',
+                use_split_objects=True,
+                use_split_groups=True,
+                global_scale=1.0,
+                clamp_size=0.0,
+                forward_axis='NEGATIVE_Z',
+                up_axis='Y',
+            )
+        main_obj = bpy.context.selected_objects[-1]
+        for face in main_obj.data.polygons:
+            face.use_smooth = True
+        bpy.context.view_layer.objects.active = main_obj
+
+        # the vertex order of the imported mesh must follow the v lines
+        coords, topology = read_obj_vertices(filepath)
+        mesh_coords = np.empty(len(main_obj.data.vertices) * 3, dtype=np.float32)
+        main_obj.data.vertices.foreach_get("co", mesh_coords)
+        if mesh_coords.size != coords.size or not np.allclose(mesh_coords.reshape(-1, 3), to_blender_axes(coords), atol=1e-4):
+            raise ValueError(f"{filepath.name}: the imported mesh doesn't follow the vertex order of the file (use a single object per file)")
+        return main_obj, coords.shape[0], topology
+
+    def read_frames(self, filepaths, vertex_count, topology):
+        """Yields the Blender vertex coordinates of each file, in order"""
+        if self.reader_processes > 0 and len(filepaths) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(self.reader_processes, mp_context=multiprocessing.get_context("spawn"))
+            frames = pool.map(read_obj_vertices, filepaths, chunksize=4)
+        else:
+            pool = None
+            frames = map(read_obj_vertices, filepaths)
+        try:
+            for filepath, (coords, frame_topology) in zip(filepaths, frames):
+                if coords.shape[0] != vertex_count or frame_topology != topology:
+                    raise ValueError(f"{filepath.name} doesn't have the topology of the first file")
+                yield to_blender_axes(coords)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def create_shapekeys(self, filepaths):
+        main_obj, vertex_count, topology = self.import_first(filepaths[0])
+        main_obj.shape_key_add(name="Basis")
+        main_key = main_obj.data.shape_keys
+        seq_len = len(filepaths)
+
+        # Read the rest straight into new shape keys
+        for i, (filepath, coords) in enumerate(zip(filepaths[1:], self.read_frames(filepaths[1:], vertex_count, topology))):
+            key_block = main_obj.shape_key_add(name=filepath.stem, from_mix=False)
+            key_block.data.foreach_set("co", coords.ravel())
+            print(f"{i}/{seq_len}", end="\r")
+        main_obj.data.update()
+
+        # Additional settings based on relative_shapekey
+        if self.relative_shapekey:
+            main_key.use_relative = True
+            key_blocks = main_key.key_blocks[1:]
+            if key_blocks:
+                # a 0, 1, 0 pulse per key block, around the frame of its file
+                main_key.animation_data_create()
+                if main_key.animation_data.action is None:
+                    main_key.animation_data.action = bpy.data.actions.new(name=main_key.name + "Action")
+                fcurves = main_key.animation_data.action.fcurves
+                for i, key_block in enumerate(key_blocks):
+                    key_block.value = 0.0
+                    data_path = key_block.path_from_id("value")
+                    fcurve = fcurves.find(data_path) or fcurves.new(data_path)
+                    fcurve.keyframe_points.add(3)
+                    fcurve.keyframe_points.foreach_set("co", (i, 0.0, i + 1, 1.0, i + 2, 0.0))
+                    fcurve.update()
+        else:
+            main_key.use_relative = False
+            fcurve = main_key.driver_add("eval_time")
+            fcurve.driver.expression = "frame*10"
+
+        # Set start/end time
+        bpy.context.scene.frame_start = 0
+        bpy.context.scene.frame_end = seq_len - 1
+
+    def create_point_cache(self, filepaths):
+        main_obj, vertex_count, topology = self.import_first(filepaths[0])
+        seq_len = len(filepaths)
+
+        cache_path = filepaths[0].with_name(filepaths[0].stem + "_cache.npy")
+        cache = np.lib.format.open_memmap(cache_path, mode="w+", dtype=np.float32, shape=(seq_len, vertex_count, 3))
+        main_obj.data.vertices.foreach_get("co", cache[0].reshape(-1))
+        for i, coords in enumerate(self.read_frames(filepaths[1:], vertex_count, topology), 1):
+            cache[i] = coords
+            print(f"{i}/{seq_len}", end="\r")
+        cache.flush()
+        del cache
+
+        _point_caches.pop(str(cache_path), None)
+        main_obj["obj_seq_cache"] = bpy.path.relpath(str(cache_path)) if bpy.data.filepath else str(cache_path)
+
+        # Set start/end time
+        bpy.context.scene.frame_start = 0
+        bpy.context.scene.frame_end = seq_len - 1
+
+
+# Memory-mapped point caches by path, shared by the objects using them
+_point_caches = {}
+
+
+def _get_point_cache(path):
+    cache = _point_caches.get(path)
+    if cache is None:
+        try:
+            cache = np.load(bpy.path.abspath(path), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        _point_caches[path] = cache
+    return cache
+
+
+@persistent
+def update_point_caches(scene, depsgraph=None):
+    """Copies the current frame of the point cache to the mesh of every object with an obj_seq_cache"""
+    for obj in scene.objects:
+        path = obj.get("obj_seq_cache")
+        if not path or obj.type != 'MESH':
+            continue
+        cache = _get_point_cache(path)
+        if cache is None or cache.shape[1] != len(obj.data.vertices):
+            continue
+        frame = min(max(scene.frame_current, 0), cache.shape[0] - 1)
+        obj.data.vertices.foreach_set("co", np.ascontiguousarray(cache[frame]).ravel())
+        obj.data.update()
+
+
+def menu_func_import(self, context):
+    self.layout.operator(ImportObjSeq.bl_idname, text="Obj Seq As Shapekey(.obj)")
+
+
+def register():
+    bpy.utils.register_class(ImportObjSeq)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.app.handlers.frame_change_pre.append(update_point_caches)
+
+
+def unregister():
+    bpy.utils.unregister_class(ImportObjSeq)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.app.handlers.frame_change_pre.remove(update_point_caches)
+    _point_caches.clear()
@@ -0,0 +1,71 @@
+"""Vertex reader for OBJ sequences.
+
+Only `v` lines are parsed, the faces are hashed to check that every frame has the
+topology of the first one. The module doesn't import bpy so frames can be read in
+worker processes.
+"""
+
+import hashlib
+
+import numpy as np
+
+
+def _line_starts(data):
+    starts = np.flatnonzero(data == ord("\n")) + 1
+    return np.concatenate(([0], starts[starts < len(data)]))
+
+
+def _select_lines(data, starts, ends, mask):
+    """Bytes of the masked lines, a plain slice when they are contiguous (the usual layout)."""
+    index = np.flatnonzero(mask)
+    if len(index) == 0:
+        return data[:0]
+    if index[-1] - index[0] + 1 == len(index):
+        return data[starts[index[0]]:ends[index[-1]]]
+    sel = np.zeros(len(data) + 1, dtype=np.int8)
+    sel[starts[index]] = 1
+    sel[ends[index]] -= 1
+    return data[np.cumsum(sel[:-1], dtype=np.int8).view(bool)]
+
+
+def read_obj_vertices(filepath):
+    """
+    Read the vertices of an OBJ file.
+
+    Returns:
+        coords: (n, 3) float32 vertex positions in OBJ axes
+        topology: digest of the vertex count and the face lines
+    """
+    data = np.fromfile(filepath, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros((0, 3), dtype=np.float32), hashlib.blake2b(digest_size=16).hexdigest()
+    starts = _line_starts(data)
+    ends = np.append(starts[1:], len(data))
+    first = data[starts]
+    second = data[np.minimum(starts + 1, len(data) - 1)]
+    separator = (second == ord(" ")) | (second == ord("\t"))
+    vertex_lines = (first == ord("v")) & separator
+    face_lines = (first == ord("f")) & separator
+
+    text = _select_lines(data, starts, ends, vertex_lines).copy()
+    # blank the leading 'v' of every line, leaving only numbers
+    text[np.flatnonzero(text[:-1] == ord("\n")) + 1] = ord(" ")
+    text[0:1] = ord(" ")
+    values = np.fromstring(text.tobytes(), sep=" ", dtype=np.float32)
+    count = np.count_nonzero(vertex_lines)
+    if values.size == count * 3:
+        coords = values.reshape(-1, 3)
+    else:
+        # homogeneous w or vertex colors after the position
+        lines = text.tobytes().splitlines()
+        coords = np.array([line.split()[:3] for line in lines if line.strip()], dtype=np.float32).reshape(-1, 3)
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(count).encode())
+    h.update(_select_lines(data, starts, ends, face_lines).tobytes())
+    return coords, h.hexdigest()
+
+
+def to_blender_axes(coords):
+    """OBJ forward -Z, up Y to Blender axes, as the OBJ importer does by default."""
+    return np.stack((coords[:, 0], -coords[:, 2], coords[:, 1]), axis=1)
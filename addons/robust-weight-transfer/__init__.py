@@ -19,11 +19,14 @@ import bpy
 import bmesh
 import igl
 import numpy as np
-from .weighttransfer import find_matches_closest_surface, inpaint, limit_mask, smooth_weigths
+import scipy as sp
+from .weighttransfer import build_surface_tree, find_matches_closest_surface, inpaint, limit_mask, smooth_weigths
 import webbrowser
 import math
+import time
 
 from . import util
+from . import cache
 
 
 class RobustWeightTransfer(bpy.types.Operator):
@@ -79,14 +82,21 @@ class RobustWeightTransfer(bpy.types.Operator):
             source_obj = source_obj.evaluated_get(depsgraph)
         
         weights_all = []
+        timings = []
+        source_start = time.perf_counter()
+        # the source is extracted and its AABB tree built once, then shared by every target
         source_verts, source_triangles, source_normals = util.get_obj_arrs_world(source_obj)
         deform_only = scene_settings.group_selection == 'DEFORM_POSE_BONES'
         is_deform = [util.is_vertex_group_deform_bone(source_obj, g.name) for g in source_obj.vertex_groups]
         source_weights = util.get_groups_arr(source_obj, is_deform if deform_only else None)
+        source_tree = build_surface_tree(source_verts, source_triangles)
+        topology_cache = cache.default_cache() if scene_settings.use_cache else None
+        source_time = time.perf_counter() - source_start
         for obj in target_objs:
+            target_start = time.perf_counter()
             object_settings: ObjectSettingsGroup = obj.robust_weight_transfer_settings
             verts, triangles, normals = util.get_obj_arrs_world(obj.evaluated_get(depsgraph) if scene_settings.use_deformed_target else obj)
-            matched_verts, weights = find_matches_closest_surface(source_verts, source_triangles, source_normals, verts, normals, source_weights, scene_settings.max_distance**2, math.degrees(scene_settings.max_normal_angle_difference), scene_settings.flip_vertex_normal)
+            matched_verts, weights = find_matches_closest_surface(source_verts, source_triangles, source_normals, verts, normals, source_weights, scene_settings.max_distance**2, math.degrees(scene_settings.max_normal_angle_difference), scene_settings.flip_vertex_normal, source_tree)
             if not scene_settings.apply_to_selected:
                 if util.is_group_valid(obj.vertex_groups, object_settings.inpaint_group):
                     inpaint_mask = util.get_group_arr(obj, object_settings.inpaint_group)
@@ -103,15 +113,23 @@ class RobustWeightTransfer(bpy.types.Operator):
                     return {'CANCELLED'}
 
                 
-            result, weights = inpaint(verts, triangles, weights, matched_verts, scene_settings.inpaint_mode == 'POINT')
+            result, weights = inpaint(verts, triangles, weights, matched_verts, scene_settings.inpaint_mode == 'POINT', cache=topology_cache)
             if not result:
                 self.report({'ERROR'}, f'Failed weight inpainting on {obj.name}: This usually happens on loose parts, where vertices are not finding a match on the source mesh. Use Select Rejected Loose Parts to solve the issue.')
                 return {'CANCELLED'}
             
-            adj_mat = util.get_mesh_adjacency_matrix_sparse(obj.data, include_self=True)
+            # only the bones that received weights are densified, the rest of the skeleton stays implicit zeros
+            active_groups = np.flatnonzero(np.diff(weights.indptr))
+            weights = weights[:, active_groups].toarray()
+            
+            if topology_cache is not None:
+                adj_key = topology_cache.mesh_key(verts, triangles, 'adjacency', len(obj.data.edges))
+                adj_mat = topology_cache.get_or_create(adj_key, lambda: {'adjacency': util.get_mesh_adjacency_matrix_sparse(obj.data, include_self=True)})['adjacency']
+                adj_mat = sp.sparse.csr_array(adj_mat)
+            else:
+                adj_mat = util.get_mesh_adjacency_matrix_sparse(obj.data, include_self=True)
             if scene_settings.smoothing_enable:
-                adj_list = util.get_mesh_adjacency_list(obj.data)
-                weights = smooth_weigths(verts, weights, matched_verts, adj_mat, adj_list, scene_settings.smoothing_repeat, scene_settings.smoothing_factor, scene_settings.max_distance)
+                weights = smooth_weigths(verts, weights, matched_verts, adj_mat, scene_settings.smoothing_repeat, scene_settings.smoothing_factor, scene_settings.max_distance)
             
             if scene_settings.enforce_four_bone_limit:
                 weights[weights <= 0.0001] = 0
@@ -119,17 +137,20 @@ class RobustWeightTransfer(bpy.types.Operator):
                 weights = (1 - mask) * weights
                 weights[weights <= 0.0001] = 0
             
-            weights_all.append(weights)
-        for obj, weights in zip(target_objs, weights_all):
-            source_vertex_groups = source_obj.vertex_groups
+            weights_all.append((active_groups, weights))
+            timings.append(time.perf_counter() - target_start)
+        source_vertex_groups = source_obj.vertex_groups
+        is_deform = [util.is_vertex_group_deform_bone(source_obj, g.name) for g in source_vertex_groups]
+        for target_index, (obj, (active_groups, weights)) in enumerate(zip(target_objs, weights_all)):
+            write_start = time.perf_counter()
+            object_settings: ObjectSettingsGroup = obj.robust_weight_transfer_settings
             weight_counts = np.count_nonzero(weights, axis=0)
-            for group, w_count in zip(source_vertex_groups, weight_counts):
+            for i, w_count in zip(active_groups, weight_counts):
+                group = source_vertex_groups[i]
                 if w_count > 0:
                     if group.name not in obj.vertex_groups:
                         obj.vertex_groups.new(name=group.name)
             
-            is_deform = [util.is_vertex_group_deform_bone(source_obj, g.name) for g in source_vertex_groups]
-            
             use_mask = not scene_settings.apply_to_selected and util.is_group_valid(obj.vertex_groups, object_settings.vertex_group)
             if use_mask:
                 mask = util.get_group_arr(obj, object_settings.vertex_group)
@@ -137,8 +158,7 @@ class RobustWeightTransfer(bpy.types.Operator):
                     mask = 1 - mask
                 current_weights = {group.name: w  for group, w in zip(obj.vertex_groups, util.get_groups_arr(obj).T)}
                 
-            for i, w in enumerate(weights.T):
-                w_count = weight_counts[i]
+            for i, w, w_count in zip(active_groups, weights.T, weight_counts):
                 if w_count == 0: continue
                 
                 source_group = source_vertex_groups[i]
@@ -154,11 +174,12 @@ class RobustWeightTransfer(bpy.types.Operator):
                     current_weight = current_weights[group_name]
                     w = (1 - mask) * current_weight + mask * w
                     
-                for j, wv in enumerate(w):
-                    if wv >= 0.00001:
-                        target_group.add([j], wv, 'REPLACE')
-                ind = np.where(w < 0.00001)[0].tolist()
-                target_group.remove(ind)   
+                util.set_group_weights(target_group, w, 0.00001)
+            timings[target_index] += time.perf_counter() - write_start
+        
+        print(f'Robust Weight Transfer: source {source_obj.name} prepared in {source_time:.3f}s')
+        for obj, t in zip(target_objs, timings):
+            print(f'Robust Weight Transfer: {obj.name} ({len(obj.data.vertices)} vertices) in {t:.3f}s')
         
         if scene_settings.draw_matched:
             if isinstance(context.space_data, bpy.types.SpaceView3D):
@@ -166,7 +187,8 @@ class RobustWeightTransfer(bpy.types.Operator):
                 view.shading.type = 'SOLID'
                 view.shading.color_type = 'VERTEX'
         if scene_settings.apply_to_selected:
-            self.report({'INFO'}, f'Weights transfered from {source_obj.name} to selected objects')
+            total_time = source_time + sum(timings)
+            self.report({'INFO'}, f'Weights transfered from {source_obj.name} to {len(target_objs)} selected objects in {total_time:.2f}s (see console for per object timings)')
         else:
             self.report({'INFO'}, f'Weights transfered from {source_obj.name} to {context.object.name}')
         return {'FINISHED'}
@@ -332,6 +354,10 @@ class SceneSettingsGroup(bpy.types.PropertyGroup):
         name='Limited vertices to Vertex Group',
         description='Visualize the vertices that got limited by writing to the "Limited" vertex group',
         default=False)
+    use_cache: bpy.props.BoolProperty(
+        name='Cache Target Matrices',
+        description='Keep the Laplacian, adjacency and factorization of unchanged target meshes in memory and on disk, so repeated transfers skip straight to matching and solving',
+        default=True)
 
     
 class RobustWeightTransferPanel(bpy.types.Panel):
@@ -421,6 +447,7 @@ class SettingsPanel(bpy.types.Panel):
         layout.prop(settings, 'inpaint_mode')
         layout.prop(settings, 'draw_matched')
         layout.prop(settings, 'enforce_four_bone_limit')
+        layout.prop(settings, 'use_cache')
         row = layout.row()
         row.enabled = not settings.enforce_four_bone_limit
         row.prop(settings, 'group_selection', text='Subset')
@@ -496,8 +523,20 @@ class UtilitiesPanel(bpy.types.Panel):
         row = layout.row(align=True)
         row.operator('object.smooth_limit_weights')
         row.prop(settings, 'smooth_limit_debug', text='', icon='GROUP_VERTEX')
+        layout.operator('object.rbt_clear_cache', icon='TRASH')
     
 
+class ClearCache(bpy.types.Operator):
+    """Delete all cached Laplacians, adjacencies and factorizations"""
+    bl_idname = "object.rbt_clear_cache"
+    bl_label = "Clear Matrix Cache"
+
+    def execute(self, context):
+        cache.default_cache().clear()
+        self.report({'INFO'}, 'Robust Weight Transfer cache cleared')
+        return {'FINISHED'}
+
+
 class SmoothLimit(bpy.types.Operator):
     """Limit weights of active vertices to 4 Bones"""
     bl_idname = "object.smooth_limit_weights"
@@ -624,6 +663,7 @@ def register():
     bpy.utils.register_class(ResetSceneSettings)
     bpy.utils.register_class(UtilitiesPanel)
     bpy.utils.register_class(SmoothLimit)
+    bpy.utils.register_class(ClearCache)
     bpy.types.Object.robust_weight_transfer_settings = bpy.props.PointerProperty(type=ObjectSettingsGroup)
     bpy.types.Scene.robust_weight_transfer_settings = bpy.props.PointerProperty(type=SceneSettingsGroup)
     
@@ -649,6 +689,7 @@ def unregister():
     bpy.utils.unregister_class(ResetSceneSettings)
     bpy.utils.unregister_class(UtilitiesPanel)
     bpy.utils.unregister_class(SmoothLimit)
+    bpy.utils.unregister_class(ClearCache)
     del bpy.types.Object.robust_weight_transfer_settings
     del bpy.types.Scene.robust_weight_transfer_settings
     SentFromSpacePanel._unregister()
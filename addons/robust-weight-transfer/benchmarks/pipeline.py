@@ -0,0 +1,117 @@
+"""
+Benchmark of the headless weight transfer pipeline on synthetic meshes, without Blender.
+
+    python benchmarks/pipeline.py --sizes 10000 100000 1000000 --json results.json
+    python benchmarks/pipeline.py --sizes 10000 100000 --baseline results.json --tolerance 1.5
+
+With --baseline the script exits with 1 if any size got slower than tolerance times the baseline total,
+so it can gate performance regressions in CI.
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from cli import StageTimer, run_pipeline
+
+
+def make_sphere(num_verts, radius=1.0):
+    """UV sphere (without pole caps) with about num_verts vertices"""
+    rings = max(int(np.sqrt(num_verts / 2)), 3)
+    segments = max(num_verts // rings, 3)
+    theta = np.linspace(0.05, np.pi - 0.05, rings)
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    N = np.stack((np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)), axis=-1).reshape(-1, 3)
+    V = radius * N
+
+    idx = np.arange(rings * segments).reshape(rings, segments)
+    a = idx[:-1]
+    b = np.roll(idx, -1, axis=1)[:-1]
+    c = idx[1:]
+    d = np.roll(idx, -1, axis=1)[1:]
+    F = np.concatenate((np.stack((a, c, b), axis=-1).reshape(-1, 3), np.stack((b, c, d), axis=-1).reshape(-1, 3)))
+    return V.astype(np.float32), F.astype(np.int64), N.astype(np.float32)
+
+
+def make_weights(V, num_bones, influences=4):
+    """Smooth falloff weights of bones placed along the z axis, limited to a few influences per vertex"""
+    bones = np.zeros((num_bones, 3), dtype=np.float32)
+    bones[:, 2] = np.linspace(-1, 1, num_bones)
+    W = np.zeros((V.shape[0], num_bones), dtype=np.float32)
+    for start in range(0, V.shape[0], 65536):
+        chunk = V[start:start + 65536]
+        dist = np.linalg.norm(chunk[:, None, :] - bones[None, :, :], axis=-1)
+        nearest = np.argpartition(dist, influences - 1, axis=1)[:, :influences]
+        w = np.exp(-8 * np.take_along_axis(dist, nearest, axis=1) ** 2)
+        w /= w.sum(axis=1, keepdims=True)
+        np.put_along_axis(W[start:start + 65536], nearest, w, axis=1)
+    return W
+
+
+def make_case(num_verts, num_bones):
+    source_verts, source_triangles, source_normals = make_sphere(num_verts // 2)
+    source_weights = make_weights(source_verts, num_bones)
+    # a slightly larger garment, with a flap sticking out that has to be inpainted
+    verts, triangles, normals = make_sphere(num_verts, radius=1.02)
+    flap = verts[:, 0] > 0.8
+    verts[flap] *= 1.2
+    return (source_verts, source_triangles, source_normals, source_weights), (verts, triangles, normals)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='target vertex counts')
+    parser.add_argument('--bones', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size, the fastest is reported')
+    parser.add_argument('--smoothing-repeat', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown factor against the baseline')
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    results = {}
+    for size in args.sizes:
+        source, target = make_case(size, args.bones)
+        best = None
+        for _ in range(args.repeat):
+            timer = StageTimer()
+            result, _, matched = run_pipeline(source, target, max_distance=0.05, smoothing_repeat=args.smoothing_repeat,
+                                              num_threads=args.threads, timer=timer)
+            if not result:
+                print(f'{size}: inpainting failed', file=sys.stderr)
+                return 1
+            if best is None or timer.total() < best.total():
+                best = timer
+        results[str(size)] = {'vertices': int(target[0].shape[0]), 'matched': int(np.count_nonzero(matched)),
+                              'stages': best.stages, 'total_seconds': best.total()}
+        print(f'--- {target[0].shape[0]} target vertices, {args.bones} bones')
+        print(best.report())
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = False
+        for size, entry in results.items():
+            if size not in baseline: continue
+            ratio = entry['total_seconds'] / baseline[size]['total_seconds']
+            status = 'REGRESSION' if ratio > args.tolerance else 'ok'
+            regressed |= ratio > args.tolerance
+            print(f'{size:>10}: {ratio:5.2f}x baseline {status}')
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
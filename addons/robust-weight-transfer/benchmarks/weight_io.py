@@ -0,0 +1,85 @@
+"""
+Microbenchmark of the vertex group read/write paths in util, against the previous per-vertex implementation.
+
+Run inside Blender:
+    blender --background --factory-startup --python benchmarks/weight_io.py -- --grid 390 --groups 100
+"""
+import argparse
+import os
+import sys
+import time
+
+import bpy
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import util
+
+
+def legacy_get_groups_arr(obj):
+    mesh = obj.data
+    arr = np.zeros((len(mesh.vertices), len(obj.vertex_groups)), dtype=np.float32)
+    for i, v in enumerate(mesh.vertices):
+        for g in v.groups:
+            arr[i, g.group] = g.weight
+    return arr
+
+
+def legacy_write_weights(obj, weights, names, threshold=0):
+    for name, w in zip(names, weights.T):
+        group = obj.vertex_groups[name]
+        for j, wv in enumerate(w):
+            if wv >= threshold:
+                group.add([j], wv, 'REPLACE')
+        ind = np.where(w < threshold)[0].tolist()
+        group.remove(ind)
+
+
+def make_object(grid, num_groups, influences, rng):
+    bpy.ops.mesh.primitive_grid_add(x_subdivisions=grid, y_subdivisions=grid, size=2)
+    obj = bpy.context.active_object
+    num_verts = len(obj.data.vertices)
+    names = [f'Bone.{i:03d}' for i in range(num_groups)]
+    for name in names:
+        obj.vertex_groups.new(name=name)
+
+    # a handful of influences per vertex, with a band of full weights like a real skin
+    weights = np.zeros((num_verts, num_groups), dtype=np.float32)
+    cols = rng.integers(0, num_groups, size=(num_verts, influences))
+    rows = np.repeat(np.arange(num_verts), influences)
+    weights[rows, cols.reshape(-1)] = rng.random(num_verts * influences, dtype=np.float32)
+    weights[rng.random(num_verts) < 0.5, 0] = 1.0
+    return obj, weights, names
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--grid', type=int, default=390, help='grid subdivisions, vertices = grid^2')
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--influences', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    obj, weights, names = make_object(args.grid, args.groups, args.influences, np.random.default_rng(args.seed))
+    print(f'{len(obj.data.vertices)} vertices, {args.groups} groups')
+
+    _, legacy_write = timed(legacy_write_weights, obj, weights, names, 0.0001)
+    legacy_arr, legacy_read = timed(legacy_get_groups_arr, obj)
+    _, bulk_write = timed(util.write_weights, obj, weights, names, 0.0001)
+    bulk_arr, bulk_read = timed(util.get_groups_arr, obj)
+
+    assert np.allclose(legacy_arr, bulk_arr), 'bulk read does not match per-vertex read'
+    print(f'{"":8}{"per-vertex":>14}{"bulk":>14}{"speedup":>10}')
+    print(f'{"read":8}{legacy_read:13.3f}s{bulk_read:13.3f}s{legacy_read / bulk_read:9.1f}x')
+    print(f'{"write":8}{legacy_write:13.3f}s{bulk_write:13.3f}s{legacy_write / bulk_write:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
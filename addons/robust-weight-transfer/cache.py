@@ -0,0 +1,160 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import scipy as sp
+
+
+def mesh_key(V, F, *extra):
+    """
+    Hash vertex positions and triangles (plus any extra settings) into a cache key
+
+    Args:
+        V: #V by 3 mesh vertices
+        F: #F by 3 mesh triangles indices
+        extra: additional values the cached data depends on
+    Returns:
+        key: hex digest string
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for arr in (V, F):
+        arr = np.ascontiguousarray(arr)
+        h.update(str((arr.dtype.str, arr.shape)).encode())
+        h.update(arr.data)
+    h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+def array_key(arr):
+    """Hash a single array, e.g. a vertex mask, into a cache key"""
+    arr = np.ascontiguousarray(arr)
+    return hashlib.blake2b(arr.data, digest_size=16).hexdigest()
+
+
+def _pack(value):
+    arrays = {}
+    for name, m in value.items():
+        if sp.sparse.issparse(m):
+            m = sp.sparse.csc_array(m)
+            arrays[f'{name}.data'] = m.data
+            arrays[f'{name}.indices'] = m.indices
+            arrays[f'{name}.indptr'] = m.indptr
+            arrays[f'{name}.shape'] = np.array(m.shape, dtype=np.int64)
+        else:
+            arrays[f'{name}.array'] = np.asarray(m)
+    return arrays
+
+
+def _unpack(arrays):
+    value = {}
+    for entry in arrays.files:
+        name, part = entry.rsplit('.', 1)
+        if part == 'array':
+            value[name] = arrays[entry]
+        elif part == 'data':
+            shape = tuple(arrays[f'{name}.shape'])
+            value[name] = sp.sparse.csc_array((arrays[entry], arrays[f'{name}.indices'], arrays[f'{name}.indptr']), shape=shape)
+    return value
+
+
+class TopologyCache:
+    """
+    Two level LRU cache for per-mesh matrices.
+
+    Values are dicts of sparse matrices or arrays. They are kept in memory up to
+    max_entries and, when persisted, written as .npz files to directory, which is
+    trimmed to max_disk_bytes by evicting the least recently used files.
+    Values that can't be serialized (e.g. factorizations) are stored with persist=False.
+    """
+    mesh_key = staticmethod(mesh_key)
+    array_key = staticmethod(array_key)
+
+    def __init__(self, directory=None, max_entries=16, max_disk_bytes=2**30):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.directory:
+            path = self._path(key)
+            if os.path.isfile(path):
+                try:
+                    with np.load(path) as arrays:
+                        value = _unpack(arrays)
+                except (OSError, ValueError, KeyError):
+                    os.remove(path)
+                else:
+                    os.utime(path) # mark as recently used for the disk eviction
+                    self._put_memory(key, value)
+                    self.hits += 1
+                    return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value, persist=True):
+        self._put_memory(key, value)
+        if persist and self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **_pack(value))
+            os.replace(tmp_path, path)
+            self._trim_disk()
+
+    def get_or_create(self, key, build, persist=True):
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value, persist)
+        return value
+
+    def _put_memory(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'): continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes: break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        self.memory.clear()
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, name))
+
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'robust_weight_transfer_cache')
+_default_cache = None
+
+
+def default_cache():
+    """Process wide cache, persisted in the temp directory"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TopologyCache(DEFAULT_CACHE_DIR)
+    return _default_cache
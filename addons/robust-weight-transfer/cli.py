@@ -0,0 +1,180 @@
+"""
+Run the weight transfer pipeline without Blender.
+
+    python cli.py source.npz target.obj -o result.npz --source-weights weights.npy
+
+Meshes are read from .npz (arrays V, F and optionally N, W) or .obj files.
+The source weights come from the source .npz (W) or --source-weights (.npy, or .npz with W).
+The result .npz contains the transferred weights W and the Matched mask.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deps'))
+
+import igl
+import numpy as np
+
+import cache
+from weighttransfer import build_surface_tree, find_matches_closest_surface, get_adjacency_matrix_sparse, inpaint, limit_mask, smooth_weigths
+
+
+class StageTimer:
+    """Records wall time and peak traced memory of each pipeline stage"""
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, func, *args, **kwargs):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        self.stages.append({'stage': name, 'seconds': elapsed, 'peak_bytes': peak})
+        return result
+
+    def total(self):
+        return sum(stage['seconds'] for stage in self.stages)
+
+    def report(self):
+        lines = [f'{"stage":16}{"time":>12}{"peak memory":>16}']
+        for stage in self.stages:
+            lines.append(f'{stage["stage"]:16}{stage["seconds"]:11.3f}s{stage["peak_bytes"] / 2**20:13.1f} MiB')
+        lines.append(f'{"total":16}{self.total():11.3f}s')
+        return '\n'.join(lines)
+
+
+def load_obj(path):
+    verts = []
+    faces = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith('v '):
+                verts.append(line.split()[1:4])
+            elif line.startswith('f '):
+                poly = [int(token.split('/')[0]) for token in line.split()[1:]]
+                poly = [i - 1 if i > 0 else len(verts) + i for i in poly]
+                faces.extend((poly[0], poly[i], poly[i + 1]) for i in range(1, len(poly) - 1))
+    return np.array(verts, dtype=np.float32), np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+
+def load_mesh(path):
+    """Returns vertices, triangles, vertex normals and weights (or None) of a .npz or .obj mesh"""
+    weights = None
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            V = data['V'].astype(np.float32)
+            F = data['F'].astype(np.int64)
+            N = data['N'].astype(np.float32) if 'N' in data else None
+            weights = data['W'].astype(np.float32) if 'W' in data else None
+    else:
+        V, F = load_obj(path)
+        N = None
+    if N is None:
+        N = igl.per_vertex_normals(V, F).astype(np.float32)
+    return V, F, N, weights
+
+
+def load_weights(path):
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return data['W'].astype(np.float32)
+    return np.load(path).astype(np.float32)
+
+
+def run_pipeline(source, target, max_distance=0.05, max_normal_angle=30.0, flip_vertex_normal=True, point_cloud=True,
+                 smoothing_repeat=0, smoothing_factor=0.2, enforce_four_bone_limit=True, num_threads=None, topology_cache=None, timer=None):
+    """
+    Transfers the weights of source to target, the same way the Blender operator does
+
+    Args:
+        source: (V, F, N, W) of the source mesh
+        target: (V, F, N) of the target mesh
+        max_normal_angle: in degrees
+        smoothing_repeat: 0 disables smoothing
+        timer: optional StageTimer, receiving one entry per stage
+    Returns:
+        result: False if inpainting failed
+        weights: #V by num_bones transferred weights
+        matched: #V array of bools
+    """
+    timer = timer or StageTimer()
+    source_verts, source_triangles, source_normals, source_weights = source
+    verts, triangles, normals = target
+
+    source_tree = timer.run('source_tree', build_surface_tree, source_verts, source_triangles)
+    matched, weights = timer.run('match', find_matches_closest_surface, source_verts, source_triangles, source_normals, verts, normals,
+                                 source_weights, max_distance**2, max_normal_angle, flip_vertex_normal, source_tree)
+    result, weights = timer.run('inpaint', inpaint, verts, triangles, weights, matched, point_cloud, num_threads, topology_cache)
+    if not result:
+        return False, None, matched
+    weights = weights.toarray()
+
+    adj_mat = timer.run('adjacency', get_adjacency_matrix_sparse, triangles, verts.shape[0], True)
+    if smoothing_repeat > 0:
+        weights = timer.run('smooth', smooth_weigths, verts, weights, matched, adj_mat, smoothing_repeat, smoothing_factor, max_distance)
+
+    if enforce_four_bone_limit:
+        def limit(weights):
+            weights[weights <= 0.0001] = 0
+            mask = limit_mask(weights, adj_mat)
+            weights = (1 - mask) * weights
+            weights[weights <= 0.0001] = 0
+            return weights
+        weights = timer.run('limit', limit, weights)
+    return True, weights, matched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='source mesh (.npz or .obj)')
+    parser.add_argument('target', help='target mesh (.npz or .obj)')
+    parser.add_argument('-o', '--output', help='result .npz with W and Matched')
+    parser.add_argument('--source-weights', help='source weights (.npy or .npz with W), if not stored in the source .npz')
+    parser.add_argument('--max-distance', type=float, default=0.05)
+    parser.add_argument('--max-normal-angle', type=float, default=30.0, help='degrees')
+    parser.add_argument('--no-flip-vertex-normal', action='store_true')
+    parser.add_argument('--inpaint-mode', choices=['POINT', 'SURFACE'], default='POINT')
+    parser.add_argument('--smoothing-repeat', type=int, default=0)
+    parser.add_argument('--smoothing-factor', type=float, default=0.2)
+    parser.add_argument('--no-limit', action='store_true', help='do not limit to 4 bones per vertex')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--cache-dir', help='persist the target matrices in this directory')
+    parser.add_argument('--json', help='write the stage timings to this file')
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    timer = StageTimer()
+    source_verts, source_triangles, source_normals, source_weights = timer.run('load_source', load_mesh, args.source)
+    if args.source_weights:
+        source_weights = load_weights(args.source_weights)
+    if source_weights is None:
+        parser.error('source has no weights, store W in the source .npz or pass --source-weights')
+    verts, triangles, normals, _ = timer.run('load_target', load_mesh, args.target)
+
+    topology_cache = cache.TopologyCache(args.cache_dir) if args.cache_dir else None
+    result, weights, matched = run_pipeline(
+        (source_verts, source_triangles, source_normals, source_weights), (verts, triangles, normals),
+        args.max_distance, args.max_normal_angle, not args.no_flip_vertex_normal, args.inpaint_mode == 'POINT',
+        args.smoothing_repeat, args.smoothing_factor, not args.no_limit, args.threads, topology_cache, timer)
+
+    print(f'{verts.shape[0]} target vertices, {np.count_nonzero(matched)} matched, {source_weights.shape[1]} bones')
+    print(timer.report())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'stages': timer.stages, 'total_seconds': timer.total()}, f, indent=2)
+    if not result:
+        print('Failed weight inpainting: parts of the target have no match on the source', file=sys.stderr)
+        return 1
+    if args.output:
+        np.savez(args.output, W=weights.astype(np.float32), Matched=matched)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
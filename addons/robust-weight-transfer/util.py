@@ -30,15 +30,28 @@ def get_obj_arrs_world(object: bpy.types.Object):
     return world_vertices, indices, world_normals
 
 
+WEIGHT_IO_CHUNK_SIZE = 65536
+
+
+def iter_vertex_group_entries(mesh: bpy.types.Mesh, chunk_size=WEIGHT_IO_CHUNK_SIZE):
+    """Yields (vertex indices, group indices, weights) arrays of all vertex group assignments, one chunk of vertices at a time"""
+    vertices = mesh.vertices
+    for start in range(0, len(vertices), chunk_size):
+        chunk = vertices[start:start + chunk_size]
+        entries = [(i, g.group, g.weight) for i, v in enumerate(chunk, start) for g in v.groups]
+        if not entries: continue
+        entries = np.array(entries, dtype=np.float64)
+        yield entries[:, 0].astype(np.int64), entries[:, 1].astype(np.int64), entries[:, 2].astype(np.float32)
+
+
 def get_group_arr(obj: bpy.types.Object, group_name):
     mesh: bpy.types.Mesh = obj.data
     if not isinstance(mesh, bpy.types.Mesh): return
     group_index = obj.vertex_groups[group_name].index
     arr = np.zeros(len(mesh.vertices), dtype=np.float32)
-    for i, v in enumerate(mesh.vertices):
-        for g in v.groups:
-            if g.group == group_index:
-                arr[i] = g.weight
+    for vert_ind, group_ind, weights in iter_vertex_group_entries(mesh):
+        in_group = group_ind == group_index
+        arr[vert_ind[in_group]] = weights[in_group]
     return arr
 
 
@@ -47,16 +60,31 @@ def get_groups_arr(obj: bpy.types.Object, include_groups: list[bool]=None):
     if not isinstance(mesh, bpy.types.Mesh): return
 
     arr = np.zeros((len(mesh.vertices), len(obj.vertex_groups)), dtype=np.float32)
-    for i, v in enumerate(mesh.vertices):
-        current_vertex = arr[i]
-        for g in v.groups:
-            if include_groups and include_groups[g.group]:
-                current_vertex[g.group] = g.weight
-            elif not include_groups:
-                current_vertex[g.group] = g.weight
+    include = np.array(include_groups, dtype=bool) if include_groups else None
+    for vert_ind, group_ind, weights in iter_vertex_group_entries(mesh):
+        if include is not None:
+            keep = include[group_ind]
+            vert_ind, group_ind, weights = vert_ind[keep], group_ind[keep], weights[keep]
+        arr[vert_ind, group_ind] = weights
     return arr
 
 
+def set_group_weights(group: bpy.types.VertexGroup, weights, threshold=0, remove=True):
+    """Writes a weight column to a vertex group, with one add call per distinct weight value instead of one per vertex"""
+    add_ind = np.flatnonzero(weights >= threshold)
+    if add_ind.shape[0] > 0:
+        values = weights[add_ind]
+        order = np.argsort(values, kind='stable')
+        add_ind, values = add_ind[order], values[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(values)) + 1))
+        for ind, value in zip(np.split(add_ind, starts[1:]), values[starts]):
+            group.add(ind.tolist(), float(value), 'REPLACE')
+    if remove:
+        remove_ind = np.flatnonzero(weights < threshold)
+        if remove_ind.shape[0] > 0:
+            group.remove(remove_ind.tolist())
+
+
 def draw_debug_vertex_colors(obj, matched):
     mesh: bpy.types.Mesh = obj.data
     if not isinstance(mesh, bpy.types.Mesh): return
@@ -141,17 +169,6 @@ def get_mesh_adjacency_matrix_sparse(mesh: bpy.types.Mesh, include_self=False):
     return adjacency_matrix
     
     
-def get_mesh_adjacency_list(mesh: bpy.types.Mesh):
-    edge_data = np.empty((len(mesh.edges), 2), dtype=int)
-    mesh.edges.foreach_get("vertices", edge_data.reshape(-1))
-    num_verts = len(mesh.vertices)
-    adj_list = [[] for _ in range(num_verts)]
-    for edge in edge_data:
-        adj_list[edge[0]].append(edge[1])
-        adj_list[edge[1]].append(edge[0])
-    return adj_list
-
-
 def write_weights(obj, weights, names, threshold=0):
     groups = obj.vertex_groups
     for name, w in zip(names, weights.T):
@@ -164,12 +181,7 @@ def write_weights(obj, weights, names, threshold=0):
         if group.lock_weight:
             continue
             
-        for j, wv in enumerate(w):
-            if wv >= threshold:
-                group.add([j], wv, 'REPLACE')
-        if not created:
-            ind = np.where(w < threshold)[0].tolist()
-            group.remove(ind)
+        set_group_weights(group, w, threshold, remove=not created)
             
             
 def is_group_valid(vertex_groups, group_name):
@@ -1,10 +1,37 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import igl
 import numpy as np
 import scipy as sp
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 import robust_laplacian
 
+try:
+    from sksparse.cholmod import cholesky, CholmodError
+except ImportError:
+    cholesky = None
+
 
-def find_closest_point_on_surface(P, V, F):
+def build_surface_tree(V, F):
+    """
+    Build an AABB tree over the V,F mesh, so many closest point queries can share it
+
+    Args:
+        V: #V by 3 mesh vertices
+        F: #F by 3 mesh triangles indices
+    Returns:
+        tree: initialized igl.AABB, or None if this igl build does not expose it
+    """
+    if not hasattr(igl, 'AABB'):
+        return None
+    tree = igl.AABB()
+    tree.init(V.astype(np.float64), F.astype(np.int32))
+    return tree
+
+
+def find_closest_point_on_surface(P, V, F, tree=None):
     """
     Given a number of points find their closest points on the surface of the V,F mesh
 
@@ -12,6 +39,7 @@ def find_closest_point_on_surface(P, V, F):
         P: #P by 3, where every row is a point coordinate
         V: #V by 3 mesh vertices
         F: #F by 3 mesh triangles indices
+        tree: optional AABB tree of V,F from build_surface_tree
     Returns:
         sqrD #P smallest squared distances
         I #P primitive indices corresponding to smallest distances
@@ -19,7 +47,11 @@ def find_closest_point_on_surface(P, V, F):
         B #P by 3 of the barycentric coordinates of the closest point
     """
     
-    sqrD,I,C = igl.point_mesh_squared_distance(P, V, F)
+    if tree is not None:
+        sqrD,I,C = tree.squared_distance(V.astype(np.float64), F.astype(np.int32), P.astype(np.float64), return_index=True)
+        I = I.astype(np.int64)
+    else:
+        sqrD,I,C = igl.point_mesh_squared_distance(P, V, F)
 
     F_closest = F[I,:]
     V1 = V[F_closest[:,0],:]
@@ -64,7 +96,7 @@ def normalize_vec(v):
     return v/np.linalg.norm(v)
 
 
-def find_matches_closest_surface(source_verts, source_triangles, source_normals, target_verts, target_normals, source_weights, dDISTANCE_THRESHOLD_SQRD, dANGLE_THRESHOLD_DEGREES, flip_vertex_normal):
+def find_matches_closest_surface(source_verts, source_triangles, source_normals, target_verts, target_normals, source_weights, dDISTANCE_THRESHOLD_SQRD, dANGLE_THRESHOLD_DEGREES, flip_vertex_normal, source_tree=None):
     """
     For each vertex on the target mesh find a match on the source mesh.
 
@@ -81,12 +113,14 @@ def find_matches_closest_surface(source_verts, source_triangles, source_normals,
 
         dDISTANCE_THRESHOLD_SQRD: scalar distance threshold
         dANGLE_THRESHOLD_DEGREES: scalar normal threshold
+        
+        source_tree: optional AABB tree of the source mesh, reused across targets
 
     Returns:
         Matched: #V2 array of bools, where Matched[i] is True if we found a good match for vertex i on the source mesh
         W2: #V2 by num_bones, where W2[i,:] are skinning weights copied directly from source using closest point method
     """
-    sqrD,I,C,B = find_closest_point_on_surface(target_verts,source_verts,source_triangles)
+    sqrD,I,C,B = find_closest_point_on_surface(target_verts,source_verts,source_triangles,source_tree)
     
     # for each closest point on the source, interpolate its per-vertex attributes(skin weights and normals) 
     # using the barycentric coordinates
@@ -114,21 +148,27 @@ def find_matches_closest_surface(source_verts, source_triangles, source_normals,
     return Matched, W2
 
 
-def inpaint(V2, F2, W2, Matched, point_cloud):
+def inpaint_system(V2, F2, point_cloud, cache=None):
     """
-    Inpaint weights for all the vertices on the target mesh for which  we didnt 
-    find a good match on the source (i.e. Matched[i] == False).
+    Build the quadratic energy matrix used for weight inpainting
 
     Args:
         V2: #V2 by 3 target mesh vertices
         F2: #F2 by 3 target mesh triangles indices
-        W2: #V2 by num_bones, where W2[i,:] are skinning weights copied directly from source using closest point method
-        Matched: #V2 array of bools, where Matched[i] is True if we found a good match for vertex i on the source mesh
+        point_cloud: use the point cloud laplacian instead of the mesh laplacian
+        cache: optional TopologyCache, the energy matrix is stored per mesh
 
     Returns:
-        W_inpainted: #V2 by num_bones, final skinning weights where we inpainted weights for all vertices i where Matched[i] == False
+        Q2: #V2 by #V2 sparse energy matrix
     """
-    
+    if cache is not None:
+        key = cache.mesh_key(V2, F2, 'system', point_cloud)
+        system = cache.get_or_create(key, lambda: _build_inpaint_system(V2, F2, point_cloud))
+        return sp.sparse.csc_matrix(system['Q2'])
+    return _build_inpaint_system(V2, F2, point_cloud)['Q2']
+
+
+def _build_inpaint_system(V2, F2, point_cloud):
     if point_cloud:
         L, M = robust_laplacian.point_cloud_laplacian(V2)
     else:
@@ -138,18 +178,108 @@ def inpaint(V2, F2, W2, Matched, point_cloud):
     Minv = sp.sparse.diags(1 / M.diagonal()) # divide by zero?
 
     Q2 = -L + L*Minv*L
-    Q2 = Q2.astype(np.float64)
-
-    Aeq = sp.sparse.csc_matrix((0, 0), dtype=np.float64)
-    Beq = np.array([], dtype=np.float64)
-    B = np.zeros(shape = (L.shape[0], W2.shape[1]), dtype=np.float64)
-
-    b = np.array(range(0, int(V2.shape[0])), dtype=np.int64)
-    b = b[Matched]
-    bc = W2[Matched,:].astype(np.float64)
-    result, W_inpainted = igl.min_quad_with_fixed(Q2, B, b, bc, Aeq, Beq, True)
-    W_inpainted = W_inpainted.astype(np.float32)
-    return result, W_inpainted # TODO: Add results
+    # only the energy matrix is used, the laplacian and mass matrix are not cached
+    return {'Q2': sp.sparse.csc_matrix(Q2, dtype=np.float64)}
+
+
+def factorize(Q):
+    """
+    Factorize a sparse symmetric matrix once, so it can be solved for many right hand sides
+
+    Args:
+        Q: #N by #N sparse symmetric matrix
+
+    Returns:
+        solve: function mapping a #N by k right hand side to the #N by k solution, or None if Q is singular
+    """
+    if cholesky is not None:
+        try:
+            factor = cholesky(Q)
+        except CholmodError:
+            return None
+        return factor.solve_A
+    try:
+        lu = sp.sparse.linalg.splu(Q, permc_spec='MMD_AT_PLUS_A')
+    except RuntimeError: # exactly singular
+        return None
+    return lu.solve
+
+
+def solve_columns(solve, rhs, num_threads=None):
+    """
+    Solve a factorized system for every column of rhs, split over multiple threads
+
+    Args:
+        solve: function returned by factorize
+        rhs: #N by k dense right hand side
+        num_threads: amount of threads, defaults to the cpu count
+
+    Returns:
+        X: #N by k solution
+    """
+    num_threads = min(num_threads or os.cpu_count() or 1, rhs.shape[1])
+    if num_threads <= 1:
+        return solve(rhs)
+    chunks = np.array_split(np.arange(rhs.shape[1]), num_threads)
+    X = np.empty_like(rhs)
+    def solve_chunk(cols):
+        X[:, cols] = solve(np.ascontiguousarray(rhs[:, cols])).reshape(-1, cols.shape[0])
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(solve_chunk, chunks))
+    return X
+
+
+def inpaint(V2, F2, W2, Matched, point_cloud, num_threads=None, cache=None):
+    """
+    Inpaint weights for all the vertices on the target mesh for which  we didnt 
+    find a good match on the source (i.e. Matched[i] == False).
+
+    The free block of the energy is factorized once and only the bones with
+    non-zero weights on the matched vertices are solved for.
+
+    Args:
+        V2: #V2 by 3 target mesh vertices
+        F2: #F2 by 3 target mesh triangles indices
+        W2: #V2 by num_bones, where W2[i,:] are skinning weights copied directly from source using closest point method
+        Matched: #V2 array of bools, where Matched[i] is True if we found a good match for vertex i on the source mesh
+        point_cloud: use the point cloud laplacian instead of the mesh laplacian
+        num_threads: amount of threads the bone columns are solved on, defaults to the cpu count
+        cache: optional TopologyCache, reuses the energy and the factorization of unchanged meshes
+
+    Returns:
+        result: False if the system could not be solved
+        W_inpainted: #V2 by num_bones float32 sparse csc array, final skinning weights where we inpainted weights for all vertices i where Matched[i] == False
+    """
+    num_verts, num_bones = W2.shape
+    fixed = np.flatnonzero(Matched)
+    free = np.flatnonzero(~Matched)
+    bc = W2[fixed, :]
+    active = np.flatnonzero(np.any(bc != 0, axis=0))
+    if fixed.shape[0] == 0:
+        return False, None
+
+    W_active = np.zeros((num_verts, active.shape[0]), dtype=np.float32)
+    W_active[fixed] = bc[:, active]
+    if free.shape[0] > 0 and active.shape[0] > 0:
+        Q2 = inpaint_system(V2, F2, point_cloud, cache)
+        Q_free = Q2[free, :]
+        if cache is not None:
+            # factorizations can't be serialized, they are only kept in memory
+            key = cache.mesh_key(V2, F2, 'factor', point_cloud, cache.array_key(Matched))
+            solve = cache.get_or_create(key, lambda: {'solve': factorize(Q_free[:, free])}, persist=False)['solve']
+        else:
+            solve = factorize(Q_free[:, free])
+        if solve is None:
+            return False, None
+        rhs = -(Q_free[:, fixed] @ bc[:, active].astype(np.float64))
+        X = solve_columns(solve, np.asarray(rhs), num_threads)
+        if not np.all(np.isfinite(X)):
+            return False, None
+        W_active[free] = X
+
+    coo = sp.sparse.coo_array(W_active)
+    W_inpainted = sp.sparse.csc_array((coo.data, (coo.row, active[coo.col])), shape=(num_verts, num_bones), dtype=np.float32)
+    return True, W_inpainted
     
     
 def limit_mask(weights, adjacency_matrix, dilation_repeat=5):
@@ -174,37 +304,84 @@ def limit_mask(weights, adjacency_matrix, dilation_repeat=5):
     return erode_mask.toarray()
 
 
-def smooth_weigths(verts, weights, matched, adjacency_matrix, adjacency_list, num_smooth_iter_steps, smooth_alpha, distance_threshold):
-    not_matched = ~matched
-    VIDs_to_smooth = np.zeros(verts.shape[0], dtype=bool)
-
-    def get_points_within_distance(V, VID, distance=distance_threshold):
-        """
-        Get all neighbours of vertex VID within dDISTANCE_THRESHOLD
-        """
-        queue = []
-        queue.append(VID)
-        while len(queue) != 0:
-            vv = queue.pop()
-            if vv < len(adjacency_list):
-                neigh = adjacency_list[vv]
-                for nn in neigh:
-                    if ~VIDs_to_smooth[nn] and np.linalg.norm(V[VID,:]-V[nn]) < distance:
-                        VIDs_to_smooth[nn] = True
-                        if nn not in queue:
-                            queue.append(nn)
-
-    for i in range(verts.shape[0]):
-        if not_matched[i]:
-            get_points_within_distance(verts, i, distance_threshold)
-            
-    adj_mat = adjacency_matrix.astype(np.float32)
+def get_adjacency_matrix_sparse(F, num_verts, include_self=False):
+    """
+    Vertex adjacency of a triangle mesh, for use without a Blender mesh
+
+    Args:
+        F: #F by 3 mesh triangles indices
+        num_verts: amount of vertices
+        include_self: set the diagonal
+    Returns:
+        adjacency_matrix: #V by #V sparse csr array
+    """
+    edges = np.concatenate((F[:, [0, 1]], F[:, [1, 2]], F[:, [2, 0]]))
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    adjacency_matrix = sp.sparse.csr_array((np.ones(len(rows), dtype=int), (rows, cols)), shape=(num_verts, num_verts))
+    adjacency_matrix.data[:] = 1 # shared edges are summed up
+    if include_self:
+        adjacency_matrix.setdiag(1)
+    return adjacency_matrix
+
+
+def get_points_within_distance(verts, sources, adjacency_matrix, distance):
+    """
+    Get all vertices within a geodesic (edge path) distance of any of the source vertices
+
+    Args:
+        verts: #V by 3 mesh vertices
+        sources: #V array of bools, the vertices to grow the region from
+        adjacency_matrix: #V by #V sparse vertex adjacency matrix
+        distance: scalar distance threshold
+    Returns:
+        in_region: #V array of bools, True for vertices reachable within distance
+    """
+    in_region = np.zeros(verts.shape[0], dtype=bool)
+    source_ids = np.flatnonzero(sources)
+    if source_ids.shape[0] == 0:
+        return in_region
+
+    adj = sp.sparse.coo_array(adjacency_matrix)
+    off_diag = adj.row != adj.col
+    rows = adj.row[off_diag]
+    cols = adj.col[off_diag]
+    lengths = np.linalg.norm(verts[rows] - verts[cols], axis=1)
+    lengths = np.maximum(lengths, np.finfo(np.float32).tiny) # explicit zeros would drop the edge
+    graph = sp.sparse.csr_array((lengths, (rows, cols)), shape=adj.shape)
+
+    # one multi-source pass, the search stops expanding beyond the distance limit
+    dist = sp.sparse.csgraph.dijkstra(graph, directed=False, indices=source_ids, min_only=True, limit=distance)
+    in_region[dist < distance] = True
+    return in_region
+
+
+def smooth_weigths(verts, weights, matched, adjacency_matrix, num_smooth_iter_steps, smooth_alpha, distance_threshold):
+    """
+    Smooth the weights of the vertices within distance_threshold of the unmatched vertices
+
+    Args:
+        verts: #V by 3 mesh vertices
+        weights: #V by num_bones skin weights
+        matched: #V array of bools, where matched[i] is True if vertex i found a match on the source
+        adjacency_matrix: #V by #V sparse vertex adjacency matrix, including the diagonal
+        num_smooth_iter_steps: amount of smoothing iterations
+        smooth_alpha: smoothing factor per iteration
+        distance_threshold: geodesic distance around unmatched vertices that gets smoothed
+    Returns:
+        weights_smoothed: #V by num_bones smoothed skin weights
+    """
+    VIDs_to_smooth = get_points_within_distance(verts, ~matched, adjacency_matrix, distance_threshold)
+    weights_smoothed = np.array(weights, dtype=np.float32)
+    if not np.any(VIDs_to_smooth):
+        return weights_smoothed
+
+    adj_mat = sp.sparse.csr_array(adjacency_matrix, dtype=np.float32)
     degrees = adj_mat.sum(axis=1)
-    
-    smooth_mat = sp.sparse.diags(1/degrees) @ adj_mat
-    weights_smoothed = sp.sparse.csr_array(weights)
+    smooth_mat = sp.sparse.diags_array(1/degrees) @ adj_mat
+    # only the rows of the region change, the rest of the weights stay dense and untouched
+    region_mat = sp.sparse.csr_array(smooth_mat[VIDs_to_smooth])
     for _ in range(num_smooth_iter_steps):
-        weights_smoothed = (1 - smooth_alpha) * weights_smoothed + smooth_alpha * (smooth_mat @ weights_smoothed)
-        weights_smoothed[~VIDs_to_smooth] = weights[~VIDs_to_smooth]
-    return weights_smoothed.todense()
-            
+        region_avg = region_mat @ weights_smoothed
+        weights_smoothed[VIDs_to_smooth] = (1 - smooth_alpha) * weights_smoothed[VIDs_to_smooth] + smooth_alpha * region_avg
+    return weights_smoothed
@@ -35,10 +35,12 @@ import sys
 import os
 import time
 import platform
+import numpy as np
 from subprocess import PIPE, Popen
 from threading  import Thread
 from bpy.props import *
 from queue import Queue, Empty
+from . import exchange
 
 class SFC_OT_ModalTimerOperator(bpy.types.Operator):
     """Operator which runs its self from a timer"""
@@ -51,107 +53,118 @@ class SFC_OT_ModalTimerOperator(bpy.types.Operator):
     _queue = None
 
     _objs = []
-    _permulation = []
-    _selected_indices = []
+    _vertex_offsets = None
+    _selected_masks = []
     _selected_group_index_weights = []
 
     _start_time = None
 
     def write_bone_data(self, obj, filepath):
-        f = open(filepath, 'w', encoding='utf-8')
-
-        f.write("# surface heat diffuse bone export.\n")
-
         amt = obj.data
+        names = []
+        heads = []
+        tails = []
         bpy.ops.object.mode_set(mode='EDIT')
         for bone in amt.edit_bones:
             if bone.use_deform:
-                world_bone_head = obj.matrix_world @ bone.head
-                world_bone_tail = obj.matrix_world @ bone.tail
-                f.write("b,{},{:.6f},{:.6f},{:.6f},{:.6f},{:.6f},{:.6f}\n".format(
-                bone.name.replace(",", "\\;"), world_bone_head[0], world_bone_head[1], world_bone_head[2],
-                world_bone_tail[0], world_bone_tail[1], world_bone_tail[2]))
+                names.append(bone.name)
+                heads.append(obj.matrix_world @ bone.head)
+                tails.append(obj.matrix_world @ bone.tail)
         bpy.ops.object.mode_set(mode='OBJECT')
 
-        f.close()
+        exchange.write_bone_text(filepath, names, heads, tails)
 
     def write_mesh_data(self, objs, filepath):
-        f = open(filepath, 'w', encoding='utf-8')
-
-        f.write("# surface heat diffuse mesh export.\n")
-
+        meshes = []
         vertex_offset = 0
         for obj in objs:
-            for v in obj.data.vertices:
-                world_v_co = obj.matrix_world @ v.co
-                f.write("v,{:.6f},{:.6f},{:.6f}\n".format(world_v_co[0], world_v_co[1], world_v_co[2]))
-
-            for poly in obj.data.polygons:
-                f.write("f");
-                for loop_ind in poly.loop_indices:
-                    vert_ind = obj.data.loops[loop_ind].vertex_index
-                    f.write(",{}".format(vertex_offset + vert_ind))
-                f.write("\n")
-
-            vertex_offset += len(obj.data.vertices)
-
-        f.close()
+            mesh = obj.data
+            co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", co)
+            matrix = np.array(obj.matrix_world)
+            world_co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+            loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+            mesh.loops.foreach_get("vertex_index", loop_vertices)
+            loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+            mesh.polygons.foreach_get("loop_start", loop_start)
+            loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+            mesh.polygons.foreach_get("loop_total", loop_total)
+            # loops of each polygon, in polygon order
+            loop_index = np.repeat(loop_start - (np.cumsum(loop_total) - loop_total), loop_total) + np.arange(loop_total.sum())
+
+            meshes.append((world_co, loop_total, vertex_offset + loop_vertices[loop_index]))
+            vertex_offset += len(mesh.vertices)
+
+        exchange.write_mesh_text(filepath, meshes)
+
+    @staticmethod
+    def add_group_weights(group, vertices, weights):
+        """Add weights to a vertex group with one call per distinct weight"""
+        order = np.argsort(weights, kind='stable')
+        weights = weights[order]
+        vertices = vertices[order]
+        splits = np.flatnonzero(np.diff(weights)) + 1
+        for vert_inds, weight in zip(np.split(vertices, splits), weights[np.concatenate(([0], splits))].tolist()):
+            group.add(vert_inds.tolist(), weight, 'REPLACE')
 
     def read_weight_data(self, objs, filepath):
-        # make permulation for all vertices
-        vertex_offset = 0;
-        for obj in objs:
-            for index in range(len(obj.data.vertices)):
-                self._permulation.append((vertex_offset + index, index, obj))
-            vertex_offset += len(obj.data.vertices)
+        # global index of the first vertex of every mesh
+        counts = [len(obj.data.vertices) for obj in objs]
+        self._vertex_offsets = np.concatenate(([0], np.cumsum(counts)))
 
         if bpy.context.scene.surface_protect:
-            for index in range(len(objs)):
-                obj = objs[index]
-                # get selected vertex indices
-                self._selected_indices.append([i.index for i in obj.data.vertices if i.select])
-                self._selected_group_index_weights.append([])
+            for obj in objs:
+                # get selected vertices
+                selected = np.empty(len(obj.data.vertices), dtype=bool)
+                obj.data.vertices.foreach_get("select", selected)
+                self._selected_masks.append(selected)
+                group_index_weights = []
 
                 # push protected vertices weight
-                for vert_ind in self._selected_indices[index]:
+                for vert_ind in np.flatnonzero(selected).tolist():
                     for g in obj.data.vertices[vert_ind].groups:
-                        self._selected_group_index_weights[index].append((obj.vertex_groups[g.group].name, vert_ind, g.weight))
-
-        f = open(filepath, 'r', encoding='utf-8')
-
-        bones = []
-        for line in f:
-            if len(line) == 0:
-                continue
-            tokens = line.strip("\r\n").split(",")
-            if tokens[0] == "b":
-                group_name = tokens[1].replace("\\;", ",")
-                bones.append(group_name)
-                for obj in objs:
-                    #check for existing group with the same name
-                    if None != obj.vertex_groups.get(group_name):
-                        group = obj.vertex_groups[group_name]
-                        obj.vertex_groups.remove(group)
-                    obj.vertex_groups.new(name = group_name)
-            if tokens[0] == "w":
-                group_name = bones[int(tokens[2])]
-                index = int(tokens[1])
-                vert_ind = self._permulation[index][1]
-                weight = float(tokens[3])
-                obj = self._permulation[index][2]
-                # protect vertices weight
-                if bpy.context.scene.surface_protect and vert_ind in self._selected_indices[objs.index(obj)]:
-                    continue
-                obj.vertex_groups[group_name].add([vert_ind], weight, 'REPLACE')
-
-        f.close()
+                        group_index_weights.append((obj.vertex_groups[g.group].name, vert_ind, g.weight))
+                self._selected_group_index_weights.append(group_index_weights)
+
+        bones, weights = exchange.read_weight_text(filepath)
+
+        for obj in objs:
+            for group_name in bones:
+                #check for existing group with the same name
+                if None != obj.vertex_groups.get(group_name):
+                    group = obj.vertex_groups[group_name]
+                    obj.vertex_groups.remove(group)
+                obj.vertex_groups.new(name = group_name)
+
+        indices = np.asarray(weights['vertex'], dtype=np.int64)
+        obj_indices = np.searchsorted(self._vertex_offsets, indices, side='right') - 1
+        vert_inds = indices - self._vertex_offsets[obj_indices]
+        bone_indices = np.asarray(weights['bone'], dtype=np.int64)
+        values = np.asarray(weights['weight'], dtype=np.float32)
+
+        for index, obj in enumerate(objs):
+            mask = obj_indices == index
+            # protect vertices weight
+            if bpy.context.scene.surface_protect:
+                mask[mask] = ~self._selected_masks[index][vert_inds[mask]]
+            obj_verts = vert_inds[mask]
+            obj_bones = bone_indices[mask]
+            obj_values = values[mask]
+            for bone_index in np.unique(obj_bones).tolist():
+                in_group = obj_bones == bone_index
+                self.add_group_weights(obj.vertex_groups[bones[bone_index]], obj_verts[in_group], obj_values[in_group])
 
         if bpy.context.scene.surface_protect:
             for index in range(len(objs)):
                 obj = objs[index]
                 # pop protected vertices weight
+                protected = {}
                 for (group_name, vert_ind, weight) in self._selected_group_index_weights[index]:
-                    obj.vertex_groups[group_name].add([vert_ind], weight, 'REPLACE')
+                    protected.setdefault(group_name, []).append((vert_ind, weight))
+                for group_name, vert_weights in protected.items():
+                    vert_weights = np.array(vert_weights)
+                    self.add_group_weights(obj.vertex_groups[group_name], vert_weights[:, 0].astype(np.int64), vert_weights[:, 1])
 
     def modal(self, context, event):
         if event.type == 'ESC':
@@ -193,8 +206,8 @@ class SFC_OT_ModalTimerOperator(bpy.types.Operator):
             return {'CANCELLED'}
 
         self._objs = []
-        self._permulation = []
-        self._selected_indices = []
+        self._vertex_offsets = None
+        self._selected_masks = []
         self._selected_group_index_weights = []
 
         arm = None
@@ -282,8 +295,8 @@ class SFC_OT_ModalTimerOperator(bpy.types.Operator):
         # remove timer
         context.window_manager.event_timer_remove(self._timer)
         self._objs = []
-        self._permulation = []
-        self._selected_indices = []
+        self._vertex_offsets = None
+        self._selected_masks = []
         self._selected_group_index_weights = []
         return {'CANCELLED'}
 
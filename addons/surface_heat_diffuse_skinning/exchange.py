@@ -0,0 +1,99 @@
+# ***** BEGIN GPL LICENSE BLOCK *****
+#
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ***** END GPL LICENCE BLOCK *****
+
+"""
+Array based mesh, bone and weight exchange with the solver.
+
+Text format (read by the bundled solver):
+    mesh:    v,x,y,z and f,i,j,k,... lines, one block of each per mesh, global vertex indices
+    bone:    b,name,head x,y,z,tail x,y,z lines, commas in names escaped as \\;
+    weight:  b,name lines followed by w,vertex,bone,weight lines
+"""
+
+import numpy as np
+
+WEIGHT_DTYPE = np.dtype([('vertex', '<i4'), ('bone', '<i4'), ('weight', '<f4')])
+
+
+def _format_rows(fmt, rows):
+    if len(rows) == 0:
+        return ""
+    return (fmt * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def _format_faces(face_sizes, face_vertices):
+    # one format string per run of faces with the same number of vertices
+    chunks = []
+    starts = np.concatenate(([0], np.cumsum(face_sizes)))
+    breaks = np.flatnonzero(np.diff(face_sizes)) + 1
+    runs = np.concatenate(([0], breaks, [len(face_sizes)]))
+    for begin, end in zip(runs[:-1], runs[1:]):
+        if begin == end:
+            continue
+        size = int(face_sizes[begin])
+        rows = face_vertices[starts[begin]:starts[end]].reshape(-1, size)
+        chunks.append(_format_rows("f" + ",%d" * size + "\n", rows))
+    return "".join(chunks)
+
+
+def write_mesh_text(filepath, meshes):
+    """
+    Write meshes in the text format.
+
+    Args:
+        meshes: sequence of (vertices (n, 3), face sizes, face vertices with global indices)
+    """
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("# surface heat diffuse mesh export.\n")
+        for vertices, face_sizes, face_vertices in meshes:
+            f.write(_format_rows("v,%.6f,%.6f,%.6f\n", vertices))
+            f.write(_format_faces(face_sizes, face_vertices))
+
+
+def write_bone_text(filepath, names, heads, tails):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("# surface heat diffuse bone export.\n")
+        for name, head, tail in zip(names, heads, tails):
+            f.write("b,{},{:.6f},{:.6f},{:.6f},{:.6f},{:.6f},{:.6f}\n".format(
+            name.replace(",", "\\;"), head[0], head[1], head[2], tail[0], tail[1], tail[2]))
+
+
+def read_weight_text(filepath):
+    """
+    Read weights in the text format.
+
+    Returns:
+        bones: bone names, in the order of the b lines
+        weights: WEIGHT_DTYPE records
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    bones = []
+    rows = []
+    for line in data.splitlines():
+        if line.startswith(b"w,"):
+            rows.append(line[2:])
+        elif line.startswith(b"b,"):
+            bones.append(line.split(b",")[1].decode('utf-8').replace("\\;", ","))
+    values = np.fromstring(b" ".join(rows).replace(b",", b" ").decode(), sep=" ", dtype=np.float64).reshape(-1, 3)
+    weights = np.empty(len(values), dtype=WEIGHT_DTYPE)
+    weights['vertex'] = values[:, 0]
+    weights['bone'] = values[:, 1]
+    weights['weight'] = values[:, 2]
+    return bones, weights
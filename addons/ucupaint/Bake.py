@@ -1209,13 +1209,32 @@ class YBakeChannels(bpy.types.Operator):
         # Prepare bake settings
         prepare_bake_settings(book, objs, yp, self.samples, margin, self.uv_map, disable_problematic_modifiers=True, bake_device=self.bake_device)
 
-        # Bake channels
+        # Get channels to bake
+        root_chs = []
         for ch in yp.channels:
             ch.no_layer_using = not is_any_layer_using_channel(ch, node)
             if not ch.no_layer_using:
                 #if ch.type != 'NORMAL': continue
-                use_hdr = not ch.use_clamp
-                bake_channel(self.uv_map, mat, node, ch, width, height, use_hdr=use_hdr)
+                root_chs.append(ch)
+
+        # Tile numbers are the same for all channels
+        tilenums = UDIM.get_tile_numbers(get_all_objects_with_same_materials(mat), self.uv_map)
+
+        # Bake single value images of several channels at once
+        tt = time.time()
+        packs = get_bake_channel_packs(node, root_chs, tilenums)
+        packed = bake_channel_packs(mat, node, packs, width, height)
+        if packs:
+            print('INFO:', len(packed), 'images are baked with', len(packs), 'packed bakes at', '{:0.2f}'.format(time.time() - tt), 'seconds!')
+
+        # Bake channels
+        for ch in root_chs:
+            tt = time.time()
+            use_hdr = not ch.use_clamp
+            bake_channel(self.uv_map, mat, node, ch, width, height, use_hdr=use_hdr, tilenums=tilenums, packed=packed)
+            print('INFO:', ch.name, 'channel is baked at', '{:0.2f}'.format(time.time() - tt), 'seconds!')
+
+        remove_channel_packs(packed)
 
         # AA process
         if self.aa_level > 1:
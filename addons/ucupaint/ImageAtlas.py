@@ -4,45 +4,150 @@ from .common import *
 from .subtree import *
 from . import BakeInfo, UDIM
 
+def get_segment_rects(atlas):
+    # Pixel rectangles (start x, start y, width, height) of all segments, read at once
+    rects = numpy.empty((4, len(atlas.segments)), dtype=numpy.int32)
+    for i, prop in enumerate(['tile_x', 'tile_y', 'width', 'height']):
+        atlas.segments.foreach_get(prop, rects[i])
+
+    rects[0] *= rects[2]
+    rects[1] *= rects[3]
+
+    return rects
+
+def get_tile_occupancy(width, height, atlas, rects=None):
+    # Occupancy grid of the tiles of a segment size, tile is occupied if any segment overlaps it
+    atlas_img = atlas.id_data
+
+    num_x = int(atlas_img.size[0] / width)
+    num_y = int(atlas_img.size[1] / height)
+
+    occupied = numpy.zeros((num_y, num_x), dtype=bool)
+
+    if rects is None:
+        rects = get_segment_rects(atlas)
+
+    start_x, start_y, seg_width, seg_height = rects
+    first_x = start_x // width
+    first_y = start_y // height
+    last_x = (start_x + seg_width - 1) // width
+    last_y = (start_y + seg_height - 1) // height
+
+    for fx, fy, lx, ly in zip(first_x.tolist(), first_y.tolist(), last_x.tolist(), last_y.tolist()):
+        occupied[fy:ly+1, fx:lx+1] = True
+
+    return occupied
+
 def is_tile_available(x, y, width, height, atlas):
+    occupied = get_tile_occupancy(width, height, atlas)
+    return y < occupied.shape[0] and x < occupied.shape[1] and not occupied[y, x]
 
-    start_x = width * x
-    end_x = start_x + width - 1
+tile_orders = {}
 
-    start_y = height * y
-    end_y = start_y + height - 1
+def get_tile_order(num_x, num_y):
+    # Tile indices in Z-order, so segments of the same size fill square blocks
+    # and leave free space for bigger segments
+    order = tile_orders.get((num_x, num_y))
+    if order is not None: return order
 
-    for segment in atlas.segments:
+    y, x = numpy.mgrid[0:num_y, 0:num_x]
+    codes = numpy.zeros((num_y, num_x), dtype=numpy.int64)
+    for bit in range(max(num_x, num_y).bit_length()):
+        codes |= ((x >> bit) & 1) << (2 * bit)
+        codes |= ((y >> bit) & 1) << (2 * bit + 1)
 
-        segment_start_x = segment.width * segment.tile_x
-        segment_end_x = segment_start_x + segment.width - 1
+    order = numpy.argsort(codes, axis=None, kind='stable')
+    tile_orders[(num_x, num_y)] = order
 
-        segment_start_y = segment.height * segment.tile_y
-        segment_end_y = segment_start_y + segment.height - 1
+    return order
 
-        if (
-            ((start_x >= segment_start_x and start_x <= segment_end_x) or 
-            (end_x <= segment_end_x and end_x >= segment_start_x)) 
-            and
-            ((start_y >= segment_start_y and start_y <= segment_end_y) or 
-            (end_y <= segment_end_y and end_y >= segment_start_y)) 
-            ):
-            return False
+def get_available_tile(width, height, atlas, rects=None):
+    occupied = get_tile_occupancy(width, height, atlas, rects)
+    if occupied.size == 0: return []
 
-    return True
+    # First available tile
+    order = get_tile_order(occupied.shape[1], occupied.shape[0])
+    free = ~occupied.ravel()[order]
+    index = int(free.argmax())
+    if not free[index]: return []
+
+    y, x = divmod(int(order[index]), occupied.shape[1])
+
+    return [x, y]
 
-def get_available_tile(width, height, atlas):
+def get_image_atlas_color(atlas):
+    if atlas.color == 'BLACK':
+        return (0.0, 0.0, 0.0, 1.0)
+    elif atlas.color == 'WHITE':
+        return (1.0, 1.0, 1.0, 1.0)
+    return (0.0, 0.0, 0.0, 0.0)
+
+def is_image_atlas_fragmented(width, height, atlas):
+    # Enough free space for the segment but no tile available for it
     atlas_img = atlas.id_data
+    rects = get_segment_rects(atlas)
+    used_area = int((rects[2].astype(numpy.int64) * rects[3]).sum())
+    free_area = atlas_img.size[0] * atlas_img.size[1] - used_area
 
-    num_x = int(atlas_img.size[0] / width)
-    num_y = int(atlas_img.size[1] / height)
+    return free_area >= width * height and not get_available_tile(width, height, atlas, rects)
+
+def defragment_image_atlas(atlas):
+    # Pack the segments again from the largest ones, return False if they can't all fit
+    if not is_greater_than_283(): return False
+
+    atlas_img = atlas.id_data
+    segments = sorted(atlas.segments, key=lambda s: (s.width * s.height, s.height, s.width), reverse=True)
+
+    # New tile of every segment
+    rects = numpy.empty((4, 0), dtype=numpy.int32)
+    tiles = []
+    for segment in segments:
+        tile = get_available_tile(segment.width, segment.height, atlas, rects)
+        if not tile: return False
+        tiles.append(tile)
+        rect = numpy.array([[tile[0] * segment.width], [tile[1] * segment.height], [segment.width], [segment.height]], dtype=numpy.int32)
+        rects = numpy.concatenate((rects, rect), axis=1)
+
+    moved = {}
+    for segment, tile in zip(segments, tiles):
+        if [segment.tile_x, segment.tile_y] != tile:
+            moved[segment.name] = (segment, tile)
+
+    if not moved: return True
+
+    # Move pixels
+    with image_pixels_batch() as batch:
+        pxs = batch.get_pixels(atlas_img)
+        old_pxs = pxs.copy()
+        pxs[:] = get_image_atlas_color(atlas)
+
+        for segment, tile in zip(segments, tiles):
+            w = segment.width
+            h = segment.height
+            x = segment.tile_x * w
+            y = segment.tile_y * h
+            pxs[tile[1]*h:tile[1]*h+h, tile[0]*w:tile[0]*w+w] = old_pxs[y:y+h, x:x+w]
+
+        batch.set_dirty(atlas_img)
+        del old_pxs
+
+    for segment, tile in moved.values():
+        segment.tile_x = tile[0]
+        segment.tile_y = tile[1]
 
-    for y in range(num_y):
-        for x in range(num_x):
-            if is_tile_available(x, y, width, height, atlas):
-                return [x, y]
+    # Update mapping of layers and masks using moved segments
+    for ng in bpy.data.node_groups:
+        if not hasattr(ng, 'yp') or not ng.yp.is_ypaint_node: continue
+        for layer in ng.yp.layers:
+            entities = [m for m in layer.masks if m.type == 'IMAGE']
+            if layer.type == 'IMAGE': entities.append(layer)
+            for entity in entities:
+                if entity.segment_name not in moved: continue
+                source = get_entity_source(entity)
+                if source and source.image == atlas_img:
+                    update_mapping(entity)
 
-    return []
+    return True
 
 def create_image_atlas(color='BLACK', size=8192, hdr=False, name=''):
 
@@ -93,23 +198,17 @@ def create_image_atlas_segment(atlas, width, height):
 
 def clear_segment(segment):
     img = segment.id_data
-    atlas = img.yia
-
-    if atlas.color == 'BLACK':
-        col = (0.0, 0.0, 0.0, 1.0)
-    elif atlas.color == 'WHITE':
-        col = (1.0, 1.0, 1.0, 1.0)
-    else:
-        col = (0.0, 0.0, 0.0, 0.0)
+    col = get_image_atlas_color(img.yia)
 
     set_image_pixels(img, col, segment)
 
 def clear_unused_segments(atlas):
 
-    # Recolor unused segments
-    for segment in atlas.segments:
-        if segment.unused:
-            clear_segment(segment)
+    # Recolor unused segments, the atlas pixels are written only once
+    with image_pixels_batch():
+        for segment in atlas.segments:
+            if segment.unused:
+                clear_segment(segment)
 
     # Remove unused segments
     for i, segment in reversed(list(enumerate(atlas.segments))):
@@ -153,6 +252,11 @@ def get_set_image_atlas_segment(width, height, color='BLACK', hdr=False, img_fro
         #if img.yia.is_image_atlas and img.yia.color == color and img.yia.float_buffer == hdr:
         if img.yia.is_image_atlas and img.yia.color == color and img.is_float == hdr:
             segment = create_image_atlas_segment(img.yia, width, height)
+
+            # Pack the segments again if they are too scattered for a new one
+            if not segment and is_image_atlas_fragmented(width, height, img.yia) and defragment_image_atlas(img.yia):
+                segment = create_image_atlas_segment(img.yia, width, height)
+
             if segment: 
                 #return segment
                 break
@@ -508,68 +612,71 @@ class YConvertToImageAtlas(bpy.types.Operator):
             entities = [[context.entity]]
             segment_names = [context.entity.segment_name]
 
-        for i, image in enumerate(images):
-            if image.yia.is_image_atlas or image.yua.is_udim_atlas: continue
-            #if image.source == 'TILED': continue # UDIM Atlas is not supported yet
-
-            used_by_masks = False
-            valid_entities = []
-            for entity in entities[i]:
-
-                # Mask will use different type of image atlas
-                m = re.match(r'^yp\.layers\[(\d+)\]\.masks\[(\d+)\]$', entity.path_from_id())
-                if m: used_by_masks = True
-
-                # Transformed mapping on entity is not valid for conversion
-                mapping = get_entity_mapping(entity)
-                if not is_transformed(mapping):
-                    valid_entities.append(entity)
-
-            if not any(valid_entities):
-                continue
-
-            # Image used by masks will use black image atlas instead of transparent so it will use linear color by default
-            color = 'BLACK' if used_by_masks else 'TRANSPARENT'
-            colorspace = 'Non-Color' if used_by_masks else 'sRGB'
-
-            # Get segment
-            if image.source == 'TILED':
-                objs = get_all_objects_with_same_materials(mat, True, valid_entities[0].uv_name)
-                tilenums = UDIM.get_tile_numbers(objs, valid_entities[0].uv_name)
-                new_segment = UDIM.get_set_udim_atlas_segment(tilenums, color=image.yui.base_color, colorspace=colorspace, hdr=image.is_float, yp=yp, source_image=image)
-                ia_image = new_segment.id_data
-            else:
-                new_segment = get_set_image_atlas_segment(image.size[0], image.size[1], color, hdr=image.is_float)
-
-                # Copy image to segment
-                ia_image = new_segment.id_data
-                copy_image_pixels(image, ia_image, new_segment)
-
-            # Copy bake info
-            if image.y_bake_info.is_baked:
-                copy_id_props(image.y_bake_info, new_segment.bake_info)
-                new_segment.bake_info.use_image_atlas = True
-
-            for entity in valid_entities:
-                # Set image atlas to entity
-                source = get_entity_source(entity)
-                source.image = ia_image
-
-                # Set segment name
-                entity.segment_name = new_segment.name
-
-                # Set image to editor
-                if entity == context.entity:
-                    update_image_editor_image(bpy.context, ia_image)
-                    context.scene.tool_settings.image_paint.canvas = ia_image
-
-                # Update mapping
-                update_mapping(entity)
-                set_uv_neighbor_resolution(entity)
-
-            # Remove image if no one using it
-            if image.users == 0:
-                bpy.data.images.remove(image)
+        # Segments of the same image atlas are written at once after the loop
+        with image_pixels_batch() as batch:
+            for i, image in enumerate(images):
+                if image.yia.is_image_atlas or image.yua.is_udim_atlas: continue
+                #if image.source == 'TILED': continue # UDIM Atlas is not supported yet
+
+                used_by_masks = False
+                valid_entities = []
+                for entity in entities[i]:
+
+                    # Mask will use different type of image atlas
+                    m = re.match(r'^yp\.layers\[(\d+)\]\.masks\[(\d+)\]$', entity.path_from_id())
+                    if m: used_by_masks = True
+
+                    # Transformed mapping on entity is not valid for conversion
+                    mapping = get_entity_mapping(entity)
+                    if not is_transformed(mapping):
+                        valid_entities.append(entity)
+
+                if not any(valid_entities):
+                    continue
+
+                # Image used by masks will use black image atlas instead of transparent so it will use linear color by default
+                color = 'BLACK' if used_by_masks else 'TRANSPARENT'
+                colorspace = 'Non-Color' if used_by_masks else 'sRGB'
+
+                # Get segment
+                if image.source == 'TILED':
+                    objs = get_all_objects_with_same_materials(mat, True, valid_entities[0].uv_name)
+                    tilenums = UDIM.get_tile_numbers(objs, valid_entities[0].uv_name)
+                    new_segment = UDIM.get_set_udim_atlas_segment(tilenums, color=image.yui.base_color, colorspace=colorspace, hdr=image.is_float, yp=yp, source_image=image)
+                    ia_image = new_segment.id_data
+                else:
+                    new_segment = get_set_image_atlas_segment(image.size[0], image.size[1], color, hdr=image.is_float)
+
+                    # Copy image to segment
+                    ia_image = new_segment.id_data
+                    copy_image_pixels(image, ia_image, new_segment)
+                    batch.release(image)
+
+                # Copy bake info
+                if image.y_bake_info.is_baked:
+                    copy_id_props(image.y_bake_info, new_segment.bake_info)
+                    new_segment.bake_info.use_image_atlas = True
+
+                for entity in valid_entities:
+                    # Set image atlas to entity
+                    source = get_entity_source(entity)
+                    source.image = ia_image
+
+                    # Set segment name
+                    entity.segment_name = new_segment.name
+
+                    # Set image to editor
+                    if entity == context.entity:
+                        update_image_editor_image(bpy.context, ia_image)
+                        context.scene.tool_settings.image_paint.canvas = ia_image
+
+                    # Update mapping
+                    update_mapping(entity)
+                    set_uv_neighbor_resolution(entity)
+
+                # Remove image if no one using it
+                if image.users == 0:
+                    bpy.data.images.remove(image)
 
         # Refresh linear nodes
         check_yp_linear_nodes(yp)
@@ -609,76 +716,81 @@ class YConvertToStandardImage(bpy.types.Operator):
 
         image_atlases = []
 
-        for i, image in enumerate(images):
-            if not image.yia.is_image_atlas and not image.yua.is_udim_atlas: continue
-
-            if image.yia.is_image_atlas:
-                segment = image.yia.segments.get(segment_names[i])
-            else: segment = image.yua.segments.get(segment_names[i])
-
-            if not segment: continue
-
-            # Create new image based on image atlas
-            if image.yia.is_image_atlas:
-                new_image = bpy.data.images.new(name=entities[i][0].name,
-                        width=segment.width, height=segment.height, alpha=True, float_buffer=image.is_float)
-            else:
-                new_image = bpy.data.images.new(name=entities[i][0].name,
-                        width=image.size[0], height=image.size[1], alpha=True, float_buffer=image.is_float, tiled=True)
-
-                atlas_tilenums = UDIM.get_udim_segment_tilenums(segment)
-                index = UDIM.get_udim_segment_index(image, segment)
-                offset = get_udim_segment_mapping_offset(segment) * 10
-                copy_dict = {}
-                tilenums = []
-                for atilenum in atlas_tilenums:
-                    atile = image.tiles.get(atilenum)
-                    tilenum = atilenum - offset
-                    tilenums.append(tilenum)
-                    copy_dict[atilenum] = tilenum
-                    UDIM.fill_tile(new_image, tilenum, image.yui.base_color, atile.size[0], atile.size[1])
-
-                UDIM.initial_pack_udim(new_image)
-
-            new_image.colorspace_settings.name = image.colorspace_settings.name
-
-            # Copy the pixels
-            if image.yia.is_image_atlas:
-                copy_image_pixels(image, new_image, None, segment)
-            else:
-                UDIM.copy_tiles(image, new_image, copy_dict)
-
-                # Pack image
-                UDIM.initial_pack_udim(new_image)
-
-            # Copy bake info
-            if segment.bake_info.is_baked:
-                copy_id_props(segment.bake_info, new_image.y_bake_info)
-                new_image.y_bake_info.use_image_atlas = False
-
-            if image.yia.is_image_atlas:
-                # Mark unused to the segment
-                segment.unused = True
-            else:
-                UDIM.remove_udim_atlas_segment_by_name(image, segment.name, yp)
-
-            for entity in entities[i]:
-                # Set new image to entity
-                source = get_entity_source(entity)
-                source.image = new_image
-                clear_mapping(entity)
-                entity.segment_name = ''
-
-                # Set image to editor
-                if entity == context.entity:
-                    update_image_editor_image(bpy.context, new_image)
-                    context.scene.tool_settings.image_paint.canvas = new_image
-
-                # Set UV Neighbor resolution
-                set_uv_neighbor_resolution(entity)
-
-            if image not in image_atlases:
-                image_atlases.append(image)
+        # Image atlases are only read once for all converted segments
+        with image_pixels_batch() as batch:
+            for i, image in enumerate(images):
+                if not image.yia.is_image_atlas and not image.yua.is_udim_atlas: continue
+
+                if image.yia.is_image_atlas:
+                    segment = image.yia.segments.get(segment_names[i])
+                else: segment = image.yua.segments.get(segment_names[i])
+
+                if not segment: continue
+
+                # Create new image based on image atlas
+                if image.yia.is_image_atlas:
+                    new_image = bpy.data.images.new(name=entities[i][0].name,
+                            width=segment.width, height=segment.height, alpha=True, float_buffer=image.is_float)
+                else:
+                    new_image = bpy.data.images.new(name=entities[i][0].name,
+                            width=image.size[0], height=image.size[1], alpha=True, float_buffer=image.is_float, tiled=True)
+
+                    atlas_tilenums = UDIM.get_udim_segment_tilenums(segment)
+                    index = UDIM.get_udim_segment_index(image, segment)
+                    offset = get_udim_segment_mapping_offset(segment) * 10
+                    copy_dict = {}
+                    tilenums = []
+                    for atilenum in atlas_tilenums:
+                        atile = image.tiles.get(atilenum)
+                        tilenum = atilenum - offset
+                        tilenums.append(tilenum)
+                        copy_dict[atilenum] = tilenum
+                        UDIM.fill_tile(new_image, tilenum, image.yui.base_color, atile.size[0], atile.size[1])
+
+                    UDIM.initial_pack_udim(new_image)
+
+                new_image.colorspace_settings.name = image.colorspace_settings.name
+
+                # Copy the pixels
+                if image.yia.is_image_atlas:
+                    copy_image_pixels(image, new_image, None, segment)
+
+                    # Only the atlas pixels are needed for the next segments
+                    batch.release(new_image)
+                else:
+                    UDIM.copy_tiles(image, new_image, copy_dict)
+
+                    # Pack image
+                    UDIM.initial_pack_udim(new_image)
+
+                # Copy bake info
+                if segment.bake_info.is_baked:
+                    copy_id_props(segment.bake_info, new_image.y_bake_info)
+                    new_image.y_bake_info.use_image_atlas = False
+
+                if image.yia.is_image_atlas:
+                    # Mark unused to the segment
+                    segment.unused = True
+                else:
+                    UDIM.remove_udim_atlas_segment_by_name(image, segment.name, yp)
+
+                for entity in entities[i]:
+                    # Set new image to entity
+                    source = get_entity_source(entity)
+                    source.image = new_image
+                    clear_mapping(entity)
+                    entity.segment_name = ''
+
+                    # Set image to editor
+                    if entity == context.entity:
+                        update_image_editor_image(bpy.context, new_image)
+                        context.scene.tool_settings.image_paint.canvas = new_image
+
+                    # Set UV Neighbor resolution
+                    set_uv_neighbor_resolution(entity)
+
+                if image not in image_atlases:
+                    image_atlases.append(image)
 
         # Remove unused image atlas
         for ia_image in image_atlases:
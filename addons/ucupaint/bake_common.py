@@ -1036,7 +1036,105 @@ def get_valid_filepath(img, use_hdr):
 
     return img.filepath
 
-def bake_channel(uv_map, mat, node, root_ch, width=1024, height=1024, target_layer=None, use_hdr=False, aa_level=1):
+def get_bake_channel_packs(node, root_chs, tilenums):
+    # Single value bakes (value channels and alphas) with the same image settings can be baked at once,
+    # each one in a color channel of the same image
+    if len(tilenums) > 1 or not is_greater_than_283(): return []
+
+    groups = {}
+    for root_ch in root_chs:
+        use_hdr = not root_ch.use_clamp
+
+        if root_ch.type == 'VALUE':
+            colorspace = 'Non-Color' if root_ch.colorspace == 'LINEAR' or use_hdr else 'sRGB'
+            groups.setdefault((colorspace, use_hdr), []).append((root_ch.name, 'MAIN'))
+
+        if root_ch.enable_alpha:
+            use_float = use_hdr and root_ch.type != 'NORMAL'
+            groups.setdefault(('Non-Color', use_float), []).append((root_ch.name, 'ALPHA'))
+
+    packs = []
+    for (colorspace, use_float), passes in groups.items():
+        for i in range(0, len(passes), 3):
+            # No need to pack a single bake
+            if len(passes[i:i+3]) > 1:
+                packs.append((colorspace, use_float, passes[i:i+3]))
+
+    return packs
+
+def bake_channel_packs(mat, node, packs, width=1024, height=1024):
+    # Returns dictionary of (channel name, 'MAIN' or 'ALPHA') to (packed image, color index)
+    packed = {}
+    if not packs: return packed
+
+    tex = mat.node_tree.nodes.new('ShaderNodeTexImage')
+    emit = mat.node_tree.nodes.new('ShaderNodeEmission')
+    combine = mat.node_tree.nodes.new('ShaderNodeCombineColor' if is_greater_than_330() else 'ShaderNodeCombineRGB')
+
+    mat.node_tree.nodes.active = tex
+
+    output = get_active_mat_output_node(mat.node_tree)
+    ori_bsdf = output.inputs[0].links[0].from_socket
+
+    mat.node_tree.links.new(emit.outputs[0], output.inputs[0])
+    mat.node_tree.links.new(combine.outputs[0], emit.inputs[0])
+
+    for colorspace, use_float, passes in packs:
+
+        img = bpy.data.images.new(name='__TEMP_PACKED_BAKE_', width=width, height=height, alpha=True, float_buffer=use_float)
+        img.generated_color = (0.0, 0.0, 0.0, 0.0)
+        img.colorspace_settings.name = colorspace
+        tex.image = img
+
+        for inp in combine.inputs:
+            for l in inp.links:
+                mat.node_tree.links.remove(l)
+
+        for i, (ch_name, pass_type) in enumerate(passes):
+            if pass_type == 'ALPHA':
+                soc = node.outputs[ch_name + io_suffix['ALPHA']]
+            else: soc = node.outputs[ch_name]
+            mat.node_tree.links.new(soc, combine.inputs[i])
+            packed[(ch_name, pass_type)] = (img, i)
+
+        # Bake!
+        print('BAKE CHANNEL: Baking ' + ', '.join([n + (' alpha' if t == 'ALPHA' else '') for n, t in passes]) + ' at once...')
+        bpy.ops.object.bake()
+
+    simple_remove_node(mat.node_tree, tex)
+    simple_remove_node(mat.node_tree, emit)
+    simple_remove_node(mat.node_tree, combine)
+
+    # Recover original bsdf
+    mat.node_tree.links.new(ori_bsdf, output.inputs[0])
+
+    return packed
+
+def remove_channel_packs(packed):
+    for img in set([p[0] for p in packed.values()]):
+        bpy.data.images.remove(img)
+
+def copy_packed_bake_pixels(src, dest, src_idx, dest_idxs, set_alpha=False, uncovered_alpha_from_red=False):
+    # Only pixels covered by the bake have alpha on the packed image
+    with image_pixels_batch() as batch:
+        src_pxs = batch.get_pixels(src)
+        dest_pxs = batch.get_pixels(dest)
+
+        covered = src_pxs[::, ::, 3] > 0.0
+        values = src_pxs[::, ::, src_idx][covered]
+        for idx in dest_idxs:
+            dest_pxs[::, ::, idx][covered] = values
+        if set_alpha:
+            dest_pxs[::, ::, 3][covered] = 1.0
+        if uncovered_alpha_from_red:
+            # Unpacked alpha bake uses a copy of the destination image,
+            # so pixels outside the bake get the red channel as alpha
+            uncovered = ~covered
+            dest_pxs[::, ::, 3][uncovered] = dest_pxs[::, ::, 0][uncovered]
+
+        batch.set_dirty(dest)
+
+def bake_channel(uv_map, mat, node, root_ch, width=1024, height=1024, target_layer=None, use_hdr=False, aa_level=1, tilenums=None, packed=None):
 
     print('BAKE CHANNEL: Baking', root_ch.name + ' channel...')
 
@@ -1044,8 +1142,11 @@ def bake_channel(uv_map, mat, node, root_ch, width=1024, height=1024, target_lay
     yp = tree.yp
 
     # Check if udim image is needed based on number of tiles
-    objs = get_all_objects_with_same_materials(mat)
-    tilenums = UDIM.get_tile_numbers(objs, uv_map)
+    if tilenums == None:
+        objs = get_all_objects_with_same_materials(mat)
+        tilenums = UDIM.get_tile_numbers(objs, uv_map)
+
+    if packed == None: packed = {}
 
     # Check if temp bake is necessary
     #temp_baked = []
@@ -1232,8 +1333,14 @@ def bake_channel(uv_map, mat, node, root_ch, width=1024, height=1024, target_lay
             img.colorspace_settings.name = 'Non-Color'
         else: img.colorspace_settings.name = 'sRGB'
 
+    # Use packed bake result
+    if (root_ch.name, 'MAIN') in packed:
+        print('BAKE CHANNEL: Using packed bake for main image of ' + root_ch.name + ' channel...')
+        pack_img, pack_idx = packed[(root_ch.name, 'MAIN')]
+        copy_packed_bake_pixels(pack_img, img, pack_idx, [0, 1, 2], set_alpha=True)
+
     # Bake main image
-    if (
+    elif (
         (target_layer and (root_ch.type != 'NORMAL' or ch.normal_map_type == 'NORMAL_MAP')) or
         (not target_layer)
         ):
@@ -1404,7 +1511,12 @@ def bake_channel(uv_map, mat, node, root_ch, width=1024, height=1024, target_lay
 
     # Bake alpha
     #if root_ch.type != 'NORMAL' and root_ch.enable_alpha:
-    if root_ch.enable_alpha:
+    if root_ch.enable_alpha and (root_ch.name, 'ALPHA') in packed:
+        print('BAKE CHANNEL: Using packed bake for alpha of ' + root_ch.name + ' channel...')
+        pack_img, pack_idx = packed[(root_ch.name, 'ALPHA')]
+        copy_packed_bake_pixels(pack_img, img, pack_idx, [3], uncovered_alpha_from_red=True)
+
+    elif root_ch.enable_alpha:
 
         # Create temp image
         alpha_img = img.copy()
@@ -1,6 +1,7 @@
 import bpy, os, sys, re, time, numpy, math
 from mathutils import *
 from bpy.app.handlers import persistent
+from contextlib import contextmanager
 #from .__init__ import bl_info
 
 BLENDER_28_GROUP_INPUT_HACK = False
@@ -4903,6 +4904,118 @@ def get_first_mirror_modifier(obj):
 
     return None
 
+# Maximum amount of float values kept in the pixel buffer pool (64 MB)
+PIXEL_BUFFER_POOL_MAX_SIZE = 16 * 1024 * 1024
+
+pixel_buffer_pool = {}
+active_pixels_batch = None
+
+def get_pixel_buffer(size):
+    buffers = pixel_buffer_pool.get(size)
+    if buffers: return buffers.pop()
+    return numpy.empty(shape=size, dtype=numpy.float32)
+
+def release_pixel_buffer(pxs):
+    pxs = pxs.reshape(-1)
+    buffers = pixel_buffer_pool.get(pxs.size)
+
+    # One buffer of each size is always kept, so images bigger than the pool can still reuse theirs,
+    # the pool is trimmed back to its maximum size when the batch is done
+    if not buffers:
+        pixel_buffer_pool[pxs.size] = [pxs]
+        return
+
+    pool_size = sum(b.size for buffers in pixel_buffer_pool.values() for b in buffers)
+    if pool_size + pxs.size <= PIXEL_BUFFER_POOL_MAX_SIZE:
+        buffers.append(pxs)
+
+def trim_pixel_buffer_pool():
+    # Drop the largest buffers first
+    pool_size = sum(b.size for buffers in pixel_buffer_pool.values() for b in buffers)
+    for size in sorted(pixel_buffer_pool, reverse=True):
+        buffers = pixel_buffer_pool[size]
+        while buffers and pool_size > PIXEL_BUFFER_POOL_MAX_SIZE:
+            pool_size -= buffers.pop().size
+        if not buffers: del pixel_buffer_pool[size]
+
+class ImagePixelsBatch:
+    # Blender can only read and write the whole pixels of an image,
+    # so the pixels of each image are read once and written back once when the batch is done
+
+    def __init__(self):
+        self.entries = {}
+
+    def get_entry(self, image):
+        key = image.as_pointer()
+        entry = self.entries.get(key)
+        if not entry: return None
+
+        # Image can be removed and another one created at the same address
+        try: valid = entry[0].name == image.name and entry[1].shape == (image.size[1], image.size[0], 4)
+        except ReferenceError: valid = False
+
+        if valid: return entry
+
+        release_pixel_buffer(entry[1])
+        del self.entries[key]
+        return None
+
+    def get_pixels(self, image, read=True):
+        # Returns pixels as (height, width, 4) array, no need to read it if all pixels will be overwritten
+        entry = self.get_entry(image)
+        if entry: return entry[1]
+
+        pxs = get_pixel_buffer(image.size[0]*image.size[1]*4)
+        if read: image.pixels.foreach_get(pxs)
+        pxs = pxs.reshape(image.size[1], image.size[0], 4)
+        self.entries[image.as_pointer()] = [image, pxs, False]
+
+        return pxs
+
+    def set_dirty(self, image):
+        self.entries[image.as_pointer()][2] = True
+
+    def write_entry(self, entry):
+        image, pxs, dirty = entry
+        if dirty:
+            try: image.pixels.foreach_set(pxs.ravel())
+            except ReferenceError: pass
+        release_pixel_buffer(pxs)
+
+    def release(self, image):
+        # Write and forget the pixels of an image that is not needed anymore in the batch
+        entry = self.get_entry(image)
+        if entry:
+            self.write_entry(entry)
+            del self.entries[image.as_pointer()]
+
+    def flush(self):
+        for entry in self.entries.values():
+            self.write_entry(entry)
+        self.entries.clear()
+
+@contextmanager
+def image_pixels_batch():
+    # Segment pixel operations inside this block write the images only once at the end,
+    # pixels should not be modified by other means inside the block
+    global active_pixels_batch
+
+    if active_pixels_batch:
+        yield active_pixels_batch
+        return
+
+    active_pixels_batch = ImagePixelsBatch()
+    try:
+        yield active_pixels_batch
+    finally:
+        batch = active_pixels_batch
+        active_pixels_batch = None
+        batch.flush()
+        trim_pixel_buffer_pool()
+
+def is_region_full_image(image, start_x, start_y, width, height):
+    return start_x <= 0 and start_y <= 0 and width >= image.size[0] and height >= image.size[1]
+
 def copy_image_channel_pixels(src, dest, src_idx=0, dest_idx=0, segment=None, segment_src=None):
 
     start_x = 0
@@ -4927,20 +5040,13 @@ def copy_image_channel_pixels(src, dest, src_idx=0, dest_idx=0, segment=None, se
 
     if is_greater_than_283():
 
-        # Store pixels to numpy
-        dest_pxs = numpy.empty(shape=dest.size[0]*dest.size[1]*4, dtype=numpy.float32)
-        src_pxs = numpy.empty(shape=src.size[0]*src.size[1]*4, dtype=numpy.float32)
-        dest.pixels.foreach_get(dest_pxs)
-        src.pixels.foreach_get(src_pxs)
-
-        # Set array to 3d
-        dest_pxs.shape = (-1, dest.size[0], 4)
-        src_pxs.shape = (-1, src.size[0], 4)
+        with image_pixels_batch() as batch:
+            dest_pxs = batch.get_pixels(dest)
+            src_pxs = batch.get_pixels(src)
 
-        # Copy to selected channel
-        #dest_pxs[dest_idx::4] = src_pxs[src_idx::4]
-        dest_pxs[start_y:start_y+height, start_x:start_x+width][::, ::, dest_idx] = src_pxs[src_start_y:src_start_y+height, src_start_x:src_start_x+width][::, ::, src_idx]
-        dest.pixels.foreach_set(dest_pxs.ravel())
+            # Copy to selected channel
+            dest_pxs[start_y:start_y+height, start_x:start_x+width, dest_idx] = src_pxs[src_start_y:src_start_y+height, src_start_x:src_start_x+width, src_idx]
+            batch.set_dirty(dest)
 
     else:
         # Get image pixels
@@ -4981,18 +5087,14 @@ def copy_image_pixels(src, dest, segment=None, segment_src=None):
         src_start_y = height * segment_src.tile_y
 
     if is_greater_than_283():
-        target_pxs = numpy.empty(shape=dest.size[0]*dest.size[1]*4, dtype=numpy.float32)
-        source_pxs = numpy.empty(shape=src.size[0]*src.size[1]*4, dtype=numpy.float32)
-        dest.pixels.foreach_get(target_pxs)
-        src.pixels.foreach_get(source_pxs)
-
-        # Set array to 3d
-        target_pxs.shape = (-1, dest.size[0], 4)
-        source_pxs.shape = (-1, src.size[0], 4)
 
-        target_pxs[start_y:start_y+height, start_x:start_x+width] = source_pxs[src_start_y:src_start_y+height, src_start_x:src_start_x+width]
+        with image_pixels_batch() as batch:
+            # Target pixels are only read if some of them are kept
+            target_pxs = batch.get_pixels(dest, read=not is_region_full_image(dest, start_x, start_y, width, height))
+            source_pxs = batch.get_pixels(src)
 
-        dest.pixels.foreach_set(target_pxs.ravel())
+            target_pxs[start_y:start_y+height, start_x:start_x+width] = source_pxs[src_start_y:src_start_y+height, src_start_x:src_start_x+width]
+            batch.set_dirty(dest)
 
     else:
         target_pxs = list(dest.pixels)
@@ -5025,14 +5127,11 @@ def set_image_pixels(image, color, segment=None):
         height = segment.height
 
     if is_greater_than_283():
-        pxs = numpy.empty(shape=image.size[0]*image.size[1]*4, dtype=numpy.float32)
-        image.pixels.foreach_get(pxs)
-
-        # Set array to 3d
-        pxs.shape = (-1, image.size[0], 4)
 
-        pxs[start_y:start_y+height, start_x:start_x+width] = color
-        image.pixels.foreach_set(pxs.ravel())
+        with image_pixels_batch() as batch:
+            pxs = batch.get_pixels(image, read=not is_region_full_image(image, start_x, start_y, width, height))
+            pxs[start_y:start_y+height, start_x:start_x+width] = color
+            batch.set_dirty(image)
 
     else:
         pxs = list(image.pixels)
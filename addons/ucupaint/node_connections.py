@@ -1,27 +1,120 @@
-import bpy
+import bpy, time
+from functools import wraps
 from .common import *
 
+# Links of the trees being reconnected, indexed by socket.
+# Getting links of a socket goes through all links of the tree,
+# so checking every connection of a big tree that way is very slow
+link_indices = {}
+link_index_users = 0
+
+# Number of links created, removed and already there on the last reconnection
+link_counters = {'created' : 0, 'removed' : 0, 'kept' : 0}
+
+class LinkIndex:
+    # Links are stored as (link, from socket, to socket)
+    # so removed links never need to be accessed again
+
+    def __init__(self, tree):
+        self.from_links = {}
+        self.to_links = {}
+        for link in tree.links:
+            self.add((link, link.from_socket, link.to_socket))
+
+    def add(self, entry):
+        self.from_links.setdefault(entry[1], []).append(entry)
+        self.to_links.setdefault(entry[2], []).append(entry)
+
+    def discard(self, entry):
+        for links, socket in [(self.from_links, entry[1]), (self.to_links, entry[2])]:
+            entries = links.get(socket)
+            if entries and entry in entries:
+                entries.remove(entry)
+
+def get_link_index(tree):
+    if not link_index_users: return None
+
+    index = link_indices.get(tree.as_pointer())
+    if not index:
+        index = link_indices[tree.as_pointer()] = LinkIndex(tree)
+
+    return index
+
+def use_link_index(func):
+    # Links are indexed once for the whole reconnection, nested reconnections share the index
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global link_index_users
+
+        if link_index_users == 0:
+            for key in link_counters:
+                link_counters[key] = 0
+            T = time.time()
+
+        link_index_users += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            link_index_users -= 1
+            if link_index_users == 0:
+                link_indices.clear()
+
+                ypup = get_user_preferences()
+                if ypup and ypup.developer_mode:
+                    print('INFO:', func.__name__, 'created', link_counters['created'], 'links, removed', link_counters['removed'],
+                            'links and kept', link_counters['kept'], 'links at', '{:0.2f}'.format((time.time() - T) * 1000), 'ms')
+
+    return wrapper
+
+def get_socket_links(tree, socket):
+    index = get_link_index(tree)
+    if index:
+        if socket.is_output:
+            return list(index.from_links.get(socket, []))
+        return list(index.to_links.get(socket, []))
+
+    return [(l, l.from_socket, l.to_socket) for l in socket.links]
+
+def remove_link(tree, entry):
+    tree.links.remove(entry[0])
+    link_counters['removed'] += 1
+
+    index = get_link_index(tree)
+    if index: index.discard(entry)
+
 def create_link(tree, out, inp):
-    if not any(l for l in out.links if l.to_socket == inp):
-        tree.links.new(out, inp)
+    if not any(e for e in get_socket_links(tree, inp) if e[1] == out):
+        link = tree.links.new(out, inp)
+        link_counters['created'] += 1
+
+        index = get_link_index(tree)
+        if index:
+            # New link replaces the link of the input
+            if not getattr(inp, 'is_multi_input', False):
+                for entry in list(index.to_links.get(inp, [])):
+                    index.discard(entry)
+            index.add((link, out, inp))
+
         #print(out, 'is connected to', inp)
+    else: link_counters['kept'] += 1
+
     if inp.node: return inp.node.outputs
     return None
 
 def break_link(tree, out, inp):
-    for link in out.links:
-        if link.to_socket == inp:
-            tree.links.remove(link)
+    for entry in get_socket_links(tree, out):
+        if entry[2] == inp:
+            remove_link(tree, entry)
             return True
     return False
 
 def break_input_link(tree, inp):
-    for link in inp.links:
-        tree.links.remove(link)
+    for entry in get_socket_links(tree, inp):
+        remove_link(tree, entry)
 
 def break_output_link(tree, outp):
-    for link in outp.links:
-        tree.links.remove(link)
+    for entry in get_socket_links(tree, outp):
+        remove_link(tree, entry)
 
 def reconnect_mask_modifier_nodes(tree, mod, start_value):
     
@@ -900,6 +993,7 @@ def reconnect_depth_layer_nodes(group_tree, parallax_ch, parallax):
                 break
 
 #def reconnect_yp_nodes(tree, ch_idx=-1):
+@use_link_index
 def reconnect_yp_nodes(tree, merged_layer_ids = []):
     yp = tree.yp
     nodes = tree.nodes
@@ -1359,6 +1453,7 @@ def reconnect_yp_nodes(tree, merged_layer_ids = []):
 
                 break
 
+@use_link_index
 def reconnect_channel_source_internal_nodes(ch, ch_source_tree):
 
     tree = ch_source_tree
@@ -1399,6 +1494,7 @@ def reconnect_channel_source_internal_nodes(ch, ch_source_tree):
     create_link(tree, rgb, end.inputs[0])
     create_link(tree, alpha, end.inputs[1])
 
+@use_link_index
 def reconnect_source_internal_nodes(layer):
     tree = get_source_tree(layer)
 
@@ -1459,6 +1555,7 @@ def reconnect_source_internal_nodes(layer):
     create_link(tree, rgb, end.inputs[0])
     create_link(tree, alpha, end.inputs[1])
 
+@use_link_index
 def reconnect_mask_internal_nodes(mask):
 
     tree = get_mask_tree(mask)
@@ -1486,6 +1583,7 @@ def reconnect_mask_internal_nodes(mask):
 
     create_link(tree, val, end.inputs[0])
 
+@use_link_index
 def reconnect_layer_nodes(layer, ch_idx=-1, merge_mask=False):
     yp = layer.id_data.yp
 